@@ -72,6 +72,7 @@ selftests/run
 %config(noreplace)/etc/avocado/sysinfo/commands
 %config(noreplace)/etc/avocado/sysinfo/files
 %config(noreplace)/etc/avocado/sysinfo/profilers
+%config(noreplace)/etc/avocado/sysinfo/static_commands
 %config(noreplace)/etc/avocado/scripts/job/pre.d/README
 %config(noreplace)/etc/avocado/scripts/job/post.d/README
 %{python_sitelib}/avocado*
@@ -16,10 +16,14 @@
 The core Avocado application.
 """
 
+import logging
 import os
 import signal
 import sys
+import time
 
+from avocado.core import dispatcher
+from avocado.core import loader
 from avocado.core import output
 from avocado.core.dispatcher import CLICmdDispatcher
 from avocado.core.dispatcher import CLIDispatcher
@@ -34,6 +38,8 @@ class AvocadoApp(object):
     """
 
     def __init__(self):
+        self.time_started = time.time()
+        self.time_configured = None
 
         # Catch all libc runtime errors to STDERR
         os.environ['LIBC_FATAL_STDERR_'] = '1'
@@ -70,6 +76,27 @@ class AvocadoApp(object):
         else:
             # In case of no exceptions, we just reconfigure the output.
             output.reconfigure(self.parser.args)
+        self.time_configured = time.time()
+
+    def _report_startup_profile(self):
+        """
+        Log the time spent loading each plugin and discovering tests by
+        each loader (--profile-startup).
+        """
+        log = logging.getLogger("avocado.app")
+        log.info("Startup profile:")
+        log.info("  %-40s %8.3fs", "options parsed after",
+                 self.time_configured - self.time_started)
+        for plugin_type, name, seconds in sorted(dispatcher.LOAD_TIMES,
+                                                 key=lambda _: -_[2]):
+            log.info("  %-40s %8.3fs", "%s.%s" % (plugin_type, name),
+                     seconds)
+        discovery_times = {}
+        for name, _, seconds in loader.DISCOVERY_TIMES:
+            discovery_times[name] = discovery_times.get(name, 0) + seconds
+        for name, seconds in sorted(discovery_times.iteritems(),
+                                    key=lambda _: -_[1]):
+            log.info("  %-40s %8.3fs", "discovery.%s" % name, seconds)
 
     def run(self):
         try:
@@ -81,6 +108,8 @@ class AvocadoApp(object):
             method = extension.obj.run
             return method(self.parser.args)
         finally:
+            if getattr(self.parser.args, 'profile_startup', False):
+                self._report_startup_profile()
             # This makes sure we cleanup the console (stty echo). The only way
             # to avoid cleaning it is to kill the less (paginator) directly
             STD_OUTPUT.close()
@@ -377,7 +377,7 @@ class Job(object):
     def _log_mux_variants(self, mux):
         job_log = _TEST_LOGGER
 
-        for (index, tpl) in enumerate(mux.variants):
+        for (index, tpl) in mux.iter_variants():
             paths = ', '.join([x.path for x in tpl])
             job_log.info('Variant %s:    %s', index + 1, paths)
 
@@ -20,14 +20,19 @@ Test loader module.
 import ast
 import collections
 import imp
+import importlib
 import inspect
+import logging
 import os
 import re
 import pipes
 import shlex
 import sys
+import threading
+import time
 
 from . import data_dir
+from . import dispatcher
 from . import output
 from . import test
 from . import safeloader
@@ -44,6 +49,39 @@ AVAILABLE = None
 ALL = True
 
 
+#: Time spent discovering tests, list of (loader name, reference, seconds)
+DISCOVERY_TIMES = []
+
+#: Cache of the python files scans (see get_scan_cache())
+_SCAN_CACHE = None
+
+
+def get_scan_cache():
+    """
+    Get the discovery cache of the python files scans, as configured in
+    the ``[loader.cache]`` settings section
+
+    :return: :class:`avocado.core.safeloader.ScanCache` or None when the
+             cache is disabled
+    """
+    global _SCAN_CACHE
+    if _SCAN_CACHE is None:
+        _SCAN_CACHE = False
+        if settings.get_value("loader.cache", "enabled", key_type=bool,
+                              default=True):
+            filename = settings.get_value("loader.cache", "path",
+                                          key_type='path', default=None)
+            if filename is None:
+                datadir = data_dir.get_data_dir()
+                if datadir is not None:
+                    filename = os.path.join(datadir, 'cache',
+                                            'discovery.pickle')
+            workers = settings.get_value("loader.cache", "workers",
+                                         key_type=int, default=None)
+            _SCAN_CACHE = safeloader.ScanCache(filename, workers)
+    return _SCAN_CACHE or None
+
+
 class LoaderError(Exception):
 
     """ Loader exception """
@@ -75,6 +113,71 @@ class LoaderUnhandledReferenceError(LoaderError):
                    " ".join(self.unhandled_references)))
 
 
+class LazyLoaderPlugin(object):
+
+    """
+    Loader plugin registered by its metadata only.
+
+    The module defining the loader, and its dependencies, are only imported
+    when the loader is instantiated (when it's selected to discover tests).
+    """
+
+    def __init__(self, name, module_name, class_name, test_types=()):
+        """
+        :param name: name of the loader (the `name` of its class)
+        :param module_name: module defining the loader class
+        :param class_name: name of the loader class
+        :param test_types: labels of the healthy test types of the loader,
+                           as returned by its `get_type_label_mapping`
+        """
+        self.name = name
+        self.module_name = module_name
+        self.class_name = class_name
+        self.test_types = tuple(test_types)
+        self._plugin = None
+
+    def load(self):
+        """
+        Import the loader class.
+
+        :return: the loader class
+        """
+        if self._plugin is None:
+            start = time.time()
+            try:
+                module = importlib.import_module(self.module_name)
+            finally:
+                dispatcher.record_load_time('loader', self.name,
+                                            time.time() - start)
+            plugin = getattr(module, self.class_name)
+            if not (inspect.isclass(plugin) and
+                    issubclass(plugin, TestLoader)):
+                raise InvalidLoaderPlugin("Object %s is not an instance of "
+                                          "TestLoader" % plugin)
+            self._plugin = plugin
+        return self._plugin
+
+    def __call__(self, args, extra_params):
+        return self.load()(args, extra_params)
+
+    def __eq__(self, other):
+        if not isinstance(other, LazyLoaderPlugin):
+            return False
+        return ((self.module_name, self.class_name) ==
+                (other.module_name, other.class_name))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.module_name, self.class_name))
+
+    def __repr__(self):
+        return "<LazyLoaderPlugin %s (%s.%s)>" % (self.name,
+                                                 self.module_name,
+                                                 self.class_name)
+
+
 class TestLoaderProxy(object):
 
     def __init__(self):
@@ -83,6 +186,10 @@ class TestLoaderProxy(object):
         self.reference_plugin_mapping = {}
 
     def register_plugin(self, plugin):
+        if isinstance(plugin, LazyLoaderPlugin):
+            if plugin not in self.registered_plugins:
+                self.registered_plugins.append(plugin)
+            return
         try:
             if issubclass(plugin, TestLoader):
                 if plugin not in self.registered_plugins:
@@ -99,6 +206,8 @@ class TestLoaderProxy(object):
             List all supported test types (excluding incorrect ones)
             """
             name = plugin.name
+            if isinstance(plugin, LazyLoaderPlugin):
+                return [name + '.' + _ for _ in plugin.test_types]
             mapping = plugin.get_type_label_mapping()
             # Using __func__ to avoid problem with different term_supp instances
             healthy_func = getattr(output.TERM_SUPPORT.healthy_str, '__func__')
@@ -133,11 +242,12 @@ class TestLoaderProxy(object):
             loaders = settings.get_value("plugins", "loaders", list, [])
         if '?' in loaders:
             raise LoaderError("Available loader plugins: %s" % _str_loaders())
+        defaults = []
         if "@DEFAULT" in loaders:  # Replace @DEFAULT with unused loaders
             idx = loaders.index("@DEFAULT")
-            loaders = (loaders[:idx] + [plugin for plugin in supported_loaders
-                                        if plugin not in loaders] +
-                       loaders[idx + 1:])
+            defaults = [plugin for plugin in supported_loaders
+                        if plugin not in loaders]
+            loaders = loaders[:idx] + defaults + loaders[idx + 1:]
             while "@DEFAULT" in loaders:  # Remove duplicate @DEFAULT entries
                 loaders.remove("@DEFAULT")
 
@@ -153,7 +263,17 @@ class TestLoaderProxy(object):
             if len(loaders[i]) == 2:
                 extra_params['loader_options'] = loaders[i][1]
             plugin = self.registered_plugins[supported_loaders.index(name)]
-            self._initialized_plugins.append(plugin(args, extra_params))
+            try:
+                self._initialized_plugins.append(plugin(args, extra_params))
+            except ImportError as details:
+                if not isinstance(plugin, LazyLoaderPlugin):
+                    raise
+                # Loaders not explicitly asked for are skipped, as the
+                # plugins failing to load
+                if name not in defaults:
+                    raise InvalidLoaderPlugin("Loader '%s' not available: %s"
+                                              % (name, details))
+                output.log_plugin_failures([(plugin, details)])
 
     def get_extra_listing(self):
         for loader_plugin in self._initialized_plugins:
@@ -187,36 +307,54 @@ class TestLoaderProxy(object):
                             DEFAULT)
         :return: A list of test factories (tuples (TestClass, test_params))
         """
-        def handle_exception(plugin, details):
+        def handle_exception(plugin, details, exc_info):
             # FIXME: Introduce avocado.exceptions logger and use here
             stacktrace.log_message("Test discovery plugin %s failed: "
                                    "%s" % (plugin, details),
                                    'avocado.app.exceptions')
             # FIXME: Introduce avocado.traceback logger and use here
-            stacktrace.log_exc_info(sys.exc_info(), 'avocado.app.debug')
+            stacktrace.log_exc_info(exc_info, 'avocado.app.debug')
+
+        def get_tests(index):
+            """ Discovered tests of the task (discovering them if needed) """
+            if index not in done:
+                done[index] = self._discover_one(tasks[index], which_tests)
+            _test, failure = done[index]
+            if failure is not None:
+                handle_exception(tasks[index][0], *failure)
+            return _test
+
+        first_time = len(DISCOVERY_TIMES)
+        if references:
+            tasks = [(loader_plugin, reference) for reference in references
+                     for loader_plugin in self._initialized_plugins]
+        else:
+            tasks = [(loader_plugin, None)
+                     for loader_plugin in self._initialized_plugins]
+        done = self._discover_concurrently(tasks, which_tests)
         tests = []
         unhandled_references = []
         if not references:
-            for loader_plugin in self._initialized_plugins:
-                try:
-                    tests.extend(loader_plugin.discover(None, which_tests))
-                except Exception as details:
-                    handle_exception(loader_plugin, details)
+            for index in xrange(len(tasks)):
+                tests.extend(get_tests(index) or [])
         else:
+            index = 0
             for reference in references:
                 handled = False
-                for loader_plugin in self._initialized_plugins:
-                    try:
-                        _test = loader_plugin.discover(reference, which_tests)
-                        if _test:
-                            tests.extend(_test)
-                            handled = True
-                            if not which_tests:
-                                break  # Don't process other plugins
-                    except Exception as details:
-                        handle_exception(loader_plugin, details)
+                for _ in self._initialized_plugins:
+                    if handled and not which_tests:
+                        # Only the first loader handling the reference
+                        # is used by default
+                        index += 1
+                        continue
+                    _test = get_tests(index)
+                    index += 1
+                    if _test:
+                        tests.extend(_test)
+                        handled = True
                 if not handled:
                     unhandled_references.append(reference)
+        self._log_discovery_times(DISCOVERY_TIMES[first_time:])
         if unhandled_references:
             if which_tests:
                 tests.extend([(test.MissingTest, {'name': reference})
@@ -226,6 +364,82 @@ class TestLoaderProxy(object):
                                                     self._initialized_plugins)
         return tests
 
+    @staticmethod
+    def _discover_one(task, which_tests):
+        """
+        Discover the tests of a reference by a loader
+
+        :param task: tuple (loader plugin, reference)
+        :return: tuple (discovered tests, None or (exception, exc_info))
+        """
+        loader_plugin, reference = task
+        start = time.time()
+        try:
+            result = (loader_plugin.discover(reference, which_tests), None)
+        except Exception as details:
+            result = (None, (details, sys.exc_info()))
+        DISCOVERY_TIMES.append((loader_plugin.name, reference,
+                                time.time() - start))
+        return result
+
+    def _discover_concurrently(self, tasks, which_tests):
+        """
+        Discover the tests of all tasks using a pool of threads, so the
+        discovery takes as long as the slowest loader rather than the sum
+        of all of them. Nothing is done when only one loader is used or
+        the ``[loader.discovery] workers`` setting is lower than 2.
+
+        The tasks of the file loaders are run by the main thread, where
+        the scan cache can prefetch the python files in worker processes.
+
+        :param tasks: list of (loader plugin, reference)
+        :return: dict {task index: result of :meth:`_discover_one`}
+        """
+        def worker(pending):
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    index = pending.pop()
+                done[index] = self._discover_one(tasks[index], which_tests)
+
+        done = {}
+        workers = settings.get_value("loader.discovery", "workers",
+                                     key_type=int, default=8)
+        if len(self._initialized_plugins) < 2 or workers < 2:
+            return done
+        lock = threading.Lock()
+        main_pending = []
+        pending = []
+        for index in xrange(len(tasks) - 1, -1, -1):
+            if isinstance(tasks[index][0], FileLoader):
+                main_pending.append(index)
+            else:
+                pending.append(index)
+        threads = [threading.Thread(target=worker, args=(pending,))
+                   for _ in xrange(min(workers - 1, len(pending)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        worker(main_pending)
+        worker(pending)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+        return done
+
+    @staticmethod
+    def _log_discovery_times(discovery_times):
+        """
+        Log the time spent by each loader discovering tests
+        """
+        loader_times = collections.OrderedDict()
+        for name, _, seconds in discovery_times:
+            loader_times[name] = loader_times.get(name, 0) + seconds
+        log = logging.getLogger("avocado.app.debug")
+        for name, seconds in loader_times.iteritems():
+            log.debug("Test discovery of loader %s took %.3fs", name, seconds)
+
     def load_test(self, test_factory):
         """
         Load test from the test factory.
@@ -450,6 +664,9 @@ class FileLoader(TestLoader):
         :return: list of matching tests
         """
         tests = self._discover(reference, which_tests)
+        scan_cache = get_scan_cache()
+        if scan_cache is not None:
+            scan_cache.save()
         if self.test_type:
             mapping = self.get_type_label_mapping()
             if self.test_type == 'INSTRUMENTED':
@@ -517,6 +734,7 @@ class FileLoader(TestLoader):
         else:  # DEFAULT, AVAILABLE => skip missing tests
             onerror = skip_non_test
 
+        paths = []
         for dirpath, dirs, filenames in os.walk(reference, onerror=onerror):
             dirs.sort()
             for file_name in sorted(filenames):
@@ -525,96 +743,31 @@ class FileLoader(TestLoader):
                         if file_name.endswith(suffix):
                             break
                     else:
-                        pth = os.path.join(dirpath, file_name)
-                        tests.extend(self._make_tests(pth, which_tests))
+                        paths.append(os.path.join(dirpath, file_name))
+        scan_cache = get_scan_cache()
+        if scan_cache is not None:
+            # Scan the new python files in parallel (on cold cache)
+            scan_cache.prefetch([_ for _ in paths if _.endswith('.py')],
+                                safeloader.find_avocado_tests)
+        for pth in paths:
+            tests.extend(self._make_tests(pth, which_tests))
         return tests
 
     def _find_avocado_tests(self, path):
         """
         Attempts to find Avocado instrumented tests from Python source files
+        (see :func:`avocado.core.safeloader.find_avocado_tests`), using the
+        discovery cache when enabled
 
         :param path: path to a Python source code file
         :type path: str
         :returns: dictionary with class name and method names
         :rtype: dict
         """
-        # If only the Test class was imported from the avocado namespace
-        test_import = False
-        # The name used, in case of 'from avocado import Test as AvocadoTest'
-        test_import_name = None
-        # If the "avocado" module itself was imported
-        mod_import = False
-        # The name used, in case of 'import avocado as avocadolib'
-        mod_import_name = None
-        # The resulting test classes
-        result = {}
-
-        mod = ast.parse(open(path).read(), path)
-
-        for statement in mod.body:
-            # Looking for a 'from avocado import Test'
-            if (isinstance(statement, ast.ImportFrom) and
-                    statement.module == 'avocado'):
-
-                for name in statement.names:
-                    if name.name == 'Test':
-                        test_import = True
-                        if name.asname is not None:
-                            test_import_name = name.asname
-                        else:
-                            test_import_name = name.name
-                        break
-
-            # Looking for a 'import avocado'
-            elif isinstance(statement, ast.Import):
-                for name in statement.names:
-                    if name.name == 'avocado':
-                        mod_import = True
-                        if name.asname is not None:
-                            mod_import_name = name.nasname
-                        else:
-                            mod_import_name = name.name
-
-            # Looking for a 'class Anything(anything):'
-            elif isinstance(statement, ast.ClassDef):
-                docstring = ast.get_docstring(statement)
-                # Looking for a class that has in the docstring either
-                # ":avocado: enable" or ":avocado: disable
-                if safeloader.is_docstring_tag_disable(docstring):
-                    continue
-                elif safeloader.is_docstring_tag_enable(docstring):
-                    functions = [st.name for st in statement.body if
-                                 isinstance(st, ast.FunctionDef) and
-                                 st.name.startswith('test')]
-                    functions = data_structures.ordered_list_unique(functions)
-                    result[statement.name] = functions
-                    continue
-
-                if test_import:
-                    base_ids = [base.id for base in statement.bases
-                                if hasattr(base, 'id')]
-                    # Looking for a 'class FooTest(Test):'
-                    if test_import_name in base_ids:
-                        functions = [st.name for st in statement.body if
-                                     isinstance(st, ast.FunctionDef) and
-                                     st.name.startswith('test')]
-                        functions = data_structures.ordered_list_unique(functions)
-                        result[statement.name] = functions
-                        continue
-
-                # Looking for a 'class FooTest(avocado.Test):'
-                if mod_import:
-                    for base in statement.bases:
-                        module = base.value.id
-                        klass = base.attr
-                        if module == mod_import_name and klass == 'Test':
-                            functions = [st.name for st in statement.body if
-                                         isinstance(st, ast.FunctionDef) and
-                                         st.name.startswith('test')]
-                            functions = data_structures.ordered_list_unique(functions)
-                            result[statement.name] = functions
-
-        return result
+        scan_cache = get_scan_cache()
+        if scan_cache is None:
+            return safeloader.find_avocado_tests(path)
+        return scan_cache.scan(path, safeloader.find_avocado_tests)
 
     def _make_avocado_tests(self, test_path, make_broken, subtests_filter,
                             test_name=None):
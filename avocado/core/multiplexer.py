@@ -27,6 +27,10 @@ import re
 from . import tree
 
 
+#: Compiled patterns of the params paths (see AvocadoParams._greedy_path)
+_GREEDY_PATHS = {}
+
+
 class MuxTree(object):
 
     """
@@ -46,6 +50,7 @@ class MuxTree(object):
                 self.pools.append(node)
             else:
                 self.pools.append([MuxTree(child) for child in node.children])
+        self._count = None
 
     @staticmethod
     def _iter_mux_leaves(node):
@@ -74,9 +79,76 @@ class MuxTree(object):
         pools = itertools.product(*pools)
         while True:
             # TODO: Implement 2nd level filters here
-            # TODO: This part takes most of the time, optimize it
             yield list(itertools.chain(*pools.next()))
 
+    def count(self):
+        """
+        Number of variants, computed without generating them
+        """
+        if self._count is None:
+            count = 1
+            for pool in self.pools:
+                if isinstance(pool, list):
+                    count *= sum(_.count() for _ in pool)
+            self._count = count
+        return self._count
+
+    def get_variant(self, index):
+        """
+        Generate only the variant number index (in the iteration order)
+
+        :param index: index of the variant, negative indexes count from the
+                      last variant
+        :return: list of the leaves of the variant
+        :raise IndexError: when there's no such variant
+        """
+        count = self.count()
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("Variant index %s out of range (%s variants)"
+                             % (index, count))
+        # Variants iterate as a product of the pools, the last pool changes
+        # the fastest, so index is a mixed radix number of pool choices
+        choices = []
+        for pool in reversed(self.pools):
+            if isinstance(pool, list):
+                index, choice = divmod(index, sum(_.count() for _ in pool))
+                choices.append(choice)
+            else:
+                choices.append(None)
+        choices.reverse()
+        variant = []
+        for pool, choice in itertools.izip(self.pools, choices):
+            if choice is None:
+                variant.append(pool)
+                continue
+            for mux_tree in pool:
+                if choice < mux_tree.count():
+                    variant.extend(mux_tree.get_variant(choice))
+                    break
+                choice -= mux_tree.count()
+        return variant
+
+    def iter_variants(self, start=0, stop=None, step=1):
+        """
+        Iterates through a slice of the variants, generating only the
+        variants of the slice
+
+        :param start: index of the first variant
+        :param stop: index after the last variant (None up to the end)
+        :param step: step between the variants indexes
+        """
+        start, stop, step = slice(start, stop, step).indices(self.count())
+        if (start, step) == (0, 1):
+            for index, variant in itertools.izip(xrange(stop), self):
+                yield variant
+            return
+        index = start
+        while (index < stop) if step > 0 else (index > stop):
+            yield self.get_variant(index)
+            index += step
+
 
 # TODO: Create multiplexer plugin and split these functions into multiple files
 class NoMatchError(KeyError):
@@ -182,7 +254,8 @@ class AvocadoParams(object):
     @staticmethod
     def _greedy_path(path):
         """
-        converts user-friendly asterisk path to python regexp and compiles it:
+        converts user-friendly asterisk path to python regexp and compiles it
+        (compiled paths are cached, they are shared by all params):
         path = ""             => ^$
         path = "/"            => /
         path = "/foo/bar"     => /foo/bar
@@ -191,14 +264,18 @@ class AvocadoParams(object):
         path = "foo/*"        => $MUX_ENTRY/?.*/foo/.*
         path = "/foo/*"       => /foo/.*
         """
+        try:
+            return _GREEDY_PATHS[path]
+        except KeyError:
+            pass
         if not path:
-            return re.compile('^$')
-        if path[-1] == '*':
-            suffix = ''
-            path = path[:-1]
+            pattern = re.compile('^$')
+        elif path[-1] == '*':
+            pattern = re.compile(path[:-1].replace('*', '[^/]*'))
         else:
-            suffix = '$'
-        return re.compile(path.replace('*', '[^/]*') + suffix)
+            pattern = re.compile(path.replace('*', '[^/]*') + '$')
+        _GREEDY_PATHS[path] = pattern
+        return pattern
 
     @staticmethod
     def _is_abspath(path):
@@ -257,15 +334,13 @@ class AvocadoParams(object):
         """
         path = self._greedy_path(path)
         for param in self._rel_paths:
-            try:
-                return param.get_or_die(path, key)
-            except NoMatchError:
-                pass
+            matches = param.get_matches(path, key)
+            if matches:
+                return param.check_matches(path, key, matches)
         if self._is_abspath(path):
-            try:
-                return self._abs_path.get_or_die(path, key)
-            except NoMatchError:
-                pass
+            matches = self._abs_path.get_matches(path, key)
+            if matches:
+                return self._abs_path.check_matches(path, key, matches)
         return self._default_params.get(key, default)
 
     def objects(self, key, path=None):
@@ -282,16 +357,12 @@ class AvocadoParams(object):
         Iterate through all available params and yield origin, key and value
         of each unique value.
         """
-        env = []
-        for param in self._rel_paths:
+        env = set()
+        for param in self._rel_paths + [self._abs_path]:
             for path, key, value in param.iteritems():
                 if (path, key) not in env:
-                    env.append((path, key))
+                    env.add((path, key))
                     yield (path, key, value)
-        for path, key, value in self._abs_path.iteritems():
-            if (path, key) not in env:
-                env.append((path, key))
-                yield (path, key, value)
 
 
 class AvocadoParam(object):
@@ -311,9 +382,23 @@ class AvocadoParam(object):
         # names cache (leaf.path is quite expensive)
         self._leaf_names = [leaf.path + '/' for leaf in leaves]
         self.name = name
+        # key => ((leaf name, value, origin), ...) in the leaves order
+        index = {}
+        for leaf_name, leaf in itertools.izip(self._leaf_names, leaves):
+            environment = leaf.environment
+            origins = leaf.environment_origin
+            for key, value in environment.iteritems():
+                index.setdefault(key, []).append((leaf_name, value,
+                                                  origins[key]))
+        self._index = dict((key, tuple(entries))
+                           for key, entries in index.iteritems())
+        # path pattern => set of names of the matching leaves
+        self._matching = {}
 
     def __eq__(self, other):
-        if self.__dict__ == other.__dict__:
+        if (self._leaves == other._leaves and
+                self._leaf_names == other._leaf_names and
+                self.name == other.name):
             return True
         else:
             return False
@@ -326,13 +411,19 @@ class AvocadoParam(object):
         """ String with identifier and all params """
         return "%s (%s)" % (self.name, self._leaf_names)
 
-    def _get_leaves(self, path):
+    def get_matches(self, path, key):
         """
-        Get all leaves matching the path
+        Get all (value, origin) pairs of the key in the leaves matching path
         """
-        return [self._leaves[i]
-                for i in xrange(len(self._leaf_names))
-                if path.search(self._leaf_names[i])]
+        try:
+            matching = self._matching[path.pattern]
+        except KeyError:
+            matching = frozenset(name for name in self._leaf_names
+                                 if path.search(name))
+            self._matching[path.pattern] = matching
+        return [(value, origin)
+                for leaf_name, value, origin in self._index.get(key, ())
+                if leaf_name in matching]
 
     def get_or_die(self, path, key):
         """
@@ -340,14 +431,18 @@ class AvocadoParam(object):
         :raise NoMatchError: When no matches
         :raise KeyError: When value is not certain (multiple matches)
         """
-        leaves = self._get_leaves(path)
-        ret = [(leaf.environment[key], leaf.environment_origin[key])
-               for leaf in leaves
-               if key in leaf.environment]
+        ret = self.get_matches(path, key)
         if not ret:
             raise NoMatchError("No matches to %s => %s in %s"
                                % (path.pattern, key, self.str_leaves_variant))
-        if len(set([_[1] for _ in ret])) == 1:  # single source of results
+        return self.check_matches(path, key, ret)
+
+    def check_matches(self, path, key, ret):
+        """
+        Get the value of the matches of the key
+        :raise ValueError: When value is not certain (multiple matches)
+        """
+        if len(ret) == 1 or len(set([_[1] for _ in ret])) == 1:
             return ret[0][0]
         else:
             raise ValueError("Multiple %s leaves contain the key '%s'; %s"
@@ -373,6 +468,23 @@ def _report_mux_already_parsed(self, *args, **kwargs):
                        % (args, kwargs))
 
 
+def parse_shard(value):
+    """
+    Parse the ``i/n`` shard specification (i-th of n shards, i from 1)
+
+    :return: tuple (0-based shard index, number of shards)
+    :raise ValueError: on invalid specification
+    """
+    try:
+        index, number = [int(_) for _ in value.split('/')]
+    except ValueError:
+        raise ValueError("Invalid shard '%s', expected 'i/n'" % value)
+    if not 1 <= index <= number:
+        raise ValueError("Invalid shard '%s', 'i' has to be in range 1..%s"
+                         % (value, number))
+    return index - 1, number
+
+
 class Mux(object):
 
     """
@@ -390,6 +502,8 @@ class Mux(object):
         self.debug = debug
         self.data = tree.TreeNodeDebug() if debug else tree.TreeNode()
         self._mux_path = None
+        # (index, number) of the variants shard, (0, 1) for all variants
+        self._shard = (0, 1)
 
     def parse(self, args):
         """
@@ -405,6 +519,9 @@ class Mux(object):
         self._mux_path = getattr(args, 'mux_path', None)
         if self._mux_path is None:
             self._mux_path = ['/run/*']
+        mux_shard = getattr(args, 'mux_shard', None)
+        if mux_shard:
+            self._shard = parse_shard(mux_shard)
         # disable data alteration (and remove data as they are not useful)
         self.data = None
         self.data_inject = _report_mux_already_parsed
@@ -469,13 +586,31 @@ class Mux(object):
         """
         # Currently number of tests is symmetrical
         if self.variants:
-            no_variants = sum(1 for _ in self.variants)
-            if no_variants > 1:
+            if self.variants.count() > 1:
                 self._has_multiple_variants = True
-            return (len(test_suite) * no_variants)
+            return (len(test_suite) * self.get_number_of_variants())
         else:
             return len(test_suite)
 
+    def get_number_of_variants(self):
+        """
+        :return: number of variants of the selected shard
+        """
+        index, number = self._shard
+        return max(0, self.variants.count() - index + number - 1) // number
+
+    def iter_variants(self):
+        """
+        Generate only the variants of the selected shard (every n-th variant
+        starting with the i-th one of ``--mux-shard i/n``)
+
+        :yield (variant index, list of leaves)
+        """
+        index, number = self._shard
+        for variant in self.variants.iter_variants(index, None, number):
+            yield index, variant
+            index += number
+
     def itertests(self):
         """
         Yield variant-id and test params
@@ -484,9 +619,10 @@ class Mux(object):
         """
         if self.variants:  # Copy template and modify it's params
             if self._has_multiple_variants:
-                for i, variant in enumerate(self.variants, 1):
-                    yield i, (variant, self._mux_path)
+                for i, variant in self.iter_variants():
+                    yield i + 1, (variant, self._mux_path)
             else:
-                yield None, (iter(self.variants).next(), self._mux_path)
+                for _, variant in self.iter_variants():
+                    yield None, (variant, self._mux_path)
         else:   # No variants, use template
             yield None, None
@@ -98,6 +98,10 @@ class Parser(object):
                                       default=argparse.SUPPRESS,
                                       action="store_true",
                                       help=BUILTIN_STREAM_SETS['none'])
+        self.application.add_argument('--profile-startup',
+                                      action='store_true', default=False,
+                                      help='Report the time spent importing '
+                                      'and initializing each plugin')
 
     def start(self):
         """
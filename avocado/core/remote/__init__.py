@@ -13,6 +13,6 @@
 # Author: Ruda Moura <rmoura@redhat.com>
 
 from .test import RemoteTest
-from .runner import RemoteTestRunner
+from .runner import RemoteTestRunner, ShardedRemoteTestRunner
 
-__all__ = ['RemoteTestRunner', 'RemoteTest']
+__all__ = ['RemoteTestRunner', 'ShardedRemoteTestRunner', 'RemoteTest']
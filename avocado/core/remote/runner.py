@@ -15,9 +15,14 @@
 
 import json
 import logging
+import multiprocessing
 import os
+import Queue
 import re
+import shutil
 import sys
+import threading
+import time
 
 from fabric.exceptions import CommandTimeout
 
@@ -26,6 +31,7 @@ from .. import exceptions
 from .. import output
 from .. import remoter
 from .. import status
+from ..result import EVENT_PREFIX
 from ..runner import TestRunner
 from ..test import TestName
 from ...utils import archive
@@ -133,12 +139,9 @@ class RemoteTestRunner(TestRunner):
                              "output:\n%s" % output)
         return response
 
-    def run_test(self, references, timeout):
+    def _get_extra_params(self):
         """
-        Run tests.
-
-        :param references: a string with test references.
-        :return: a dictionary with test results.
+        Options of the local job passed on to the remote avocado
         """
         extra_params = []
         mux_files = getattr(self.job.args, 'mux_yaml') or []
@@ -147,6 +150,16 @@ class RemoteTestRunner(TestRunner):
 
         if getattr(self.job.args, "dry_run", False):
             extra_params.append("--dry-run")
+        return extra_params
+
+    def run_test(self, references, timeout):
+        """
+        Run tests.
+
+        :param references: a string with test references.
+        :return: a dictionary with test results.
+        """
+        extra_params = self._get_extra_params()
         references_str = " ".join(references)
 
         avocado_cmd = ('avocado run --force-job-id %s --json - '
@@ -192,25 +205,7 @@ class RemoteTestRunner(TestRunner):
 
         stdout_backup = sys.stdout
         stderr_backup = sys.stderr
-        fabric_debugfile = os.path.join(self.job.logdir, 'remote.log')
-        paramiko_logger = logging.getLogger('paramiko')
-        fabric_logger = logging.getLogger('avocado.fabric')
-        remote_logger = logging.getLogger('avocado.remote')
-        app_logger = logging.getLogger('avocado.debug')
-        fmt = ('%(asctime)s %(module)-10.10s L%(lineno)-.4d %('
-               'levelname)-5.5s| %(message)s')
-        formatter = logging.Formatter(fmt=fmt, datefmt='%H:%M:%S')
-        file_handler = logging.FileHandler(filename=fabric_debugfile)
-        file_handler.setFormatter(formatter)
-        fabric_logger.addHandler(file_handler)
-        paramiko_logger.addHandler(file_handler)
-        remote_logger.addHandler(file_handler)
-        logger_list = [fabric_logger]
-        if self.job.args.show_job_log:
-            logger_list.append(app_logger)
-            output.add_log_handler(paramiko_logger.name)
-        sys.stdout = output.LoggingFile(logger=logger_list)
-        sys.stderr = output.LoggingFile(logger=logger_list)
+        self._redirect_output()
         try:
             try:
                 self.setup()
@@ -239,19 +234,7 @@ class RemoteTestRunner(TestRunner):
                                   logfile=tst['logfile'],
                                   fail_reason=tst['fail_reason'],
                                   job_logdir=local_log_dir)
-                state = test.get_state()
-                self.result.start_test(state)
-                self.job._result_events_dispatcher.map_method('start_test',
-                                                              self.result,
-                                                              state)
-                self.result.check_test(state)
-                self.job._result_events_dispatcher.map_method('end_test',
-                                                              self.result,
-                                                              state)
-                if state['status'] == "INTERRUPTED":
-                    summary.add("INTERRUPTED")
-                elif not status.mapping[state['status']]:
-                    summary.add("FAIL")
+                self._report_test(test.get_state(), summary)
             zip_filename = remote_log_dir + '.zip'
             zip_path_filename = os.path.join(local_log_dir,
                                              os.path.basename(zip_filename))
@@ -271,6 +254,51 @@ class RemoteTestRunner(TestRunner):
             sys.stderr = stderr_backup
         return summary
 
+    def _report_test(self, state, summary):
+        """
+        Feed the state of a finished remote test to the result and the
+        result_events plugins
+
+        :param summary: set of the test failure types, updated in place
+        """
+        self.result.start_test(state)
+        self.job._result_events_dispatcher.map_method('start_test',
+                                                      self.result,
+                                                      state)
+        self.result.check_test(state)
+        self.job._result_events_dispatcher.map_method('end_test',
+                                                      self.result,
+                                                      state)
+        if state['status'] == "INTERRUPTED":
+            summary.add("INTERRUPTED")
+        elif not status.mapping[state['status']]:
+            summary.add("FAIL")
+
+    def _redirect_output(self):
+        """
+        Send the fabric and paramiko logs (and the standard output, where
+        fabric writes) to the remote.log file of the job
+        """
+        fabric_debugfile = os.path.join(self.job.logdir, 'remote.log')
+        paramiko_logger = logging.getLogger('paramiko')
+        fabric_logger = logging.getLogger('avocado.fabric')
+        remote_logger = logging.getLogger('avocado.remote')
+        app_logger = logging.getLogger('avocado.debug')
+        fmt = ('%(asctime)s %(module)-10.10s L%(lineno)-.4d %('
+               'levelname)-5.5s| %(message)s')
+        formatter = logging.Formatter(fmt=fmt, datefmt='%H:%M:%S')
+        file_handler = logging.FileHandler(filename=fabric_debugfile)
+        file_handler.setFormatter(formatter)
+        fabric_logger.addHandler(file_handler)
+        paramiko_logger.addHandler(file_handler)
+        remote_logger.addHandler(file_handler)
+        logger_list = [fabric_logger]
+        if self.job.args.show_job_log:
+            logger_list.append(app_logger)
+            output.add_log_handler(paramiko_logger.name)
+        sys.stdout = output.LoggingFile(logger=logger_list)
+        sys.stderr = output.LoggingFile(logger=logger_list)
+
     def tear_down(self):
         """
         This method is only called when `run_suite` gets to the point of to be
@@ -282,6 +310,361 @@ class RemoteTestRunner(TestRunner):
         pass
 
 
+
+def parse_hosts(hosts, default_port=22):
+    """
+    Parse a comma separated list of ``HOST[:PORT]`` items
+
+    :return: list of (hostname, port)
+    :raise ValueError: on invalid port numbers
+    """
+    parsed = []
+    for host in hosts.split(','):
+        host = host.strip()
+        if not host:
+            continue
+        hostname, _, port = host.partition(':')
+        parsed.append((hostname, int(port) if port else default_port))
+    return parsed
+
+
+class TestEventStreamer(object):
+
+    """
+    File-like object receiving the output of a remote avocado job, which
+    forwards the ``--json-events`` lines to a queue as they come.
+
+    The logs of each finished test are downloaded (from a thread of its
+    own, not to hold back the output) before its end event is forwarded.
+    """
+
+    def __init__(self, host, events, staging_dir=None):
+        """
+        :param host: host name the events are tagged with
+        :param events: queue receiving (event type, host, event)
+        :param staging_dir: local directory the test logs are downloaded
+                            to (None not to download them)
+        """
+        self.host = host
+        self.events = events
+        self.staging_dir = staging_dir
+        self._buffer = ''
+        self._pending = Queue.Queue()
+        thread = threading.Thread(target=self._forward)
+        thread.daemon = True
+        thread.start()
+
+    def write(self, data):
+        self._buffer += data
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            index = line.find(EVENT_PREFIX)
+            if index < 0:
+                continue
+            try:
+                event = json.loads(line[index + len(EVENT_PREFIX):])
+            except ValueError:
+                continue
+            self._pending.put(event)
+
+    def flush(self):
+        pass
+
+    def wait(self):
+        """
+        Wait for all the received events to be forwarded
+        """
+        self._pending.join()
+
+    def _download_logs(self, event):
+        logdir = event.get('logdir')
+        if not logdir:
+            return
+        try:
+            remoter.receive_files(self.staging_dir, logdir)
+        except Exception as details:
+            logging.getLogger('avocado.remote').warning(
+                "Failed to download the logs of %s from %s: %s",
+                event.get('test'), self.host, details)
+        else:
+            event['local_logdir'] = os.path.join(self.staging_dir,
+                                                 os.path.basename(logdir))
+
+    def _forward(self):
+        while True:
+            event = self._pending.get()
+            try:
+                if event.get('event') == 'end' and self.staging_dir:
+                    self._download_logs(event)
+                self.events.put((event.get('event'), self.host, event))
+            finally:
+                self._pending.task_done()
+
+
+class ShardedRemoteTestRunner(RemoteTestRunner):
+
+    """
+    Runs the test references on several remote machines at the same time.
+
+    Each host runs the next pending reference as soon as it's done with
+    the previous one, and streams its test results back as they finish,
+    so the results plugins see them in real time. The reference of a lost
+    host is moved to the other hosts when none of its tests started,
+    otherwise its test in flight and the tests it did not start are
+    reported as errors, as are the references no host was left to run.
+    """
+
+    def __init__(self, job, result):
+        super(ShardedRemoteTestRunner, self).__init__(job, result)
+        #: local unique id of the last reported test
+        self._test_uid = 0
+        #: host => start event of the test running there
+        self._in_flight = {}
+        #: host => progress of the reference running there (reference,
+        #: total and reported number of tests)
+        self._running = {}
+        #: references of lost hosts, to be run by the other hosts
+        self._requeue = multiprocessing.Queue()
+        #: references requeued and not taken by a host yet
+        self._requeued = []
+
+    def _get_remote_avocado_cmd(self, reference):
+        return ('avocado run --json-events - --json-job-result off '
+                '--xunit-job-result off %s %s'
+                % (reference, " ".join(self._get_extra_params())))
+
+    def _next_reference(self, next_index):
+        """
+        Take the next pending reference, the requeued ones first
+
+        :param next_index: :class:`multiprocessing.Value` shared by the
+                           hosts, index of the next pending reference
+        :return: the reference or None when none is left
+        """
+        try:
+            return self._requeue.get_nowait()
+        except Queue.Empty:
+            pass
+        with next_index.get_lock():
+            index = next_index.value
+            if index >= len(self.job.references):
+                return None
+            next_index.value += 1
+        return self.job.references[index]
+
+    def _run_host(self, hostname, port, next_index, events, deadline):
+        """
+        Run references on one host until none is left (runs in a process
+        of its own, as fabric keeps the connection state in globals)
+        """
+        host = "%s:%s" % (hostname, port)
+        try:
+            self.remote = remoter.Remote(
+                hostname=hostname,
+                username=self.job.args.remote_username,
+                password=self.job.args.remote_password,
+                key_filename=self.job.args.remote_key_file,
+                port=port,
+                timeout=self.job.args.remote_timeout,
+                env_keep=self.job.args.env_keep)
+            avocado_installed, _ = self.check_remote_avocado()
+            if not avocado_installed:
+                raise exceptions.JobError('Remote machine does not seem to '
+                                          'have avocado installed')
+            streamer = TestEventStreamer(host, events,
+                                         self._get_staging_dir(host))
+            while True:
+                reference = self._next_reference(next_index)
+                if reference is None:
+                    break
+                events.put(('reference', host, {'reference': reference}))
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        raise CommandTimeout(timeout)
+                self.remote.run(self._get_remote_avocado_cmd(reference),
+                                ignore_status=True, quiet=False,
+                                timeout=timeout, stdout=streamer)
+                streamer.wait()
+        except Exception as details:
+            stacktrace.log_exc_info(sys.exc_info(), logger='avocado.remote')
+            events.put(('lost', host, {'reason': str(details)}))
+        finally:
+            events.put(('done', host, None))
+
+    def _get_staging_dir(self, host):
+        return os.path.join(self.job.logdir, '.remote-%s' % host)
+
+    def _get_test_state(self, event, logdir=None, **overrides):
+        """
+        Build the local state of a remote test event, numbering the test
+        within the local job
+        """
+        self._test_uid += 1
+        name = event['test'].split('-', 1)[-1].split(';', 1)
+        name = TestName(self._test_uid, *name, no_digits=-1)
+        if logdir is None:
+            logdir = os.path.join(self.job.logdir, 'test-results',
+                                  name.str_filesystem())
+        record = {'time': -1, 'start': -1, 'end': -1, 'status': 'ERROR',
+                  'fail_reason': None}
+        record.update(event)
+        record.update(overrides)
+        test = RemoteTest(name=name,
+                          time=record['time'],
+                          start=record['start'],
+                          end=record['end'],
+                          status=record['status'],
+                          logdir=logdir,
+                          logfile=os.path.join(logdir, 'debug.log'),
+                          fail_reason=record['fail_reason'],
+                          job_logdir=self.job.logdir)
+        return test.get_state()
+
+    def _report_reference(self, reference, reason, summary):
+        """
+        Report a reference (or its tests which did not run) as one error
+        """
+        state = self._get_test_state({'test': '0-%s' % reference},
+                                     status='ERROR', fail_reason=reason)
+        self._report_test(state, summary)
+
+    def _handle_lost_reference(self, host, reason, summary):
+        """
+        Requeue the reference of a lost host when none of its tests
+        started, otherwise report the tests it did not start
+        """
+        running = self._running.pop(host, None)
+        if running is None:
+            return
+        remaining = running['total'] - running['reported']
+        if remaining <= 0:
+            return
+        # The tests not run are reported as one
+        self.result.tests_total -= remaining - 1
+        if not running['reported']:
+            self.job.log.info("REQUEUED   : %s", running['reference'])
+            self._requeued.append(running['reference'])
+            self._requeue.put(running['reference'])
+        else:
+            self._report_reference(running['reference'],
+                                   "Lost host %s: %d test(s) not run (%s)"
+                                   % (host, remaining, reason), summary)
+
+    def _handle_event(self, kind, host, event, summary):
+        """
+        Process one event of a host
+
+        :return: False when the host is done
+        """
+        if kind == 'reference':
+            if event['reference'] in self._requeued:
+                self._requeued.remove(event['reference'])
+            self._running[host] = {'reference': event['reference'],
+                                   'total': 1, 'reported': 0}
+        elif kind == 'job':
+            # Each reference was counted as one test until its job started
+            self.result.tests_total += event.get('total', 1) - 1
+            if host in self._running:
+                self._running[host]['total'] = event.get('total', 1)
+        elif kind == 'start':
+            self._in_flight[host] = event
+        elif kind == 'end':
+            self._in_flight.pop(host, None)
+            if host in self._running:
+                self._running[host]['reported'] += 1
+            state = self._get_test_state(event)
+            local_logdir = event.get('local_logdir')
+            if local_logdir and os.path.isdir(local_logdir):
+                shutil.move(local_logdir, state['logdir'])
+            self._report_test(state, summary)
+        elif kind == 'lost':
+            self.job.log.error("HOST LOST  : %s (%s)", host, event['reason'])
+            in_flight = self._in_flight.pop(host, None)
+            if in_flight is not None:
+                reason = "Lost host %s: %s" % (host, event['reason'])
+                state = self._get_test_state(in_flight, status='ERROR',
+                                             fail_reason=reason)
+                self._report_test(state, summary)
+                if host in self._running:
+                    self._running[host]['reported'] += 1
+            self._handle_lost_reference(host, event['reason'], summary)
+        elif kind == 'done':
+            self._running.pop(host, None)
+            return False
+        return True
+
+    def run_suite(self, test_suite, mux, timeout=0, replay_map=None):
+        """
+        Shard the test references among the hosts and report the results
+        as they come.
+
+        :return: a set with types of test failures.
+        """
+        del test_suite     # using self.job.references instead
+        del mux            # we're not using multiplexation here
+        deadline = time.time() + timeout if timeout else None
+        summary = set()
+        hosts = parse_hosts(self.job.args.remote_hosts,
+                            self.job.args.remote_port)
+        next_index = multiprocessing.Value('i', 0)
+        events = multiprocessing.Queue()
+
+        stdout_backup = sys.stdout
+        stderr_backup = sys.stderr
+        self._redirect_output()
+        self.result.tests_total = len(self.job.references)
+        self.result.start_tests()
+        processes = {}
+        try:
+            for hostname, port in hosts:
+                host = "%s:%s" % (hostname, port)
+                self.job.log.info("LOGIN      : %s@%s (TIMEOUT: %s seconds)",
+                                  self.job.args.remote_username, host,
+                                  self.job.args.remote_timeout)
+                os.makedirs(self._get_staging_dir(host))
+                proc = multiprocessing.Process(target=self._run_host,
+                                               args=(hostname, port,
+                                                     next_index, events,
+                                                     deadline))
+                proc.daemon = True
+                proc.start()
+                processes[host] = proc
+            running = set(processes)
+            while running:
+                try:
+                    kind, host, event = events.get(timeout=1)
+                except Queue.Empty:
+                    for host in [_ for _ in running
+                                 if not processes[_].is_alive()]:
+                        self._handle_event('lost', host,
+                                           {'reason': 'process died'},
+                                           summary)
+                        running.discard(host)
+                    continue
+                if not self._handle_event(kind, host, event, summary):
+                    running.discard(host)
+            # No host left to run them
+            for reference in (self._requeued +
+                              self.job.references[next_index.value:]):
+                self._report_reference(reference, "No remote host left to "
+                                       "run it", summary)
+        except KeyboardInterrupt:
+            summary.add('INTERRUPTED')
+        finally:
+            for proc in processes.itervalues():
+                if proc.is_alive():
+                    proc.terminate()
+                proc.join()
+            for host in processes:
+                shutil.rmtree(self._get_staging_dir(host), ignore_errors=True)
+            sys.stdout = stdout_backup
+            sys.stderr = stderr_backup
+        self.result.end_tests()
+        self.job._result_events_dispatcher.map_method('post_tests', self.job)
+        return summary
+
 #class VMTestRunner(RemoteTestRunner):
 #
 #    """
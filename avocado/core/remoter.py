@@ -63,7 +63,7 @@ def _get_env_vars(env_vars):
     return env_vars_map
 
 
-def run(command, ignore_status=False, quiet=True, timeout=60):
+def run(command, ignore_status=False, quiet=True, timeout=60, stdout=None):
     """
     Executes a command on the defined fabric hosts.
 
@@ -76,6 +76,8 @@ def run(command, ignore_status=False, quiet=True, timeout=60):
         command's return code is different than zero.
     :param timeout: Maximum time allowed for the command to return.
     :param quiet: Whether to not log command stdout/err. Default: True.
+    :param stdout: File-like object the command stdout is written to, as
+        it's produced (requires quiet=False).
 
     :return: the result of the remote program's execution.
     :rtype: :class:`avocado.utils.process.CmdResult`.
@@ -93,7 +95,8 @@ def run(command, ignore_status=False, quiet=True, timeout=60):
             fabric_result = fabric.operations.run(command=command,
                                                   quiet=quiet,
                                                   warn_only=True,
-                                                  timeout=timeout)
+                                                  timeout=timeout,
+                                                  stdout=stdout)
             break
         except fabric.network.NetworkError, details:
             fabric_exception = details
@@ -230,7 +233,8 @@ class Remote(object):
                               disable_known_hosts=disable_known_hosts)
 
     @_update_fabric_env
-    def run(self, command, ignore_status=False, quiet=True, timeout=60):
+    def run(self, command, ignore_status=False, quiet=True, timeout=60,
+            stdout=None):
         """
         Run a command on the remote host.
 
@@ -239,6 +243,8 @@ class Remote(object):
             command's return code is different than zero.
         :param timeout: Maximum time allowed for the command to return.
         :param quiet: Whether to not log command stdout/err. Default: True.
+        :param stdout: File-like object the command stdout is written to, as
+            it's produced (requires quiet=False).
 
         :return: the result of the remote program's execution.
         :rtype: :class:`avocado.utils.process.CmdResult`.
@@ -247,7 +253,7 @@ class Remote(object):
 
         with shell_env(**self.env_vars):
             return_dict = fabric.tasks.execute(run, command, ignore_status,
-                                               quiet, timeout,
+                                               quiet, timeout, stdout,
                                                hosts=[self.hostname])
             return return_dict[self.hostname]
 
@@ -17,6 +17,10 @@
 Contains the Result class, used for result accounting.
 """
 
+#: Prefix of the test event lines written by ``--json-events``, telling
+#: them apart from the rest of the output of a job
+EVENT_PREFIX = 'avocado-event: '
+
 
 class Result(object):
 
@@ -17,21 +17,24 @@
 Test runner module.
 """
 
+import errno
+import fcntl
 import logging
 import multiprocessing
 from multiprocessing import queues
 import os
+import select
 import signal
 import sys
 import time
 
 from . import test
 from . import exceptions
+from . import multiplexer
 from . import output
 from . import status
 from .loader import loader
 from .status import mapping
-from ..utils import wait
 from ..utils import runtime
 from ..utils import process
 from ..utils import stacktrace
@@ -74,6 +77,93 @@ def add_runner_failure(test_state, new_status, message):
     return test_state
 
 
+class ChildExitNotifier(object):
+
+    """
+    Wakes up the runner waits when a child process exits.
+
+    While in use (as a context manager), a SIGCHLD handler is installed and
+    the signal wakeup fd (see :func:`signal.set_wakeup_fd`) points to a non
+    blocking pipe, selected along with the test status queues.  Outside of
+    the main thread signals can't be handled, and waits are bounded to
+    :attr:`POLL_INTERVAL` instead.
+    """
+
+    #: Longest wait when the exit of child processes can't be notified
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._pipe = None
+        self._depth = 0
+        self._active = False
+        self._previous_handler = None
+        self._previous_wakeup_fd = -1
+
+    def _get_pipe(self):
+        if self._pipe is None:
+            self._pipe = os.pipe()
+            for fd in self._pipe:
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+                flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+                fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+        return self._pipe
+
+    def __enter__(self):
+        if self._depth == 0:
+            try:
+                wakeup_fd = self._get_pipe()[1]
+                self._previous_handler = signal.signal(signal.SIGCHLD,
+                                                       lambda *args: None)
+                # Don't interrupt the system calls of other code
+                signal.siginterrupt(signal.SIGCHLD, False)
+                self._previous_wakeup_fd = signal.set_wakeup_fd(wakeup_fd)
+                self._active = True
+            except ValueError:  # Not in the main thread
+                self._active = False
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0 and self._active:
+            signal.set_wakeup_fd(self._previous_wakeup_fd)
+            signal.signal(signal.SIGCHLD, self._previous_handler or
+                          signal.SIG_DFL)
+            self._active = False
+
+    def wait(self, fds, timeout):
+        """
+        Wait until one of fds is readable, a child process exits (or any
+        other signal is received) or timeout expires.
+
+        :param fds: file descriptors (or objects with a fileno method)
+        :param timeout: maximum time to wait, in seconds
+        """
+        fds = list(fds)
+        if self._active:
+            fds.append(self._pipe[0])
+        else:
+            timeout = min(timeout, self.POLL_INTERVAL)
+        try:
+            readable = select.select(fds, [], [], max(timeout, 0))[0]
+        except select.error as details:
+            if details.args[0] != errno.EINTR:
+                raise
+            return
+        if self._active and self._pipe[0] in readable:
+            try:
+                while os.read(self._pipe[0], 4096):
+                    pass
+            except OSError as details:
+                if details.errno != errno.EAGAIN:
+                    raise
+
+
+#: Notifies the exits of the test processes to the waits of the runner
+CHILD_EXIT = ChildExitNotifier()
+
+
 class TestStatus(object):
 
     """
@@ -92,6 +182,34 @@ class TestStatus(object):
         self.interrupt = None
         self._failed = False
 
+    def fileno(self):
+        """
+        File descriptor readable when a message is waiting in the queue.
+        """
+        return self.queue._reader.fileno()
+
+    def wait(self, condition, timeout):
+        """
+        Wait until condition() evaluates to True.
+
+        The condition is evaluated again whenever a message arrives in the
+        queue or a child process exits, without polling.
+
+        :param condition: function returning the value to wait for
+        :param timeout: maximum time to wait, in seconds
+        :return: the value of condition(), None on timeout
+        """
+        end = time.time() + timeout
+        with CHILD_EXIT:
+            while True:
+                result = condition()
+                if result:
+                    return result
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                CHILD_EXIT.wait([self], remaining)
+
     def _get_msg_from_queue(self):
         """
         Helper method to handle safely getting messages from the queue.
@@ -142,20 +260,17 @@ class TestStatus(object):
         :param timeout: timeout for early_state
         :raise exceptions.TestError: On timeout/error
         """
-        step = 0.01
-        end = time.time() + timeout
-        while not self.early_status:
-            if not proc.is_alive():
-                if not self.early_status:
-                    raise exceptions.TestError("Process died before it pushed "
-                                               "early test_status.")
-            if time.time() > end and not self.early_status:
-                msg = ("Unable to receive test's early-status in %ss, "
-                       "something wrong happened probably in the "
-                       "avocado framework." % timeout)
-                os.kill(proc.pid, signal.SIGKILL)
-                raise exceptions.TestError(msg)
-            time.sleep(step)
+        self.wait(lambda: self.early_status or not proc.is_alive(), timeout)
+        if self.early_status:
+            return
+        if not proc.is_alive():
+            raise exceptions.TestError("Process died before it pushed "
+                                       "early test_status.")
+        msg = ("Unable to receive test's early-status in %ss, "
+               "something wrong happened probably in the "
+               "avocado framework." % timeout)
+        os.kill(proc.pid, signal.SIGKILL)
+        raise exceptions.TestError(msg)
 
     def _tick(self):
         """
@@ -194,7 +309,7 @@ class TestStatus(object):
                                       " see overall job.log for details.")
         return test_state
 
-    def finish(self, proc, started, timeout, step):
+    def finish(self, proc, started, timeout, step=None):
         """
         Wait for the test process to finish and report status or error status
         if unable to obtain the status till deadline.
@@ -202,20 +317,18 @@ class TestStatus(object):
         :param proc: The test's process
         :param started: Time when the test started
         :param timeout: Timeout for waiting on status
-        :param first: Delay before first check
-        :param step: Step between checks for the status
+        :param step: Unused, kept for compatibility (status changes and
+                     process exits are waited for without polling)
         """
         # Wait for either process termination or test status
-        wait.wait_for(lambda: not proc.is_alive() or self.status, timeout, 0,
-                      step)
+        self.wait(lambda: not proc.is_alive() or self.status, timeout)
         if self.status:     # status exists, wait for process to finish
-            if not wait.wait_for(lambda: not proc.is_alive(), timeout, 0,
-                                 step):
+            if not self.wait(lambda: not proc.is_alive(), timeout):
                 err = "Test reported status but did not finish"
             else:   # Test finished and reported status, pass
                 return self._add_status_failures(self.status)
         else:   # proc finished, wait for late status delivery
-            if not wait.wait_for(lambda: self.status, timeout, 0, step):
+            if not self.wait(lambda: self.status, timeout):
                 err = "Test died without reporting the status."
             else:
                 # Status delivered after the test process finished, pass
@@ -252,6 +365,31 @@ class TestStatus(object):
         return self._add_status_failures(test_state)
 
 
+class RunningTest(object):
+
+    """
+    Bookkeeping of a test process started by the parallel runner
+    """
+
+    def __init__(self, test_factory, proc, test_status, time_started,
+                 deadline, serial_only=False):
+        """
+        :param test_factory: Test factory (test class and parameters)
+        :param proc: The test's process
+        :param test_status: :class:`TestStatus` of the test process
+        :param time_started: Time when the test started
+        :param deadline: Time when the test is going to be interrupted
+        :param serial_only: Whether the test needs exclusive access
+        """
+        self.test_factory = test_factory
+        self.proc = proc
+        self.test_status = test_status
+        self.time_started = time_started
+        self.deadline = deadline
+        self.serial_only = serial_only
+        self.abort_reason = None
+
+
 class TestRunner(object):
 
     """
@@ -270,7 +408,7 @@ class TestRunner(object):
         self.result = result
         self.sigstopped = False
 
-    def _run_test(self, test_factory, queue):
+    def _run_test(self, test_factory, queue, notify_start=True):
         """
         Run a test instance.
 
@@ -283,6 +421,9 @@ class TestRunner(object):
         :type test_factory: tuple of :class:`avocado.core.test.Test` and dict.
         :param queue: Multiprocess queue.
         :type queue: :class:`multiprocessing.Queue` instance.
+        :param notify_start: Whether to notify the result plugins about the
+                             test start from the test process (the parallel
+                             runner does it from the main process).
         """
         signal.signal(signal.SIGTSTP, signal.SIG_IGN)
         logger_list_stdout = [logging.getLogger('avocado.test.stdout'),
@@ -314,10 +455,11 @@ class TestRunner(object):
         except Exception:
             instance.error(stacktrace.str_unpickable_object(early_state))
 
-        self.result.start_test(early_state)
-        self.job._result_events_dispatcher.map_method('start_test',
-                                                      self.result,
-                                                      early_state)
+        if notify_start:
+            self.result.start_test(early_state)
+            self.job._result_events_dispatcher.map_method('start_test',
+                                                          self.result,
+                                                          early_state)
         try:
             instance.run_avocado()
         finally:
@@ -388,8 +530,6 @@ class TestRunner(object):
         ignore_time_started = time.time()
         stage_1_msg_displayed = False
         stage_2_msg_displayed = False
-        first = 0.01
-        step = 0.01
         abort_reason = None
         result_dispatcher = self.job._result_events_dispatcher
 
@@ -402,8 +542,11 @@ class TestRunner(object):
                     except OSError:
                         pass
                     break
-                wait.wait_for(lambda: not queue.empty() or not proc.is_alive(),
-                              cycle_timeout, first, step)
+                # Wake up on test messages and test process exit, or at
+                # least every cycle_timeout to notify the progress
+                test_status.wait(lambda: (not queue.empty() or
+                                          not proc.is_alive()),
+                                 min(cycle_timeout, deadline - time.time()))
                 if test_status.interrupt:
                     break
                 if proc.is_alive():
@@ -437,8 +580,7 @@ class TestRunner(object):
                     os.kill(proc.pid, signal.SIGKILL)
 
         # Get/update the test status
-        test_state = test_status.finish(proc, time_started, cycle_timeout,
-                                        step)
+        test_state = test_status.finish(proc, time_started, cycle_timeout)
 
         # Try to log the timeout reason to test's results and update test_state
         if abort_reason:
@@ -449,13 +591,31 @@ class TestRunner(object):
         if ctrl_c_count > 0:
             self.job.log.debug('')
 
+        if not self._report_test_state(test_factory, test_state, summary):
+            return False
+        if ctrl_c_count > 0:
+            return False
+        return True
+
+    def _report_test_state(self, test_factory, test_state, summary):
+        """
+        Deliver the final test state to the result and result_events plugins.
+
+        :param test_factory: Test factory (test class and parameters).
+        :param test_state: Final test state (dict).
+        :param summary: Contains types of test failures.
+        :type summary: set.
+        :return: False when no other test should be run (failfast or
+                 abort_on_error), True otherwise.
+        """
         # Make sure the test status is correct
         if test_state.get('status') not in status.user_facing_status:
             test_state = add_runner_failure(test_state, "ERROR", "Test reports"
                                             " unsupported test status.")
 
         self.result.check_test(test_state)
-        result_dispatcher.map_method('end_test', self.result, test_state)
+        self.job._result_events_dispatcher.map_method('end_test', self.result,
+                                                      test_state)
         if test_state['status'] == "INTERRUPTED":
             summary.add("INTERRUPTED")
         elif not mapping[test_state['status']]:
@@ -466,11 +626,9 @@ class TestRunner(object):
                 self.job.log.debug("Interrupting job (failfast).")
                 return False
 
-        if test_factory[1]['ct_params'].get('abort_on_error', 'no') in 'yes' \
+        ct_params = test_factory[1].get('ct_params') or {}
+        if ct_params.get('abort_on_error', 'no') in 'yes' \
            and test_state.get('status') in ('ERROR', 'FAIL'):
-            ctrl_c_count += 1
-
-        if ctrl_c_count > 0:
             return False
         return True
 
@@ -497,6 +655,238 @@ class TestRunner(object):
                 factory = template
             yield factory, variant
 
+    def _iter_suite(self, test_suite, mux, deadline, replay_map, summary):
+        """
+        Iterate through the expanded test suite in execution order.
+
+        :param test_suite: a list of tests to run.
+        :param mux: the multiplexer.
+        :param deadline: job deadline (None when the job has no timeout)
+        :param replay_map: optional list of replay test classes
+        :param summary: Contains types of test failures.
+        :type summary: set.
+        :return: Yields tuple(test_factory, job deadline for the test)
+        """
+        no_digits = len(str(self.result.tests_total))
+        index = -1
+        for test_template in test_suite:
+            test_template[1]['base_logdir'] = self.job.logdir
+            test_template[1]['job'] = self.job
+            for test_factory, variant in self._iter_variants(test_template,
+                                                             mux):
+                index += 1
+                test_parameters = test_factory[1]
+                name = test_parameters.get("name")
+                test_parameters["name"] = test.TestName(index + 1, name,
+                                                        variant,
+                                                        no_digits)
+                if deadline is not None and time.time() > deadline:
+                    summary.add('INTERRUPTED')
+                    if 'methodName' in test_parameters:
+                        del test_parameters['methodName']
+                    yield (test.TimeOutSkipTest, test_parameters), 0
+                else:
+                    if (replay_map is not None and
+                            replay_map[index] is not None):
+                        test_parameters["methodName"] = "test"
+                        test_factory = (replay_map[index], test_parameters)
+                    yield test_factory, deadline
+            runtime.CURRENT_TEST = None
+
+    @staticmethod
+    def _is_serial_only(test_factory):
+        """
+        Whether the test requires exclusive access when running in parallel.
+
+        Tests declare it by setting ``run_serial = yes`` in their cartesian
+        config params or ``run_serial: true`` in their multiplex params.
+
+        :param test_factory: Test factory (test class and parameters).
+        """
+        test_parameters = test_factory[1]
+        ct_params = test_parameters.get('ct_params') or {}
+        if ct_params.get('run_serial', 'no') == 'yes':
+            return True
+        params = test_parameters.get('params')
+        if isinstance(params, tuple):
+            params = multiplexer.AvocadoParams(params[0], "run_serial",
+                                               params[1], {})
+            return str(params.get('run_serial', default='no')).lower() in (
+                'yes', 'true', 'on', '1')
+        return False
+
+    def _start_parallel_test(self, test_factory, job_deadline):
+        """
+        Start a test process for the parallel runner.
+
+        :param test_factory: Test factory (test class and parameters).
+        :param job_deadline: Maximum time to execute.
+        :return: :class:`RunningTest` instance
+        """
+        queue = queues.SimpleQueue()
+        proc = multiprocessing.Process(target=self._run_test,
+                                       args=(test_factory, queue, False))
+        test_status = TestStatus(self.job, queue)
+        time_started = time.time()
+        proc.start()
+        test_status.wait_for_early_status(proc, 10)
+
+        timeout = test_status.early_status.get('timeout')
+        timeout = float(timeout or self.DEFAULT_TIMEOUT)
+        deadline = time_started + timeout
+        if job_deadline > 0:
+            deadline = min(deadline, job_deadline)
+        return RunningTest(test_factory, proc, test_status, time_started,
+                           deadline, self._is_serial_only(test_factory))
+
+    def _finish_parallel_test(self, running_test, summary):
+        """
+        Collect the status of a finished parallel test and report it.
+
+        :param running_test: :class:`RunningTest` instance
+        :param summary: Contains types of test failures.
+        :type summary: set.
+        :return: False when no other test should be started.
+        """
+        test_status = running_test.test_status
+        test_state = test_status.finish(running_test.proc,
+                                        running_test.time_started, 1)
+        if running_test.abort_reason:
+            test_state = add_runner_failure(test_state, "INTERRUPTED",
+                                            running_test.abort_reason)
+        # Tests finish in arbitrary order, deliver start and end together so
+        # the result_events plugins always see consistent pairs.
+        early_state = test_status.early_status
+        self.result.start_test(early_state)
+        self.job._result_events_dispatcher.map_method('start_test',
+                                                      self.result,
+                                                      early_state)
+        return self._report_test_state(running_test.test_factory, test_state,
+                                       summary)
+
+    def run_suite_parallel(self, suite, summary, parallel):
+        """
+        Run the tests of the suite using a bounded pool of test processes.
+
+        Each test still runs in its own process with its own timeout, but up
+        to ``parallel`` of them run at the same time.  Tests declared as
+        serial-only (see :meth:`_is_serial_only`) wait for the running tests
+        to finish and run alone.  Results are delivered one by one, in the
+        order the tests finish.
+
+        :param suite: iterator of (test_factory, job_deadline) tuples
+        :param summary: Contains types of test failures.
+        :type summary: set.
+        :param parallel: maximum number of tests running at the same time
+        """
+        running = []
+        pending = None
+        exhausted = False
+        stop = False
+        ctrl_c_count = 0
+        ignore_window = 2.0
+        ignore_time_started = time.time()
+        sigtstp = multiprocessing.Lock()
+
+        def sigtstp_handler(signum, frame):     # pylint: disable=W0613
+            """ SIGSTOP all test processes on SIGTSTP """
+            if not running:
+                return
+            with sigtstp:
+                pids = ", ".join(str(_.proc.pid) for _ in running)
+                msg = "ctrl+z pressed, %%s tests (%s)" % pids
+                if self.sigstopped:
+                    APP_LOG.info("\n" + msg, "resumming")
+                    TEST_LOG.info(msg, "resumming")
+                    sig = signal.SIGCONT
+                else:
+                    APP_LOG.info("\n" + msg, "stopping")
+                    TEST_LOG.info(msg, "stopping")
+                    sig = signal.SIGSTOP
+                for running_test in running:
+                    process.kill_process_tree(running_test.proc.pid, sig,
+                                              False)
+                self.sigstopped = not self.sigstopped
+
+        signal.signal(signal.SIGTSTP, sigtstp_handler)
+
+        # Child exits are notified during the whole loop, so none is missed
+        # between the checks of the running tests and the wait
+        with CHILD_EXIT:
+            while True:
+                try:
+                    while not stop and not exhausted:
+                        if pending is None:
+                            try:
+                                pending = next(suite)
+                            except StopIteration:
+                                exhausted = True
+                                break
+                        serial_only = self._is_serial_only(pending[0])
+                        if running and (serial_only or
+                                        running[0].serial_only or
+                                        len(running) >= parallel):
+                            break
+                        running.append(self._start_parallel_test(*pending))
+                        pending = None
+                        if serial_only:
+                            break
+                    if not running:
+                        break
+
+                    now = time.time()
+                    finished = False
+                    for running_test in running[:]:
+                        if now >= running_test.deadline:
+                            running_test.abort_reason = "Timeout reached"
+                            try:
+                                os.kill(running_test.proc.pid, signal.SIGTERM)
+                            except OSError:
+                                pass
+                        elif (not running_test.test_status.interrupt and
+                              running_test.proc.is_alive()):
+                            continue
+                        running.remove(running_test)
+                        finished = True
+                        if not self._finish_parallel_test(running_test,
+                                                          summary):
+                            stop = True
+                    if running and not finished:
+                        # Wake up on test messages, test process exits or
+                        # the next test deadline
+                        CHILD_EXIT.wait([_.test_status for _ in running],
+                                        min(_.deadline for _ in running) -
+                                        time.time())
+                except KeyboardInterrupt:
+                    time_elapsed = time.time() - ignore_time_started
+                    ctrl_c_count += 1
+                    stop = True
+                    if ctrl_c_count == 1:
+                        self.job.log.debug("\nInterrupt requested. Waiting "
+                                           "%d seconds for %d running tests "
+                                           "to finish (ignoring new Ctrl+C "
+                                           "until then)", ignore_window,
+                                           len(running))
+                        for running_test in running:
+                            running_test.abort_reason = ("Interrupted by "
+                                                         "ctrl+c")
+                        ignore_time_started = time.time()
+                    elif time_elapsed > ignore_window:
+                        for running_test in running:
+                            running_test.abort_reason = ("Interrupted by "
+                                                         "ctrl+c (multiple-"
+                                                         "times)")
+                            self.job.log.debug("Killing test subprocess %s",
+                                               running_test.proc.pid)
+                            try:
+                                os.kill(running_test.proc.pid, signal.SIGKILL)
+                            except OSError:
+                                pass
+
+        if ctrl_c_count > 0:
+            self.job.log.debug('')
+            summary.add('INTERRUPTED')
+
     def run_suite(self, test_suite, mux, timeout=0, replay_map=None):
         """
         Run one or more tests and report with test result.
@@ -516,49 +906,23 @@ class TestRunner(object):
         else:
             deadline = None
 
-        test_result_total = mux.get_number_of_tests(test_suite)
-        no_digits = len(str(test_result_total))
-        self.result.tests_total = test_result_total
+        self.result.tests_total = mux.get_number_of_tests(test_suite)
         self.result.start_tests()
-        index = -1
+        suite = self._iter_suite(test_suite, mux, deadline, replay_map,
+                                 summary)
+        parallel = getattr(self.job.args, 'parallel', 1) or 1
         try:
-            for test_template in test_suite:
-                test_template[1]['base_logdir'] = self.job.logdir
-                test_template[1]['job'] = self.job
-                break_loop = False
-                for test_factory, variant in self._iter_variants(test_template,
-                                                                 mux):
-                    index += 1
-                    test_parameters = test_factory[1]
-                    name = test_parameters.get("name")
-                    test_parameters["name"] = test.TestName(index + 1, name,
-                                                            variant,
-                                                            no_digits)
-                    if deadline is not None and time.time() > deadline:
-                        summary.add('INTERRUPTED')
-                        if 'methodName' in test_parameters:
-                            del test_parameters['methodName']
-                        test_factory = (test.TimeOutSkipTest, test_parameters)
-                        break_loop = not self.run_test(test_factory, queue,
-                                                       summary)
-                        if break_loop:
-                            break
-                    else:
-                        if (replay_map is not None and
-                                replay_map[index] is not None):
-                            test_parameters["methodName"] = "test"
-                            test_factory = (replay_map[index], test_parameters)
-
-                        break_loop = not self.run_test(test_factory, queue,
-                                                       summary, deadline)
-                        if break_loop:
-                            break
-                runtime.CURRENT_TEST = None
-                if break_loop:
-                    break
+            if parallel > 1:
+                self.run_suite_parallel(suite, summary, parallel)
+            else:
+                for test_factory, job_deadline in suite:
+                    if not self.run_test(test_factory, queue, summary,
+                                         job_deadline):
+                        break
         except KeyboardInterrupt:
             TEST_LOG.error('Job interrupted by ctrl+c.')
             summary.add('INTERRUPTED')
+        runtime.CURRENT_TEST = None
 
         if self.job.sysinfo is not None:
             self.job.sysinfo.end_job_hook()
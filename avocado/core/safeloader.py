@@ -17,7 +17,14 @@ Safe (AST based) test loader module utilities
 """
 
 import ast
+import cPickle
+import hashlib
+import multiprocessing
+import os
 import re
+import tempfile
+import threading
+import time
 
 from ..utils import data_structures
 
@@ -139,3 +146,285 @@ def find_class_and_methods(path, method_pattern=None, base_class=None):
                 methods = data_structures.ordered_list_unique(methods)
             result[statement.name] = methods
     return result
+
+
+def find_avocado_tests(path):
+    """
+    Attempts to find Avocado instrumented tests from Python source files
+
+    :param path: path to a Python source code file
+    :type path: str
+    :returns: dictionary with class name and method names
+    :rtype: dict
+    """
+    # If only the Test class was imported from the avocado namespace
+    test_import = False
+    # The name used, in case of 'from avocado import Test as AvocadoTest'
+    test_import_name = None
+    # If the "avocado" module itself was imported
+    mod_import = False
+    # The name used, in case of 'import avocado as avocadolib'
+    mod_import_name = None
+    # The resulting test classes
+    result = {}
+
+    mod = ast.parse(open(path).read(), path)
+
+    for statement in mod.body:
+        # Looking for a 'from avocado import Test'
+        if (isinstance(statement, ast.ImportFrom) and
+                statement.module == 'avocado'):
+
+            for name in statement.names:
+                if name.name == 'Test':
+                    test_import = True
+                    if name.asname is not None:
+                        test_import_name = name.asname
+                    else:
+                        test_import_name = name.name
+                    break
+
+        # Looking for a 'import avocado'
+        elif isinstance(statement, ast.Import):
+            for name in statement.names:
+                if name.name == 'avocado':
+                    mod_import = True
+                    if name.asname is not None:
+                        mod_import_name = name.nasname
+                    else:
+                        mod_import_name = name.name
+
+        # Looking for a 'class Anything(anything):'
+        elif isinstance(statement, ast.ClassDef):
+            docstring = ast.get_docstring(statement)
+            # Looking for a class that has in the docstring either
+            # ":avocado: enable" or ":avocado: disable
+            if is_docstring_tag_disable(docstring):
+                continue
+            elif is_docstring_tag_enable(docstring):
+                functions = [st.name for st in statement.body if
+                             isinstance(st, ast.FunctionDef) and
+                             st.name.startswith('test')]
+                functions = data_structures.ordered_list_unique(functions)
+                result[statement.name] = functions
+                continue
+
+            if test_import:
+                base_ids = [base.id for base in statement.bases
+                            if hasattr(base, 'id')]
+                # Looking for a 'class FooTest(Test):'
+                if test_import_name in base_ids:
+                    functions = [st.name for st in statement.body if
+                                 isinstance(st, ast.FunctionDef) and
+                                 st.name.startswith('test')]
+                    functions = data_structures.ordered_list_unique(functions)
+                    result[statement.name] = functions
+                    continue
+
+            # Looking for a 'class FooTest(avocado.Test):'
+            if mod_import:
+                for base in statement.bases:
+                    module = base.value.id
+                    klass = base.attr
+                    if module == mod_import_name and klass == 'Test':
+                        functions = [st.name for st in statement.body if
+                                     isinstance(st, ast.FunctionDef) and
+                                     st.name.startswith('test')]
+                        functions = data_structures.ordered_list_unique(functions)
+                        result[statement.name] = functions
+
+    return result
+
+
+class ScanError(Exception):
+
+    """
+    Failure of a (cached) scan of a source file
+    """
+
+
+def _scan(item):
+    """
+    Scan one file, see :meth:`ScanCache.scan`
+
+    :param item: tuple (scanner, path)
+    :return: tuple (success, result or error message)
+    """
+    scanner, path = item
+    try:
+        return True, scanner(path)
+    except Exception as details:
+        return False, "%s: %s" % (details.__class__.__name__, details)
+
+
+class ScanCache(object):
+
+    """
+    Persistent cache of the results of scans of source files (such as
+    :func:`find_avocado_tests`), so unchanged files are not parsed again.
+
+    The results of each file are kept while its size and mtime don't
+    change, or, when they do, while the sha1 of its content is the same.
+    Scanners have to be module level functions taking the file path, their
+    results are keyed by their names. A cache can be shared by threads,
+    but only the main thread prefetches.
+    """
+
+    #: Version of the cache file format
+    VERSION = 1
+    #: Minimal number of files to scan using worker processes
+    PARALLEL_MIN = 32
+
+    def __init__(self, filename=None, workers=None, max_age=30):
+        """
+        :param filename: path of the cache file, None to keep the cache only
+                         in memory
+        :param workers: number of processes scanning files in
+                        :meth:`prefetch` (by default the number of CPUs)
+        :param max_age: number of days after which unused entries are
+                        dropped
+        """
+        self.filename = filename
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.max_age = max_age
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if self.filename:
+            try:
+                with open(self.filename, 'rb') as cache_file:
+                    data = cPickle.load(cache_file)
+                if data.get('version') == self.VERSION:
+                    self._entries = data['entries']
+            except Exception:   # Missing or corrupted cache, start over
+                pass
+        return self._entries
+
+    def _get_entry(self, path):
+        """
+        Get the (valid) cache entry of a file
+
+        :return: the entry or None when the file can't be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stat = (stat.st_size, stat.st_mtime)
+        today = int(time.time() / 86400)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(path)
+            if entry is None or entry['stat'] != stat:
+                try:
+                    with open(path, 'rb') as source:
+                        digest = hashlib.sha1(source.read()).hexdigest()
+                except IOError:
+                    return None
+                if entry is None or entry['hash'] != digest:
+                    entry = {'hash': digest, 'results': {}, 'used': today}
+                    entries[path] = entry
+                entry['stat'] = stat
+                self._dirty = True
+            if entry['used'] != today:
+                entry['used'] = today
+                self._dirty = True
+            return entry
+
+    def scan(self, path, scanner):
+        """
+        Get the (cached) result of ``scanner(path)``
+
+        :raise ScanError: when the scanner failed
+        """
+        path = os.path.abspath(path)
+        entry = self._get_entry(path)
+        if entry is None:
+            result = _scan((scanner, path))
+        else:
+            with self._lock:
+                result = entry['results'].get(scanner.__name__)
+            if result is None:
+                result = _scan((scanner, path))
+                with self._lock:
+                    entry['results'][scanner.__name__] = result
+                    self._dirty = True
+        if not result[0]:
+            raise ScanError(result[1])
+        return result[1]
+
+    def prefetch(self, paths, scanner):
+        """
+        Scan the files missing in the cache in worker processes (only when
+        there are enough of them, otherwise they are left to :meth:`scan`).
+        Nothing is done outside of the main thread, as forking the worker
+        processes while other threads run is not safe.
+
+        :param paths: paths of the source files
+        """
+        if (self.workers < 2 or
+                not isinstance(threading.current_thread(),
+                               threading._MainThread)):
+            return
+        missing = []
+        for path in paths:
+            path = os.path.abspath(path)
+            entry = self._get_entry(path)
+            with self._lock:
+                if (entry is not None and
+                        scanner.__name__ not in entry['results']):
+                    missing.append((path, entry))
+        if len(missing) < self.PARALLEL_MIN:
+            return
+        pool = multiprocessing.Pool(min(self.workers, len(missing)))
+        try:
+            results = pool.map(_scan, [(scanner, _[0]) for _ in missing],
+                               max(1, len(missing) / (self.workers * 4)))
+        finally:
+            pool.close()
+            pool.join()
+        with self._lock:
+            for (path, entry), result in zip(missing, results):
+                entry['results'][scanner.__name__] = result
+            self._dirty = True
+
+    def save(self):
+        """
+        Atomically write the modified cache (dropping the entries unused for
+        more than ``max_age`` days). Failures are ignored, the cache is only
+        an optimization.
+        """
+        # Entries are not modified while they are written
+        with self._lock:
+            if not self._dirty or not self.filename:
+                return
+            oldest = int(time.time() / 86400) - self.max_age
+            entries = dict((path, entry)
+                           for path, entry in self._entries.iteritems()
+                           if entry['used'] >= oldest)
+            dirname = os.path.dirname(os.path.abspath(self.filename))
+            try:
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                fd, tmp_path = tempfile.mkstemp(dir=dirname,
+                                                prefix='.scan-cache')
+                try:
+                    with os.fdopen(fd, 'wb') as cache_file:
+                        cPickle.dump({'version': self.VERSION,
+                                      'entries': entries}, cache_file,
+                                     cPickle.HIGHEST_PROTOCOL)
+                    os.rename(tmp_path, self.filename)
+                except Exception:
+                    os.unlink(tmp_path)
+                    raise
+            except (IOError, OSError):
+                return
+            self._entries = entries
+            self._dirty = False
@@ -17,6 +17,8 @@ import json
 import logging
 import os
 import shutil
+import signal
+import threading
 import time
 
 try:
@@ -33,6 +35,43 @@ from ..utils import path as utils_path
 
 log = logging.getLogger("avocado.sysinfo")
 
+#: Files of the package databases, whose mtime moves when packages are
+#: installed or removed
+PACKAGE_DATABASES = ('/var/lib/rpm/Packages',
+                     '/var/lib/rpm/rpmdb.sqlite',
+                     '/var/lib/dpkg/status')
+
+#: Snapshot of the installed packages {'mtime': ..., 'packages': [...]},
+#: shared by the job and the (forked) tests sysinfo
+_PACKAGES = {}
+
+
+def _package_db_mtime():
+    """
+    Modification times of the package databases, or None when none of
+    them was found (and the inventory can't be cached)
+    """
+    mtimes = []
+    for path in PACKAGE_DATABASES:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            continue
+    return tuple(mtimes) or None
+
+
+def get_installed_packages():
+    """
+    List the installed packages, listing them again only when the package
+    databases changed since the last call.
+    """
+    mtime = _package_db_mtime()
+    if mtime is None or _PACKAGES.get('mtime') != mtime:
+        sm = software_manager.SoftwareManager()
+        _PACKAGES['packages'] = sm.list_all()
+        _PACKAGES['mtime'] = mtime
+    return _PACKAGES['packages']
+
 
 class Collectible(object):
 
@@ -115,14 +154,16 @@ class Command(Collectible):
     :param cmd: String with the command.
     :param logf: Basename of the file where output is logged (optional).
     :param compress_logf: Wether to compress the output of the command.
+    :param timeout: Seconds after which the command is killed (optional).
     """
 
-    def __init__(self, cmd, logf=None, compress_log=False):
+    def __init__(self, cmd, logf=None, compress_log=False, timeout=None):
         if not logf:
             logf = cmd.replace(" ", "_")
         super(Command, self).__init__(logf)
         self.cmd = cmd
         self._compress_log = compress_log
+        self.timeout = timeout
 
     def __repr__(self):
         r = "sysinfo.Command(%r, %r, %r)"
@@ -160,10 +201,20 @@ class Command(Collectible):
         logf_path = os.path.join(logdir, self.logf)
         stdin = open(os.devnull, "r")
         stdout = open(logf_path, "w")
+        timer = None
         try:
-            subprocess.call(self.cmd, stdin=stdin, stdout=stdout,
-                            stderr=subprocess.STDOUT, shell=True, env=env)
+            # In its own process group, so the children of the shell are
+            # killed with it on timeout
+            proc = subprocess.Popen(self.cmd, stdin=stdin, stdout=stdout,
+                                    stderr=subprocess.STDOUT, shell=True,
+                                    env=env, preexec_fn=os.setsid)
+            if self.timeout:
+                timer = threading.Timer(self.timeout, self._kill, (proc,))
+                timer.start()
+            proc.wait()
         finally:
+            if timer is not None:
+                timer.cancel()
             for f in (stdin, stdout):
                 f.close()
             if self._compress_log and os.path.exists(logf_path):
@@ -171,6 +222,15 @@ class Command(Collectible):
                             ignore_status=True,
                             verbose=False)
 
+    def _kill(self, proc):
+        if proc.poll() is None:
+            log.warning("Sysinfo command '%s' timed out after %ss, killing "
+                        "it", self.cmd, self.timeout)
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:     # finished meanwhile
+                pass
+
 
 class Daemon(Command):
 
@@ -222,11 +282,12 @@ class JournalctlWatcher(Collectible):
     :param logf: Basename of the file where output is logged (optional).
     """
 
-    def __init__(self, logf=None):
+    def __init__(self, logf=None, timeout=None):
         if not logf:
             logf = 'journalctl.gz'
 
         super(JournalctlWatcher, self).__init__(logf)
+        self.timeout = timeout
         self.cursor = self._get_cursor()
 
     def _get_cursor(self):
@@ -242,7 +303,8 @@ class JournalctlWatcher(Collectible):
         if self.cursor:
             try:
                 cmd = 'journalctl --quiet --after-cursor %s' % self.cursor
-                log_diff = process.system_output(cmd, verbose=False)
+                log_diff = process.system_output(cmd, timeout=self.timeout,
+                                                  verbose=False)
                 dstpath = os.path.join(logdir, self.logf)
                 with gzip.GzipFile(dstpath, "w")as out_journalctl:
                     out_journalctl.write(log_diff)
@@ -354,7 +416,8 @@ class SysInfo(object):
     * end_job
     """
 
-    def __init__(self, basedir=None, log_packages=None, profiler=None):
+    def __init__(self, basedir=None, log_packages=None, profiler=None,
+                 static_in_job=False):
         """
         Set sysinfo collectibles.
 
@@ -365,6 +428,8 @@ class SysInfo(object):
                              files, and if not found, defaults to False.
         :param profiler: Wether to use the profiler. If not given explicitly,
                          tries to look in the config files.
+        :param static_in_job: Whether the static commands are captured by the
+                              job sysinfo, so the test hooks skip them.
         """
         if basedir is None:
             basedir = utils_path.init_dir('sysinfo')
@@ -391,6 +456,33 @@ class SysInfo(object):
             log.debug('File %s does not exist.', commands_file)
             self.commands = []
 
+        # Commands whose output doesn't change during a job, captured once
+        static_file = settings.get_value('sysinfo.collectibles',
+                                         'static_commands',
+                                         key_type='path',
+                                         default='')
+        if os.path.isfile(static_file):
+            log.debug('Static commands configured by file: %s', static_file)
+            self.static_commands = set(genio.read_all_lines(static_file))
+            ignored = self.static_commands.difference(self.commands)
+            if ignored:
+                log.debug('Ignoring static commands not listed in %s: %s',
+                          commands_file, ', '.join(sorted(ignored)))
+                self.static_commands.difference_update(ignored)
+        else:
+            log.debug('File %s does not exist.', static_file)
+            self.static_commands = set()
+        self.static_in_job = static_in_job
+
+        # Blank or 0 means no timeout
+        timeout = settings.get_value('sysinfo.collect', 'timeout',
+                                     default='60', allow_blank=True)
+        self.timeout = float(timeout.strip() or 0) or None
+        self.workers = settings.get_value('sysinfo.collect', 'workers',
+                                          key_type=int, default=4)
+        #: Seconds spent by the last run of each hook
+        self.overhead = {}
+
         files_file = settings.get_value('sysinfo.collectibles',
                                         'files',
                                         key_type='path',
@@ -462,10 +554,15 @@ class SysInfo(object):
                 self.start_job_collectibles.add(Daemon(cmd))
 
         for cmd in self.commands:
-            self.start_job_collectibles.add(Command(cmd))
-            self.end_job_collectibles.add(Command(cmd))
-            self.start_test_collectibles.add(Command(cmd))
-            self.end_test_collectibles.add(Command(cmd))
+            command = Command(cmd, timeout=self.timeout)
+            self.start_job_collectibles.add(command)
+            if cmd in self.static_commands:
+                if not self.static_in_job:
+                    self.start_test_collectibles.add(command)
+                continue
+            self.end_job_collectibles.add(command)
+            self.start_test_collectibles.add(command)
+            self.end_test_collectibles.add(command)
 
         for filename in self.files:
             self.start_job_collectibles.add(Logfile(filename))
@@ -478,7 +575,7 @@ class SysInfo(object):
         except ValueError as details:
             log.debug(details)
 
-        self.end_test_collectibles.add(JournalctlWatcher())
+        self.end_test_collectibles.add(JournalctlWatcher(timeout=self.timeout))
 
     def _get_collectibles(self, hook):
         collectibles = self.hook_mapping.get(hook)
@@ -496,7 +593,7 @@ class SysInfo(object):
                      job).
         """
         collectibles = self._get_collectibles(hook)
-        collectibles.add(Command(cmd))
+        collectibles.add(Command(cmd, timeout=self.timeout))
 
     def add_file(self, filename, hook):
         """
@@ -521,8 +618,7 @@ class SysInfo(object):
         collectibles.add(LogWatcher(filename))
 
     def _get_installed_packages(self):
-        sm = software_manager.SoftwareManager()
-        installed_pkgs = sm.list_all()
+        installed_pkgs = get_installed_packages()
         self._installed_pkgs = installed_pkgs
         return installed_pkgs
 
@@ -544,25 +640,61 @@ class SysInfo(object):
         removed_packages = "\n".join(old_packages - new_packages) + "\n"
         genio.write_file(removed_path, removed_packages)
 
+    def _run_collectibles(self, collectibles, logdir):
+        """
+        Run the collectibles using a pool of ``[sysinfo.collect] workers``
+        threads (commands are killed after ``[sysinfo.collect] timeout``)
+        """
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    collectible = pending.pop()
+                try:
+                    if isinstance(collectible, Daemon):
+                        # log daemons in profile directory
+                        collectible.run(self.profile_dir)
+                    else:
+                        collectible.run(logdir)
+                except Exception as details:
+                    log.error("Sysinfo collectible %r failed: %s",
+                              collectible, details)
+
+        lock = threading.Lock()
+        pending = list(collectibles)
+        threads = [threading.Thread(target=worker)
+                   for _ in xrange(min(self.workers, len(pending)) - 1)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        worker()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+
+    def _log_overhead(self, hook, start):
+        self.overhead[hook] = time.time() - start
+        log.info("Sysinfo %s collection took %.2fs", hook,
+                 self.overhead[hook])
+
     def start_job_hook(self):
         """
         Logging hook called whenever a job starts.
         """
-        for log in self.start_job_collectibles:
-            if isinstance(log, Daemon):  # log daemons in profile directory
-                log.run(self.profile_dir)
-            else:
-                log.run(self.pre_dir)
+        start = time.time()
+        self._run_collectibles(self.start_job_collectibles, self.pre_dir)
 
         if self.log_packages:
             self._log_installed_packages(self.pre_dir)
+        self._log_overhead('start_job', start)
 
     def end_job_hook(self):
         """
         Logging hook called whenever a job finishes.
         """
-        for log in self.end_job_collectibles:
-            log.run(self.post_dir)
+        start = time.time()
+        self._run_collectibles(self.end_job_collectibles, self.post_dir)
         # Stop daemon(s) started previously
         for log in self.start_job_collectibles:
             if isinstance(log, Daemon):
@@ -570,26 +702,29 @@ class SysInfo(object):
 
         if self.log_packages:
             self._log_modified_packages(self.post_dir)
+        self._log_overhead('end_job', start)
 
     def start_test_hook(self):
         """
         Logging hook called before a test starts.
         """
-        for log in self.start_test_collectibles:
-            log.run(self.pre_dir)
+        start = time.time()
+        self._run_collectibles(self.start_test_collectibles, self.pre_dir)
 
         if self.log_packages:
             self._log_installed_packages(self.pre_dir)
+        self._log_overhead('start_test', start)
 
     def end_test_hook(self):
         """
         Logging hook called after a test finishes.
         """
-        for log in self.end_test_collectibles:
-            log.run(self.post_dir)
+        start = time.time()
+        self._run_collectibles(self.end_test_collectibles, self.post_dir)
 
         if self.log_packages:
             self._log_modified_packages(self.post_dir)
+        self._log_overhead('end_test', start)
 
 
 def collect_sysinfo(args):
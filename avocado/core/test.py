@@ -191,7 +191,8 @@ class Test(unittest.TestCase):
         self.outputdir = utils_path.init_dir(self.logdir, 'data')
         self.sysinfo_enabled = getattr(self.job, 'sysinfo', False)
         self.sysinfodir = utils_path.init_dir(self.logdir, 'sysinfo')
-        self.sysinfo_logger = sysinfo.SysInfo(basedir=self.sysinfodir)
+        self.sysinfo_logger = sysinfo.SysInfo(
+            basedir=self.sysinfodir, static_in_job=bool(self.sysinfo_enabled))
 
         self.log = logging.getLogger("avocado.test")
         original_log_warn = self.log.warning
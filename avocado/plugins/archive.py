@@ -14,9 +14,127 @@
 
 """Result Archive Plugin"""
 
-from avocado.core.plugin_interfaces import CLI, Result
+import collections
+import json
+import os
+import shutil
+import zipfile
+
+from avocado.core.plugin_interfaces import CLI, Result, ResultEvents
 from avocado.utils import archive
 
+#: Name of the member indexing the tests of incremental archives
+INDEX_NAME = 'archive-index.json'
+
+
+class IncrementalArchive(object):
+
+    """
+    ZIP archive of a job written test by test, as the tests finish.
+
+    Each test log directory is stored as soon as the test finishes (and
+    optionally removed), the rest of the job directory and an index of the
+    tests (:data:`INDEX_NAME`) are stored when closing the archive.
+    """
+
+    def __init__(self, filename, logdir, remove_logs=False):
+        """
+        :param filename: path of the archive
+        :param logdir: job log directory
+        :param remove_logs: remove the test log directories once archived
+        """
+        self.filename = filename
+        self.logdir = logdir
+        self.remove_logs = remove_logs
+        #: test name => {'logdir', 'status', 'offset', 'members'}
+        self.index = collections.OrderedDict()
+        self._zip = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED,
+                                    allowZip64=True)
+        self._archived = set()
+        self._to_remove = []
+
+    def _add_tree(self, path):
+        """
+        Add the files of path not archived yet
+
+        :return: list of the added members
+        """
+        members = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                filename = os.path.join(root, name)
+                arcname = os.path.relpath(filename, self.logdir)
+                if arcname in self._archived:
+                    continue
+                try:
+                    self._zip.write(filename, arcname)
+                except (IOError, OSError):   # broken links, removed files
+                    continue
+                self._archived.add(arcname)
+                members.append(arcname)
+        return members
+
+    def _remove_archived_logs(self):
+        while self._to_remove:
+            shutil.rmtree(self._to_remove.pop(), ignore_errors=True)
+
+    def add_test(self, state):
+        """
+        Archive the log directory of a finished test
+        """
+        # The logs are removed on the next test, once all the result
+        # plugins processed the test end
+        self._remove_archived_logs()
+        logdir = state.get('logdir')
+        if not logdir or not os.path.isdir(logdir):
+            return
+        offset = self._zip.fp.tell()
+        self.index[str(state['name'])] = {
+            'logdir': os.path.relpath(logdir, self.logdir),
+            'status': state.get('status'),
+            'offset': offset,
+            'members': self._add_tree(logdir)}
+        if self.remove_logs:
+            self._to_remove.append(logdir)
+
+    def close(self):
+        """
+        Archive the rest of the job directory and the index
+        """
+        try:
+            self._remove_archived_logs()
+            self._add_tree(self.logdir)
+            self._zip.writestr(INDEX_NAME, json.dumps({'tests': self.index},
+                                                      indent=4))
+        finally:
+            self._zip.close()
+
+
+def extract_test(filename, name, path='.'):
+    """
+    Extract the log directory of one test from an incremental job archive,
+    reading only its members
+
+    :param filename: path of the archive
+    :param name: test name (or log directory name) as in the index
+    :param path: destination directory
+    :return: path of the extracted test log directory
+    :raise KeyError: when the test is not in the archive
+    """
+    with zipfile.ZipFile(filename) as zip_file:
+        tests = json.loads(zip_file.read(INDEX_NAME))['tests']
+        test = tests.get(name)
+        if test is None:
+            for test in tests.itervalues():
+                if os.path.basename(test['logdir']) == name:
+                    break
+            else:
+                raise KeyError("Test %s not found in %s" % (name, filename))
+        for member in test['members']:
+            zip_file.extract(member, path)
+    return os.path.join(path, test['logdir'])
+
 
 class Archive(Result):
 
@@ -24,10 +142,47 @@ class Archive(Result):
     description = 'Result archive (ZIP) support'
 
     def render(self, result, job):
-        if getattr(job.args, 'archive', False):
+        incremental = getattr(job, 'incremental_archive', None)
+        if incremental is not None:
+            incremental.close()
+        elif getattr(job.args, 'archive', False):
             archive.compress("%s.zip" % job.logdir, job.logdir)
 
 
+class ArchiveIncremental(ResultEvents):
+
+    """
+    Archives the test logs as the tests finish (--archive-incremental)
+    """
+
+    name = 'zip_archive_incremental'
+    description = 'Incremental result archive (ZIP) support'
+
+    def __init__(self, args):
+        self.archive = None
+
+    def pre_tests(self, job):
+        if getattr(job.args, 'archive_incremental', False):
+            self.archive = IncrementalArchive(
+                "%s.zip" % job.logdir, job.logdir,
+                getattr(job.args, 'archive_remove_logs', False))
+            # Closed by the Archive result plugin, once the job is over
+            job.incremental_archive = self.archive
+
+    def start_test(self, result, state):
+        pass
+
+    def test_progress(self, progress=False):
+        pass
+
+    def end_test(self, result, state):
+        if self.archive is not None:
+            self.archive.add_test(state)
+
+    def post_tests(self, job):
+        pass
+
+
 class ArchiveCLI(CLI):
 
     name = 'zip_archive'
@@ -42,6 +197,14 @@ class ArchiveCLI(CLI):
             '-z', '--archive', action='store_true',
             dest='archive', default=False,
             help='Archive (ZIP) files generated by tests')
+        run_subcommand_parser.output.add_argument(
+            '--archive-incremental', action='store_true', default=False,
+            help='Archive (ZIP) the logs of each test as soon as it '
+            'finishes, with an index of the tests (implies --archive)')
+        run_subcommand_parser.output.add_argument(
+            '--archive-remove-logs', action='store_true', default=False,
+            help='Remove the logs of each test once archived (with '
+            '--archive-incremental)')
 
     def run(self, args):
         pass
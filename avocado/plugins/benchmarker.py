@@ -5,6 +5,7 @@
 Avocado Benchmarker Test plugin
 """
 
+import json
 import logging
 import os
 import sys
@@ -19,6 +20,7 @@ from avocado.utils import genio
 from avocado.utils import process
 from avocado.utils import stacktrace
 
+from cloudtest import benchmark_samples
 from cloudtest import data_dir
 from cloudtest import funcatexit
 from cloudtest import utils_env
@@ -132,6 +134,8 @@ class BenchmarkTest(test.Test):
         self.logfile = None
         self.file_handler = None
         self.whiteboard = None
+        #: samples count and regressions, reported in the test state
+        self.benchmark_results = None
         super(BenchmarkTest, self).__init__(methodName=methodName, name=name,
                                             params=params,
                                             base_logdir=base_logdir, job=job,
@@ -172,6 +176,7 @@ class BenchmarkTest(test.Test):
         """
         state = super(BenchmarkTest, self).get_state()
         state["params"] = self.__dict__.get("avocado_params")
+        state["benchmark_results"] = self.__dict__.get("benchmark_results")
         return state
 
     def _start_logging(self):
@@ -187,6 +192,56 @@ class BenchmarkTest(test.Test):
     def write_test_keyval(self, d):
         self.whiteboard = str(d)
 
+    def _ingest_samples(self, samples_path):
+        """
+        Store the samples published by PKB in the test results and the
+        samples store, and check them against the baselines
+
+        :raise exceptions.TestFail: on performance regressions
+        """
+        params = self.params
+        if not os.path.isfile(samples_path):
+            self.log.warn("No samples published by the benchmark")
+            return
+        samples = benchmark_samples.load_samples(samples_path)
+        benchmark_samples.write_samples(
+            samples, os.path.join(self.logdir, 'benchmark_samples.json'))
+        store = benchmark_samples.SampleStore(
+            params.get('benchmark_store',
+                       os.path.join(data_dir.get_data_dir(),
+                                    'benchmark_samples.sqlite')))
+        try:
+            store.add(samples, self.job.unique_id)
+            regressions = store.check_regressions(
+                samples,
+                float(params.get('benchmark_regression_tolerance', 0.1)),
+                params.get('benchmark_baseline_labels', '').split(),
+                params.get('benchmark_update_baseline', 'no') == 'yes',
+                self.job.unique_id)
+        finally:
+            store.close()
+        self.benchmark_results = {
+            'samples': len(samples),
+            'regressions': [{'benchmark': _.sample.benchmark,
+                             'metric': _.sample.metric,
+                             'value': _.sample.value,
+                             'unit': _.sample.unit,
+                             'baseline': _.baseline,
+                             'change': _.change} for _ in regressions]}
+        self.write_test_keyval(json.dumps(self.benchmark_results))
+        for regression in self.benchmark_results['regressions']:
+            self.log.error("Regression of %(benchmark)s %(metric)s: "
+                           "%(value)s %(unit)s (baseline %(baseline)s, "
+                           "%(change)+.1f%%)",
+                           dict(regression, change=regression['change'] * 100))
+        if regressions:
+            msg = ("%d performance regression(s), see the whiteboard"
+                   % len(regressions))
+            if params.get('benchmark_regression_action', 'fail') == 'warn':
+                self.log.warn(msg)
+            else:
+                raise exceptions.TestFail(msg)
+
     def __safe_env_save(self, env):
         """
         Treat "env.save()" exception as warnings
@@ -285,12 +340,20 @@ class BenchmarkTest(test.Test):
                             cmd += (' --openstack_volume_size=%s' %
                                     params.get('volume_size'))
 
+                        # Publish the samples (with their metadata) in the
+                        # test results, to ingest them once PKB is done
+                        samples_path = os.path.join(self.logdir,
+                                                    'pkb_samples.json')
+                        cmd += (' --json_path=%s --nocollapse_labels'
+                                % samples_path)
+
                         self.log.info("Start running benchmark via command: %s"
                                       % cmd)
                         result = process.run(cmd, shell=True)
                         if result.exit_status != 0:
                             self.log.error(result.stderr)
                         self.log.info(result.stdout)
+                        self._ingest_samples(samples_path)
 
                     finally:
                         self.__safe_env_save(env)
@@ -14,15 +14,6 @@ from avocado.core import loader
 from avocado.core.settings import settings
 
 from avocado.plugins.ct_options import CloudTestOptionsProcess
-from avocado.plugins.tempest_test import TempestTestLoader
-from avocado.plugins.rally_test import RallyTest
-from avocado.plugins.healthcheck_test import HealthCheckTestLoader
-from avocado.plugins.security import SecurityTestLoader
-from avocado.plugins.vm_reliability_test import VMReliabilityTestLoader
-from avocado.plugins.benchmarker import BechmarkerTestLoader
-from avocado.plugins.shaker import ShakerTestLoader
-from avocado.plugins.ceph_api import CephApiTestLoader
-from avocado.plugins.nfv import NFVTestLoader
 
 # Avocado's plugin interface module has changed location. Let's keep
 # compatibility with old for at, least, a new LTS release
@@ -32,6 +23,31 @@ except ImportError:
     from avocado.plugins.base import CLI  # pylint: disable=E0611,E0401
 
 
+#: The cloudtest loaders, imported (along with tempest, rally, novaclient,
+#: etc) only when they are used to discover tests
+CLOUDTEST_LOADERS = (
+    loader.LazyLoaderPlugin('ct', 'avocado.plugins.ct', 'CloudTestLoader',
+                            ['CLOUDTEST']),
+    loader.LazyLoaderPlugin('tempest_test', 'avocado.plugins.tempest_test',
+                            'TempestTestLoader', ['TEMPEST']),
+    loader.LazyLoaderPlugin('healthcheck', 'avocado.plugins.healthcheck_test',
+                            'HealthCheckTestLoader', ['HEALTHCHECKTEST']),
+    loader.LazyLoaderPlugin('security', 'avocado.plugins.security',
+                            'SecurityTestLoader', ['SECURITY']),
+    loader.LazyLoaderPlugin('vmreliability',
+                            'avocado.plugins.vm_reliability_test',
+                            'VMReliabilityTestLoader', ['VMRELIABILITY']),
+    loader.LazyLoaderPlugin('bechmarker', 'avocado.plugins.benchmarker',
+                            'BechmarkerTestLoader', ['BENCHMARKING']),
+    loader.LazyLoaderPlugin('shaker', 'avocado.plugins.shaker',
+                            'ShakerTestLoader', ['SHAKER']),
+    loader.LazyLoaderPlugin('ceph-api', 'avocado.plugins.ceph_api',
+                            'CephApiTestLoader', ['CephMgmtApi']),
+    loader.LazyLoaderPlugin('nfv-test', 'avocado.plugins.nfv',
+                            'NFVTestLoader', ['NFVTest']),
+)
+
+
 class CloudTestRun(CLI):
     """
     Avocado CloudTest support
@@ -70,7 +86,10 @@ class CloudTestRun(CLI):
                                              action="store",
                                              default="serial",
                                              help="Run mode of tempest: could"
-                                                  " be 'serial' or 'parallel'")
+                                                  " be 'serial', 'parallel' "
+                                                  "or 'partition' (parallel "
+                                                  "workers balanced by the "
+                                                  "past test durations)")
 
     def run(self, args):
         """
@@ -78,15 +97,8 @@ class CloudTestRun(CLI):
 
         :param args: Command line args received from the run subparser.
         """
-        loader.loader.register_plugin(CloudTestLoader)
-        loader.loader.register_plugin(TempestTestLoader)
-        loader.loader.register_plugin(HealthCheckTestLoader)
-        loader.loader.register_plugin(SecurityTestLoader)
-        loader.loader.register_plugin(VMReliabilityTestLoader)
-        loader.loader.register_plugin(BechmarkerTestLoader)
-        loader.loader.register_plugin(ShakerTestLoader)
-        loader.loader.register_plugin(CephApiTestLoader)
-        loader.loader.register_plugin(NFVTestLoader)
+        for loader_plugin in CLOUDTEST_LOADERS:
+            loader.loader.register_plugin(loader_plugin)
 
 
 class CloudTestLoader(loader.TestLoader):
@@ -125,7 +137,7 @@ class CloudTestLoader(loader.TestLoader):
 
         :return: Dict {TestClass: 'TEST_LABEL_STRING'}
         """
-
+        from avocado.plugins.rally_test import RallyTest
         return {RallyTest: 'CLOUDTEST'}
 
     @staticmethod
@@ -135,6 +147,7 @@ class CloudTestLoader(loader.TestLoader):
 
         :return: Dict {TestClass: decorator function}
         """
+        from avocado.plugins.rally_test import RallyTest
         term_support = output.TermSupport()
         return {RallyTest: term_support.healthy_str}
 
@@ -144,6 +157,7 @@ class CloudTestLoader(loader.TestLoader):
         except Exception as details:
             raise EnvironmentError(details)
 
+        from avocado.plugins.rally_test import RallyTest
         if url is not None:
             cartesian_parser.only_filter(url)
         elif which_tests is loader.DEFAULT:
@@ -213,7 +227,8 @@ class CloudTestLister(CLI):
                                             action="store",
                                             default="serial",
                                             help="Run type of Tempest tests, "
-                                            "could be 'serial', 'paralle'")
+                                            "could be 'serial', 'parallel', "
+                                            "'partition'")
 
     def run(self, args):
-        loader.loader.register_plugin(CloudTestLoader)
+        loader.loader.register_plugin(CLOUDTEST_LOADERS[0])
@@ -3,13 +3,159 @@
 # Author: Yingfu Zhou <zhouyf6@lenovo.com>
 
 
+import cPickle
+import hashlib
 import os
 import logging
+import tempfile
+import threading
 
 from avocado.core.settings import settings
 from cloudtest import cartesian_config
 
 
+class CartesianParserCache(object):
+
+    """
+    Cache of parsed cartesian configs, shared by all the cloudtest loaders.
+
+    Parsed trees are stored pickled, so every :meth:`get` returns a private
+    parser the caller is free to filter (``only_filter`` modifies the tree).
+    Entries are keyed by the config file and the assigned overrides and are
+    only reused while the mtime of every parsed file (including the
+    ``include``-d ones) is unchanged.  When a cache directory is configured,
+    the compiled form is also stored on disk, so later avocado invocations
+    don't need to lex and parse the config again.  The cache is thread
+    safe: concurrent lookups of an entry not cached yet wait for the one
+    thread parsing it.
+    """
+
+    #: Bump when the pickled parser layout changes
+    VERSION = 1
+
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: directory for the on-disk compiled configs (None
+                          keeps the cache in memory only)
+        """
+        self.cache_dir = cache_dir
+        self._entries = {}
+        # Guards the counters and the per-key locks
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _get_mtimes(filenames):
+        mtimes = {}
+        for filename in filenames:
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime
+            except OSError:
+                return None
+        return mtimes
+
+    def _is_valid(self, entry):
+        return (entry is not None and
+                entry.get('version') == self.VERSION and
+                self._get_mtimes(entry['mtimes']) == entry['mtimes'])
+
+    def _get_disk_path(self, key):
+        return os.path.join(self.cache_dir, "cartesian-%s.pickle"
+                            % hashlib.sha1(repr(key)).hexdigest())
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._get_disk_path(key), 'rb') as cache_file:
+                entry = cPickle.load(cache_file)
+        except Exception:   # Missing or broken cache files are just misses
+            return None
+        if not isinstance(entry, dict) or entry.get('key') != key:
+            return None
+        return entry
+
+    def _save_to_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                            prefix='.cartesian-')
+            with os.fdopen(fd, 'wb') as cache_file:
+                cPickle.dump(entry, cache_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._get_disk_path(key))
+        except (IOError, OSError) as details:
+            logging.debug("Unable to store compiled cartesian config in %s: "
+                          "%s", self.cache_dir, details)
+
+    def get(self, cfg, assignments=()):
+        """
+        Get a parser for the given config file and assignments.
+
+        :param cfg: path of the cartesian config file
+        :param assignments: sequence of (key, value) assigned after parsing
+        :return: a new :class:`cloudtest.cartesian_config.Parser`
+        """
+        key = (os.path.abspath(cfg), tuple(assignments))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if self._is_valid(entry):
+                counter = 'hits'
+            else:
+                entry = self._load_from_disk(key)
+                if self._is_valid(entry):
+                    counter = 'disk_hits'
+                else:
+                    counter = 'misses'
+                    entry = self._parse(key)
+                    self._save_to_disk(key, entry)
+                self._entries[key] = entry
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        return cPickle.loads(entry['parser'])
+
+    def _parse(self, key):
+        cfg, assignments = key
+        parser = cartesian_config.Parser(debug=False)
+        parser.parse_file(cfg)
+        for name, value in assignments:
+            parser.assign(name, value)
+        # The mtimes are taken after parsing, a file modified in the meantime
+        # simply invalidates the entry on the next lookup
+        return {'version': self.VERSION,
+                'key': key,
+                'mtimes': self._get_mtimes(parser.parsed_files),
+                'parser': cPickle.dumps(parser, cPickle.HIGHEST_PROTOCOL)}
+
+    def clear(self):
+        """
+        Drop all in-memory entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """
+        :return: dict with the hits, disk_hits and misses counters
+        """
+        return {'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses}
+
+
+#: Parsed config cache shared by all the loaders of this process
+PARSER_CACHE = CartesianParserCache(settings.get_value(
+    'cloudtest.common', 'config_cache_dir', default=None))
+
+
 class CloudTestOptionsProcess(object):
 
     """
@@ -58,21 +204,21 @@ class CloudTestOptionsProcess(object):
         #                             self.options.vt_type,
         #                             " ".join(SUPPORTED_TEST_TYPES)))
 
-        self.cartesian_parser = cartesian_config.Parser(debug=False)
-
         if self.options.ct_config:
             cfg = os.path.abspath(self.options.ct_config)
         else:
             cfg = os.path.join(settings.get_value('datadir.paths', 'base_dir'),
                                'config/tests.cfg')
-        self.cartesian_parser.parse_file(cfg)
 
+        assignments = []
         if self.options.tempest_run_type:
-            self.cartesian_parser.assign('tempest_run_type',
-                                         self.options.tempest_run_type)
+            assignments.append(('tempest_run_type',
+                                self.options.tempest_run_type))
         if self.options.tempest_run_mode:
-            self.cartesian_parser.assign('tempest_run_mode',
-                                         self.options.tempest_run_type)
+            assignments.append(('tempest_run_mode',
+                                self.options.tempest_run_mode))
+        self.cartesian_parser = PARSER_CACHE.get(cfg, assignments)
+        logging.debug("Cartesian config cache: %s", PARSER_CACHE.stats())
         # if self.options.rally_debug:
         #     self._process_general_options()
         # self._process_extra_params()
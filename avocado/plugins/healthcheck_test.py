@@ -5,7 +5,6 @@ import os
 import sys
 import logging
 import Queue
-import ipaddr
 
 from avocado.core import exceptions
 from avocado.core import test
@@ -18,7 +17,7 @@ from avocado.utils import stacktrace
 
 from cloudtest import data_dir
 from cloudtest import utils_params
-from cloudtest.health_check import HealthCheck
+from cloudtest import health_check
 
 from avocado.plugins.ct_options import CloudTestOptionsProcess
 
@@ -315,44 +314,17 @@ class HealthCheckTest(test.Test):
         for key in keys:
             self.log.info("    %s = %s", key, params[key])
 
-        ips_list = []
-        host_list = params.get("host_ips").split(",")
-        for item in host_list:
-            if item.find("/") != -1:
-                for ip_info in ipaddr.IPv4Network(item):
-                    ips_list.append(str(ip_info))
-            elif item.find("-") != -1:
-                begin_ip, end_ip = item.split("-")
-                ip_ranges = ipaddr.summarize_address_range(
-                    ipaddr.IPv4Address(begin_ip), ipaddr.IPv4Address(end_ip))
-                for ip_range in ip_ranges:
-                    for ip_info in ipaddr.IPv4Network(str(ip_range)):
-                        ips_list.append(str(ip_info))
-            else:
-                ips_list.append(item)
-
-        ips_list = sorted(set(ips_list), key=ips_list.index)
+        ips_list = health_check.get_host_ips(params.get("host_ips"))
         self.log.debug("all health check ip list:")
         self.log.debug(ips_list)
 
         test_passed = True
-        health_check_result = {}
 
         try:
             try:
                 try:
-                    for host_ip in ips_list:
-                        try:
-                            health_check = \
-                                HealthCheck(host_ip, params,
-                                            is_raise_health_check_excp=True)
-
-                            health_check.get_health_status()
-                            health_check_result[host_ip] = True
-                        except exceptions.TestError:
-                            health_check_result[host_ip] = False
-                        except exceptions.TestFail:
-                            health_check_result[host_ip] = False
+                    health_check_result = health_check.check_hosts(ips_list,
+                                                                   params)
                     for key in health_check_result.keys():
                         result = health_check_result[key]
                         if not result:
@@ -17,8 +17,10 @@
 import os
 import sqlite3
 import datetime
+import time
 
 from avocado.core.plugin_interfaces import CLI, ResultEvents
+from avocado.core.settings import settings
 
 JOURNAL_FILENAME = ".journal.sqlite"
 
@@ -30,6 +32,21 @@ SCHEMA = {'job_info': 'CREATE TABLE job_info (unique_id TEXT UNIQUE)',
                            "status TEXT, "
                            "flushed BOOLEAN DEFAULT 0)")}
 
+INSERT_SQL = ("INSERT INTO test_journal (tag, time, action, status) "
+              "VALUES (?, ?, ?, ?)")
+
+#: Indexes used by the replay (pending entries by time, entries by test)
+INDEXES = ("CREATE INDEX IF NOT EXISTS test_journal_time "
+           "ON test_journal (flushed, time)",
+           "CREATE INDEX IF NOT EXISTS test_journal_tag "
+           "ON test_journal (tag, action)")
+
+#: Durability levels (--journal-durability) and their sqlite synchronous mode:
+#: "full" syncs each commit, "normal" syncs only the WAL checkpoints (a
+#: power loss may lose the last commits, never corrupts the journal) and
+#: "off" never syncs
+DURABILITY = {'full': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
 
 class JournalResult(ResultEvents):
     """
@@ -50,65 +67,121 @@ class JournalResult(ResultEvents):
         :param job: an instance of :class:`avocado.core.job.Job`.
         """
         self.journal_initialized = False
-
-    def _init_journal(self, logdir):
-        self.journal_path = os.path.join(logdir, JOURNAL_FILENAME)
-        self.journal = sqlite3.connect(self.journal_path)
-        self.journal_cursor = self.journal.cursor()
+        durability = getattr(args, 'journal_durability', None)
+        if durability is None:
+            durability = settings.get_value('plugins.journal', 'durability',
+                                            default='normal')
+        if durability not in DURABILITY:
+            raise ValueError("Invalid journal durability '%s' (%s)"
+                             % (durability, ", ".join(sorted(DURABILITY))))
+        self.durability = durability
+        #: Maximum number of entries committed at once
+        self.batch_size = settings.get_value('plugins.journal', 'batch_size',
+                                             key_type=int, default=100)
+        #: Maximum time (in seconds) the entries wait to be committed
+        self.flush_interval = settings.get_value('plugins.journal',
+                                                 'flush_interval',
+                                                 key_type=float, default=1.0)
+        self._pending = []
+        self._pending_since = None
+        # Process buffering the entries, the test processes forked by the
+        # runner report the start of their test themselves
+        self._pid = os.getpid()
+
+    def _connect(self, state):
+        """
+        Open the journal (creating it when needed) of the job of state
+        """
+        journal_path = os.path.join(state['job_logdir'], JOURNAL_FILENAME)
+        journal = sqlite3.connect(journal_path, timeout=60)
+        cursor = journal.cursor()
+        # WAL lets the readers (avocado-journal-replay) run while writing
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=%s" % DURABILITY[self.durability])
         for table in SCHEMA:
-            res = \
-                self.journal_cursor.execute("PRAGMA table_info('%s')" % table)
+            res = cursor.execute("PRAGMA table_info('%s')" % table)
             if res.fetchone() is None:
-                self.journal_cursor.execute(SCHEMA[table])
-        self.journal.commit()
+                cursor.execute(SCHEMA[table])
+        for index in INDEXES:
+            cursor.execute(index)
+        res = cursor.execute("SELECT unique_id FROM job_info")
+        if res.fetchone() is None:
+            sql = "INSERT INTO job_info (unique_id) VALUES (?)"
+            cursor.execute(sql, (state['job_unique_id'],))
+        journal.commit()
+        return journal_path, journal, cursor
 
     def lazy_init_journal(self, state):
         # lazy init because we need the toplevel logdir for the job
         if not self.journal_initialized:
-            self._init_journal(state['job_logdir'])
-            self._record_job_info(state)
+            (self.journal_path, self.journal,
+             self.journal_cursor) = self._connect(state)
             self.journal_initialized = True
 
     def _shutdown_journal(self):
-        self.journal.close()
-
-    def _record_job_info(self, state):
-        res = self.journal_cursor.execute("SELECT unique_id FROM job_info")
-        if res.fetchone() is None:
-            sql = "INSERT INTO job_info (unique_id) VALUES (?)"
-            self.journal_cursor.execute(sql, (state['job_unique_id'],))
-            self.journal.commit()
+        if self.journal_initialized:
+            self.flush()
+            self.journal.close()
+            self.journal_initialized = False
 
     def _record_status(self, state, action):
-        sql = "INSERT INTO test_journal (tag, time, action, status) " \
-              "VALUES (?, ?, ?, ?)"
-
         # This shouldn't be required
         if action == "ENDED":
             status = state['status']
         else:
             status = None
 
-        self.journal_cursor.execute(sql,
-                                    (str(state['name']),
-                                     datetime.datetime(1, 1,
-                                                       1).now().isoformat(),
-                                     action,
-                                     status))
+        entry = (str(state['name']),
+                 datetime.datetime(1, 1, 1).now().isoformat(),
+                 action,
+                 status)
+        if os.getpid() != self._pid:
+            # Test process, commit right away using its own connection
+            journal = self._connect(state)[1]
+            try:
+                journal.execute(INSERT_SQL, entry)
+                journal.commit()
+            finally:
+                journal.close()
+            return
+        self.lazy_init_journal(state)
+        self._pending.append(entry)
+        if self._pending_since is None:
+            self._pending_since = time.time()
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self._flush_expired()
+
+    def _flush_expired(self):
+        if (self._pending_since is not None and
+                time.time() - self._pending_since >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Commit the pending entries (in one transaction)
+        """
+        if not self._pending:
+            return
+        self.journal_cursor.executemany(INSERT_SQL, self._pending)
         self.journal.commit()
+        self._pending = []
+        self._pending_since = None
 
     def pre_tests(self, job):
         pass
 
     def start_test(self, result, state):
-        self.lazy_init_journal(state)
         self._record_status(state, "STARTED")
 
     def test_progress(self, progress=False):
-        pass
+        # Called periodically while tests run, commits the entries
+        # waiting for longer than flush_interval
+        if self.journal_initialized:
+            self._flush_expired()
 
     def end_test(self, result, state):
-        self.lazy_init_journal(state)
         self._record_status(state, "ENDED")
 
     def post_tests(self, job):
@@ -134,6 +207,13 @@ class Journal(CLI):
         run_subcommand_parser.output.add_argument('--journal',
                                                   action='store_true',
                                                   help=help_msg)
+        run_subcommand_parser.output.add_argument(
+            '--journal-durability', choices=sorted(DURABILITY), default=None,
+            help="Durability of the journal writes: 'full' syncs each "
+            "commit, 'normal' may lose the last entries on power loss, "
+            "'off' never syncs. Current: %s"
+            % settings.get_value('plugins.journal', 'durability',
+                                 default='normal'))
 
     def run(self, args):
         pass
@@ -22,47 +22,133 @@ import logging
 import os
 
 from avocado.core.parser import FileOrStdoutAction
-from avocado.core.plugin_interfaces import CLI, Result
+from avocado.core.plugin_interfaces import CLI, Result, ResultEvents
+from avocado.core.result import EVENT_PREFIX
 
 
 UNKNOWN = '<unknown>'
 
 
+def _test_record(test):
+    return {'id': str(test.get('name', UNKNOWN)),
+            'start': test.get('time_start', -1),
+            'end': test.get('time_end', -1),
+            'time': test.get('time_elapsed', -1),
+            'status': test.get('status', {}),
+            'whiteboard': test.get('whiteboard', UNKNOWN),
+            'logdir': test.get('logdir', UNKNOWN),
+            'logfile': test.get('logfile', UNKNOWN),
+            'fail_reason': str(test.get('fail_reason', UNKNOWN)),
+            # COMPATIBILITY: `test` and `url` are backward
+            # compatibility key names for the test ID,
+            # as defined by the test name RFC.  `url` is
+            # not a test reference, as it's recorded
+            # after it has been processed by the test resolver
+            # (currently called test loader in the code).
+            # Expect them to be removed in the future.
+            'test': str(test.get('name', UNKNOWN)),
+            'url': str(test.get('name', UNKNOWN))}
+
+
+def _summary(result):
+    return {'job_id': result.job_unique_id,
+            'debuglog': result.logfile,
+            'total': result.tests_total,
+            'pass': result.passed,
+            'errors': result.errors,
+            'failures': result.failed,
+            'skip': result.skipped,
+            'time': result.tests_total_time}
+
+
+def _get_output_paths(job):
+    """
+    Return the paths of the JSON files requested for the job.
+    """
+    paths = []
+    if getattr(job.args, 'json_job_result', 'off') == 'on':
+        paths.append(os.path.join(job.logdir, 'results.json'))
+    json_path = getattr(job.args, 'json_output', None)
+    if json_path is not None and json_path != '-':
+        paths.append(json_path)
+    return paths
+
+
+class JSONStreamWriter(object):
+
+    """
+    Writes a JSON result document one test at a time.
+
+    The document stays valid JSON after every test: the summary is written
+    in a space padded header, rewritten in place, and the test records are
+    appended before the closing brackets, so results of interrupted jobs
+    can still be read (by the diff and replay plugins, for instance).
+    """
+
+    #: Room left in the header for the summary values to grow
+    HEADER_PADDING = 128
+    TRAILER = '\n    ]\n}\n'
+
+    def __init__(self, path, result):
+        self.path = path
+        self.tests = 0
+        self._file = open(path, 'w')
+        header = self._header(result)
+        self._header_size = len(header) + self.HEADER_PADDING
+        self._file.write(header.ljust(self._header_size))
+        self._file.write('\n    "tests": [')
+        self._tail = self._file.tell()
+        self._file.write(self.TRAILER)
+        self._file.flush()
+
+    @staticmethod
+    def _header(result):
+        summary = json.dumps(_summary(result), sort_keys=True, indent=4,
+                             separators=(',', ': '))
+        # Leave the object open, the tests key comes after the padding
+        return summary[:-2] + ','
+
+    def _write_header(self, result):
+        header = self._header(result)
+        if len(header) > self._header_size:
+            raise IOError("JSON result summary too large for %s" % self.path)
+        self._file.seek(0)
+        self._file.write(header.ljust(self._header_size))
+
+    def add_test(self, result, state):
+        """
+        Append the record of a finished test and update the summary.
+        """
+        record = json.dumps(_test_record(state), sort_keys=True, indent=4,
+                            separators=(',', ': '))
+        record = '\n'.join('        ' + line for line in record.splitlines())
+        if self.tests:
+            record = ',\n' + record
+        else:
+            record = '\n' + record
+        self._file.seek(self._tail)
+        self._file.write(record + self.TRAILER)
+        self._tail += len(record)
+        self.tests += 1
+        self._write_header(result)
+        self._file.flush()
+
+    def close(self, result):
+        """
+        Write the final summary and close the file.
+        """
+        self._write_header(result)
+        self._file.close()
+
+
 class JSONResult(Result):
 
     name = 'json'
     description = 'JSON result support'
 
     def _render(self, result):
-        tests = []
-        for test in result.tests:
-            tests.append({'id': str(test.get('name', UNKNOWN)),
-                          'start': test.get('time_start', -1),
-                          'end': test.get('time_end', -1),
-                          'time': test.get('time_elapsed', -1),
-                          'status': test.get('status', {}),
-                          'whiteboard': test.get('whiteboard', UNKNOWN),
-                          'logdir': test.get('logdir', UNKNOWN),
-                          'logfile': test.get('logfile', UNKNOWN),
-                          'fail_reason': str(test.get('fail_reason', UNKNOWN)),
-                          # COMPATIBILITY: `test` and `url` are backward
-                          # compatibility key names for the test ID,
-                          # as defined by the test name RFC.  `url` is
-                          # not a test reference, as it's recorded
-                          # after it has been processed by the test resolver
-                          # (currently called test loader in the code).
-                          # Expect them to be removed in the future.
-                          'test': str(test.get('name', UNKNOWN)),
-                          'url': str(test.get('name', UNKNOWN))})
-        content = {'job_id': result.job_unique_id,
-                   'debuglog': result.logfile,
-                   'tests': tests,
-                   'total': result.tests_total,
-                   'pass': result.passed,
-                   'errors': result.errors,
-                   'failures': result.failed,
-                   'skip': result.skipped,
-                   'time': result.tests_total_time}
+        content = _summary(result)
+        content['tests'] = [_test_record(test) for test in result.tests]
         return json.dumps(content,
                           sort_keys=True,
                           indent=4,
@@ -73,14 +159,15 @@ class JSONResult(Result):
                 hasattr(job.args, 'json_output')):
             return
 
-        content = self._render(result)
-        if getattr(job.args, 'json_job_result', 'off') == 'on':
-            json_path = os.path.join(job.logdir, 'results.json')
-            with open(json_path, 'w') as json_file:
-                json_file.write(content)
+        streamed = getattr(job, 'streamed_results', set())
+        paths = [_ for _ in _get_output_paths(job) if _ not in streamed]
+        if getattr(job.args, 'json_output', None) == '-':
+            paths.append('-')
+        if not paths:
+            return
 
-        json_path = getattr(job.args, 'json_output', 'None')
-        if json_path is not None:
+        content = self._render(result)
+        for json_path in paths:
             if json_path == '-':
                 log = logging.getLogger("avocado.app")
                 log.debug(content)
@@ -89,6 +176,96 @@ class JSONResult(Result):
                     json_file.write(content)
 
 
+class JSONStreamResult(ResultEvents):
+
+    """
+    Writes the JSON results as the tests finish
+    """
+
+    name = 'json_stream'
+    description = 'Streaming JSON result support'
+
+    def __init__(self, args):
+        self.writers = []
+        self.result = None
+
+    def pre_tests(self, job):
+        self.result = job.result
+        for path in _get_output_paths(job):
+            self.writers.append(JSONStreamWriter(path, self.result))
+
+    def start_test(self, result, state):
+        pass
+
+    def test_progress(self, progress=False):
+        pass
+
+    def end_test(self, result, state):
+        self.result = result
+        for writer in self.writers:
+            writer.add_test(result, state)
+
+    def post_tests(self, job):
+        streamed = getattr(job, 'streamed_results', set())
+        for writer in self.writers:
+            writer.close(self.result)
+            streamed.add(writer.path)
+        job.streamed_results = streamed
+        self.writers = []
+
+
+class JSONEventsResult(ResultEvents):
+
+    """
+    Writes one line per test event (``--json-events``), so the results of a
+    job can be followed while it runs (by the sharded remote runner, for
+    instance)
+    """
+
+    name = 'json_events'
+    description = 'JSON test events support'
+
+    def __init__(self, args):
+        self._fd = None
+
+    def _write(self, event):
+        # Tests may run on forked processes sharing the descriptor, a
+        # single write keeps the lines whole
+        os.write(self._fd, EVENT_PREFIX + json.dumps(event) + '\n')
+
+    def pre_tests(self, job):
+        path = getattr(job.args, 'json_events', None)
+        if path is None:
+            return
+        if path == '-':
+            self._fd = os.dup(1)
+        else:
+            self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        self._write({'event': 'job', 'id': job.unique_id,
+                     'logdir': job.logdir, 'total': len(job.test_suite)})
+
+    def start_test(self, result, state):
+        if self._fd is not None:
+            self._write({'event': 'start',
+                         'test': str(state.get('name', UNKNOWN)),
+                         'logdir': state.get('logdir', UNKNOWN)})
+
+    def test_progress(self, progress=False):
+        pass
+
+    def end_test(self, result, state):
+        if self._fd is not None:
+            event = _test_record(state)
+            event['event'] = 'end'
+            self._write(event)
+
+    def post_tests(self, job):
+        if self._fd is not None:
+            self._write({'event': 'end_job', 'id': job.unique_id})
+            os.close(self._fd)
+            self._fd = None
+
+
 class JSONCLI(CLI):
 
     """
@@ -115,5 +292,11 @@ class JSONCLI(CLI):
             help=('Enables default JSON result in the job results directory. '
                   'File will be named "results.json".'))
 
+        run_subcommand_parser.output.add_argument(
+            '--json-events', type=str, dest='json_events', metavar='FILE',
+            help="Write one JSON line per test event (start, end) to FILE, "
+                 "as the tests run. Use '-' to write them to the standard "
+                 "output.")
+
     def run(self, args):
         pass
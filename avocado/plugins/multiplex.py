@@ -51,6 +51,12 @@ class Multiplex(CLICmd):
         parser.add_argument('--mux-inject', default=[], nargs='*',
                             help="Inject [path:]key:node values into "
                             "the final multiplex tree.")
+        parser.add_argument('--mux-shard', default=None, metavar='I/N',
+                            help="Show only the I-th of N shards of the "
+                            "variants, eg. '1/4'")
+        parser.add_argument('--count', action='store_true', default=False,
+                            help="Only show the number of variants, "
+                            "without generating them")
         env_parser = parser.add_argument_group("environment view options")
         env_parser.add_argument('-d', '--debug', action='store_true',
                                 dest="mux_debug", default=False,
@@ -90,8 +96,12 @@ class Multiplex(CLICmd):
             log.debug(tree.tree_view(mux.variants.root, verbose, use_utf8))
             sys.exit(exit_codes.AVOCADO_ALL_OK)
 
+        if args.count:
+            log.info(mux.get_number_of_variants())
+            sys.exit(exit_codes.AVOCADO_ALL_OK)
+
         log.info('Variants generated:')
-        for (index, tpl) in enumerate(mux.variants):
+        for (index, tpl) in mux.iter_variants():
             if not args.mux_debug:
                 paths = ', '.join([x.path for x in tpl])
             else:
@@ -27,7 +27,7 @@ from cloudtest import utils_env
 from cloudtest import utils_params
 from cloudtest import funcatexit
 from cloudtest import utils_injection
-from cloudtest.health_check import HealthCheck
+from cloudtest.health_check import check_hosts
 from cloudtest.openstack.cloud_manager import CloudManager
 from cloudtest.openstack.compute import Compute
 
@@ -421,22 +421,8 @@ class NFVTest(test.Test):
 
     def _run_health_check(self, nodes):
         test_passed = True
-        health_check_result = {}
-        for node in nodes:
-            host_ip = node.ip
-            try:
-                health_check = HealthCheck(node, self.params,
-                                         is_raise_health_check_excp=True)
-                health_check.get_health_status()
-                health_check_result[host_ip] = True
-            except exceptions.HealthCheckFail:
-                health_check_result[host_ip] = False
-            except exceptions.TestError:
-                health_check_result[host_ip] = False
-            if self.params.has_key('health_check_ceph'):
-                self.params['health_check_ceph'] = "false"
-            if self.params.has_key('health_check_compute_node_status'):
-                self.params['health_check_compute_node_status'] = "false"
+        health_check_result = check_hosts(nodes, self.params,
+                                          cluster_checks_once=True)
         for key in health_check_result.keys():
             result = health_check_result[key]
             if not result:
@@ -6,13 +6,13 @@
 Avocado RallyTest plugin
 """
 
+import functools
+import json
 import os
-import re
 import sys
 import time
 import yaml
 import logging
-from enum import Enum
 
 from avocado.core import exceptions
 from avocado.core import test
@@ -21,6 +21,8 @@ from avocado.utils import stacktrace
 from avocado.utils import process
 
 from cloudtest import data_dir
+from cloudtest import rally_dag
+from cloudtest import rally_result
 from cloudtest import utils_env
 from cloudtest import utils_params
 from cloudtest import funcatexit
@@ -30,63 +32,52 @@ from cloudtest.openstack.conf import ConfigStability
 
 def _run_rally_task(task_path, deployment, rally_arg_file, logdir,
                     debug='False', print_rally_output=False, env=None):
-    err_count = None
+    """
+    Run a rally task and ingest its structured results
+
+    :return: (task uuid, error count, success rate, task results document)
+    :raise exceptions.TestError: when the task could not be started
+    """
     cmd = "rally --log-dir %s " % logdir
     if debug is 'True':
         cmd += " --debug"
     cmd += " task start %s --deployment %s" % (task_path, deployment)
     cmd += " --task-args-file %s" % rally_arg_file
     result = process.run(cmd, shell=True, verbose=print_rally_output,
-                         ignore_status=False)
+                         ignore_status=True)
     if result.exit_status != 0:
         logging.error("Failed to execute rally test: %s" % result.stdout)
+        raise exceptions.TestError("Rally task %s exited with status %s"
+                                   % (task_path, result.exit_status))
+
+    task_uuid = rally_result.get_task_uuid(result.stdout)
+    if task_uuid is None:
+        raise exceptions.TestError("Failed to get the uuid of rally task %s"
+                                   % task_path)
+
+    task = _get_rally_result(task_uuid, logdir, env)
+    success = task['total']['success']
+    return (task_uuid, task['error_count'],
+            'n/a' if success is None else success, task)
+
 
-    pat = 'rally task report (.*) --out output.html'
-    task_uuid = re.findall(pat, result.stdout)[0]
-    pat1 = 'Task (.*) has (\d+) error'
-    res = re.findall(pat1, result.stdout)[0]
-    if task_uuid not in res[0]:
-        logging.error("Failed to get correct rally task uuid")
-        return None, err_count
-    err_count = res[1]
-
-    result_list = _get_rally_result(task_uuid, result.stdout, env)
-    raw_success = result_list['Success']
-    if raw_success.find('%') == -1:
-        success = raw_success
-    else:
-        success = raw_success[0:raw_success.find('%')]
-    return task_uuid, err_count, success
-
-
-def _get_rally_result(task_uuid, stdout, env=None):
-    result_items = Enum('Result', ('Action', 'Min(sec)', 'Median(sec)',
-                                   '90%ile(sec)', '95%ile(sec)', 'Max(sec)',
-                                   'Avg(sec)', 'Success', 'Count'))
-    data = None
-    pat = "total (.*)|"
-    info = re.findall(pat, stdout)
-    for i in range(len(info)):
-        if info[i] != '' and info[i] != ' ':
-            data = info[i]
-            break
-
-    result_list = data.split('|')
-    result_dict = {}
-    i = 0
-    for name in result_items.__members__.items():
-        result_dict[name[0]] = result_list[i].strip()
-        i += 1
-
-    result_dict['rally_task_uuid'] = task_uuid
-
-    env.register_rally_total_result(result_dict)
-
-    tmp_list = env.get_rally_total_result(task_uuid)
-    for key, value in tmp_list.items():
+def _get_rally_result(task_uuid, logdir, env=None):
+    task = rally_result.ingest_task(
+        task_uuid, rally_result.export_task_results(task_uuid))
+    rally_result.write_artifact(task, logdir)
+
+    result_dict = rally_result.get_total_row(task)
+    if env is not None:
+        env.register_rally_total_result(result_dict)
+    for key, value in sorted(result_dict.items()):
         logging.info("%s => %s" % (key, value))
+    for scenario in task['scenarios']:
+        for sla in scenario['sla']:
+            if not sla['success']:
+                logging.warning("SLA %s of %s failed: %s", sla['criterion'],
+                                scenario['name'], sla['detail'])
 
-    return result_dict
+    return task
 
 
 class RallyTest(test.Test):
@@ -115,6 +106,8 @@ class RallyTest(test.Test):
         self.logfile = None
         self.file_handler = None
         self.whiteboard = None
+        #: summaries of the rally tasks results, reported in the test state
+        self.rally_results = []
         super(RallyTest, self).__init__(methodName=methodName, name=name,
                                         params=params,
                                         base_logdir=base_logdir, job=job,
@@ -157,6 +150,7 @@ class RallyTest(test.Test):
         """
         state = super(RallyTest, self).get_state()
         state["params"] = self.__dict__.get("avocado_params")
+        state["rally_results"] = self.__dict__.get("rally_results")
         return state
 
     def _start_logging(self):
@@ -221,6 +215,27 @@ class RallyTest(test.Test):
         self.log.info("Exit status: %s", result.exit_status)
         self.log.info("Duration: %s", result.duration)
 
+    def _wait_deployment_ready(self, node):
+        """
+        Wait until the deployment of a rally task is ready (its services
+        answer), instead of sleeping a fixed time between the tasks
+        """
+        if node.deployment is None or \
+                self.params.get('rally_readiness_check', 'true') != 'true':
+            return
+        cmd = "rally deployment check --deployment %s" % node.deployment
+
+        def check():
+            return process.run(cmd, shell=True, verbose=False,
+                               ignore_status=True).exit_status == 0
+
+        timeout = float(self.params.get('rally_readiness_timeout', 300))
+        if not rally_dag.wait_until(
+                check, timeout,
+                float(self.params.get('rally_readiness_interval', 5))):
+            raise exceptions.TestError("Deployment %s not ready after %ss"
+                                       % (node.deployment, timeout))
+
     def _run_performance_test(self, test_params, env):
         def _get_task_path_from_name(test_params, name):
             mod = test_params.get('id').split('.')[1]
@@ -256,102 +271,121 @@ class RallyTest(test.Test):
             dependencies = test_params.get("pre_process", "")
             if dependencies:
                 dependent_tasks = dependencies.split(" ")
+            recovery_on_error_tasks = []
             recoveries_on_error = test_params.get("post_process_on_error", "")
             if recoveries_on_error:
                 recovery_on_error_tasks = recoveries_on_error.split(" ")
 
             deployment = test_params.get('deployment')
             rerun_times = int(test_params.get('rerun_times', '1'))
-            matched_result = None
-
-            # Run dependencies in dependency list
-            for dep in dependent_tasks:
-                task_path = _get_task_path_from_name(test_params, dep)
-                curr_run = 0
-                test_passed = False
-
-                while curr_run < rerun_times:
-                    curr_run += 1
-                    if test_passed:
-                        break
-                    self.log.info("Try to run dependent task: %s (%d/%d)" %
-                                  (task_path, curr_run, rerun_times))
-                    _, err_count, pass_rate = _run_rally_task(task_path,
-                                                   deployment,
-                                                   rally_arg_file,
-                                                   self.logdir,
-                                                   'False',
-                                                   False, env)
-                    if err_count is not None:
-                        test_passed = int(err_count) == 0
-                    if pass_rate == 'n/a' or float(pass_rate) < \
-                            float(self.params.get('rally_task_arg_success_rate')):
-                        test_passed = 0
-
-                    if not test_passed:
-                        recovery_on_error_task = \
-                            recovery_on_error_tasks[
-                                dependent_tasks.index(dep)]
-                        recovery_task_path = _get_task_path_from_name(
-                            test_params, recovery_on_error_task)
-                        self.log.info("Try to run recovery task: %s" %
-                                      recovery_on_error_task)
-                        try:
-                            _run_rally_task(recovery_task_path,
-                                            deployment,
-                                            rally_arg_file,
-                                            self.logdir,
-                                            'False',
-                                            False, env)
-                        except Exception:
-                            self.log.error("Error while running recovery"
-                                           " task: %s" %
-                                           recovery_on_error_task)
-                        if curr_run >= rerun_times:
-                            raise exceptions.TestError(
-                                "Failed to run dependent"
-                                " tasks : %s" % dep)
-
-            # Register final recoveries before running actual test
-            final_recovers = test_params.get('post_process')
-            if final_recovers is not None:
-                final_recovers = final_recovers.split(' ')
-                for final_recover in final_recovers:
-                    t_path = _get_task_path_from_name(test_params,
-                                                      final_recover)
-                    self.log.info("Registering recoveries: %s" % t_path)
-                    self.runner_queue.put({"func_at_exit": _run_rally_task,
-                                           "args": (t_path,
-                                                    deployment,
-                                                    rally_arg_file,
-                                                    self.logdir,
-                                                    'False',
-                                                    False),
-                                           "once": True})
+            # The dependent tasks run one after the other ('chain'), unless
+            # they are 'independent' of each other
+            chained = test_params.get('pre_process_mode', 'chain') == 'chain'
+            exclusive = test_params.get('rally_task_exclusive',
+                                        'false') == 'true'
+
+            def run_dependent_task(task_path):
+                _, err_count, pass_rate, _ = _run_rally_task(task_path,
+                                                             deployment,
+                                                             rally_arg_file,
+                                                             self.logdir,
+                                                             'False',
+                                                             False, env)
+                return (int(err_count) == 0 and pass_rate != 'n/a' and
+                        float(pass_rate) >=
+                        float(self.params.get('rally_task_arg_success_rate')))
+
+            def run_recovery_task(recovery_task):
+                self.log.info("Try to run recovery task: %s" % recovery_task)
+                _run_rally_task(_get_task_path_from_name(test_params,
+                                                         recovery_task),
+                                deployment, rally_arg_file, self.logdir,
+                                'False', False, env)
+
+            # Dependent tasks (with their reruns and recoveries) and the
+            # indeed test make a graph, the test depending on all of them
+            graph = rally_dag.TaskGraph()
+            for index, dep in enumerate(dependent_tasks):
+                name = dep if dep not in graph.nodes else '%s#%d' % (dep,
+                                                                     index)
+                recovery = None
+                if index < len(recovery_on_error_tasks):
+                    recovery = functools.partial(
+                        run_recovery_task, recovery_on_error_tasks[index])
+                depends = graph.nodes.keys()[-1:] if chained else []
+                graph.add(rally_dag.TaskNode(
+                    name, functools.partial(
+                        run_dependent_task,
+                        _get_task_path_from_name(test_params, dep)),
+                    depends, recovery, rerun_times, deployment, exclusive))
+            results = {}
+
+            def run_test_task():
+                # Register final recoveries before running actual test
+                final_recovers = test_params.get('post_process')
+                if final_recovers is not None:
+                    final_recovers = final_recovers.split(' ')
+                    for final_recover in final_recovers:
+                        t_path = _get_task_path_from_name(test_params,
+                                                          final_recover)
+                        self.log.info("Registering recoveries: %s" % t_path)
+                        self.runner_queue.put({"func_at_exit":
+                                               _run_rally_task,
+                                               "args": (t_path,
+                                                        deployment,
+                                                        rally_arg_file,
+                                                        self.logdir,
+                                                        'False',
+                                                        False),
+                                               "once": True})
+                results['task'] = _run_rally_task(test_name, deployment,
+                                                  rally_arg_file,
+                                                  self.logdir, 'False',
+                                                  True, env)
+                return True
+
+            graph.add(rally_dag.TaskNode(test_name, run_test_task,
+                                         graph.nodes.keys(),
+                                         deployment=deployment,
+                                         exclusive=exclusive))
+            scheduler = rally_dag.DAGScheduler(
+                graph, int(test_params.get('rally_task_width', 1)),
+                self._wait_deployment_ready)
+            statuses = scheduler.run()
+            failed_deps = [name for name, status in statuses.items()
+                           if name != test_name and
+                           status != rally_dag.TASK_PASS]
+            if failed_deps:
+                raise exceptions.TestError("Failed to run dependent"
+                                           " tasks : %s"
+                                           % ' '.join(failed_deps))
+            if test_name in scheduler.errors:
+                raise scheduler.errors[test_name]
 
             # Run the indeed test
-            task_id, err_count, pass_rate = _run_rally_task(test_name, deployment,
-                                                 rally_arg_file, self.logdir,
-                                                 'False', True, env)
-            if task_id is None:
-                raise exceptions.TestError("Failed to get rally task id")
-
-            if test_params.get('html_report_for_each_rally_task',
-                               'True') == 'True':
-                cmd = ("rally task report %s --out %s --html-static"
-                       % (task_id, os.path.join(self.logdir,
-                                                'rally_report.html')))
+            task_id, err_count, pass_rate, task = results['task']
+            self.rally_results.append(rally_result.get_summary(task))
+            self.write_test_keyval(json.dumps(self.rally_results))
+
+            # The HTML report is generated on demand ('lazy') unless asked
+            cmd = ("rally task report %s --out %s --html-static"
+                   % (task_id, os.path.join(self.logdir,
+                                            'rally_report.html')))
+            html_report = test_params.get('html_report_for_each_rally_task',
+                                          'lazy')
+            if html_report == 'True':
                 process.run(cmd)
+            elif html_report == 'lazy':
+                report_script = os.path.join(self.logdir, 'rally_report.sh')
+                genio.write_file(report_script, "#!/bin/sh\n%s\n" % cmd)
+                os.chmod(report_script, 0755)
 
-            if (err_count is None or int(err_count) > 0) or \
+            if int(err_count) > 0 or \
                     (pass_rate == 'n/a' or float(pass_rate) <
                         float(self.params.get('rally_task_arg_success_rate'))):
                 raise exceptions.TestFail("Rally task failed due to total "
                                           "pass_rate is %s" % pass_rate)
 
-            # Sleep for some seconds between each test run
-            time.sleep(int(test_params.get('test_interval', 1)))
-
         except process.CmdError as details:
             self._log_detailed_cmd_info(details.result)
             self.log.error("Failed to execute rally test: %s" %
@@ -387,6 +421,15 @@ class RallyTest(test.Test):
         # persist information accross cloud-test/avocado-ct job runs)
         env_filename = os.path.join("/var/tmp/rally_env")
         env = utils_env.Env(env_filename, self.env_version)
+        # Drop the results of old rally tasks once per job, so the env
+        # stays small
+        job_id = getattr(self.job, 'unique_id', None)
+        if job_id is None or env.get('rally_env_compacted') != job_id:
+            env.compact(max_age=float(params.get('rally_env_max_age_days',
+                                                 30)) * 86400,
+                        prefix='rally_result__')
+            env['rally_env_compacted'] = job_id
+            self.__safe_env_save(env)
         if self.ct_type == 'stability':
             if ((params.get('prepare_resource').lower() == 'true') and
             not (env.get_status_for_stability_resources())):
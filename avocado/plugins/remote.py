@@ -23,6 +23,7 @@ from avocado.core import loader
 from avocado.core import remoter
 from avocado.core.plugin_interfaces import CLI
 from avocado.core.remote import RemoteTestRunner
+from avocado.core.remote import ShardedRemoteTestRunner
 
 
 class Remote(CLI):
@@ -73,6 +74,14 @@ class Remote(CLI):
                                               " to the remote machine. Defaults"
                                               " to %(default)s seconds."),
                                         default=60, type=int)
+        self.remote_parser.add_argument('--remote-hosts', metavar='HOSTS',
+                                        dest='remote_hosts', default=None,
+                                        help='Comma separated list of '
+                                        'HOST[:PORT] to shard the test '
+                                        'references on. Each host runs the '
+                                        'next reference as soon as it is '
+                                        'done with the previous one, and '
+                                        'streams its test results back.')
         self.configured = True
 
     @staticmethod
@@ -98,8 +107,12 @@ class Remote(CLI):
         return True
 
     def run(self, args):
-        if self._check_required_args(args, 'remote_hostname',
-                                     ('remote_hostname',)):
+        if getattr(args, 'remote_hosts', None):
+            loader.loader.clear_plugins()
+            loader.loader.register_plugin(loader.DummyLoader)
+            args.test_runner = ShardedRemoteTestRunner
+        elif self._check_required_args(args, 'remote_hostname',
+                                       ('remote_hostname',)):
             loader.loader.clear_plugins()
             loader.loader.register_plugin(loader.DummyLoader)
             args.test_runner = RemoteTestRunner
@@ -91,6 +91,14 @@ class Run(CLICmd):
                             help='Enable or disable the job interruption on '
                             'first failed test.')
 
+        parallel_default = settings.get_value('runner.behavior', 'parallel',
+                                              key_type=int, default=1)
+        parser.add_argument('--parallel', type=int, metavar='N',
+                            default=parallel_default,
+                            help='Run up to N tests at the same time. Tests '
+                            'declaring "run_serial" in their params still '
+                            'run alone. Current: %(default)s')
+
         sysinfo_default = settings.get_value('sysinfo.collect',
                                              'enabled',
                                              key_type='bool',
@@ -151,6 +159,10 @@ class Run(CLICmd):
         mux.add_argument('--mux-inject', default=[], nargs='*',
                          help="Inject [path:]key:node values into the "
                          "final multiplex tree.")
+        mux.add_argument('--mux-shard', default=None, metavar='I/N',
+                         help="Run only the I-th of N shards of the "
+                         "variants (every N-th variant starting with the "
+                         "I-th one), eg. '1/4'")
 
     def run(self, args):
         """
@@ -172,6 +184,9 @@ class Run(CLICmd):
         except ValueError as e:
             log.error(e.message)
             sys.exit(exit_codes.AVOCADO_FAIL)
+        if args.parallel < 1:
+            log.error('--parallel needs to be a positive number of tests')
+            sys.exit(exit_codes.AVOCADO_FAIL)
         job_instance = job.Job(args)
         job_run = job_instance.run()
         result_dispatcher = ResultDispatcher()
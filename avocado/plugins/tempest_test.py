@@ -6,8 +6,10 @@
 Avocado CloudTest plugin
 """
 
+import multiprocessing
 import os
-import re
+import select
+import signal
 import sys
 import time
 import logging
@@ -26,6 +28,8 @@ from avocado.utils import process
 from avocado.plugins.ct_options import CloudTestOptionsProcess
 
 from cloudtest import data_dir
+from cloudtest import subunit_v2
+from cloudtest import tempest_partition
 from cloudtest import utils_params
 from cloudtest.openstack.conf import ConfigTempest
 
@@ -344,6 +348,116 @@ class TempestTest(test.Test):
         self.log.info("Exit status: %s", result.exit_status)
         self.log.info("Duration: %s", result.duration)
 
+    def _run_subunit(self, cmd, label, timeout, report=None):
+        """
+        Run a ``testr run --subunit`` command, parsing its subunit stream
+        as it is written: the tests are logged as they finish and added to
+        the HTML report.
+
+        :param cmd: command, or list of the commands of parallel workers
+                    (their tests are tagged ``worker-N``)
+        :return: (:class:`cloudtest.subunit_v2.ResultCollector` of the run,
+                  first non-zero exit status of the commands or 0)
+        :raise exceptions.TestError: when the command runs out of time
+        """
+        def on_test(record):
+            self.log.info("[%s] %s%s ... %s (%.2fs)", label,
+                          '{%s} ' % record.worker if record.worker else '',
+                          record.id, record.status, record.duration)
+            if record.status in subunit_v2.FAILED_STATUSES:
+                for name, content in record.details.iteritems():
+                    self.log.error("[%s] %s %s:\n%s", label, record.id, name,
+                                   content.decode('utf-8', 'replace'))
+            if report is not None:
+                report.add_test(record)
+
+        def on_output(data):
+            for line in data.splitlines():
+                if line.strip():
+                    self.log.info("[%s] %s", label, line)
+
+        def tag_worker(worker):
+            tag = ('worker-%d' % worker,)
+            return lambda packet: result.packet(
+                packet._replace(tags=packet.tags + tag))
+
+        result = subunit_v2.ResultCollector(on_test)
+        commands = cmd if isinstance(cmd, list) else [cmd]
+        procs = []
+        streams = {}
+        end_time = time.time() + timeout
+        try:
+            for worker, command in enumerate(commands):
+                # In its own process group, so the test runners spawned by
+                # testr are killed with it
+                proc = subprocess.Popen(command, shell=True,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        preexec_fn=os.setsid)
+                procs.append(proc)
+                on_packet = (tag_worker(worker) if len(commands) > 1
+                             else result.packet)
+                streams[proc.stdout.fileno()] = subunit_v2.StreamParser(
+                    on_packet, on_output)
+            while streams:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    raise exceptions.TestError("Tempest test timed out after "
+                                               "%s seconds" % timeout)
+                for fd in select.select(streams.keys(), [], [],
+                                        min(remaining, 1))[0]:
+                    data = os.read(fd, 65536)
+                    if data:
+                        streams[fd].feed(data)
+                    else:
+                        streams.pop(fd).close()
+        finally:
+            for parser in streams.itervalues():
+                parser.close()
+            for proc in procs:
+                if proc.poll() is None:
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                proc.wait()
+        statuses = [proc.returncode for proc in procs if proc.returncode]
+        for proc, command in zip(procs, commands):
+            if proc.returncode:
+                self.log.error("[%s] Command '%s' exited with status %s",
+                               label, command, proc.returncode)
+        return result, (statuses[0] if statuses else 0)
+
+    def _get_partitioned_commands(self, filters, history, workers):
+        """
+        Commands of the workers of a partitioned run: the tests are
+        balanced among the workers by their duration in past runs
+
+        :param filters: test filters, as given to ``testr run``
+        :param history: :class:`cloudtest.tempest_partition.DurationHistory`
+        """
+        testr_conf = tempest_partition.read_testr_conf('.testr.conf')
+        if 'test_command' not in testr_conf:
+            raise exceptions.TestError("No test_command in .testr.conf, can "
+                                       "not run partitioned workers")
+        listing = process.run("testr list-tests %s" % ' '.join(filters),
+                              shell=True).stdout
+        test_ids = [line.strip() for line in listing.splitlines()
+                    if '.' in line and ' ' not in line.strip()]
+        group_regex = testr_conf.get('group_regex',
+                                     tempest_partition.DEFAULT_GROUP_REGEX)
+        partitions = tempest_partition.partition_tests(
+            test_ids, history.durations, workers, group_regex)
+        commands = []
+        for worker, (load, tests) in enumerate(partitions):
+            id_file = os.path.join(self.logdir, 'worker-%d.list' % worker)
+            genio.write_file(id_file, ''.join('%s\n' % _ for _ in tests))
+            self.log.info("Worker %d: %d tests, estimated to last %.2fs",
+                          worker, len(tests), load)
+            commands.append(tempest_partition.get_worker_command(testr_conf,
+                                                                 id_file))
+        return commands
+
     def _runTest(self):
         params = self.params
 
@@ -371,6 +485,10 @@ class TempestTest(test.Test):
             self.log.info("Prepare resource for tempest done...")
 
         test_passed = False
+        report = None
+        result = None
+        exit_status = 0
+        history = None
 
         try:
             try:
@@ -392,93 +510,67 @@ class TempestTest(test.Test):
                                   tempest_dir)
                     os.chdir(tempest_dir)
                     process.run("testr init", ignore_status=True, shell=True)
-                    process.run(cmd="find . -name '*.pyc' -delete",
-                                ignore_status=True, shell=True)
-
-                    cmd = "testr run --subunit"
+                    # Python recompiles the stale bytecode by itself, only
+                    # the one of removed sources has to go
+                    tempest_partition.remove_orphaned_bytecode(tempest_dir)
+                    history = tempest_partition.DurationHistory(
+                        params.get('tempest_duration_history',
+                                   os.path.join(data_dir.get_data_dir(),
+                                                'tempest_durations.json')))
+                    history.harvest_testrepository('.testrepository')
+
+                    filters = []
                     if test_name != 'tempest' and \
                                     test_name != 'tempest_smoke':
                         # Run module, suite, class or single case
-                        cmd += ' %s' % self.name.name
+                        filters.append(self.name.name)
 
                     if self.params.get('tempest_run_type') in 'smoke':
-                        cmd += ' %s' % smoke_str
-
-                    if params.get('tempest_run_mode') == 'parallel':
-                        cmd += ' --parallel'
+                        filters.append(smoke_str)
+
+                    run_mode = params.get('tempest_run_mode')
+                    if run_mode == 'partition':
+                        cmd = self._get_partitioned_commands(
+                            filters, history,
+                            int(params.get('tempest_workers', 0)) or
+                            multiprocessing.cpu_count())
+                    else:
+                        cmd = ' '.join(["testr run --subunit"] + filters)
+                        if run_mode == 'parallel':
+                            cmd += ' --parallel'
 
                     self.log.info('Try to run command: %s' % cmd)
-                    proc = subprocess.Popen(cmd, shell=True,
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.STDOUT)
-                    proc2 = subprocess.Popen('subunit-trace -n -f',
-                                             stdin=proc.stdout,
-                                             stdout=subprocess.PIPE,
-                                             stderr=subprocess.PIPE,
-                                             shell=True)
+                    report = subunit_v2.HTMLReport(
+                        os.path.join(self.job.logdir, 'tempest_result.html'))
                     test_timeout = params.get('tempest_test_timeout', 1200)
-                    end_time = time.time() + int(test_timeout)
-                    while time.time() < end_time:
-                        line = proc2.stdout.readline()
-                        if line.strip() != '':
-                            self.log.info("[Tempest run] %s" % line)
-                        if line == '' and proc2.poll() is not None:
-                            break
-                    else:
-                        raise exceptions.TestError("Tempest test timed out"
-                                                   " after %s seconds"
-                                                   % test_timeout)
+                    result, exit_status = self._run_subunit(
+                        cmd, "Tempest run", int(test_timeout), report)
+                    history.update(result.durations)
 
                     # Rerun failed case when needed
                     if params.get('auto_rerun_on_failure', 'false') == 'true':
+                        failed_case_file_path = \
+                            os.path.join(self.logdir, "failed_cases.list")
                         curr_rerun = 0
-                        try:
-                            failed_case_file_path = \
-                                os.path.join(self.logdir, "failed_cases.list")
-
-                            failed_case_file = open(failed_case_file_path,
-                                                    'w')
-                        except IOError:
-                            raise exceptions.TestError(
-                                "Failed to create blank "
-                                "failed_cases.list file")
-                        while curr_rerun < int(
-                                params.get('auto_rerun_times')):
+                        while (result.failures and curr_rerun <
+                               int(params.get('auto_rerun_times'))):
                             curr_rerun += 1
-
-                            cmd1 = "testr last --subunit"
-                            cmd2 = "subunit-filter -s --xfail"
-                            cmd2 += " --with-tag=worker-0"
-                            cmd3 = "subunit-ls"
-                            cmd = cmd1 + ' | ' + cmd2 + ' | ' + cmd3
-                            self.log.debug("Try to get failed cases from last"
-                                           " run via command: %s" % cmd)
-                            proc = subprocess.Popen(cmd1, shell=True,
-                                                    stdout=subprocess.PIPE,
-                                                    stderr=subprocess.STDOUT)
-                            proc1 = subprocess.Popen(cmd2, shell=True,
-                                                     stdin=proc.stdout,
-                                                     stdout=subprocess.PIPE,
-                                                     stderr=subprocess.STDOUT)
-                            proc2 = subprocess.Popen(
-                                cmd3, shell=True,
-                                stdin=proc1.stdout,
-                                stdout=failed_case_file,
-                                stderr=subprocess.STDOUT).wait()
+                            try:
+                                genio.write_file(
+                                    failed_case_file_path,
+                                    ''.join('%s\n' % case
+                                            for case in result.failures))
+                            except IOError:
+                                raise exceptions.TestError(
+                                    "Failed to create failed_cases.list file")
                             self.log.info("Start to #%d round of rerun..." %
                                           curr_rerun)
-                            cmd_rerun = "testr run --load-list=%s" % \
-                                        failed_case_file_path
-                            proc3 = subprocess.Popen(cmd_rerun, shell=True,
-                                                     stdout=subprocess.PIPE,
-                                                     stderr=subprocess.STDOUT)
-                            while True:
-                                line = proc3.stdout.readline()
-                                if line.strip() != '':
-                                    self.log.info("[Tempest rerun #%d] %s" % (
-                                        curr_rerun, line))
-                                if line == '' and proc3.poll() is not None:
-                                    break
+                            cmd_rerun = ("testr run --subunit --load-list=%s"
+                                         % failed_case_file_path)
+                            result, exit_status = self._run_subunit(
+                                cmd_rerun, "Tempest rerun #%d" % curr_rerun,
+                                int(test_timeout), report)
+                            history.update(result.durations)
 
                 except Exception:
                     # try:
@@ -491,37 +583,27 @@ class TempestTest(test.Test):
             finally:
                 # Postprocess
                 try:
-                    # Generate HTML report of tempest
-                    latest_id = 0
-                    testrepository_path = os.path.join(tempest_dir,
-                                                       '.testrepository')
-                    for _, _, files in os.walk(testrepository_path):
-                        for stream_file in files:
-                            try:
-                                last_stream = int(stream_file)
-                            except (TypeError, ValueError):
-                                last_stream = 0
-                            latest_id = max(latest_id, last_stream)
-                    self.log.info("The last result stream id: %d" % latest_id)
-
-                    cmd_gen_html = "subunit2html %s/%d %s" % (
-                        testrepository_path,
-                        latest_id,
-                        os.path.join(self.job.logdir, 'tempest_result.html'))
-                    self.log.info("Try to generate HTML report for tempest...")
-                    process.run(cmd_gen_html, shell=True, ignore_status=False)
-
-                    # Analyze test result
-                    result = process.run(
-                        'testr last --subunit | subunit-stats',
-                        shell=True, ignore_status=False).stdout
-                    self.log.info("Tempest result:\n%s" % result)
-                    total_num = re.findall('Total tests:.*(\d+)', result)[0]
-                    passed_num = re.findall('Passed tests:.*(\d+)', result)[0]
-                    skipped_num = \
-                        re.findall('Skipped tests:.*(\d+)', result)[0]
-                    if int(total_num) != int(passed_num) + int(skipped_num):
-                        raise exceptions.TestFail("Tempest result failed")
+                    if report is not None:
+                        report.close(result or subunit_v2.ResultCollector())
+                    if history is not None:
+                        history.save()
+                    # Analyze test result (of the last rerun, if any)
+                    if result is not None:
+                        self.log.info("Tempest result: total %d, %s, run "
+                                      "time %.2fs", result.total,
+                                      ', '.join('%s %d' % _ for _ in sorted(
+                                          result.counters.iteritems())),
+                                      result.run_time)
+                        self.write_test_keyval(result.counters)
+                        if result.failures:
+                            raise exceptions.TestFail("Tempest result failed")
+                        if exit_status:
+                            raise exceptions.TestFail("testr exited with "
+                                                      "status %s"
+                                                      % exit_status)
+                        if not result.total:
+                            raise exceptions.TestFail("No tempest test was "
+                                                      "run")
 
                     try:
                         params['test_passed'] = str(test_passed)
@@ -19,15 +19,32 @@ import datetime
 import logging
 import os
 import string
+import StringIO
 from xml.dom.minidom import Document, Element
+from xml.sax.saxutils import quoteattr
 
 from avocado.core.parser import FileOrStdoutAction
-from avocado.core.plugin_interfaces import CLI, Result
+from avocado.core.plugin_interfaces import CLI, Result, ResultEvents
 
 
-class XUnitResult(Result):
-    name = 'xunit'
-    description = 'XUnit result support'
+def _get_output_paths(job):
+    """
+    Return the paths of the xUnit files requested for the job.
+    """
+    paths = []
+    if getattr(job.args, 'xunit_job_result', 'off') == 'on':
+        paths.append(os.path.join(job.logdir, 'results.xml'))
+    xunit_path = getattr(job.args, 'xunit_output', None)
+    if xunit_path is not None and xunit_path != '-':
+        paths.append(xunit_path)
+    return paths
+
+
+class XUnitRenderer(object):
+
+    """
+    Renders the xUnit elements of tests and test suites.
+    """
 
     UNKNOWN = '<unknown>'
     PRINTABLE = string.ascii_letters + string.digits + string.punctuation + \
@@ -71,36 +88,48 @@ class XUnitResult(Result):
         element.appendChild(system_out)
         return element
 
+    def _create_testcase(self, document, test):
+        testcase = self._create_testcase_element(document, test)
+        status = test.get('status', 'ERROR')
+        if status in ('PASS', 'WARN'):
+            pass
+        elif status == 'SKIP':
+            testcase.appendChild(Element('skipped'))
+        elif status == 'FAIL':
+            element = self._create_failure_or_error(document, test,
+                                                    'failure')
+            testcase.appendChild(element)
+        else:
+            element = self._create_failure_or_error(document, test,
+                                                    'error')
+            testcase.appendChild(element)
+        return testcase
+
+    def _testsuite_attributes(self, result, timestamp):
+        return {'name': 'avocado',
+                'tests': self._escape_attr(result.tests_total),
+                'errors': self._escape_attr(result.errors +
+                                            result.interrupted),
+                'failures': self._escape_attr(result.failed),
+                'skipped': self._escape_attr(result.skipped),
+                'time': self._escape_attr(result.tests_total_time),
+                'timestamp': self._escape_attr(timestamp)}
+
+
+class XUnitResult(XUnitRenderer, Result):
+    name = 'xunit'
+    description = 'XUnit result support'
+
     def _render(self, result):
         document = Document()
         testsuite = document.createElement('testsuite')
-        testsuite.setAttribute('name', 'avocado')
-        testsuite.setAttribute('tests', self._escape_attr(result.tests_total))
-        testsuite.setAttribute('errors', self._escape_attr(
-            result.errors + result.interrupted))
-        testsuite.setAttribute('failures', self._escape_attr(result.failed))
-        testsuite.setAttribute('skipped', self._escape_attr(result.skipped))
-        testsuite.setAttribute('time',
-                               self._escape_attr(result.tests_total_time))
-        testsuite.setAttribute('timestamp',
-                               self._escape_attr(datetime.datetime.now()))
+        attributes = self._testsuite_attributes(result,
+                                                datetime.datetime.now())
+        for name, value in attributes.iteritems():
+            testsuite.setAttribute(name, value)
         document.appendChild(testsuite)
         for test in result.tests:
-            testcase = self._create_testcase_element(document, test)
-            status = test.get('status', 'ERROR')
-            if status in ('PASS', 'WARN'):
-                pass
-            elif status == 'SKIP':
-                testcase.appendChild(Element('skipped'))
-            elif status == 'FAIL':
-                element = self._create_failure_or_error(document, test,
-                                                        'failure')
-                testcase.appendChild(element)
-            else:
-                element = self._create_failure_or_error(document, test,
-                                                        'error')
-                testcase.appendChild(element)
-            testsuite.appendChild(testcase)
+            testsuite.appendChild(self._create_testcase(document, test))
         return document.toprettyxml(encoding='UTF-8')
 
     def render(self, result, job):
@@ -108,14 +137,15 @@ class XUnitResult(Result):
                     hasattr(job.args, 'xunit_output')):
             return
 
-        content = self._render(result)
-        if getattr(job.args, 'xunit_job_result', 'off') == 'on':
-            xunit_path = os.path.join(job.logdir, 'results.xml')
-            with open(xunit_path, 'w') as xunit_file:
-                xunit_file.write(content)
+        streamed = getattr(job, 'streamed_results', set())
+        paths = [_ for _ in _get_output_paths(job) if _ not in streamed]
+        if getattr(job.args, 'xunit_output', None) == '-':
+            paths.append('-')
+        if not paths:
+            return
 
-        xunit_path = getattr(job.args, 'xunit_output', 'None')
-        if xunit_path is not None:
+        content = self._render(result)
+        for xunit_path in paths:
             if xunit_path == '-':
                 log = logging.getLogger("avocado.app")
                 log.debug(content)
@@ -124,6 +154,108 @@ class XUnitResult(Result):
                     xunit_file.write(content)
 
 
+class XUnitStreamWriter(XUnitRenderer):
+
+    """
+    Writes an xUnit document one test at a time.
+
+    The document stays well-formed after every test: the testsuite start
+    tag, holding the summary, is padded and rewritten in place, and the
+    testcases are appended before the closing tag.
+    """
+
+    #: Room left in the testsuite tag for the summary values to grow
+    HEADER_PADDING = 128
+    TRAILER = '</testsuite>\n'
+
+    def __init__(self, path, result):
+        self.path = path
+        self.tests = 0
+        self.timestamp = datetime.datetime.now()
+        self._document = Document()
+        self._file = open(path, 'w')
+        header = self._header(result)
+        self._header_size = len(header) + self.HEADER_PADDING
+        self._file.write(header.ljust(self._header_size) + '>\n')
+        self._tail = self._file.tell()
+        self._file.write(self.TRAILER)
+        self._file.flush()
+
+    def _header(self, result):
+        attributes = self._testsuite_attributes(result, self.timestamp)
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n<testsuite' +
+                ''.join(' %s=%s' % (name, quoteattr(attributes[name]))
+                        for name in sorted(attributes)))
+
+    def _write_header(self, result):
+        header = self._header(result)
+        if len(header) > self._header_size:
+            raise IOError("xUnit result summary too large for %s"
+                          % self.path)
+        self._file.seek(0)
+        self._file.write(header.ljust(self._header_size))
+
+    def add_test(self, result, state):
+        """
+        Append the testcase of a finished test and update the summary.
+        """
+        testcase = StringIO.StringIO()
+        self._create_testcase(self._document, state).writexml(
+            testcase, '\t', '\t', '\n')
+        testcase = testcase.getvalue()
+        self._file.seek(self._tail)
+        self._file.write(testcase + self.TRAILER)
+        self._tail += len(testcase)
+        self.tests += 1
+        self._write_header(result)
+        self._file.flush()
+
+    def close(self, result):
+        """
+        Write the final summary and close the file.
+        """
+        self._write_header(result)
+        self._file.close()
+
+
+class XUnitStreamResult(ResultEvents):
+
+    """
+    Writes the xUnit results as the tests finish
+    """
+
+    name = 'xunit_stream'
+    description = 'Streaming xUnit result support'
+
+    def __init__(self, args):
+        self.writers = []
+        self.result = None
+
+    def pre_tests(self, job):
+        self.result = job.result
+        for path in _get_output_paths(job):
+            self.writers.append(XUnitStreamWriter(path, self.result))
+
+    def start_test(self, result, state):
+        pass
+
+    def test_progress(self, progress=False):
+        pass
+
+    def end_test(self, result, state):
+        self.result = result
+        for writer in self.writers:
+            writer.add_test(result, state)
+
+    def post_tests(self, job):
+        streamed = getattr(job, 'streamed_results', set())
+        for writer in self.writers:
+            writer.close(self.result)
+            streamed.add(writer.path)
+        job.streamed_results = streamed
+        self.writers = []
+
+
 class XUnitCLI(CLI):
     """
     xUnit output
@@ -0,0 +1,250 @@
+"""
+PerfKitBenchmarker samples as typed records, and their time-series store.
+
+PKB publishes its samples as newline delimited JSON (``--json_path``, with
+``--nocollapse_labels`` to keep the metadata as a dict). Those samples are
+loaded as :class:`Sample` records and accumulated, job after job, in a
+local sqlite store indexed by benchmark, metric and labels, where the
+baselines of the regression checks are kept as well.
+"""
+
+import collections
+import json
+import sqlite3
+import time
+
+
+Sample = collections.namedtuple('Sample', ('benchmark', 'metric', 'value',
+                                           'unit', 'timestamp', 'labels',
+                                           'run_uri', 'sample_uri'))
+
+Regression = collections.namedtuple('Regression', ('sample', 'baseline',
+                                                   'change'))
+
+#: Units of the metrics for which lower values are better
+LOWER_IS_BETTER_UNITS = ('ns', 'nsec', 'nanoseconds', 'us', 'usec',
+                         'microseconds', 'ms', 'msec', 'milliseconds', 's',
+                         'sec', 'second', 'seconds', 'min', 'minutes',
+                         'hours')
+
+
+def parse_labels(labels):
+    """
+    Labels of a sample, from its metadata dict or the collapsed
+    ``|key:value|,|key:value|`` string of PKB
+    """
+    if isinstance(labels, dict):
+        return dict((str(key), unicode(value))
+                    for key, value in labels.iteritems())
+    parsed = {}
+    for label in (labels or '').split('|,|'):
+        label = label.strip('|')
+        if ':' in label:
+            key, value = label.split(':', 1)
+            parsed[key] = value
+    return parsed
+
+
+def to_sample(raw):
+    """
+    Typed record of a sample published by PKB
+    """
+    return Sample(benchmark=raw.get('test'), metric=raw['metric'],
+                  value=float(raw['value']), unit=raw.get('unit', ''),
+                  timestamp=float(raw.get('timestamp') or time.time()),
+                  labels=parse_labels(raw.get('metadata', raw.get('labels'))),
+                  run_uri=raw.get('run_uri'),
+                  sample_uri=raw.get('sample_uri'))
+
+
+def load_samples(path):
+    """
+    Load the samples of a PKB newline delimited JSON file
+
+    :return: list of :class:`Sample`
+    """
+    samples = []
+    with open(path) as samples_file:
+        for line in samples_file:
+            if line.strip():
+                samples.append(to_sample(json.loads(line)))
+    return samples
+
+
+def write_samples(samples, path):
+    """
+    Write typed samples as newline delimited JSON
+    """
+    with open(path, 'w') as samples_file:
+        for sample in samples:
+            samples_file.write(json.dumps(sample._asdict(),
+                                          sort_keys=True) + '\n')
+
+
+def lower_is_better(sample):
+    return sample.unit in LOWER_IS_BETTER_UNITS
+
+
+def get_labels_key(labels, keys):
+    """
+    Key of the labels identifying a configuration in the baselines
+    """
+    return json.dumps(dict((key, labels.get(key)) for key in keys
+                           if key in labels), sort_keys=True)
+
+
+class SampleStore(object):
+
+    """
+    Local time-series store of the samples of the benchmark tests
+    """
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS samples "
+              "(id INTEGER PRIMARY KEY, job_id TEXT, benchmark TEXT, "
+              "metric TEXT, value REAL, unit TEXT, timestamp REAL, "
+              "run_uri TEXT, sample_uri TEXT UNIQUE)",
+              "CREATE INDEX IF NOT EXISTS samples_metric "
+              "ON samples (benchmark, metric, timestamp)",
+              "CREATE TABLE IF NOT EXISTS labels "
+              "(sample_id INTEGER, key TEXT, value TEXT)",
+              "CREATE INDEX IF NOT EXISTS labels_key "
+              "ON labels (key, value, sample_id)",
+              "CREATE INDEX IF NOT EXISTS labels_sample "
+              "ON labels (sample_id)",
+              "CREATE TABLE IF NOT EXISTS baselines "
+              "(benchmark TEXT, metric TEXT, labels_key TEXT, value REAL, "
+              "unit TEXT, job_id TEXT, mtime REAL, "
+              "PRIMARY KEY (benchmark, metric, labels_key))")
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._connection = sqlite3.connect(filename, timeout=60)
+        # WAL, so the store can be queried while a job writes it
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            for statement in self.SCHEMA:
+                self._connection.execute(statement)
+
+    def close(self):
+        self._connection.close()
+
+    def add(self, samples, job_id=None):
+        """
+        Add samples (in one transaction), the ones already stored (same
+        sample_uri) are ignored
+
+        :return: number of added samples
+        """
+        added = 0
+        with self._connection:
+            for sample in samples:
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO samples (job_id, benchmark, "
+                    "metric, value, unit, timestamp, run_uri, sample_uri) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, sample.benchmark, sample.metric, sample.value,
+                     sample.unit, sample.timestamp, sample.run_uri,
+                     sample.sample_uri))
+                if not cursor.rowcount:
+                    continue
+                self._connection.executemany(
+                    "INSERT INTO labels (sample_id, key, value) "
+                    "VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, key, value)
+                     for key, value in sample.labels.iteritems()])
+                added += 1
+        return added
+
+    def query(self, benchmark=None, metric=None, labels=None, since=None,
+              until=None):
+        """
+        Samples matching all the given criteria, oldest first
+
+        :param labels: dict of the labels the samples must have
+        :param since: minimum timestamp
+        :param until: maximum timestamp
+        :return: list of :class:`Sample`
+        """
+        conditions = []
+        args = []
+        for column, value in (('benchmark', benchmark), ('metric', metric)):
+            if value is not None:
+                conditions.append("%s = ?" % column)
+                args.append(value)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            args.append(since)
+        if until is not None:
+            conditions.append("timestamp <= ?")
+            args.append(until)
+        for key, value in sorted((labels or {}).iteritems()):
+            conditions.append("EXISTS (SELECT 1 FROM labels WHERE key = ? "
+                              "AND value = ? AND sample_id = samples.id)")
+            args.extend((key, unicode(value)))
+        sql = ("SELECT id, benchmark, metric, value, unit, timestamp, "
+               "run_uri, sample_uri FROM samples")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        rows = self._connection.execute(sql + " ORDER BY timestamp, id",
+                                        args).fetchall()
+        samples = []
+        for row in rows:
+            sample_labels = dict(self._connection.execute(
+                "SELECT key, value FROM labels WHERE sample_id = ?",
+                (row[0],)))
+            samples.append(Sample(row[1], row[2], row[3], row[4], row[5],
+                                  sample_labels, row[6], row[7]))
+        return samples
+
+    def get_baseline(self, benchmark, metric, labels_key):
+        """
+        :return: the baseline value, or None when there's none
+        """
+        row = self._connection.execute(
+            "SELECT value FROM baselines WHERE benchmark = ? AND metric = ? "
+            "AND labels_key = ?", (benchmark, metric, labels_key)).fetchone()
+        return row[0] if row else None
+
+    def set_baseline(self, benchmark, metric, labels_key, value, unit=None,
+                     job_id=None):
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO baselines (benchmark, metric, "
+                "labels_key, value, unit, job_id, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (benchmark, metric, labels_key, value, unit, job_id,
+                 time.time()))
+
+    def check_regressions(self, samples, tolerance, label_keys=(),
+                          update_baseline=False, job_id=None):
+        """
+        Compare the samples of a run to the stored baselines.
+
+        The samples of a metric (and configuration, as given by the
+        label_keys) are averaged. The metrics without baseline get the
+        average as their baseline, as do all of them with update_baseline.
+
+        :param tolerance: change (ratio) tolerated in the wrong direction
+        :param label_keys: labels identifying a configuration
+        :return: list of :class:`Regression`
+        """
+        groups = collections.OrderedDict()
+        for sample in samples:
+            key = (sample.benchmark, sample.metric,
+                   get_labels_key(sample.labels, label_keys))
+            groups.setdefault(key, []).append(sample)
+        regressions = []
+        for (benchmark, metric, labels_key), group in groups.iteritems():
+            value = sum(_.value for _ in group) / len(group)
+            baseline = self.get_baseline(benchmark, metric, labels_key)
+            if baseline is not None and baseline != 0:
+                change = (value - baseline) / abs(baseline)
+                if lower_is_better(group[0]):
+                    change = -change
+                if change < -tolerance:
+                    regressions.append(Regression(group[0]._replace(
+                        value=value), baseline, change))
+            if baseline is None or update_baseline:
+                self.set_baseline(benchmark, metric, labels_key, value,
+                                  group[0].unit, job_id)
+        return regressions
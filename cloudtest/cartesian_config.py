@@ -1368,6 +1368,9 @@ class Parser(object):
         self.debug = debug
         self.defaults = defaults
         self.expand_defaults = [LIdentifier(x) for x in expand_defaults]
+        # Every config file read by this parser (including the included
+        # ones), used to validate cached copies of the parsed tree
+        self.parsed_files = []
 
         self.filename = filename
         if self.filename:
@@ -1399,6 +1402,7 @@ class Parser(object):
         :param filename: Path of the configuration file.
         """
         self.node.filename = filename
+        self.parsed_files.append(filename)
         self.node = self._parse(Lexer(FileReader(filename)), self.node)
         self.filename = filename
 
@@ -1803,6 +1807,7 @@ class Parser(object):
                         raise MissingIncludeError(lexer.line, lexer.filename,
                                                   lexer.linenum)
                     pre_dict = apply_predict(lexer, node, pre_dict)
+                    self.parsed_files.append(filename)
                     lch = Lexer(FileReader(filename))
                     node = self._parse(lch, node, -1)
                     lexer.set_prev_indent(prev_indent)
@@ -1,33 +1,153 @@
 import os
 import re
 import yaml
+import pipes
+import time
+import ipaddr
 import logging
+import threading
 import StringIO
 
 from avocado.core.settings import settings
 from avocado.utils import process
 from cloudtest import cartesian_config
-from avocado.core.exceptions import TestError, HealthCheckFail
+from avocado.core.exceptions import TestError, TestFail, HealthCheckFail
 from cloudtest import remote
 from cloudtest import data_dir
 from cloudtest import utils_misc
 
+#: Marker starting every command record of the probe document
+PROBE_MARKER = "==HEALTH-CHECK=="
+
+#: Snapshot of the processes used by the process check (pid, state, name)
+PROCESS_COMMAND = "ps aux | awk '{print $2,$8,$12}'"
+
+#: Health checks of the whole cluster, not of the node they run on
+CLUSTER_CHECKS = ('health_check_ceph', 'health_check_compute_node_status')
+
+#: Time (in seconds) allowed to a node check beyond its timeout, before it
+#: is given up on and reported as failed
+HOST_TIMEOUT_GRACE = 60
+
+
+def get_host_ips(host_ips):
+    """
+    Expand the ``host_ips`` param into a list of addresses.
+
+    :param host_ips: comma separated list of addresses, CIDRs
+                     (10.1.64.0/28) and ranges (10.1.64.36-10.1.64.50)
+    :return: list of unique addresses, in the given order
+    """
+    ips_list = []
+    for item in host_ips.split(","):
+        item = item.strip()
+        if item.find("/") != -1:
+            for ip_info in ipaddr.IPv4Network(item):
+                ips_list.append(str(ip_info))
+        elif item.find("-") != -1:
+            begin_ip, end_ip = item.split("-")
+            ip_ranges = ipaddr.summarize_address_range(
+                ipaddr.IPv4Address(begin_ip), ipaddr.IPv4Address(end_ip))
+            for ip_range in ip_ranges:
+                for ip_info in ipaddr.IPv4Network(str(ip_range)):
+                    ips_list.append(str(ip_info))
+        elif item:
+            ips_list.append(item)
+    return sorted(set(ips_list), key=ips_list.index)
+
+
+def build_probe_script(commands, command_timeout=60):
+    """
+    Build a shell script running all the commands and reporting them as one
+    document.
+
+    Every command produces a record made of a header line
+    ``PROBE_MARKER index exit_status stdout_bytes stderr_bytes`` followed
+    by the raw stdout and stderr, so outputs can contain anything.
+
+    :param commands: list of shell commands
+    :param command_timeout: maximum time (in seconds) of each command
+    :return: shell script (str)
+    """
+    lines = ['d=$(mktemp -d /tmp/health_check.XXXXXX) || exit 1']
+    for index, command in enumerate(commands):
+        lines.append('timeout %d sh -c %s >"$d/o" 2>"$d/e" </dev/null'
+                     % (command_timeout, pipes.quote(command)))
+        lines.append('echo "%s %d $? $(wc -c <"$d/o") $(wc -c <"$d/e")"'
+                     % (PROBE_MARKER, index))
+        lines.append('cat "$d/o" "$d/e"')
+    lines.append('rm -rf "$d"')
+    return "\n".join(lines)
+
+
+def parse_probe_document(commands, document):
+    """
+    Parse the output of :func:`build_probe_script`.
+
+    :param commands: list of the commands used to build the script
+    :param document: the script output
+    :return: dict {command: :class:`avocado.utils.process.CmdResult`}
+    """
+    results = {}
+    pos = 0
+    while pos < len(document):
+        end = document.find("\n", pos)
+        if end == -1:
+            break
+        header = document[pos:end].split()
+        if len(header) != 5 or header[0] != PROBE_MARKER:
+            raise ValueError("Malformed health check probe record: %r"
+                             % document[pos:end])
+        index, status, out_len, err_len = [int(_) for _ in header[1:]]
+        pos = end + 1
+        stdout = document[pos:pos + out_len]
+        pos += out_len
+        stderr = document[pos:pos + err_len]
+        pos += err_len
+        results[commands[index]] = process.CmdResult(commands[index],
+                                                     stdout, stderr, status)
+    return results
+
+
+class _HostLogAdapter(logging.LoggerAdapter):
+
+    """
+    Prefix the health check messages with the host, as many hosts are
+    checked at the same time.
+    """
+
+    def process(self, msg, kwargs):
+        return "[%s] %s" % (self.extra["host"], msg), kwargs
+
 
 class HealthCheck(object):
     """
     health check for nodes
+
+    All the remote commands needed by the enabled checks are sent to the
+    node as one probe script, and their outputs are returned as one
+    document (see :func:`build_probe_script`).
     """
 
     def __init__(self, node, params, username="root",
                  is_raise_health_check_excp=True,
-                 is_debug=False):
-        self.host_ip = node.ip
-        if "controller" in node.role:
+                 is_debug=False, timeout=None):
+        """
+        :param node: CloudNode (or address) of the node to check
+        :param params: health check params
+        :param timeout: maximum time (in seconds) for checking the node
+        """
+        if isinstance(node, basestring):
+            self.host_ip = node
             self.noderole = "controller"
-        if "compute" in node.role:
-            self.noderole = "compute"
-            if params.has_key('health_check_cluster_status'):
-                params['health_check_cluster_status'] = "false"
+        else:
+            self.host_ip = node.ip
+            if "controller" in node.role:
+                self.noderole = "controller"
+            if "compute" in node.role:
+                self.noderole = "compute"
+                if params.has_key('health_check_cluster_status'):
+                    params['health_check_cluster_status'] = "false"
         self.failed_test = 0
         self.logger = logging.getLogger("avocado.test")
         if is_debug:
@@ -39,11 +159,16 @@ class HealthCheck(object):
                 "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
             ch.setFormatter(formatter)
             self.logger.addHandler(ch)
+        self.logger = _HostLogAdapter(self.logger, {"host": self.host_ip})
 
+        if timeout is None:
+            timeout = int(params.get('health_check_host_timeout', 300))
+        self.deadline = time.time() + timeout
         self.runner = remote.RemoteRunner(host=self.host_ip,
                                           username=username,
                                           use_key=True,
-                                          timeout=10)
+                                          timeout=min(10, timeout))
+        self._probe = {}
 
         self.raise_health_check_excp = is_raise_health_check_excp
         self.result = {}
@@ -119,7 +244,7 @@ class HealthCheck(object):
     def _get_cpu_useage(self):
         cpu_compile = re.compile("^\%Cpu\(s\):.*,\s+(.*)\s+id,")
         cpu_usage = 0.0
-        result = self.runner.run("top -bn 1 -c", internal_timeout=1)
+        result = self._run("top -bn 1 -c")
         reader = StringIO.StringIO(result.stdout)
         for item in reader:
             cpu_search = cpu_compile.search(item)
@@ -138,7 +263,7 @@ class HealthCheck(object):
         memory_usage = 0.0
         total_memory = None
         free_memory = None
-        result = self.runner.run("cat /proc/meminfo")
+        result = self._run("cat /proc/meminfo")
         reader = StringIO.StringIO(result.stdout)
         for item in reader:
             total_search = re.search("^MemTotal:\s+(\d+)\s+kB", item)
@@ -160,7 +285,7 @@ class HealthCheck(object):
             return [False, memory_usage]
 
     def _get_disk_usage(self, mount_point):
-        result = self.runner.run("df -h %s" % mount_point)
+        result = self._run("df -h %s" % mount_point)
         disk_usage = re.findall(r"\b([\d.]+)\b",
                                 result.stdout, re.M | re.I)[0]
         disk_usage = float(disk_usage)
@@ -175,7 +300,7 @@ class HealthCheck(object):
 
     def _get_ceph_status(self):
         try:
-            result = self.runner.run("ceph -s")
+            result = self._run("ceph -s")
             ceph_status = re.findall(r"health (.*)", result.stdout)
         except Exception, e:
             self.logger.info("No ceph found")
@@ -195,24 +320,20 @@ class HealthCheck(object):
 
     def _get_process_info(self, process_name):
         pid_list = []
-        result = self.runner.run(
-            "ps aux | grep %s | grep -v grep | awk {'print $2,$12'}"
-            % process_name)
+        result = self._run(PROCESS_COMMAND)
         reader = StringIO.StringIO(result.stdout)
         for item in reader:
             item_list = item.split()
-            if item_list[1].endswith(process_name):
+            if len(item_list) == 3 and item_list[2].endswith(process_name):
                 pid_list.append(item_list[0])
-        if len(pid_list) == 0:
-            self.logger.error("Can not find process: %s " % process_name)
-            self.failed_test += 1
-        else:
-            for pid in pid_list:
-                if not self._pid_is_alive(pid):
+                if item_list[1].startswith('Z'):
                     self.logger.error(
                         "%s process group has zombie process, pid is %s" % (
-                            process_name, pid))
+                            process_name, item_list[0]))
                     self.failed_test += 1
+        if len(pid_list) == 0:
+            self.logger.error("Can not find process: %s " % process_name)
+            self.failed_test += 1
         return {process_name: len(pid_list)}
 
     def _get_multiple_processes_info(self):
@@ -221,18 +342,10 @@ class HealthCheck(object):
             result.update(self._get_process_info(process))
         return result
 
-    def _pid_is_alive(self, pid):
-        path = '/proc/%s/stat' % pid
-        result = self.runner.run("test -f %s && echo OK" % path)
-        if not result.stdout.strip().endswith("OK"):
-            return False
-        result = self.runner.run("head -1 %s" % path)
-        return result.stdout.split()[2] != 'Z'
-
     def _get_vm_info(self):
         vm_list = []
         try:
-            result = self.runner.run("virsh list")
+            result = self._run("virsh list")
         except:
             self.logger.info("Not a compute node")
             return vm_list
@@ -254,7 +367,7 @@ class HealthCheck(object):
         for keyword in keyword_list:
             command = 'tail -n 500 %s | grep -n "%s"' % (log_file_path, keyword)
             try:
-                result = self.runner.run(command, ignore_status=True)
+                result = self._run(command, ignore_status=True)
                 if len(result.stdout.strip()) != 0:
                     error_found = True
                     break
@@ -284,7 +397,7 @@ class HealthCheck(object):
         check_result = {}
         command = ("systemctl status %s|grep \"Active:\"|awk '{print $2\" \"$3}'"
                   % service_name)
-        result = self.runner.run(command)
+        result = self._run(command)
         std_out_result = result.stdout.strip().lower()
         if len(std_out_result) <= 0:
             self.logger.info(
@@ -313,7 +426,7 @@ class HealthCheck(object):
     def _check_rabbitmq_cluster_status(self):
         command = "rabbitmqctl cluster_status"
         try:
-            result = self.runner.run(command)
+            result = self._run(command)
         except Exception, e:
             self.logger.info(e)
             return False
@@ -344,10 +457,78 @@ class HealthCheck(object):
                 return False
         return True
 
+    def _get_log_filter_commands(self):
+        commands = []
+        error_string_dict = self.content[0]["health_check"][
+            "log_should_not_contain_string"]
+        for component in error_string_dict.keys():
+            for service_name in error_string_dict[component].keys():
+                log_file_path = os.path.join("/var/log", component,
+                                             service_name + ".log")
+                for keyword in error_string_dict[component][service_name]:
+                    commands.append('tail -n 500 %s | grep -n "%s"'
+                                    % (log_file_path, keyword))
+        return commands
+
+    def _get_probe_commands(self):
+        """
+        :return: list of the remote commands needed by the enabled checks
+        """
+        commands = []
+        if self.hc_cpu:
+            commands.append("top -bn 1 -c")
+        if self.hc_memory:
+            commands.append("cat /proc/meminfo")
+        if self.hc_disk:
+            commands.append("df -h /")
+        if self.hc_ceph:
+            commands.append("ceph -s")
+        if self.hc_process:
+            commands.append(PROCESS_COMMAND)
+        if self.hc_vm_count:
+            commands.append("virsh list")
+        if self.hc_service_log:
+            commands.extend(self._get_log_filter_commands())
+        if self.hc_service:
+            for service_name in self.service_dict.keys():
+                commands.append("systemctl status %s|grep \"Active:\"|"
+                                "awk '{print $2\" \"$3}'" % service_name)
+        if self.rabbitmq_cluster_status:
+            commands.append("rabbitmqctl cluster_status")
+        return commands
+
+    def _collect_probe(self):
+        """
+        Run the commands of all the enabled checks on the node at once.
+        """
+        commands = self._get_probe_commands()
+        if not commands:
+            return
+        remaining = max(int(self.deadline - time.time()), 1)
+        script = build_probe_script(commands, remaining)
+        result = self.runner.run("sh -c %s" % pipes.quote(script),
+                                 timeout=remaining, ignore_status=True)
+        self._probe = parse_probe_document(commands, result.stdout)
+
+    def _run(self, command, ignore_status=False):
+        """
+        Get the result of a command from the probe document, running it on
+        the node when it was not part of the probe.
+        """
+        result = self._probe.get(command)
+        if result is None:
+            remaining = max(self.deadline - time.time(), 1)
+            return self.runner.run(command, timeout=remaining,
+                                   ignore_status=ignore_status)
+        if result.exit_status and not ignore_status:
+            raise process.CmdError(command, result)
+        return result
+
     def get_health_status(self):
         self.logger.info("=" * 50)
         self.logger.info("start health check in host: %s" % self.host_ip)
         try:
+            self._collect_probe()
             if self.hc_cpu:
                 self.result["cpu_usage"] = self._get_cpu_useage()
             if self.hc_memory:
@@ -383,6 +564,103 @@ class HealthCheck(object):
             self.logger.info("=" * 50)
 
 
+def check_hosts(nodes, params, username="root", concurrency=None,
+                timeout=None, cluster_checks_once=False):
+    """
+    Run the health check on many nodes at the same time.
+
+    :param nodes: list of CloudNodes (or addresses) to check
+    :param params: health check params
+    :param concurrency: maximum number of nodes checked at the same time,
+                        defaults to the ``health_check_concurrency`` param
+    :param timeout: maximum time (in seconds) for checking each node,
+                    defaults to the ``health_check_host_timeout`` param
+    :param cluster_checks_once: run the checks of the whole cluster
+                                (:data:`CLUSTER_CHECKS`) on the first node
+                                only
+    :return: dict {host_ip: True if the node is healthy}, the nodes whose
+             check didn't finish within timeout (and
+             :data:`HOST_TIMEOUT_GRACE`) are reported unhealthy
+    """
+    logger = logging.getLogger("avocado.test")
+    if concurrency is None:
+        concurrency = int(params.get('health_check_concurrency', 16))
+    if timeout is None:
+        timeout = int(params.get('health_check_host_timeout', 300))
+    jobs = []
+    for index, node in enumerate(nodes):
+        node_params = params.copy()
+        if cluster_checks_once and index > 0:
+            for key in CLUSTER_CHECKS:
+                if node_params.has_key(key):
+                    node_params[key] = "false"
+        jobs.append((node, node_params))
+    jobs.reverse()
+    results = {}
+    #: host_ip => start time of the running checks
+    started = {}
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def _get_ip(node):
+        return node if isinstance(node, basestring) else node.ip
+
+    def _check(node, node_params):
+        host_ip = _get_ip(node)
+        logger.info("Start to do health check on: %s" % host_ip)
+        try:
+            HealthCheck(node, node_params, username=username,
+                        is_raise_health_check_excp=True,
+                        timeout=timeout).get_health_status()
+            return True
+        except (TestError, TestFail, HealthCheckFail):
+            return False
+        except Exception, details:
+            logger.error("Health check on %s failed: %s" % (host_ip, details))
+            return False
+
+    def _worker():
+        while True:
+            with lock:
+                if not jobs:
+                    return
+                job = jobs.pop()
+                host_ip = _get_ip(job[0])
+                started[host_ip] = time.time()
+            healthy = _check(*job)
+            with lock:
+                # Unless given up on meanwhile
+                if started.pop(host_ip, None) is not None:
+                    results[host_ip] = healthy
+            finished.set()
+
+    def _start_worker():
+        worker = threading.Thread(target=_worker)
+        worker.daemon = True
+        worker.start()
+
+    if not jobs:
+        return results
+    for _ in xrange(max(min(concurrency, len(jobs)), 1)):
+        _start_worker()
+    while True:
+        finished.wait(1)
+        finished.clear()
+        with lock:
+            now = time.time()
+            expired = [host_ip for host_ip, start in started.iteritems()
+                       if now - start > timeout + HOST_TIMEOUT_GRACE]
+            for host_ip in expired:
+                logger.error("Health check on %s did not finish in %ss, "
+                             "giving up" % (host_ip, timeout))
+                del started[host_ip]
+                results[host_ip] = False
+            if not jobs and not started:
+                return results
+            # The stuck workers are left behind, others take their jobs
+            for _ in xrange(min(len(expired), len(jobs))):
+                _start_worker()
+
 if __name__ == "__main__":
     parser = cartesian_config.Parser()
     cfg = os.path.join(settings.get_value('datadir.paths',
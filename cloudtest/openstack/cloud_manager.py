@@ -2,8 +2,10 @@
 # Author: Yingfu Zhou <zhouyf6@lenovo.com>
 
 
+import time
 import random
 import logging
+import threading
 import requests
 
 from avocado.utils import process
@@ -13,28 +15,168 @@ from cloudtest.openstack import cloud_node
 
 LOG = logging.getLogger('avocado.test')
 
+#: Time (in seconds) a discovered topology is reused, unless overridden by
+#: the ``cloud_topology_ttl`` param
+DEFAULT_TOPOLOGY_TTL = 300
+
+# Topologies discovered by this process, by list_hosts endpoint
+_TOPOLOGIES = {}
+_TOPOLOGIES_LOCK = threading.Lock()
+
+
+def _service_name_filter(service_name):
+    def match(node):
+        for s in node.cloud_services:
+            if service_name in s.get('name'):
+                return True
+        return False
+    return match
+
+
+#: Node filters accepted by :meth:`CloudManager.filter_nodes`, cheapest
+#: first (the service name filter runs commands on the nodes)
+NODE_FILTERS = (('role', lambda role: lambda node: role in node.role),
+                ('status', lambda status: lambda node: status in node.status),
+                ('service_name', _service_name_filter))
+
+
+def compile_node_filter(**kwargs):
+    """
+    Compile node filters into a single predicate.
+
+    :param kwargs: filters by name (see :data:`NODE_FILTERS`), filters set
+                   to None are ignored
+    :return: function returning True for the nodes matching all the filters
+    :raise ValueError: on unknown filters
+    """
+    unknown = set(kwargs) - set(name for name, _ in NODE_FILTERS)
+    if unknown:
+        raise ValueError("Unknown node filter(s): %s" % ", ".join(unknown))
+    predicates = [compile_filter(kwargs[name])
+                  for name, compile_filter in NODE_FILTERS
+                  if kwargs.get(name) is not None]
+
+    def match(node):
+        for predicate in predicates:
+            if not predicate(node):
+                return False
+        return True
+    return match
+
+
+class CloudTopology(object):
+    """
+    The nodes of the cloud, indexed by IP, hostname and role.
+    """
+    def __init__(self, nodes, timestamp=None):
+        self.nodes = list(nodes)
+        if timestamp is None:
+            timestamp = time.time()
+        self.timestamp = timestamp
+        self.by_ip = {}
+        self.by_host = {}
+        self.by_role = {}
+        for node in self.nodes:
+            self.by_ip[node.ip] = node
+            self.by_host[node.host] = node
+            for role in node.role or []:
+                self.by_role.setdefault(role, []).append(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def is_fresh(self, ttl):
+        return time.time() - self.timestamp < ttl
+
+    def get_node(self, host):
+        """
+        Get a node by its hostname or IP, None when not found.
+        """
+        return self.by_host.get(host) or self.by_ip.get(host)
+
+
+def invalidate_topology(env=None, endpoint=None):
+    """
+    Forget the discovered topologies, so the next CloudManager discovers
+    the nodes again.
+
+    :param env: Env object also holding the topologies
+    :param endpoint: list_hosts endpoint of the topology, all when None
+    """
+    with _TOPOLOGIES_LOCK:
+        if endpoint is None:
+            _TOPOLOGIES.clear()
+        else:
+            _TOPOLOGIES.pop(endpoint, None)
+    if env is not None:
+        env.unregister_cloud_topology(endpoint)
+
 
 class CloudManager(object):
     """
     The module for Cloud management.
+
+    The discovered topology is shared by all the CloudManager objects of
+    the process, and by the tests of the job through the env, for
+    ``cloud_topology_ttl`` seconds.
     """
     def __init__(self, params, env):
         self.params = params
         self.env = env
-        self._nodes = self.discover_nodes()
+        self.topology = self.get_topology()
+
+    @property
+    def _nodes(self):
+        return self.topology.nodes
 
     @property
     def nodes(self):
-        return sorted(self._nodes)
+        return sorted(self._nodes, key=lambda node: node.host)
 
     def __len__(self):
         return len(self._nodes)
 
-    def get_host_list(self):
+    @property
+    def list_hosts_url(self):
         auth_url = self.params.get('OS_AUTH_URL')
-        nova_endpoint_v1 = ':'.join(auth_url.split(':')[:-1]) + ':9080' \
-                           + '/v1/server/list_hosts'
-        r = requests.get(nova_endpoint_v1, verify=True)
+        return ':'.join(auth_url.split(':')[:-1]) + ':9080' \
+            + '/v1/server/list_hosts'
+
+    def get_topology(self, refresh=False):
+        """
+        Get the topology of the cloud, discovering it only when no fresh
+        one is known by this process or by the env.
+
+        :param refresh: discover the topology even when a fresh one is known
+        :return: :class:`CloudTopology`
+        """
+        endpoint = self.list_hosts_url
+        ttl = float(self.params.get('cloud_topology_ttl',
+                                    DEFAULT_TOPOLOGY_TTL))
+        with _TOPOLOGIES_LOCK:
+            topology = _TOPOLOGIES.get(endpoint)
+            if refresh or topology is None or not topology.is_fresh(ttl):
+                topology = None
+                stored = self.env.get_cloud_topology(endpoint)
+                if not refresh and stored:
+                    topology = CloudTopology(stored[1], stored[0])
+                if topology is None or not topology.is_fresh(ttl):
+                    topology = CloudTopology(self.discover_nodes())
+                    self.env.register_cloud_topology(endpoint,
+                                                     topology.timestamp,
+                                                     topology.nodes)
+                _TOPOLOGIES[endpoint] = topology
+        return topology
+
+    def invalidate_topology(self):
+        """
+        Forget the topology of this cloud (e.g. after nodes were rebooted
+        or powered off), it is discovered again by the next CloudManager.
+        """
+        invalidate_topology(self.env, self.list_hosts_url)
+
+    def get_host_list(self):
+        r = requests.get(self.list_hosts_url, verify=True)
         response = r.json()
         try:
             return_code = response[u'return_code']
@@ -79,13 +221,16 @@ class CloudManager(object):
                 host_status = 'ready'
             node = self.env.get_cloud_node(host_name)
             if node:
+                node.role = host_roles
+                node.status = host_status
+                node.ip = host_ip
                 node_list.append(node)
             else:
                 node = cloud_node.CloudNode(host_name, host_roles,
                                             host_status, host_ip)
                 LOG.info("Discovered node: %s" % node.__dict__)
-                self.env.register_cloud_node(node)
                 node_list.append(node)
+            self.env.register_cloud_node(node)
 
         return node_list
 
@@ -95,43 +240,23 @@ class CloudManager(object):
         return random.sample(source, count)
 
     def filter_by_service_name(self, nodes, service_name):
-        affected_nodes = []
-        if service_name is not None:
-            for node in nodes:
-                for s in node.cloud_services:
-                    if service_name in s.get('name'):
-                        # match server_name in the node
-                        affected_nodes.append(node)
-        else:
-            affected_nodes = nodes
-        return affected_nodes
+        return self.filter_nodes(nodes, service_name=service_name)
 
     def filter_by_role(self, nodes, role=None):
-        affected_nodes = []
-        if role is not None:
-            for node in nodes:
-                if role in node.role:
-                    affected_nodes.append(node)
-        else:
-            affected_nodes = nodes
-        return affected_nodes
+        return self.filter_nodes(nodes, role=role)
 
     def filter_by_status(self, nodes, status=None):
-        affected_nodes = []
-        if status is not None:
-            for node in nodes:
-                if status in node.status:
-                    affected_nodes.append(node)
-        else:
-            affected_nodes = nodes
-        return affected_nodes
+        return self.filter_nodes(nodes, status=status)
 
     def filter_nodes(self, nodes, **kwargs):
-        affected_nodes = nodes
-        for k in kwargs:
-            fun = "self.filter_by_%s" % k
-            affected_nodes = eval(fun)(affected_nodes, kwargs[k])
-        return affected_nodes
+        """
+        Get the nodes matching all the given filters.
+
+        :param nodes: nodes to filter
+        :param kwargs: filters by name (see :data:`NODE_FILTERS`)
+        """
+        match = compile_node_filter(**kwargs)
+        return [node for node in nodes if match(node)]
 
     def get_nodes(self, node_role=None, service_name=None, select_policy=None,
                  node_status=None):
@@ -145,9 +270,12 @@ class CloudManager(object):
 
         :return: node hostname or IP
         """
-        affected_nodes = []
-        affected_nodes = self.filter_nodes(nodes=self.nodes, status=node_status,
-                                           role=node_role, service_name=service_name)
+        nodes = self.nodes
+        if node_role is not None:
+            nodes = sorted(self.topology.by_role.get(node_role, []),
+                           key=lambda node: node.host)
+        affected_nodes = self.filter_nodes(nodes=nodes, status=node_status,
+                                           service_name=service_name)
 
         if not select_policy is None:
             if select_policy in 'random' and len(affected_nodes) > 1:
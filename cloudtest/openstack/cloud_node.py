@@ -32,6 +32,13 @@ class CloudNode(object):
     def __repr__(self):
         return {'host': self.host, 'services': self.cloud_services}
 
+    def __getstate__(self):
+        # The remote runner holds a live connection, the unpickled node
+        # creates a new one when needed
+        state = self.__dict__.copy()
+        state['remote_runner'] = None
+        return state
+
     @property
     def cloud_services(self):
         if self.services:
@@ -261,8 +268,8 @@ class CloudNode(object):
 
         :param cmd: the command to execute
         """
-        return self.remote_runner.run(cmd, timeout=timeout,
-                                      ignore_status=ignore_status)
+        return self.ssh_session.run(cmd, timeout=timeout,
+                                    ignore_status=ignore_status)
    
     def find_pci_devices(self, search_string=None):
         """
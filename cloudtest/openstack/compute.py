@@ -30,6 +30,7 @@ from cloudtest import utils_misc
 from cloudtest import remote
 from cloudtest.openstack import network
 from cloudtest.openstack import volume
+from cloudtest.openstack import waiter
 from common import Common
 
 
@@ -58,6 +59,11 @@ class Compute(Common):
         self.usage_client = self.novaclient.usage
         self.limits_client = self.novaclient.limits
 
+        self.server_waiter = waiter.StatusWaiter(self.server_client.list,
+                                                 kind='VM')
+        self.image_waiter = waiter.StatusWaiter(self.image_client.list,
+                                                kind='Image')
+
     def get_public_key(self, public_key_filename=None):
         cmd = 'dmidecode | awk "/UUID/ {print $2}"'
         result = process.run(cmd, shell=True, verbose=False)
@@ -325,55 +331,54 @@ class Compute(Common):
     def find_vm_from_instance_id(self, instance_id):
         return self.server_client.get(instance_id)
 
+    def _wait_for_vm(self, vm, status, step, timeout):
+        request = self.server_waiter.wait(vm.id, status, timeout, step)
+        # A resolved DELETED wait has no resource, the VM is gone
+        if not request.reached and request.resource is None:
+            raise exceptions.VMNotFound("Did not find VM %s" % vm.name)
+        return request
+
     def wait_for_vm_active(self, vm, step=3, timeout=360,
                            delete_on_failure=True):
+        """
+        Wait for a VM to be active, sharing the VM listings with all the
+        other VMs waited for.
+        """
+        request = self._wait_for_vm(vm, 'ACTIVE', step, timeout)
+        if request.reached:
+            return True
 
-        end_time = time.time() + timeout
-
-        while time.time() < end_time:
-            _vm = self.find_vm_from_name(vm.name)
-            if _vm.status == 'ACTIVE':
-                return True
-
-            if (_vm.status == 'ERROR'):
-                LOG.error("VM (ID: %s name: %s) creation ERROR: %s" % (
-                    _vm.id, _vm.name, _vm.fault['message']))
-                if delete_on_failure:
-                    _vm.delete()
-                return False
-
-            LOG.info("VM (ID:%s Name:%s) in status: %s" % (_vm.id, _vm.name,
-                                                           _vm.status))
-            time.sleep(step)
+        _vm = request.resource
+        if _vm.status == 'ERROR':
+            fault = getattr(_vm, 'fault', None) or {}
+            LOG.error("VM (ID: %s name: %s) creation ERROR: %s" % (
+                _vm.id, _vm.name, fault.get('message')))
         else:
             LOG.error("Timeout to build VM: %s" % _vm.name)
-            if delete_on_failure:
-                _vm.delete()
-            return False
+        if delete_on_failure:
+            _vm.delete()
+        return False
 
     def wait_for_vm_in_status(self, vm, status, step=3, timeout=360,
                               delete_on_failure=False):
+        """
+        Wait for a VM to be in a status, sharing the VM listings with all
+        the other VMs waited for.
+        """
+        request = self._wait_for_vm(vm, status, step, timeout)
+        if request.reached:
+            return True
 
-        end_time = time.time() + timeout
-
-        while time.time() < end_time:
-            _vm = self.find_vm_from_name(vm.name)
-            LOG.info("VM (ID:%s Name:%s) in status: %s" % (_vm.id, _vm.name,
-                                                           _vm.status))
-            if _vm.status == status:
-                return True
-
-            if _vm.status == 'ERROR':
-                LOG.error("VM ID: %s name: %s in status ERROR!!" % (_vm.id, _vm.name))
-                if delete_on_failure:
-                    _vm.delete()
-                return False
-
-            time.sleep(step)
+        _vm = request.resource
+        if _vm.status == 'ERROR':
+            LOG.error("VM ID: %s name: %s in status ERROR!!" % (_vm.id,
+                                                                 _vm.name))
+            if delete_on_failure:
+                _vm.delete()
         else:
             LOG.error("VM (ID: %s name: %s) still not in status: %s"
                       % (_vm.id, _vm.name, status))
-            return False
+        return False
 
     def get_vm_by_ip(self, vm_ip):
         vms = self.server_client.list()
@@ -1036,20 +1041,14 @@ class Compute(Common):
             return image
 
     def wait_for_image_in_status(self, image, status, step=3, timeout=360):
+        request = self.image_waiter.wait(image.id, status, timeout, step)
+        if request.reached:
+            return True
 
-        end_time = time.time() + timeout
-
-        while time.time() < end_time:
-            _image = self.image_client.find(name=image.name)
-            LOG.info("Image (ID:%s Name:%s) in status: %s" % (_image.id, _image.name, _image.status))
-            if _image.status == status:
-                return True
-
-            time.sleep(step)
-        else:
-            LOG.error("Image (ID: %s name: %s) failed to in status %s!!"
-                      % (_image.id, _image.name, status))
-            return False
+        _image = request.resource or image
+        LOG.error("Image (ID: %s name: %s) failed to in status %s!!"
+                  % (_image.id, _image.name, status))
+        return False
 
     def get_hypervisor_statistics(self):
         """
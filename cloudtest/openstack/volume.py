@@ -3,6 +3,7 @@ import time
 
 import os_client_config
 from common import Common
+from cloudtest.openstack import waiter
 
 from avocado.core import exceptions
 
@@ -18,6 +19,9 @@ class Volume(Common):
 
         self.volume_back = self.cinderclient.backups
         self.volume_type = self.cinderclient.volume_types
+        self.volume_waiter = waiter.StatusWaiter(
+            self.cinderclient.volumes.list, kind='Volume', step=5,
+            error_statuses=('error', 'error_restoring'))
 
     def get_specified_volume(self, name):
         """
@@ -179,30 +183,21 @@ class Volume(Common):
 
     def wait_for_volume_status(self, volume_id, status, step=5, timeout=90):
         """Waits for a Volume to reach a given status."""
-        start = int(time.time())
-
-        current_status = self.get_volume_status(volume_id)
-        if current_status == 'error' and status != 'error':
+        request = self.volume_waiter.wait(volume_id, status, timeout, step)
+        if request.reached:
+            return True
+
+        current_status = None
+        if request.resource is not None:
+            current_status = request.resource.status
+        if current_status == 'error':
             raise exceptions.VolumeBuildErrorException(volume_id=
                                                        volume_id)
         if current_status == 'error_restoring':
             raise exceptions.VolumeRestoreErrorException(volume_id=
                                                          volume_id)
-        while current_status != status:
-            LOG.info("vol.status is %s" % current_status)
-            time.sleep(step)
-            current_status = self.get_volume_status(volume_id)
-            if int(time.time()) - start >= timeout:
-                LOG.info("time left is %s" % str(int(time.time()) - start))
-                raise exceptions.TestFail('Volume %s failed to reach %s '
-                                          'status (current %s) within '
-                                          'the required time (%s s).' %
-                                          (volume_id, status,
-                                           current_status, timeout))
-
-        return True
-
-
-
-
-
+        raise exceptions.TestFail('Volume %s failed to reach %s '
+                                  'status (current %s) within '
+                                  'the required time (%s s).' %
+                                  (volume_id, status,
+                                   current_status, timeout))
@@ -0,0 +1,200 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: Lenovo Inc. 2017
+
+"""
+Wait for many OpenStack resources to reach a status with bulk listings.
+
+Waiting for N resources by polling each of them costs N API calls per
+poll interval (and even N listings when the lookup lists all of them).
+A :class:`StatusWaiter` collects all the pending waits for one kind of
+resource and resolves them from one listing per poll interval.
+"""
+
+import time
+import logging
+import threading
+
+
+LOG = logging.getLogger('avocado.test')
+
+
+class WaitRequest(object):
+    """
+    A pending wait for one resource, resolved by the :class:`StatusWaiter`.
+    """
+    def __init__(self, resource_id, status, timeout, step):
+        self.resource_id = resource_id
+        self.status = status
+        self.step = step
+        self.deadline = time.time() + timeout
+        #: Last seen version of the resource, None when never seen
+        self.resource = None
+        self.last_status = None
+        #: True when the resource reached the status, False on error status,
+        #: timeout or disappearance
+        self.reached = None
+        self.reason = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def resolve(self, reached, reason=None):
+        self.reached = reached
+        self.reason = reason
+        self._done.set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the request to be resolved.
+
+        :return: True when the resource reached the status
+        """
+        self._done.wait(timeout)
+        return self.reached
+
+
+class StatusWaiter(object):
+    """
+    Resolves the pending waits of one kind of resource.
+
+    A poller thread, running only while waits are pending, lists all the
+    resources at once every poll interval. The interval is the smallest
+    ``step`` of the pending waits, and grows up to ``max_step`` while no
+    pending resource changes status.
+    """
+    def __init__(self, list_resources, kind='Resource', step=3, max_step=15,
+                 error_statuses=('ERROR',)):
+        """
+        :param list_resources: function returning all the resources, each
+                               with ``id`` and ``status`` attributes
+        :param kind: resource kind, for logging
+        :param step: default poll interval (in seconds) of the waits
+        :param max_step: maximum poll interval (in seconds)
+        :param error_statuses: statuses resolving the waits as failed
+        """
+        self.list_resources = list_resources
+        self.kind = kind
+        self.step = step
+        self.max_step = max_step
+        self.error_statuses = error_statuses
+        #: Number of listings issued so far
+        self.polls = 0
+        self._pending = []
+        self._lock = threading.Condition()
+        self._poller = None
+        self._interval = step
+
+    def submit(self, resource_id, status, timeout=360, step=None):
+        """
+        Start waiting for a resource to reach a status.
+
+        :param resource_id: id of the resource
+        :param status: expected status, ``DELETED`` waits for the resource
+                       to disappear
+        :param timeout: maximum time (in seconds) to wait
+        :param step: poll interval (in seconds) after a status change
+        :return: :class:`WaitRequest`
+        """
+        request = WaitRequest(resource_id, status, timeout, step or self.step)
+        with self._lock:
+            self._pending.append(request)
+            self._interval = min(self._interval, request.step)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop)
+                self._poller.daemon = True
+                self._poller.start()
+            self._lock.notify()
+        return request
+
+    def wait(self, resource_id, status, timeout=360, step=None):
+        """
+        Wait for a resource to reach a status.
+
+        :return: the resolved :class:`WaitRequest`
+        """
+        request = self.submit(resource_id, status, timeout, step)
+        request.result()
+        return request
+
+    def _poll_loop(self):
+        last_poll = 0
+        while True:
+            with self._lock:
+                while True:
+                    self._pending = [_ for _ in self._pending if not _.done()]
+                    if not self._pending:
+                        self._poller = None
+                        return
+                    next_poll = min([last_poll + self._interval] +
+                                    [_.deadline for _ in self._pending])
+                    delay = next_poll - time.time()
+                    if delay <= 0:
+                        break
+                    self._lock.wait(delay)
+                pending = list(self._pending)
+            try:
+                changed = self._poll(pending)
+            except Exception, details:
+                LOG.warn("Failed to list %ss: %s" % (self.kind, details))
+                for request in pending:
+                    if time.time() >= request.deadline:
+                        request.resolve(False, "Failed to list %ss: %s"
+                                        % (self.kind, details))
+                changed = False
+            last_poll = time.time()
+            with self._lock:
+                step = min([self.max_step] +
+                           [_.step for _ in self._pending if not _.done()])
+                if changed:
+                    self._interval = step
+                else:
+                    self._interval = min(self._interval * 1.5,
+                                         max(step, self.max_step))
+
+    def _poll(self, pending):
+        resources = {}
+        for resource in self.list_resources():
+            resources[resource.id] = resource
+        self.polls += 1
+        now = time.time()
+        changed = False
+        for request in pending:
+            resource = resources.get(request.resource_id)
+            previous = request.resource
+            if resource is None:
+                if request.status == 'DELETED':
+                    request.resolve(True)
+                elif previous is not None:
+                    request.resolve(False, "%s %s disappeared"
+                                    % (self.kind, request.resource_id))
+                else:
+                    request.resolve(False, "%s %s not found"
+                                    % (self.kind, request.resource_id))
+                continue
+            request.resource = resource
+            if request.last_status != resource.status:
+                request.last_status = resource.status
+                changed = True
+                LOG.info("%s (ID:%s Name:%s) in status: %s"
+                         % (self.kind, resource.id,
+                            getattr(resource, 'name', None), resource.status))
+            if resource.status == request.status:
+                request.resolve(True)
+            elif resource.status in self.error_statuses:
+                request.resolve(False, "%s %s in status %s"
+                                % (self.kind, resource.id, resource.status))
+            elif now >= request.deadline:
+                request.resolve(False, "%s %s still not in status %s"
+                                % (self.kind, resource.id, request.status))
+        return changed
@@ -0,0 +1,243 @@
+"""
+Dependency graph scheduling of rally tasks.
+
+The tasks are the nodes of a DAG: a task starts as soon as the tasks it
+depends on passed, up to a configured number of tasks at the same time.
+A task which fails (after its reruns) runs its recovery task, and only
+the tasks depending on it are skipped; the other branches go on.
+
+The tasks of a deployment hold a shared lock on it while they run, the
+exclusive ones an exclusive lock, so a task which must not share the
+deployment (with other threads or avocado processes) runs alone on it.
+"""
+
+import collections
+import contextlib
+import fcntl
+import logging
+import os
+import threading
+import time
+
+
+LOG = logging.getLogger('avocado.test')
+
+TASK_PASS = 'PASS'
+TASK_FAIL = 'FAIL'
+TASK_ERROR = 'ERROR'
+TASK_SKIP = 'SKIP'
+
+#: Directory of the deployment lock files
+LOCK_DIR = '/var/tmp'
+
+
+class TaskNode(object):
+
+    """
+    A rally task of the graph
+    """
+
+    def __init__(self, name, run, depends=(), recovery=None, reruns=1,
+                 deployment=None, exclusive=False):
+        """
+        :param name: unique name of the task in the graph
+        :param run: function running the task, returning whether it passed
+        :param depends: names of the tasks which must pass before this one
+        :param recovery: function run after each failed run of the task
+        :param reruns: number of times the task is run until it passes
+        :param deployment: rally deployment of the task
+        :param exclusive: run the task alone on its deployment
+        """
+        self.name = name
+        self.run = run
+        self.depends = list(depends)
+        self.recovery = recovery
+        self.reruns = max(int(reruns), 1)
+        self.deployment = deployment
+        self.exclusive = exclusive
+
+
+class TaskGraph(object):
+
+    """
+    DAG of the rally tasks
+    """
+
+    def __init__(self):
+        self.nodes = collections.OrderedDict()
+
+    def add(self, node):
+        if node.name in self.nodes:
+            raise ValueError("Duplicated task %s" % node.name)
+        self.nodes[node.name] = node
+        return node
+
+    def validate(self):
+        """
+        :raise ValueError: on unknown dependencies and cycles
+        """
+        for node in self.nodes.itervalues():
+            for name in node.depends:
+                if name not in self.nodes:
+                    raise ValueError("Task %s depends on unknown task %s"
+                                     % (node.name, name))
+        visited = {}
+
+        def visit(name, path):
+            if visited.get(name) == 'done':
+                return
+            if visited.get(name) == 'visiting':
+                raise ValueError("Dependency cycle: %s"
+                                 % ' -> '.join(path + [name]))
+            visited[name] = 'visiting'
+            for depend in self.nodes[name].depends:
+                visit(depend, path + [name])
+            visited[name] = 'done'
+
+        for name in self.nodes:
+            visit(name, [])
+
+    def descendants(self, name):
+        """
+        Names of the tasks depending (directly or not) on a task
+        """
+        found = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            for node in self.nodes.itervalues():
+                if current in node.depends and node.name not in found:
+                    found.add(node.name)
+                    pending.append(node.name)
+        return found
+
+
+@contextlib.contextmanager
+def deployment_lock(deployment, exclusive=False, lock_dir=LOCK_DIR):
+    """
+    Hold a shared (or exclusive) lock on a deployment, among the threads
+    and processes using the same lock directory
+    """
+    if deployment is None:
+        yield
+        return
+    path = os.path.join(lock_dir, 'rally_deployment_%s.lock' % deployment)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DAGScheduler(object):
+
+    """
+    Run the tasks of a graph, the independent ones concurrently
+    """
+
+    def __init__(self, graph, width=1, wait_ready=None, lock_dir=LOCK_DIR):
+        """
+        :param graph: :class:`TaskGraph` to run
+        :param width: maximum number of tasks running at the same time
+        :param wait_ready: function called with a node before running it,
+                           to wait until its deployment is ready
+        :param lock_dir: directory of the deployment lock files
+        """
+        graph.validate()
+        self.graph = graph
+        self.width = max(int(width), 1)
+        self.wait_ready = wait_ready
+        self.lock_dir = lock_dir
+        #: task name => status
+        self.statuses = collections.OrderedDict()
+        #: task name => exception raised by the task
+        self.errors = {}
+        self._condition = threading.Condition()
+
+    def _run_node(self, node):
+        for attempt in xrange(1, node.reruns + 1):
+            status = TASK_FAIL
+            LOG.info("Running task %s (%d/%d)", node.name, attempt,
+                     node.reruns)
+            try:
+                if self.wait_ready is not None:
+                    self.wait_ready(node)
+                with deployment_lock(node.deployment, node.exclusive,
+                                     self.lock_dir):
+                    passed = node.run()
+            except Exception as details:
+                LOG.error("Task %s raised: %s", node.name, details)
+                self.errors[node.name] = details
+                status = TASK_ERROR
+                passed = False
+            if passed:
+                status = TASK_PASS
+                break
+            if node.recovery is not None:
+                LOG.info("Running the recovery of task %s", node.name)
+                try:
+                    node.recovery()
+                except Exception as details:
+                    LOG.error("Error while running the recovery of task "
+                              "%s: %s", node.name, details)
+        with self._condition:
+            self.statuses[node.name] = status
+            if status != TASK_PASS:
+                for name in self.graph.descendants(node.name):
+                    if name not in self.statuses:
+                        LOG.info("Skipping task %s, as %s did not pass",
+                                 name, node.name)
+                        self.statuses[name] = TASK_SKIP
+            self._condition.notify()
+
+    def _get_ready(self, started):
+        return [node for name, node in self.graph.nodes.iteritems()
+                if name not in started and
+                all(self.statuses.get(_) == TASK_PASS for _ in node.depends)]
+
+    def run(self):
+        """
+        Run the tasks (to the end, whatever the failures)
+
+        :return: OrderedDict {task name: status} in the order of the graph
+        """
+        started = set()
+        threads = []
+        with self._condition:
+            while len(self.statuses) < len(self.graph.nodes):
+                running = len(started) - len([_ for _ in started
+                                              if _ in self.statuses])
+                for node in self._get_ready(started | set(self.statuses)):
+                    if running >= self.width:
+                        break
+                    started.add(node.name)
+                    thread = threading.Thread(target=self._run_node,
+                                              args=(node,))
+                    thread.daemon = True
+                    thread.start()
+                    threads.append(thread)
+                    running += 1
+                # Waiting with a timeout keeps the main thread responsive
+                # to ctrl+c
+                self._condition.wait(1)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+        return collections.OrderedDict((name, self.statuses[name])
+                                       for name in self.graph.nodes)
+
+
+def wait_until(check, timeout, interval=1):
+    """
+    Wait until check returns True
+
+    :return: whether check returned True before the timeout
+    """
+    end_time = time.time() + timeout
+    while True:
+        if check():
+            return True
+        if time.time() >= end_time:
+            return False
+        time.sleep(min(interval, max(end_time - time.time(), 0)))
@@ -0,0 +1,221 @@
+"""
+Ingestion of the structured (JSON) results of rally tasks.
+
+The results exported by ``rally task results`` are turned into a compact
+columnar document per task: one column per iteration field and per atomic
+action of each scenario, the distinct errors, the SLA outcomes and the
+statistics rally prints in its console tables.
+"""
+
+import collections
+import json
+import math
+import os
+import re
+
+from avocado.utils import process
+
+
+UUID_PATTERN = ('[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                '[0-9a-f]{12}')
+
+#: Name of the statistics of the whole iterations
+TOTAL = 'total'
+
+
+def get_task_uuid(output):
+    """
+    Get the uuid of the task started by a ``rally task start`` command
+
+    :param output: output of the command
+    :return: the uuid, or None when it can't be found
+    """
+    match = re.search(r'Task\s+(%s)' % UUID_PATTERN, output)
+    return match.group(1) if match else None
+
+
+def export_task_results(task_uuid):
+    """
+    Get the structured results of a task from rally
+
+    :return: list of the scenario results, as exported by rally
+    """
+    result = process.run('rally task results %s' % task_uuid, shell=True,
+                         verbose=False)
+    return json.loads(result.stdout)
+
+
+def parse_atomic_actions(atomic_actions):
+    """
+    Durations of the atomic actions of an iteration, from the dict (older
+    rally) or the list (newer rally, with start and end times) formats
+
+    :return: OrderedDict {action name: duration}
+    """
+    durations = collections.OrderedDict()
+    if isinstance(atomic_actions, dict):
+        for name in sorted(atomic_actions):
+            durations[name] = atomic_actions[name]
+        return durations
+    for action in atomic_actions or []:
+        if action.get('finished_at') is None:
+            duration = None
+        else:
+            duration = action['finished_at'] - action['started_at']
+        if durations.get(action['name']) is not None and duration is not None:
+            duration += durations[action['name']]
+        durations[action['name']] = duration
+    return durations
+
+
+def percentile(values, percent):
+    """
+    Percentile of sorted values, interpolated as rally does
+    """
+    if not values:
+        return None
+    index = (len(values) - 1) * percent
+    floor = math.floor(index)
+    ceil = math.ceil(index)
+    if floor == ceil:
+        return values[int(index)]
+    return (values[int(floor)] * (ceil - index) +
+            values[int(ceil)] * (index - floor))
+
+
+def get_stats(durations, count):
+    """
+    Statistics of the durations of the successful iterations
+
+    :param durations: durations (None for the failed iterations)
+    :param count: number of iterations
+    """
+    values = sorted(_ for _ in durations if _ is not None)
+    stats = {'count': count,
+             'success': 100.0 * len(values) / count if count else None}
+    for name, percent in (('min', 0), ('median', 0.5), ('90%ile', 0.9),
+                          ('95%ile', 0.95), ('max', 1)):
+        stats[name] = percentile(values, percent)
+    stats['avg'] = sum(values) / len(values) if values else None
+    return stats
+
+
+def ingest_scenario(raw):
+    """
+    Columnar document of the results of one scenario
+    """
+    iterations = raw.get('result', [])
+    columns = collections.OrderedDict((name, []) for name in
+                                      ('timestamp', 'duration',
+                                       'idle_duration', 'error'))
+    actions = collections.OrderedDict()
+    errors = []
+    for number, iteration in enumerate(iterations):
+        error = iteration.get('error') or None
+        if error:
+            error = list(error[:3])
+            if error not in errors:
+                errors.append(error)
+            error = errors.index(error)
+        for name in ('timestamp', 'duration', 'idle_duration'):
+            columns[name].append(iteration.get(name))
+        columns['error'].append(error)
+        for name, duration in parse_atomic_actions(
+                iteration.get('atomic_actions')).iteritems():
+            # Actions missing in the previous iterations are None there
+            column = actions.setdefault(name, [None] * number)
+            column.append(duration if error is None else None)
+        for column in actions.itervalues():
+            if len(column) <= number:
+                column.append(None)
+    count = len(iterations)
+    stats = collections.OrderedDict()
+    for name, column in actions.iteritems():
+        stats[name] = get_stats(column, count)
+    stats[TOTAL] = get_stats([duration if error is None else None
+                              for duration, error in zip(columns['duration'],
+                                                         columns['error'])],
+                             count)
+    sla = [{'criterion': _.get('criterion'), 'success': _.get('success'),
+            'detail': _.get('detail')} for _ in raw.get('sla', [])]
+    key = raw.get('key', {})
+    return {'name': key.get('name'), 'pos': key.get('pos'),
+            'load_duration': raw.get('load_duration'),
+            'full_duration': raw.get('full_duration'),
+            'iterations': count,
+            'error_count': sum(1 for _ in columns['error'] if _ is not None),
+            'sla': sla,
+            'sla_passed': all(_['success'] for _ in sla),
+            'columns': columns,
+            'atomic_actions': actions,
+            'errors': errors,
+            'stats': stats}
+
+
+def ingest_task(task_uuid, raw_results):
+    """
+    Columnar document of the results of a task
+
+    :param raw_results: results exported by rally (list of scenarios)
+    """
+    scenarios = [ingest_scenario(_) for _ in raw_results]
+    durations = []
+    for scenario in scenarios:
+        durations.extend(duration if error is None else None
+                         for duration, error in
+                         zip(scenario['columns']['duration'],
+                             scenario['columns']['error']))
+    return {'task_uuid': task_uuid,
+            'error_count': sum(_['error_count'] for _ in scenarios),
+            'sla_passed': all(_['sla_passed'] for _ in scenarios),
+            'total': get_stats(durations, len(durations)),
+            'scenarios': scenarios}
+
+
+def write_artifact(task, logdir):
+    """
+    Write the document of a task (compact JSON) in logdir
+
+    :return: path of the artifact
+    """
+    path = os.path.join(logdir, 'rally_task_%s.json' % task['task_uuid'])
+    with open(path, 'w') as artifact:
+        json.dump(task, artifact, separators=(',', ':'))
+    return path
+
+
+def get_summary(task):
+    """
+    Summary of a task, reported as test metadata (no iteration data)
+    """
+    return {'task_uuid': task['task_uuid'],
+            'error_count': task['error_count'],
+            'sla_passed': task['sla_passed'],
+            'total': task['total'],
+            'scenarios': [{'name': _['name'], 'iterations': _['iterations'],
+                           'error_count': _['error_count'],
+                           'sla_passed': _['sla_passed'],
+                           'stats': _['stats']}
+                          for _ in task['scenarios']]}
+
+
+def get_total_row(task):
+    """
+    The "total" row of the rally console tables of a task, as registered
+    in the env
+    """
+    def seconds(value):
+        return 'n/a' if value is None else '%.3f' % value
+
+    total = task['total']
+    return {'Action': TOTAL,
+            'Min(sec)': seconds(total['min']),
+            'Median(sec)': seconds(total['median']),
+            '90%ile(sec)': seconds(total['90%ile']),
+            '95%ile(sec)': seconds(total['95%ile']),
+            'Max(sec)': seconds(total['max']),
+            'Avg(sec)': seconds(total['avg']),
+            'Success': ('n/a' if total['success'] is None
+                        else '%.1f%%' % total['success']),
+            'Count': str(total['count']),
+            'rally_task_uuid': task['task_uuid']}
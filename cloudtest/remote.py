@@ -4,8 +4,10 @@ Functions and classes used for logging into guests and transferring files.
 import logging
 import os
 import re
+import select
 import shutil
 import tempfile
+import threading
 import time
 
 import aexpect
@@ -14,6 +16,7 @@ import socket
 from paramiko.ssh_exception import SSHException
 
 from avocado.core import exceptions
+from avocado.core.settings import settings
 from avocado.utils import process
 from . import data_dir
 from . import rss_client
@@ -1166,6 +1169,162 @@ class RemoteFile(object):
         self._push_file()
 
 
+class SSHConnection(object):
+    """
+    Persistent SSH transport to a host, able to run several commands at once.
+
+    Every command is executed on its own channel of the same transport, so
+    the exit status, stdout and stderr are obtained in a single exchange and
+    concurrent commands (from different threads) don't need extra logins.
+    Use :func:`get_ssh_connection` to share the connections of a process.
+    """
+
+    def __init__(self, host, port=22, username="root", password=None,
+                 use_key=False, timeout=240, max_channels=8):
+        """
+        :param host: Hostname or IP address
+        :param port: Port to connect to
+        :param username: Username
+        :param password: Password (if required)
+        :param use_key: Whether to authenticate using the local ssh keys
+        :param timeout: Total time duration to wait for a successful login
+        :param max_channels: Maximum number of commands running at the same
+                time (sshd refuses more than MaxSessions, 10 by default)
+        """
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.use_key = use_key
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+        self._channels = threading.BoundedSemaphore(max_channels)
+
+    def _connect(self):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(hostname=self.host, port=self.port,
+                       username=self.username, password=self.password,
+                       timeout=10, allow_agent=self.use_key,
+                       look_for_keys=self.use_key)
+        client.get_transport().set_keepalive(30)
+        return client
+
+    def connect(self):
+        """
+        Log into the host, retrying until the login timeout expires.
+
+        :raise LoginAuthenticationError: If the credentials are refused
+        :raise LoginTimeoutError: If the host is not reachable in time
+        """
+        logging.debug("Attempting to log into %s:%s using paramiko "
+                      "(timeout %ds)", self.host, self.port, self.timeout)
+        end_time = time.time() + self.timeout
+        while True:
+            try:
+                self._client = self._connect()
+                return
+            except paramiko.AuthenticationException as details:
+                raise LoginAuthenticationError(str(details), "")
+            except (socket.error, SSHException, EOFError) as details:
+                logging.debug("Login to %s failed: %s", self.host, details)
+                if time.time() >= end_time:
+                    raise LoginTimeoutError(str(details))
+            time.sleep(2)
+
+    def get_transport(self):
+        """
+        :return: Active transport, reconnecting if the old one was lost
+        """
+        with self._lock:
+            transport = self._client and self._client.get_transport()
+            if transport is None or not transport.is_active():
+                self.connect()
+                transport = self._client.get_transport()
+            return transport
+
+    def run(self, command, timeout=60):
+        """
+        Run a command on a new channel of the transport.
+
+        :param command: Command to be executed
+        :param timeout: Total time duration to wait for command return
+        :return: tuple(exit status, stdout, stderr)
+        :raise aexpect.ShellTimeoutError: If the command didn't finish in time
+        """
+        with self._channels:
+            channel = self.get_transport().open_session(timeout=timeout)
+            try:
+                channel.exec_command(command)
+                return self._communicate(channel, command, timeout)
+            finally:
+                channel.close()
+
+    @staticmethod
+    def _communicate(channel, command, timeout):
+        stdout = []
+        stderr = []
+        end_time = time.time() + timeout
+        while True:
+            # Drain both streams, otherwise a full stderr window blocks stdout
+            while channel.recv_ready():
+                stdout.append(channel.recv(32768))
+            while channel.recv_stderr_ready():
+                stderr.append(channel.recv_stderr(32768))
+            if (channel.exit_status_ready() and not channel.recv_ready() and
+                    not channel.recv_stderr_ready()):
+                break
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise aexpect.ShellTimeoutError(command, "".join(stdout))
+            if channel.eof_received:
+                # Both streams are done, only the exit status is missing
+                channel.status_event.wait(min(remaining, 1))
+            else:
+                select.select([channel], [], [], min(remaining, 1))
+        return channel.recv_exit_status(), "".join(stdout), "".join(stderr)
+
+    def close(self):
+        """
+        Close the transport and all its channels.
+        """
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_SSH_CONNECTIONS = {}
+_SSH_CONNECTIONS_LOCK = threading.Lock()
+_SSH_CONNECTIONS_PID = None
+
+
+def get_ssh_connection(host, port=22, username="root", password=None,
+                       use_key=False, timeout=240):
+    """
+    Get the :class:`SSHConnection` to a host shared within this process.
+
+    Connections inherited from a parent process (test processes are forked)
+    are never reused, since their transport threads don't exist here.
+
+    :see: SSHConnection
+    """
+    global _SSH_CONNECTIONS_PID
+    key = (host, str(port), username, password, use_key)
+    with _SSH_CONNECTIONS_LOCK:
+        if _SSH_CONNECTIONS_PID != os.getpid():
+            _SSH_CONNECTIONS.clear()
+            _SSH_CONNECTIONS_PID = os.getpid()
+        connection = _SSH_CONNECTIONS.get(key)
+        if connection is None:
+            connection = SSHConnection(host, port, username, password,
+                                       use_key, timeout)
+            _SSH_CONNECTIONS[key] = connection
+    connection.get_transport()
+    return connection
+
+
 class RemoteRunner(object):
     """
     Class to provide a utils.run-like method to execute command on
@@ -1176,7 +1335,7 @@ class RemoteRunner(object):
     def __init__(self, client="ssh", host=None, port="22", username="root",
                  password=None, prompt=r"[\#\$]\s*$", linesep="\n",
                  log_filename=None, timeout=240, internal_timeout=10,
-                 session=None, use_key=False):
+                 session=None, use_key=False, backend=None):
         """
         Initialization of RemoteRunner. Init a session login to remote host or
         guest.
@@ -1195,27 +1354,83 @@ class RemoteRunner(object):
                 for each step of the login procedure (e.g. the "Are you sure"
                 prompt or the password prompt)
         :param session: An existing session
+        :param use_key: Whether to authenticate using the local ssh keys
+        :param backend: 'paramiko' runs every command on its own channel of
+                a persistent SSH transport shared by the whole process,
+                'aexpect' runs them through a shell session. Defaults to the
+                cloudtest.common.remote_runner_backend setting. Only ssh
+                clients without an existing session can use 'paramiko'.
         :see: wait_for_login()
         :raise: Whatever wait_for_login() raises
         """
         self.host = host
         self.username = username
         self.password = password
-        if session is None:
-            if host is None:
-                raise exceptions.TestError(
-                    "Neither host, nor session was defined!")
-            self.session = wait_for_login(client, host, port, username,
-                                          password, prompt, linesep,
-                                          log_filename, timeout,
-                                          internal_timeout, use_key=use_key)
-        else:
-            self.session = session
+        if session is None and host is None:
+            raise exceptions.TestError(
+                "Neither host, nor session was defined!")
+        if backend is None:
+            backend = settings.get_value('cloudtest.common',
+                                         'remote_runner_backend',
+                                         default='paramiko')
+        if session is not None or client != "ssh":
+            backend = "aexpect"
+        self.backend = backend
+        self._login_args = (client, host, port, username, password, prompt,
+                            linesep, log_filename, timeout, internal_timeout)
+        self._use_key = use_key
+        self._session = session
+        self.connection = None
+        if backend == "paramiko":
+            self.connection = get_ssh_connection(host, port, username,
+                                                 password, use_key, timeout)
+        elif session is None:
+            self._session = self._login()
         # Init stdout pipe and stderr pipe.
         random_pipe = utils_misc.generate_random_string(6)
         self.stdout_pipe = '/tmp/cmd_stdout_%s' % random_pipe
         self.stderr_pipe = '/tmp/cmd_stderr_%s' % random_pipe
 
+    def _login(self):
+        return wait_for_login(*self._login_args, use_key=self._use_key)
+
+    @property
+    def session(self):
+        """
+        Shell session on the remote host (with the 'paramiko' backend it's
+        only logged in when first accessed).
+        """
+        if self._session is None:
+            self._session = self._login()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def is_responsive(self, timeout=10):
+        """
+        Whether the remote host still answers, without logging a shell
+        session in when the 'paramiko' backend is used.
+        """
+        if self.connection is None:
+            return self.session.is_responsive(timeout=timeout)
+        try:
+            status, _, _ = self.connection.run("true", timeout)
+        except Exception, details:
+            logging.debug("%s is not responsive: %s", self.host, details)
+            return False
+        return status == 0
+
+    def close(self):
+        """
+        Close the shell session, if one was logged in. The persistent
+        connection of the 'paramiko' backend is shared, it stays open.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
     def run(self, command, timeout=60, ignore_status=False, internal_timeout=None):
         """
         Method to provide a utils.run-like interface to execute command on
@@ -1227,17 +1442,20 @@ class RemoteRunner(object):
                               Else, raise CmdError if exit code of command is not
                               zero.
         """
-        # Redirect the stdout and stderr to file, Deviding error message
-        # from output, and taking off the color of output. To return the same
-        # result with utils.run() function.
-        command = "%s 1>%s 2>%s" % (
-            command, self.stdout_pipe, self.stderr_pipe)
-        status, _ = self.session.cmd_status_output(command, timeout=timeout,
-                                                   internal_timeout=internal_timeout)
-        output = self.session.cmd_output("cat %s;rm -f %s" %
-                                         (self.stdout_pipe, self.stdout_pipe))
-        errput = self.session.cmd_output("cat %s;rm -f %s" %
-                                         (self.stderr_pipe, self.stderr_pipe))
+        if self.connection is not None:
+            status, output, errput = self.connection.run(command, timeout)
+        else:
+            # Redirect the stdout and stderr to file, Deviding error message
+            # from output, and taking off the color of output. To return the
+            # same result with utils.run() function.
+            command = "%s 1>%s 2>%s" % (
+                command, self.stdout_pipe, self.stderr_pipe)
+            status, _ = self.session.cmd_status_output(
+                command, timeout=timeout, internal_timeout=internal_timeout)
+            output = self.session.cmd_output(
+                "cat %s;rm -f %s" % (self.stdout_pipe, self.stdout_pipe))
+            errput = self.session.cmd_output(
+                "cat %s;rm -f %s" % (self.stderr_pipe, self.stderr_pipe))
         cmd_result = process.CmdResult(command=command, exit_status=status,
                                        stdout=output, stderr=errput)
         if status and (not ignore_status):
@@ -1500,7 +1718,7 @@ def get_zabbix_server_ip(controller_ip, controller_user, controller_password):
         LOG.debug('Run cmd %s on %s successfully!' % (cmd, controller_ip))
     zabbix_server_ip = (result.stdout).strip('\n')
     LOG.info('Zabbix server ip is %s' % zabbix_server_ip)
-    session.session.close()
+    session.close()
 
     return zabbix_server_ip
 
@@ -1516,7 +1734,7 @@ def ping_host(controller_ip, controller_user, controller_password,
         cmd = "ping %s -c 1 -W 30" % host_ip
     LOG.info('Run cmd %s on %s!' % (cmd, controller_ip))
     result = session.run(cmd, ignore_status=True)
-    session.session.close()
+    session.close()
     if result.exit_status != 0:
         LOG.info(result.stderr)
         LOG.info("Destination host unreachable!")
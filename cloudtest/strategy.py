@@ -0,0 +1,299 @@
+"""
+Concurrent dispatch of the test plans of a test strategy.
+
+The plans of different hosts run at the same time, the plans of one host
+one after the other.  The state of each plan is kept in a JSON state file,
+so an interrupted strategy can be resumed (finished plans are skipped)
+and stopped (the remote process group of each running plan is killed).
+"""
+
+import json
+import logging
+import os
+import pipes
+import signal
+import tempfile
+import threading
+import time
+
+import aexpect
+
+
+LOG = logging.getLogger('avocado.test')
+
+PLAN_PENDING = 'PENDING'
+PLAN_RUNNING = 'RUNNING'
+PLAN_PASS = 'PASS'
+PLAN_FAIL = 'FAIL'
+PLAN_ERROR = 'ERROR'
+PLAN_TIMEOUT = 'TIMEOUT'
+PLAN_STOPPED = 'STOPPED'
+#: States of the plans not run again when resuming a strategy
+PLAN_FINISHED = (PLAN_PASS, PLAN_FAIL)
+
+#: Timeout of the plans without one (RemoteRunner.run requires a number)
+NO_TIMEOUT = 999999999999999
+
+#: Seconds between the TERM and KILL signals when stopping a plan
+STOP_GRACE_TIME = 5
+
+
+def get_plan_key(index, plan):
+    """
+    Key of a plan in the state file (its uuid, when defined)
+    """
+    return plan.get('plan_uuid') or '%d-%s' % (index, plan.get('plan_name'))
+
+
+def get_pid_file(key):
+    """
+    Remote file keeping the pid of the process group running a plan
+    """
+    return '/tmp/avocado-strategy-%s.pid' % key.strip('.').replace('/', '_')
+
+
+def get_process_identity(pid):
+    """
+    Identity of a local process: its start time and command line, which
+    tell it apart from a later process reusing its pid
+
+    :return: the identity string, or None when there's no such process
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as stat_file:
+            # The command name (in parentheses) may contain spaces
+            start_time = stat_file.read().rsplit(')', 1)[1].split()[19]
+        with open('/proc/%d/cmdline' % pid) as cmdline_file:
+            cmdline = cmdline_file.read().rstrip('\0').replace('\0', ' ')
+    except (IOError, IndexError):
+        return None
+    return '%s %s' % (start_time, cmdline)
+
+
+def wrap_command(command, pid_file):
+    """
+    Wrap a plan command, so its process group can be tracked and killed.
+
+    The remote shell records its pid and replaces itself with the command,
+    which then runs as the leader of the process group (with pipefail, so
+    the status of the plan isn't the one of a trailing ``tee``).
+    """
+    return ('echo $$ > %s; exec bash -o pipefail -c %s'
+            % (pid_file, pipes.quote(command)))
+
+
+class StrategyState(object):
+
+    """
+    State of the plans of a strategy, saved in a JSON file on each change
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.plans = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path) as state_file:
+                self.plans = json.load(state_file).get('plans', {})
+
+    def get(self, key):
+        return self.plans.get(key, {})
+
+    def update(self, key, **fields):
+        """
+        Update the record of a plan and save the state
+        """
+        with self._lock:
+            self.plans.setdefault(key, {}).update(fields)
+            self._save()
+
+    def _save(self):
+        # Write a new file and rename it, so an interrupted save (or
+        # strategy) never leaves a truncated state file behind
+        fd, tmp_path = tempfile.mkstemp(
+            prefix='.' + os.path.basename(self.path),
+            dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'w') as state_file:
+                json.dump({'plans': self.plans}, state_file, indent=4,
+                          sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class PlanDispatcher(object):
+
+    """
+    Run the test plans of a strategy concurrently, one worker per host
+    """
+
+    def __init__(self, plans, state, connect, get_command, log_dir=None,
+                 parallel=True, resume=False):
+        """
+        :param plans: list of the test plan dicts (host_ip, plan_name,
+                      plan_timeout, plan_uuid...)
+        :param state: :class:`StrategyState` of the strategy
+        :param connect: function returning a session with a
+                        ``run(command, timeout, ignore_status)`` method
+                        (a :class:`cloudtest.remote.RemoteRunner`) to a host
+        :param get_command: function returning the command of a plan
+        :param log_dir: directory the output of each plan is written to
+        :param parallel: run the plans of different hosts concurrently
+        :param resume: skip the plans which finished in a previous run
+        """
+        self.plans = plans
+        self.state = state
+        self.connect = connect
+        self.get_command = get_command
+        self.log_dir = log_dir
+        self.parallel = parallel
+        self.resume = resume
+
+    def _run_plan(self, key, plan, session):
+        timeout = int(plan.get('plan_timeout') or 0)
+        pid_file = get_pid_file(key)
+        command = wrap_command(self.get_command(plan), pid_file)
+        start = time.time()
+        self.state.update(key, status=PLAN_RUNNING, host=plan['host_ip'],
+                          name=plan.get('plan_name'), start=start, end=None,
+                          pid_file=pid_file, dispatcher_pid=os.getpid(),
+                          dispatcher=get_process_identity(os.getpid()))
+        LOG.info("Plan %s (%s) started on %s", key, plan.get('plan_name'),
+                 plan['host_ip'])
+        output = ''
+        try:
+            result = session.run(command, timeout=timeout or NO_TIMEOUT,
+                                 ignore_status=True)
+            output = result.stdout
+            status = PLAN_PASS if result.exit_status == 0 else PLAN_FAIL
+            exit_status = result.exit_status
+        except aexpect.ShellTimeoutError as details:
+            output = details.output or ''
+            status = PLAN_TIMEOUT
+            exit_status = None
+            try:
+                kill_plan(session, pid_file)
+            except Exception as details:
+                LOG.error("Could not kill plan %s on %s: %s", key,
+                          plan['host_ip'], details)
+        except Exception as details:
+            output = str(details)
+            status = PLAN_ERROR
+            exit_status = None
+        if self.log_dir:
+            log_path = os.path.join(self.log_dir,
+                                    'avocado_run_test_strategy_%s.log'
+                                    % key.strip('.'))
+            with open(log_path, 'w') as log_file:
+                log_file.write(output)
+        end = time.time()
+        self.state.update(key, status=status, end=end,
+                          exit_status=exit_status)
+        LOG.info("Plan %s (%s) on %s: %s (%.2f s)", key,
+                 plan.get('plan_name'), plan['host_ip'], status, end - start)
+        return status
+
+    def _run_plans(self, plans):
+        """
+        Run plans one after the other, sharing one session per host
+        """
+        sessions = {}
+        for key, plan in plans:
+            host = plan['host_ip']
+            if host not in sessions:
+                try:
+                    sessions[host] = self.connect(host)
+                except Exception as details:
+                    LOG.error("Could not connect to %s: %s", host, details)
+                    sessions[host] = None
+            if sessions[host] is None:
+                self.state.update(key, status=PLAN_ERROR,
+                                  error="Could not connect to %s" % host)
+                continue
+            self._run_plan(key, plan, sessions[host])
+
+    def run(self):
+        """
+        Run the plans (not finished yet, when resuming)
+
+        :return: dict {plan key: final status}
+        """
+        pending = []
+        hosts = {}
+        for index, plan in enumerate(self.plans):
+            key = get_plan_key(index, plan)
+            if (self.resume and
+                    self.state.get(key).get('status') in PLAN_FINISHED):
+                LOG.info("Plan %s already finished (%s), skipping it", key,
+                         self.state.get(key)['status'])
+                continue
+            self.state.update(key, status=PLAN_PENDING)
+            pending.append((key, plan))
+            hosts.setdefault(plan['host_ip'], []).append((key, plan))
+        if self.parallel:
+            workers = [threading.Thread(target=self._run_plans,
+                                        args=(plans,))
+                       for plans in hosts.itervalues()]
+            for worker in workers:
+                worker.daemon = True
+                worker.start()
+            for worker in workers:
+                # Joining with a timeout keeps the main thread responsive
+                # to ctrl+c
+                while worker.is_alive():
+                    worker.join(1)
+        else:
+            self._run_plans(pending)
+        return dict((get_plan_key(index, plan),
+                     self.state.get(get_plan_key(index, plan)).get('status'))
+                    for index, plan in enumerate(self.plans))
+
+
+def kill_plan(session, pid_file, grace_time=None):
+    """
+    Kill the remote process group of a plan: TERM, then KILL after the
+    grace time (:data:`STOP_GRACE_TIME` by default)
+    """
+    kill = ('test -f {0} && kill -{1} -- -$(cat {0}) 2>/dev/null; true')
+    session.run(kill.format(pid_file, 'TERM'), timeout=30,
+                ignore_status=True)
+    time.sleep(STOP_GRACE_TIME if grace_time is None else grace_time)
+    session.run(kill.format(pid_file, 'KILL') + '; rm -f %s' % pid_file,
+                timeout=30, ignore_status=True)
+
+
+def stop_plans(state, connect, grace_time=None):
+    """
+    Stop the running plans of a strategy, as recorded in its state
+
+    :return: list of the keys of the stopped plans
+    """
+    stopped = []
+    for key, record in sorted(state.plans.iteritems()):
+        if record.get('status') != PLAN_RUNNING:
+            continue
+        LOG.info("Stopping plan %s on %s", key, record['host'])
+        pid = record.get('dispatcher_pid')
+        if pid and pid != os.getpid():
+            identity = get_process_identity(pid)
+            if identity is None or identity != record.get('dispatcher'):
+                # Gone, and its pid possibly reused by another process
+                LOG.debug("Dispatcher %s of plan %s is not running", pid,
+                          key)
+            else:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:     # The dispatcher is gone already
+                    pass
+        try:
+            kill_plan(connect(record['host']), record['pid_file'],
+                      grace_time)
+        except Exception as details:
+            LOG.error("Could not stop plan %s on %s: %s", key,
+                      record['host'], details)
+            continue
+        state.update(key, status=PLAN_STOPPED, end=time.time())
+        stopped.append(key)
+    return stopped
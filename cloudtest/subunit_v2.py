@@ -0,0 +1,312 @@
+"""
+In-process consumer of subunit v2 streams (as written by ``testr run
+--subunit``).
+
+The stream is parsed as it is read: each finished test is reported to a
+callback, counted, and its failures kept, so no ``subunit-trace``,
+``subunit-stats``, ``subunit2html`` or ``subunit-filter`` process has to
+read the stream again once the run is over.
+"""
+
+import cgi
+import collections
+import struct
+import zlib
+
+
+SIGNATURE = '\xb3'
+VERSION = 2
+
+FLAG_TEST_ID = 0x0800
+FLAG_ROUTE_CODE = 0x0400
+FLAG_TIMESTAMP = 0x0200
+FLAG_RUNNABLE = 0x0100
+FLAG_TAGS = 0x0080
+FLAG_MIME_TYPE = 0x0040
+FLAG_EOF = 0x0020
+FLAG_FILE_CONTENT = 0x0010
+STATUS_MASK = 0x0007
+
+#: Test statuses, indexed by their code in the packets
+STATUSES = (None, 'exists', 'inprogress', 'success', 'uxsuccess', 'skip',
+            'fail', 'xfail')
+#: Statuses of finished tests
+FINAL_STATUSES = ('success', 'uxsuccess', 'skip', 'fail', 'xfail')
+#: Statuses of the tests considered as failed (and run again on reruns)
+FAILED_STATUSES = ('fail', 'uxsuccess')
+
+#: Packets bigger than this are considered garbage (as subunit does)
+MAX_PACKET_SIZE = 4 * 1024 * 1024
+
+Packet = collections.namedtuple('Packet', ('test_id', 'status', 'timestamp',
+                                           'tags', 'mime_type', 'file_name',
+                                           'file_bytes', 'eof', 'route_code',
+                                           'runnable'))
+
+
+def read_number(data, pos):
+    """
+    Read a subunit variable length number (1 to 4 bytes, the size being
+    in the 2 high bits of the first one)
+
+    :return: (number, position after it)
+    :raise IndexError: when data is too short
+    """
+    first = ord(data[pos])
+    size = first >> 6
+    value = first & 0x3f
+    for index in xrange(pos + 1, pos + 1 + size):
+        value = (value << 8) | ord(data[index])
+    return value, pos + 1 + size
+
+
+def read_string(data, pos):
+    length, pos = read_number(data, pos)
+    if pos + length > len(data):
+        raise IndexError("String out of the packet")
+    return data[pos:pos + length].decode('utf-8', 'replace'), pos + length
+
+
+def parse_packet(data):
+    """
+    Parse a whole packet (CRC included)
+
+    :raise ValueError: on packets which don't check out
+    """
+    crc = struct.unpack('>I', data[-4:])[0]
+    if zlib.crc32(data[:-4]) & 0xffffffff != crc:
+        raise ValueError("Bad packet CRC")
+    flags = struct.unpack('>H', data[1:3])[0]
+    _, pos = read_number(data, 3)
+    timestamp = test_id = mime_type = file_name = file_bytes = None
+    route_code = None
+    tags = ()
+    try:
+        if flags & FLAG_TIMESTAMP:
+            seconds = struct.unpack('>I', data[pos:pos + 4])[0]
+            nanoseconds, pos = read_number(data, pos + 4)
+            timestamp = seconds + nanoseconds / 1e9
+        if flags & FLAG_TEST_ID:
+            test_id, pos = read_string(data, pos)
+        if flags & FLAG_TAGS:
+            count, pos = read_number(data, pos)
+            tags = []
+            for _ in xrange(count):
+                tag, pos = read_string(data, pos)
+                tags.append(tag)
+        if flags & FLAG_MIME_TYPE:
+            mime_type, pos = read_string(data, pos)
+        if flags & FLAG_FILE_CONTENT:
+            file_name, pos = read_string(data, pos)
+            length, pos = read_number(data, pos)
+            file_bytes = data[pos:pos + length]
+            pos += length
+        if flags & FLAG_ROUTE_CODE:
+            route_code, pos = read_string(data, pos)
+    except (IndexError, struct.error):
+        raise ValueError("Truncated packet fields")
+    return Packet(test_id, STATUSES[flags & STATUS_MASK], timestamp,
+                  tuple(tags), mime_type, file_name, file_bytes,
+                  bool(flags & FLAG_EOF), route_code,
+                  bool(flags & FLAG_RUNNABLE))
+
+
+class StreamParser(object):
+
+    """
+    Incremental subunit v2 parser.
+
+    Data is fed as it's read. Complete packets go to ``on_packet``, bytes
+    outside of packets (stderr of the test runner, for instance) go to
+    ``on_output``.
+    """
+
+    def __init__(self, on_packet, on_output=None):
+        self.on_packet = on_packet
+        self.on_output = on_output
+        self._buffer = ''
+
+    def _output(self, data):
+        if data and self.on_output is not None:
+            self.on_output(data)
+
+    def feed(self, data):
+        buf = self._buffer + data
+        while buf:
+            if buf[0] != SIGNATURE:
+                index = buf.find(SIGNATURE)
+                if index < 0:
+                    index = len(buf)
+                self._output(buf[:index])
+                buf = buf[index:]
+                continue
+            try:
+                version = ord(buf[1]) >> 4
+                length = read_number(buf, 3)[0]
+            except IndexError:
+                break       # Header not complete yet
+            if version != VERSION or not 7 <= length <= MAX_PACKET_SIZE:
+                self._output(buf[0])
+                buf = buf[1:]
+                continue
+            if len(buf) < length:
+                break       # Packet not complete yet
+            try:
+                packet = parse_packet(buf[:length])
+            except ValueError:
+                self._output(buf[0])
+                buf = buf[1:]
+                continue
+            buf = buf[length:]
+            self.on_packet(packet)
+        self._buffer = buf
+
+    def close(self):
+        """
+        Flush what's left of an incomplete packet as output
+        """
+        self._output(self._buffer)
+        self._buffer = ''
+
+
+class TestRecord(object):
+
+    """
+    State of one test of the stream
+    """
+
+    def __init__(self, test_id):
+        self.id = test_id
+        self.status = None
+        self.start = None
+        self.end = None
+        self.tags = set()
+        #: attachment name => content (traceback, reason...)
+        self.details = collections.OrderedDict()
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+    @property
+    def worker(self):
+        for tag in self.tags:
+            if tag.startswith('worker-'):
+                return tag
+        return None
+
+
+class ResultCollector(object):
+
+    """
+    Keep the counters and failures of a stream, reporting each test as it
+    finishes
+    """
+
+    def __init__(self, on_test=None):
+        """
+        :param on_test: function called with the :class:`TestRecord` of
+                        each finished test
+        """
+        self.on_test = on_test
+        #: status => number of tests
+        self.counters = dict((status, 0) for status in FINAL_STATUSES)
+        #: ids of the failed tests, in the order they failed
+        self.failures = []
+        #: test id => duration of the tests which ran (not skipped)
+        self.durations = {}
+        #: sum of the test durations
+        self.run_time = 0.0
+        self._running = {}
+
+    @property
+    def total(self):
+        return sum(self.counters.itervalues())
+
+    def packet(self, packet):
+        if not packet.test_id or packet.status == 'exists':
+            return
+        record = self._running.get(packet.test_id)
+        if record is None:
+            record = self._running[packet.test_id] = TestRecord(packet.test_id)
+        record.tags.update(packet.tags)
+        if packet.file_name and packet.file_bytes:
+            content = record.details.get(packet.file_name, '')
+            record.details[packet.file_name] = content + packet.file_bytes
+        if packet.timestamp is not None:
+            if packet.status == 'inprogress' or record.start is None:
+                record.start = packet.timestamp
+            if packet.status in FINAL_STATUSES:
+                record.end = packet.timestamp
+        if packet.status in FINAL_STATUSES:
+            record.status = packet.status
+            del self._running[packet.test_id]
+            self.counters[record.status] += 1
+            self.run_time += record.duration
+            if record.status != 'skip' and record.end is not None:
+                self.durations[record.id] = record.duration
+            if record.status in FAILED_STATUSES:
+                self.failures.append(record.id)
+            if self.on_test is not None:
+                self.on_test(record)
+
+
+class HTMLReport(object):
+
+    """
+    HTML summary of a tempest run, written one test at a time
+    """
+
+    HEADER = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<style>
+body { font-family: sans-serif; font-size: 12px; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ccc; padding: 2px 6px; vertical-align: top; }
+tr.success td.status { background: #6c6; }
+tr.fail td.status, tr.uxsuccess td.status { background: #c66; }
+tr.skip td.status, tr.xfail td.status { background: #cc6; }
+pre { margin: 0; white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<h1>%(title)s</h1>
+<table>
+<tr><th>Test</th><th>Status</th><th>Time (s)</th><th>Details</th></tr>
+"""
+
+    def __init__(self, path, title='Tempest result'):
+        self.path = path
+        self._file = open(path, 'w')
+        self._file.write(self.HEADER % {'title': cgi.escape(title)})
+        self._file.flush()
+
+    def add_test(self, record):
+        details = ''
+        if record.status != 'success':
+            details = '\n'.join(content.decode('utf-8', 'replace')
+                                for content in record.details.itervalues())
+        row = ('<tr class="%s"><td>%s</td><td class="status">%s</td>'
+               '<td>%.3f</td><td><pre>%s</pre></td></tr>\n'
+               % (record.status, cgi.escape(record.id), record.status,
+                  record.duration, cgi.escape(details)))
+        self._file.write(row.encode('utf-8'))
+        self._file.flush()
+
+    def close(self, collector):
+        """
+        Write the summary of the collected results and close the report
+        """
+        self._file.write('</table>\n<h2>Summary</h2>\n<table>\n')
+        for label, value in ([('total', collector.total)] +
+                             sorted(collector.counters.iteritems()) +
+                             [('run time (s)', '%.3f' % collector.run_time)]):
+            self._file.write('<tr><th>%s</th><td>%s</td></tr>\n'
+                             % (label, value))
+        self._file.write('</table>\n</body>\n</html>\n')
+        self._file.close()
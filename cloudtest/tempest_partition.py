@@ -0,0 +1,175 @@
+"""
+Duration-aware partitioning of the tempest tests among parallel workers.
+
+The duration of each test is kept in a history file, updated after every
+run (and seeded from the ``times.dbm`` of testrepository). The tests are
+grouped as tempest requires it (by class, see ``group_regex`` in
+``.testr.conf``) and the groups are packed into the workers, the longest
+first, each in the worker with the smallest load so far.
+"""
+
+import ConfigParser
+import anydbm
+import collections
+import heapq
+import json
+import os
+import re
+import tempfile
+
+
+#: Grouping of tempest (all the tests of a class run in the same worker)
+DEFAULT_GROUP_REGEX = r'([^\.]*\.)*'
+
+#: Estimated duration (s) of the tests without any history
+DEFAULT_DURATION = 1.0
+
+
+class DurationHistory(object):
+
+    """
+    Durations of the tests in past runs, kept in a JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        #: test id => duration (s) of its last run
+        self.durations = {}
+        if os.path.isfile(path):
+            with open(path) as history_file:
+                self.durations = json.load(history_file)
+
+    def harvest_testrepository(self, repository):
+        """
+        Add the durations recorded by testr (in ``times.dbm``) of the
+        tests which are not in the history yet
+
+        :return: number of added durations
+        """
+        times_path = os.path.join(repository, 'times.dbm')
+        try:
+            times = anydbm.open(times_path, 'r')
+        except Exception:
+            return 0
+        added = 0
+        try:
+            for test_id in times.keys():
+                if test_id in self.durations:
+                    continue
+                try:
+                    self.durations[test_id] = float(times[test_id])
+                except ValueError:
+                    continue
+                added += 1
+        finally:
+            times.close()
+        return added
+
+    def update(self, durations):
+        self.durations.update(durations)
+
+    def save(self):
+        # Write a new file and rename it, so a concurrent or interrupted
+        # save never leaves a truncated history behind
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix='.' + os.path.basename(self.path), dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as history_file:
+                json.dump(self.durations, history_file, indent=0,
+                          sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+def group_tests(test_ids, group_regex=DEFAULT_GROUP_REGEX):
+    """
+    Group the test ids which must run in the same worker
+
+    :return: OrderedDict {group: [test ids]}
+    """
+    pattern = re.compile(group_regex)
+    groups = collections.OrderedDict()
+    for test_id in test_ids:
+        match = pattern.match(test_id)
+        group = match.group(0) if match and match.group(0) else test_id
+        groups.setdefault(group, []).append(test_id)
+    return groups
+
+
+def partition_tests(test_ids, durations, workers,
+                    group_regex=DEFAULT_GROUP_REGEX):
+    """
+    Partition the tests among workers, longest processing time first
+
+    :param test_ids: ids of the tests to run
+    :param durations: dict {test id: duration}, the tests not in it are
+                      expected to last the mean duration of the others
+    :param workers: number of workers
+    :return: list of (estimated duration, [test ids]) of the non empty
+             workers
+    """
+    known = [durations[_] for _ in test_ids if _ in durations]
+    default = sum(known) / len(known) if known else DEFAULT_DURATION
+    groups = group_tests(test_ids, group_regex)
+    costs = dict((group, sum(durations.get(_, default) for _ in tests))
+                 for group, tests in groups.iteritems())
+    loads = [(0.0, index, []) for index in xrange(max(workers, 1))]
+    for group in sorted(groups, key=lambda _: (-costs[_], _)):
+        load, index, tests = heapq.heappop(loads)
+        tests.extend(groups[group])
+        heapq.heappush(loads, (load + costs[group], index, tests))
+    return [(load, tests) for load, _, tests
+            in sorted(loads, key=lambda _: _[1]) if tests]
+
+
+def read_testr_conf(path):
+    """
+    Read the test command options of a ``.testr.conf`` file
+
+    :return: dict with the test_command, test_id_option, test_list_option
+             and group_regex options
+    """
+    config = ConfigParser.RawConfigParser()
+    config.read(path)
+    options = {}
+    for option in ('test_command', 'test_id_option', 'test_list_option',
+                   'group_regex'):
+        if config.has_option('DEFAULT', option):
+            options[option] = config.get('DEFAULT', option)
+    return options
+
+
+def get_worker_command(testr_conf, id_file):
+    """
+    Command running the tests listed in id_file, as testr runs each of its
+    workers
+    """
+    id_option = testr_conf.get('test_id_option', '--load-list $IDFILE')
+    command = testr_conf['test_command'].replace('$LISTOPT', '')
+    return command.replace('$IDOPTION', id_option.replace('$IDFILE',
+                                                          id_file))
+
+
+def remove_orphaned_bytecode(path):
+    """
+    Remove the compiled files whose source is gone (python recompiles the
+    ones whose source changed by itself, the orphaned ones could still be
+    imported though)
+
+    :return: number of removed files
+    """
+    removed = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(('.pyc', '.pyo')) and name[:-1] not in files:
+                try:
+                    os.unlink(os.path.join(root, name))
+                except OSError:
+                    continue
+                removed += 1
+    return removed
@@ -20,19 +20,33 @@ ISO8601_INT_SECONDS = '%Y-%m-%dT%H:%M:%SZ'
 EXPIRY_DATE_FORMATS = (ISO8601_FLOAT_SECONDS, ISO8601_INT_SECONDS)
 LOCK = thread.allocate_lock()
 
+# Auth data of the tokens got by this process, with their parsed expiry,
+# by (auth url, tenant, username)
+_TOKENS = {}
+
 
 class CephMgmtClient(rest_client.RestClient):
     """
     Base class for all clients.
+
+    Tokens are cached in memory and in ``cached_token_path``, shared with
+    the other processes, which is only read and written when the token in
+    memory is missing or about to expire.
     """
 
     token_expiry_threshold = datetime.timedelta(seconds=3600)
+    #: Tokens expiring within this delay are renewed
+    token_refresh_margin = datetime.timedelta(seconds=60)
 
     def __init__(self, params):
         self.params = params
         self.base_url = params.get('ceph_management_url')
         self.cached_token_path = '/tmp/sds_token'
-        super(CephMgmtClient, self).__init__(self.base_url)
+        keep_alive = params.get('ceph_api_keep_alive', 'yes') == 'yes'
+        pool_maxsize = int(params.get('ceph_api_pool_maxsize', 10))
+        super(CephMgmtClient, self).__init__(self.base_url,
+                                             keep_alive=keep_alive,
+                                             pool_maxsize=pool_maxsize)
         self.logger = logging.getLogger('avocado.test')
 
     def get_cached_token(self):
@@ -47,14 +61,15 @@ class CephMgmtClient(rest_client.RestClient):
             json.dump(auth_data, cache_file)
 
     def is_token_expired(self, auth_data):
-        LOCK.acquire()
         expiry = self._parse_expiry_time(auth_data['access']['token']['expires'])
-        r = expiry <= datetime.datetime.utcnow()
+        r = self._is_expiring(expiry)
         if r:
             self.logger.info('Token expired, will renew token...')
-        LOCK.release()
         return r
 
+    def _is_expiring(self, expiry):
+        return expiry - self.token_refresh_margin <= datetime.datetime.utcnow()
+
     def _parse_expiry_time(self, expiry_string):
         expiry = None
         for date_format in EXPIRY_DATE_FORMATS:
@@ -70,25 +85,41 @@ class CephMgmtClient(rest_client.RestClient):
                     data=expiry_string, formats=self.EXPIRY_DATE_FORMATS))
         return expiry
 
+    def _authenticate(self):
+        req = {'auth': {'tenantName': self.params.get('OS_TENANT_NAME'),
+                        'passwordCredentials': {
+                            'username': self.params.get('OS_USERNAME'),
+                            'password': self.params.get('OS_PASSWORD')
+                         }
+                        }
+              }
+        self.logger.info("SDS version is 1.2, start authenticating...")
+        auth = rest_client.RestClient(self.params.get('OS_AUTH_URL'))
+        resp, body = auth.post('/tokens', body=json.dumps(req))
+        return json.loads(body)
+
+    def _get_auth_data(self):
+        key = (self.params.get('OS_AUTH_URL'),
+               self.params.get('OS_TENANT_NAME'),
+               self.params.get('OS_USERNAME'))
+        with LOCK:
+            cached = _TOKENS.get(key)
+            if cached is not None and not self._is_expiring(cached[1]):
+                return cached[0]
+            # Another process may have renewed the token already
+            auth_data = self.get_cached_token()
+            if not auth_data or self.is_token_expired(auth_data):
+                auth_data = self._authenticate()
+                self.set_cached_token(auth_data)
+            expiry = self._parse_expiry_time(
+                auth_data['access']['token']['expires'])
+            _TOKENS[key] = (auth_data, expiry)
+            return auth_data
+
     def get_token(self):
         if self.params.get('sds_version') in '1.2':
-            cached_token = self.get_cached_token()
-            if not cached_token or self.is_token_expired(cached_token):
-                req = {'auth': {'tenantName': self.params.get('OS_TENANT_NAME'),
-                                'passwordCredentials': {
-                                    'username': self.params.get('OS_USERNAME'),
-                                    'password': self.params.get('OS_PASSWORD')
-                                 }
-                                }
-                      }
-                self.logger.info("SDS version is 1.2, start authenticating...")
-                auth = rest_client.RestClient(self.params.get('OS_AUTH_URL'))
-                resp, body = auth.post('/tokens', body=json.dumps(req))
-                body = json.loads(body)
-                token = body['access']['token']['id']
-                self.set_cached_token(body)
-                return {'X-Auth-Token': token, 'LOG_USER': 'admin'}
-            return {'X-Auth-Token': cached_token['access']['token']['id'],
+            auth_data = self._get_auth_data()
+            return {'X-Auth-Token': auth_data['access']['token']['id'],
                     'LOG_USER': 'admin'}
         else:
             self.logger.info('SDS version < 1.2, no need to authenticate')
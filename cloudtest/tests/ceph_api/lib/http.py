@@ -13,13 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import urllib3
 
 
 class ClosingHttp(urllib3.poolmanager.PoolManager):
+
+    #: Headers forced in every request
+    forced_headers = {'connection': 'close'}
+
     def __init__(self, disable_ssl_certificate_validation=False,
-                 ca_certs=None, timeout=None):
-        kwargs = {}
+                 ca_certs=None, timeout=None, **kwargs):
 
         if disable_ssl_certificate_validation:
             urllib3.disable_warnings()
@@ -47,7 +52,7 @@ class ClosingHttp(urllib3.poolmanager.PoolManager):
                 self['content-location'] = url
 
         original_headers = kwargs.get('headers', {})
-        new_headers = dict(original_headers, connection='close')
+        new_headers = dict(original_headers, **self.forced_headers)
         new_kwargs = dict(kwargs, headers=new_headers)
 
         # Follow up to 5 redirections. Don't raise an exception if
@@ -56,3 +61,40 @@ class ClosingHttp(urllib3.poolmanager.PoolManager):
         r = super(ClosingHttp, self).request(method, url, retries=retry,
                                              *args, **new_kwargs)
         return Response(r), r.data
+
+
+class KeepAliveHttp(ClosingHttp):
+    """
+    Keeps the connections open, in a bounded pool per host.
+
+    When all the connections to a host are in use, requests wait for one
+    to be released instead of opening more.
+    """
+
+    forced_headers = {}
+
+    def __init__(self, disable_ssl_certificate_validation=False,
+                 ca_certs=None, timeout=None, maxsize=10):
+        dscv = disable_ssl_certificate_validation
+        super(KeepAliveHttp, self).__init__(
+            disable_ssl_certificate_validation=dscv, ca_certs=ca_certs,
+            timeout=timeout, maxsize=maxsize, block=True)
+
+
+_SHARED_HTTP = {}
+_SHARED_HTTP_LOCK = threading.Lock()
+
+
+def get_keep_alive_http(disable_ssl_certificate_validation=False,
+                        ca_certs=None, timeout=None, maxsize=10):
+    """
+    Get the :class:`KeepAliveHttp` shared by all the clients of the
+    process using the same settings.
+    """
+    key = (disable_ssl_certificate_validation, ca_certs, timeout, maxsize)
+    with _SHARED_HTTP_LOCK:
+        if key not in _SHARED_HTTP:
+            _SHARED_HTTP[key] = KeepAliveHttp(
+                disable_ssl_certificate_validation, ca_certs, timeout,
+                maxsize)
+        return _SHARED_HTTP[key]
@@ -44,6 +44,10 @@ class RestClient(object):
                               of the request and response payload
     :param str http_timeout: Timeout in seconds to wait for the http request to
                              return
+    :param bool keep_alive: Keep the connections open, in a per host pool
+                            shared by all the clients
+    :param int pool_maxsize: Maximum number of connections per host kept
+                             open, when keep_alive is set
     """
     TYPE = "json"
 
@@ -53,7 +57,8 @@ class RestClient(object):
     LOG = logging.getLogger('avocado.test')
 
     def __init__(self, endpoint, disable_ssl_certificate_validation=False,
-                 ca_certs=None, trace_requests='', http_timeout=None):
+                 ca_certs=None, trace_requests='', http_timeout=None,
+                 keep_alive=False, pool_maxsize=10):
 
         self.endpoint = endpoint
         self.trace_requests = trace_requests
@@ -68,9 +73,14 @@ class RestClient(object):
                                        'retry-after', 'server',
                                        'vary', 'www-authenticate'))
         dscv = disable_ssl_certificate_validation
-        self.http_obj = http.ClosingHttp(
-            disable_ssl_certificate_validation=dscv, ca_certs=ca_certs,
-            timeout=http_timeout)
+        if keep_alive:
+            self.http_obj = http.get_keep_alive_http(
+                disable_ssl_certificate_validation=dscv, ca_certs=ca_certs,
+                timeout=http_timeout, maxsize=pool_maxsize)
+        else:
+            self.http_obj = http.ClosingHttp(
+                disable_ssl_certificate_validation=dscv, ca_certs=ca_certs,
+                timeout=http_timeout)
 
     def _get_type(self):
         if self.TYPE != "json":
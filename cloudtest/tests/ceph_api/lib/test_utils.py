@@ -285,7 +285,7 @@ def get_vip1_hostname(params):
                                   password=ceph_ssh_password)
     logging.info("cmd of getting vip1 hostname is:%s" % get_vip1_cmd)
     vip1_result = session.run(get_vip1_cmd)
-    session.session.close()
+    session.close()
     vip1_hostname = vip1_result.stdout.split(':')[1].strip()
     return vip1_hostname
 
@@ -97,7 +97,7 @@ class TestDeploy(test.Test):
         cmd += ' %s -u admin -p zabbix -t 600 -r 10' % self.params.get('zabbix_server_ip')
         logging.info("cmd is:%s" % cmd)
         session.run(cmd)
-        session.session.close()
+        session.close()
 
     def test_deploy_cluster_with_multi_hosts(self):
         """
@@ -696,7 +696,7 @@ class LiveMigrateTest(NFVTestBase):
 
     def teardown(self):
         for session in self.session_list:
-            session.session.close()
+            session.close()
 
         for volume_id in self.volume_id_list:
             self.register_cleanup(resource=volume_id,
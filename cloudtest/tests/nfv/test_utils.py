@@ -552,7 +552,7 @@ def get_host_session(params, host_type, host_ip=None):
             compute_utils.capture_vm_console_log(_vm)
         raise exceptions.TestFail('Failed to ssh login to VM: %s' % str(e))
 
-    if not session.session.is_responsive():
+    if not session.is_responsive():
         LOG.error('Failed to ssh log into VM %s, capturing console log...' % host_ip)
         if host_type in "instance":
             compute_utils = Compute(params)
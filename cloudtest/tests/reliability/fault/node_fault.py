@@ -62,6 +62,9 @@ class NodeFault(object):
             return results
         except Exception, e:
             LOG.error("%s" % e)
+        finally:
+            # The nodes status changed, discover them again next time
+            self.cloudmanager.invalidate_topology()
 
     def teardown(self):
         if ((self.params["fault_action"] == "reboot") or 
@@ -37,7 +37,7 @@ class NetworkWorkload(object):
                                   LTP_RUN_PATH)
         self.session.run('pkill ltp || true')
         self.session.run("rm -rf %s" % file_list)
-        self.session.session.close()
+        self.session.close()
 
     def test(self):
         cmd = 'cd %s ; %s' % (LTP_RUN_PATH, self.ltp_cmd)
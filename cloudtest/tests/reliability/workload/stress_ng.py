@@ -134,5 +134,5 @@ class StressNG(object):
         except Exception, e:
             return False
         finally:
-            self.session.session.close()
+            self.session.close()
         return True
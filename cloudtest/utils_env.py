@@ -4,11 +4,22 @@ import UserDict
 import os
 import logging
 import re
+import sqlite3
+import tempfile
 import threading
+import time
+
+from avocado.core.settings import settings
 
 
 ENV_VERSION = 1
 
+SQLITE_HEADER = "SQLite format 3\x00"
+
+#: Fraction of free pages of the sqlite env above which compacting it
+#: rewrites the database even when no key was removed
+VACUUM_FREE_RATIO = 0.25
+
 
 def get_env_version():
     return ENV_VERSION
@@ -115,13 +126,250 @@ def _update_address_cache(env, line):
 #     _update_address_cache(env, line)
 
 
-class Env(UserDict.IterableUserDict):
+class _TrackedDict(dict):
+
+    """
+    A dict recording the keys set and removed since the last reset.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.changed = set(self)
+        self.removed = set()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.touch(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.changed.discard(key)
+        self.removed.add(key)
+
+    def touch(self, key):
+        self.changed.add(key)
+        self.removed.discard(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.changed.discard(key)
+            self.removed.add(key)
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self.changed.discard(key)
+        self.removed.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def clear(self):
+        self.removed.update(self)
+        self.changed.clear()
+        dict.clear(self)
+
+    def reset(self):
+        self.changed = set()
+        self.removed = set()
+
+
+class PickleEnvBackend(object):
+
+    """
+    Stores the whole env as one pickle, replaced atomically on every save.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        with open(self.filename, "r") as env_file:
+            return cPickle.load(env_file)
+
+    def save(self, data, changed, removed, full):
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".env-")
+        try:
+            with os.fdopen(fd, "w") as env_file:
+                cPickle.dump(dict(data), env_file)
+            os.rename(tmp_path, self.filename)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+    def compact(self, max_age=None, prefix=""):
+        return []
+
+    def remove(self):
+        if os.path.isfile(self.filename):
+            os.unlink(self.filename)
+
+
+class SqliteEnvBackend(object):
+
+    """
+    Stores each key of the env in a row of a sqlite database.
+
+    Saves only write the keys added, removed or whose value changed since
+    the previous save (including values changed in place, found by comparing
+    their pickles with the stored ones), in a single transaction. The
+    database is in WAL mode, so test processes can read it while another one
+    saves. Env files written by :class:`PickleEnvBackend` are imported, and
+    replaced by a database on the first save.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._legacy = False
+        # Pickled values as stored in the database, by key
+        self._stored = {}
+
+    def _connect(self, filename=None):
+        connection = sqlite3.connect(filename or self.filename, timeout=60)
+        connection.text_factory = str
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS env "
+                           "(key BLOB PRIMARY KEY, value BLOB, mtime REAL)")
+        return connection
+
+    @staticmethod
+    def _dumps(obj):
+        return sqlite3.Binary(cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL))
+
+    def load(self):
+        with open(self.filename, "rb") as env_file:
+            self._legacy = env_file.read(len(SQLITE_HEADER)) != SQLITE_HEADER
+        if self._legacy:
+            return PickleEnvBackend(self.filename).load()
+        connection = self._connect()
+        try:
+            self._stored = dict((cPickle.loads(str(key)), str(value))
+                                for key, value in
+                                connection.execute("SELECT key, value FROM "
+                                                   "env"))
+        finally:
+            connection.close()
+        return dict((key, cPickle.loads(value))
+                    for key, value in self._stored.iteritems())
+
+    def save(self, data, changed, removed, full):
+        full = full or self._legacy or not os.path.isfile(self.filename)
+        rows = {}
+        for key, value in data.iteritems():
+            value = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+            if full or key in changed or self._stored.get(key) != value:
+                rows[key] = value
+        removed = set(removed)
+        removed.update(key for key in self._stored if key not in data)
+        if self._legacy or not os.path.isfile(self.filename):
+            # Build the whole database aside, so readers either see the
+            # previous env file or the complete database
+            dirname = os.path.dirname(os.path.abspath(self.filename))
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".env-")
+            os.close(fd)
+            try:
+                self._write(tmp_path, rows, (), True)
+                os.rename(tmp_path, self.filename)
+            finally:
+                for path in (tmp_path, tmp_path + "-wal", tmp_path + "-shm"):
+                    if os.path.exists(path):
+                        os.unlink(path)
+            self._legacy = False
+        else:
+            self._write(self.filename, rows, removed, full)
+        if full:
+            self._stored = {}
+        for key in removed:
+            self._stored.pop(key, None)
+        self._stored.update(rows)
+
+    def _write(self, filename, rows, removed, full):
+        now = time.time()
+        connection = self._connect(filename)
+        try:
+            with connection:
+                if full:
+                    connection.execute("DELETE FROM env")
+                connection.executemany(
+                    "DELETE FROM env WHERE key = ?",
+                    [(self._dumps(key),) for key in removed])
+                connection.executemany(
+                    "INSERT OR REPLACE INTO env (key, value, mtime) "
+                    "VALUES (?, ?, ?)",
+                    [(self._dumps(key), sqlite3.Binary(value), now)
+                     for key, value in rows.iteritems()])
+        finally:
+            connection.close()
+
+    def compact(self, max_age=None, prefix=""):
+        """
+        Remove the keys not saved for max_age seconds and reclaim the space
+        of the removed keys.
+
+        The database is only rewritten when keys were removed, or when too
+        many of its pages are free (see :data:`VACUUM_FREE_RATIO`).
+
+        :return: the keys removed
+        """
+        if self._legacy or not os.path.isfile(self.filename):
+            return []
+        connection = self._connect()
+        try:
+            removed = []
+            if max_age is not None:
+                with connection:
+                    for key, in connection.execute(
+                            "SELECT key FROM env WHERE mtime < ?",
+                            (time.time() - max_age,)):
+                        key = cPickle.loads(str(key))
+                        if (isinstance(key, basestring) and
+                                key.startswith(prefix)):
+                            removed.append(key)
+                    connection.executemany(
+                        "DELETE FROM env WHERE key = ?",
+                        [(self._dumps(key),) for key in removed])
+            for key in removed:
+                self._stored.pop(key, None)
+            free, = connection.execute("PRAGMA freelist_count").fetchone()
+            pages, = connection.execute("PRAGMA page_count").fetchone()
+            if removed or free > pages * VACUUM_FREE_RATIO:
+                connection.execute("VACUUM")
+            return removed
+        finally:
+            connection.close()
+
+    def remove(self):
+        for path in (self.filename, self.filename + "-wal",
+                     self.filename + "-shm"):
+            if os.path.isfile(path):
+                os.unlink(path)
+
+
+#: Env storage backends, by name
+ENV_BACKENDS = {'pickle': PickleEnvBackend,
+                'sqlite': SqliteEnvBackend}
+
+
+class Env(UserDict.IterableUserDict, object):
 
     """
     A dict-like object containing global objects used by tests.
+
+    The env is stored by a backend (see :data:`ENV_BACKENDS`), chosen by
+    the ``env_backend`` key of the ``cloudtest.common`` settings section.
+    Incremental backends find the values changed in place (instead of
+    being set again) by themselves, :meth:`touch` forces a key to be saved.
     """
 
-    def __init__(self, filename=None, version=0):
+    def __init__(self, filename=None, version=0, backend=None):
         """
         Create an empty Env object or load an existing one from a file.
 
@@ -131,6 +379,8 @@ class Env(UserDict.IterableUserDict):
 
         :param filename: Path to an env file.
         :param version: Required env version (int).
+        :param backend: Name of the storage backend (see
+                        :data:`ENV_BACKENDS`).
         """
         UserDict.IterableUserDict.__init__(self)
         empty = {"version": version}
@@ -138,14 +388,20 @@ class Env(UserDict.IterableUserDict):
         self._tcpdump = None
         self._params = None
         self.save_lock = threading.RLock()
+        if backend is None:
+            backend = settings.get_value('cloudtest.common', 'env_backend',
+                                         default='sqlite')
+        self._backend = None
         if filename:
+            self._backend = ENV_BACKENDS[backend](filename)
             try:
                 if os.path.isfile(filename):
-                    f = open(filename, "r")
-                    env = cPickle.load(f)
-                    f.close()
+                    env = self._backend.load()
                     if env.get("version", 0) >= version:
                         self.data = env
+                        # Only the keys changed from now on need saving
+                        self.data.reset()
+                        self._full = False
                     else:
                         logging.warn(
                             "Incompatible env file found. Not using it.")
@@ -168,21 +424,86 @@ class Env(UserDict.IterableUserDict):
                          self._filename)
             self.data = empty
 
+    def _get_data(self):
+        return self._data
+
+    def _set_data(self, data):
+        # Replacing the whole dict rewrites the whole env on next save
+        self._data = _TrackedDict(data)
+        self._full = True
+
+    data = property(_get_data, _set_data)
+
+    def touch(self, key):
+        """
+        Mark a key as changed, so it is saved even when its value looks
+        unchanged.
+
+        :param key: Key of the changed value.
+        """
+        self.data.touch(key)
+
     def save(self, filename=None):
         """
-        Pickle the contents of the Env object into a file.
+        Save the contents of the Env object.
+
+        Only the keys changed since the last save are written when the
+        backend supports it.
 
         :param filename: Filename to pickle the dict into.  If not supplied,
                 use the filename from which the dict was loaded.
         """
-        filename = filename or self._filename
-        if filename is None:
+        if filename is not None and filename != self._filename:
+            self.export_pickle(filename)
+            return
+        if self._backend is None:
             raise EnvSaveError("No filename specified for this env file")
         self.save_lock.acquire()
         try:
-            f = open(filename, "w")
-            cPickle.dump(self.data, f)
-            f.close()
+            self._backend.save(self.data, self.data.changed,
+                               self.data.removed, self._full)
+            self.data.reset()
+            self._full = False
+        finally:
+            self.save_lock.release()
+
+    def export_pickle(self, filename):
+        """
+        Pickle the contents of the Env object into a file.
+
+        :param filename: Filename to pickle the dict into.
+        """
+        self.save_lock.acquire()
+        try:
+            PickleEnvBackend(filename).save(self.data, None, None, True)
+        finally:
+            self.save_lock.release()
+
+    @lock_safe
+    def import_pickle(self, filename):
+        """
+        Update the contents of the Env object from a pickle file.
+
+        :param filename: Filename of the pickled dict.
+        """
+        self.data.update(PickleEnvBackend(filename).load())
+
+    def compact(self, max_age=None, prefix=""):
+        """
+        Remove old keys from the env file and reclaim its unused space.
+
+        :param max_age: Remove the keys (starting with prefix) not saved
+                        since max_age seconds.
+        :param prefix: Prefix of the keys to remove.
+        """
+        if self._backend is None:
+            return
+        self.save_lock.acquire()
+        try:
+            for key in self._backend.compact(max_age, prefix):
+                if key in self.data:
+                    dict.__delitem__(self.data, key)
+                self.data.changed.discard(key)
         finally:
             self.save_lock.release()
 
@@ -213,9 +534,8 @@ class Env(UserDict.IterableUserDict):
         Destroy all objects stored in Env and remove the backing file.
         """
         self.clean_objects()
-        if self._filename is not None:
-            if os.path.isfile(self._filename):
-                os.unlink(self._filename)
+        if self._backend is not None:
+            self._backend.remove()
 
     @lock_safe
     def register_rally_task(self, uuid):
@@ -283,25 +603,70 @@ class Env(UserDict.IterableUserDict):
         return self.data.get("lvmdev__%s" % name)
 
     def get_cloud_node(self, host):
-        if self.data.has_key(host):
-            return self.data.get(host)
-        return False
+        """
+        Get a cloud node object by its hostname or IP.
+
+        :param host: hostname or IP of the node
+        :return: CloudNode object, False when not registered
+        """
+        return self.data.get("cloud_node__%s" % host, False)
 
+    @lock_safe
     def register_cloud_node(self, node):
-        ip = node.ip
-        self.data[ip] = node
+        """
+        Register a cloud node object by its hostname and by its IP.
+
+        :param node: CloudNode object
+        """
+        self.data["cloud_node__%s" % node.host] = node
+        self.data["cloud_node__%s" % node.ip] = node
+
+    def get_cloud_topology(self, endpoint):
+        """
+        Get the cloud topology discovered from an endpoint.
+
+        :param endpoint: URL the topology was discovered from
+        :return: tuple (discovery timestamp, list of CloudNode objects),
+                 None when not registered
+        """
+        return self.data.get("cloud_topology__%s" % endpoint)
+
+    @lock_safe
+    def register_cloud_topology(self, endpoint, timestamp, nodes):
+        """
+        Register the cloud topology discovered from an endpoint.
+
+        :param endpoint: URL the topology was discovered from
+        :param timestamp: time of the discovery
+        :param nodes: list of CloudNode objects
+        """
+        self.data["cloud_topology__%s" % endpoint] = (timestamp, nodes)
+
+    @lock_safe
+    def unregister_cloud_topology(self, endpoint=None):
+        """
+        Remove the cloud topology discovered from an endpoint.
+
+        :param endpoint: URL the topology was discovered from, all the
+                         topologies are removed when None
+        """
+        for key in self.data.keys():
+            if (key == "cloud_topology__%s" % endpoint or
+                    endpoint is None and key.startswith("cloud_topology__")):
+                del self.data[key]
 
     def save_cloud_nodes(self, nodes):
         self.env['cloud_node'] = nodes
 
     def get_rally_total_result(self, task_uuid):
-        if self.data.has_key(task_uuid):
-            return self.data.get(task_uuid)
+        for key in ("rally_result__%s" % task_uuid, task_uuid):
+            if self.data.has_key(key):
+                return self.data.get(key)
         return False
 
     def register_rally_total_result(self, rally_total_results):
         task_uuid = rally_total_results['rally_task_uuid']
-        self.data[task_uuid] = rally_total_results
+        self.data["rally_result__%s" % task_uuid] = rally_total_results
 
     def save_rally_total_result(self, rally_total_results):
         self.env['rally_total_result'] = rally_total_results
@@ -99,7 +99,7 @@ class Injection(object):
 
     def _close_all_sessions(self):
         for session in self.session_list:
-            session.session.close()
+            session.close()
 
     @staticmethod
     def _get_class_from_module(_module, cls_name):
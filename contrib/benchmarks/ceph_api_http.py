@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Compares the requests per second of the ceph management API transports
+# (one connection per request vs. shared keep-alive pool) against a local
+# HTTP stand-in of the management server:
+#
+# $ python contrib/benchmarks/ceph_api_http.py -n 2000 -t 8
+#
+
+import argparse
+import BaseHTTPServer
+import json
+import SocketServer
+import threading
+import time
+
+from cloudtest.tests.ceph_api.lib import http
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one segment, as real servers do
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    body = json.dumps({'items': [{'id': i, 'name': 'pool-%d' % i}
+                                 for i in xrange(20)]})
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def bench(http_obj, url, count, threads):
+    def worker():
+        for _ in xrange(count / threads):
+            resp, _ = http_obj.request(url, 'GET',
+                                       headers={'X-Auth-Token': 'token'})
+            assert resp.status == 200
+
+    workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+    start = time.time()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return count / threads * threads / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ceph API HTTP benchmark")
+    parser.add_argument('-n', '--count', type=int, default=2000,
+                        help='Number of requests per transport')
+    parser.add_argument('-t', '--threads', type=int, default=8,
+                        help='Number of clients sending requests')
+    parser.add_argument('--pool-maxsize', type=int, default=10)
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    url = 'http://127.0.0.1:%d/v1/clusters/1/pools' % server.server_port
+
+    for label, http_obj in (
+            ('connection: close', http.ClosingHttp()),
+            ('keep-alive pool', http.get_keep_alive_http(
+                maxsize=args.pool_maxsize))):
+        print "%-18s %8.0f requests/s" % (label, bench(http_obj, url,
+                                                       args.count,
+                                                       args.threads))
+    server.shutdown()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Measures the FileLoader discovery time of a tree of python test modules
+# without the discovery cache, with a cold and with a warm cache (a new
+# process reusing the cache file):
+#
+# $ python contrib/benchmarks/discovery.py -n 2000
+# $ python contrib/benchmarks/discovery.py --path cloudtest/tests
+#
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from avocado.core import loader
+from avocado.core import safeloader
+
+MODULE = '''from avocado import Test
+
+
+class Module%(i)dTest(Test):
+
+    def setUp(self):
+        self.values = [_ * 2 for _ in range(%(i)d)]
+
+    def test_first(self):
+        self.assertEqual(len(self.values), %(i)d)
+
+    def test_second(self):
+        self.assertTrue(all(_ %% 2 == 0 for _ in self.values))
+'''
+
+
+def create_tree(path, count):
+    for i in xrange(count):
+        directory = os.path.join(path, 'dir%d' % (i / 100))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, 'test%d.py' % i), 'w') as module:
+            module.write(MODULE % {'i': i})
+
+
+def discover(path, scan_cache):
+    loader._SCAN_CACHE = scan_cache
+    file_loader = loader.FileLoader(None, {})
+    start = time.time()
+    tests = file_loader.discover(path)
+    return time.time() - start, len(tests)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test discovery benchmark")
+    parser.add_argument('-n', '--count', type=int, default=2000,
+                        help='Number of generated test modules')
+    parser.add_argument('--path', default=None,
+                        help='Discover this tree instead of generated modules')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes scanning a cold cache')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='avocado-discovery-')
+    try:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmpdir, 'tests')
+            create_tree(path, args.count)
+        cache_file = os.path.join(tmpdir, 'discovery.pickle')
+        for label, scan_cache in (
+                ('no cache', False),
+                ('cold cache', safeloader.ScanCache(cache_file,
+                                                    args.workers)),
+                ('warm cache', safeloader.ScanCache(cache_file,
+                                                    args.workers))):
+            duration, tests = discover(path, scan_cache)
+            print "%-10s %8.3fs (%d tests)" % (label, duration, tests)
+    finally:
+        shutil.rmtree(tmpdir)
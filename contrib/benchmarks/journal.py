@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Measures the journal events per second (start and end of tests) of the
+# journal result plugin for each durability level, against committing each
+# event in the default sqlite journal mode (the former journal behavior):
+#
+# $ python contrib/benchmarks/journal.py -n 2000
+#
+
+import argparse
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from avocado.plugins import journal
+
+
+def per_event_commit(logdir, states):
+    connection = sqlite3.connect(os.path.join(logdir,
+                                              journal.JOURNAL_FILENAME))
+    for table in journal.SCHEMA.itervalues():
+        connection.execute(table)
+    connection.commit()
+    for state in states:
+        for action in ('STARTED', 'ENDED'):
+            connection.execute(journal.INSERT_SQL,
+                               (state['name'],
+                                datetime.datetime.now().isoformat(), action,
+                                state['status']))
+            connection.commit()
+    connection.close()
+
+
+def journal_plugin(logdir, states, durability):
+    result = journal.JournalResult(
+        argparse.Namespace(journal_durability=durability))
+    for state in states:
+        result.start_test(None, state)
+        result.end_test(None, state)
+    result.post_tests(None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Journal benchmark")
+    parser.add_argument('-n', '--count', type=int, default=2000,
+                        help='Number of tests (2 events each)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='avocado-journal-')
+    try:
+        runs = [('per event commit', per_event_commit, ())]
+        runs.extend(('durability %s' % _, journal_plugin, (_,))
+                     for _ in sorted(journal.DURABILITY))
+        for label, function, extra_args in runs:
+            logdir = tempfile.mkdtemp(dir=tmpdir)
+            states = [{'name': '%d-test' % _, 'status': 'PASS',
+                       'job_logdir': logdir, 'job_unique_id': '0' * 40}
+                      for _ in xrange(args.count)]
+            start = time.time()
+            function(logdir, states, *extra_args)
+            duration = time.time() - start
+            print "%-18s %10.0f events/s" % (label,
+                                              args.count * 2 / duration)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Measures the params.get() throughput on a synthetic params tree (keys
+# spread over the leaves of a few mux domains), with uncached queries
+# (each key queried once) and cached queries:
+#
+# $ python contrib/benchmarks/params_get.py -k 10000
+#
+
+import argparse
+import logging
+import time
+
+from avocado.core import multiplexer
+from avocado.core import tree
+
+
+def create_tree(keys, domains, leaves):
+    root = tree.TreeNode()
+    run = tree.TreeNode('run', parent=root)
+    root.children.append(run)
+    per_leaf = max(1, keys / (domains * leaves))
+    key = 0
+    for domain_no in xrange(domains):
+        domain = tree.TreeNode('domain%d' % domain_no, parent=run)
+        domain.multiplex = True
+        run.children.append(domain)
+        for leaf_no in xrange(leaves):
+            values = dict(('key%d' % _, _)
+                          for _ in xrange(key, key + per_leaf))
+            key += per_leaf
+            leaf = tree.TreeNode('leaf%d' % leaf_no, values, parent=domain)
+            domain.children.append(leaf)
+    return root, key
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="params.get() benchmark")
+    parser.add_argument('-k', '--keys', type=int, default=10000,
+                        help='Number of keys in the params tree')
+    parser.add_argument('--domains', type=int, default=4,
+                        help='Number of mux domains in the params tree')
+    parser.add_argument('--leaves', type=int, default=5,
+                        help='Number of leaves of each mux domain')
+    args = parser.parse_args()
+    logging.getLogger("avocado.test").disabled = True
+
+    root, keys = create_tree(args.keys, args.domains, args.leaves)
+    variant = multiplexer.MuxTree(root).get_variant(0)
+    start = time.time()
+    params = multiplexer.AvocadoParams(variant, 'bench', ['/run/*'], {})
+    print "%d keys: params created in %.3fs" % (keys, time.time() - start)
+    queries = ['key%d' % _ for _ in xrange(keys)]
+    for label, path in (('relative path', None),
+                        ('absolute path', '/run/domain0/*')):
+        params._cache.clear()
+        for cached in ('uncached', 'cached'):
+            start = time.time()
+            for key in queries:
+                params.get(key, path)
+            duration = time.time() - start
+            print "%-14s %-9s %10.0f gets/s" % (label, cached,
+                                                 len(queries) / duration)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Compares the per-command latency of the RemoteRunner backends
+# (aexpect shell session vs. paramiko channels) against a local sshd:
+#
+# $ python contrib/benchmarks/remote_runner.py --password secret -n 200
+#
+
+import argparse
+import threading
+import time
+
+from cloudtest import remote
+
+
+def bench_serial(runner, command, count):
+    start = time.time()
+    for _ in xrange(count):
+        runner.run(command)
+    return (time.time() - start) / count
+
+
+def bench_concurrent(runner, command, count, threads):
+    def worker():
+        for _ in xrange(count / threads):
+            runner.run(command)
+
+    workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+    start = time.time()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return (time.time() - start) / (count / threads * threads)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="RemoteRunner benchmark")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default='22')
+    parser.add_argument('--username', default='root')
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--use-key', action='store_true', default=False)
+    parser.add_argument('-n', '--count', type=int, default=100,
+                        help='Number of commands per backend')
+    parser.add_argument('-t', '--threads', type=int, default=4,
+                        help='Threads for the concurrent paramiko run')
+    parser.add_argument('--command', default='true')
+    args = parser.parse_args()
+
+    for backend in ('aexpect', 'paramiko'):
+        runner = remote.RemoteRunner(host=args.host, port=args.port,
+                                     username=args.username,
+                                     password=args.password,
+                                     use_key=args.use_key, backend=backend)
+        runner.run(args.command)    # warm up
+        latency = bench_serial(runner, args.command, args.count)
+        print "%-9s serial:     %8.2f ms/command" % (backend, latency * 1000)
+        if backend == 'paramiko':
+            latency = bench_concurrent(runner, args.command, args.count,
+                                       args.threads)
+            print "%-9s %2d threads: %8.2f ms/command" % (backend,
+                                                          args.threads,
+                                                          latency * 1000)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Measures the per test overhead of the test runner, running a job of
+# no-op tests (/bin/true through the external runner):
+#
+# $ python contrib/benchmarks/runner_overhead.py -n 1000
+# $ python contrib/benchmarks/runner_overhead.py -n 1000 --parallel 4
+#
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+AVOCADO = os.path.join(BASEDIR, 'scripts', 'avocado')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test runner overhead "
+                                     "benchmark")
+    parser.add_argument('-n', '--count', type=int, default=1000,
+                        help='Number of no-op tests in the job')
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='Number of tests run at the same time')
+    args = parser.parse_args()
+
+    results_dir = tempfile.mkdtemp(prefix='avocado-runner-overhead-')
+    cmd = [sys.executable, AVOCADO, 'run', '--external-runner', '/bin/true',
+           '--sysinfo', 'off', '--json-job-result', 'off',
+           '--xunit-job-result', 'off', '--parallel', str(args.parallel),
+           '--job-results-dir', results_dir]
+    cmd.extend(str(_) for _ in xrange(args.count))
+    try:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.time()
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(cmd, stdout=devnull, stderr=devnull)
+        duration = time.time() - start
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    finally:
+        shutil.rmtree(results_dir)
+    cpu = ((usage_after.ru_utime - usage.ru_utime) +
+           (usage_after.ru_stime - usage.ru_stime))
+    print ("%d no-op tests: %.2fs wall (%.2fms per test), %.2fs CPU "
+           "(%.2fms per test)" % (args.count, duration,
+                                  duration * 1000 / args.count, cpu,
+                                  cpu * 1000 / args.count))
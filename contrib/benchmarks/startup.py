@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Measures the cold-start time of avocado commands (each run in a new
+# process), and fails when the median exceeds a bound, so plugins importing
+# heavy modules at load time are caught:
+#
+# $ python contrib/benchmarks/startup.py -n 10 --max 1.5 -- --help
+# $ python contrib/benchmarks/startup.py --profile -- list
+#
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+AVOCADO = os.path.join(BASEDIR, 'scripts', 'avocado')
+
+
+def run_avocado(command, profile=False):
+    cmd = [sys.executable, AVOCADO]
+    if profile:
+        cmd.append('--profile-startup')
+    cmd.extend(command)
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+    output = proc.communicate()[0]
+    return time.time() - start, output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Avocado startup benchmark")
+    parser.add_argument('-n', '--count', type=int, default=10,
+                        help='Number of runs of the command')
+    parser.add_argument('--max', type=float, default=None,
+                        help='Fail when the median run time (in seconds) '
+                        'exceeds this bound')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='Show the per plugin load times of one run')
+    parser.add_argument('command', nargs='*', default=['--help'],
+                        help='Avocado command line to run')
+    args = parser.parse_args()
+
+    durations = sorted(run_avocado(args.command)[0]
+                       for _ in xrange(args.count))
+    median = durations[len(durations) / 2]
+    print ("avocado %s: min %.3fs median %.3fs max %.3fs (%d runs)"
+           % (' '.join(args.command), durations[0], median, durations[-1],
+              args.count))
+    if args.profile:
+        output = run_avocado(args.command, profile=True)[1]
+        print output[output.find('Startup profile:'):]
+    if args.max is not None and median > args.max:
+        print "FAIL: median startup time above %.3fs" % args.max
+        sys.exit(1)
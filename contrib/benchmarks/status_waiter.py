@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; specifically version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+#
+# Compares the nova API load of waiting for many VMs to become ACTIVE,
+# polling each VM by name (as Compute used to) vs. the shared StatusWaiter,
+# against an in-process fake nova:
+#
+# $ python contrib/benchmarks/status_waiter.py -n 200
+#
+
+import argparse
+import random
+import threading
+import time
+
+from cloudtest.openstack import waiter
+
+
+class FakeServer(object):
+
+    def __init__(self, manager, name, build_time, status):
+        self.manager = manager
+        self.id = 'id-%s' % name
+        self.name = name
+        self.created = time.time()
+        self.build_time = build_time
+        self.final_status = status
+
+    @property
+    def status(self):
+        if time.time() - self.created < self.build_time:
+            return 'BUILD'
+        return self.final_status
+
+
+class FakeServerManager(object):
+
+    """
+    Stands for novaclient's servers manager, counting the API calls.
+    """
+
+    def __init__(self):
+        self.servers = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def create(self, name, build_time, status='ACTIVE'):
+        server = FakeServer(self, name, build_time, status)
+        self.servers.append(server)
+        return server
+
+    def list(self):
+        with self.lock:
+            self.calls += 1
+        return list(self.servers)
+
+    def findall(self, name):
+        # novaclient lists all the servers and filters them locally
+        return [_ for _ in self.list() if _.name == name]
+
+
+def legacy_wait(manager, vm, status, step, timeout):
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        _vm = manager.findall(name=vm.name)[0]
+        if _vm.status == status:
+            return True
+        if _vm.status == 'ERROR':
+            return False
+        time.sleep(step)
+    return False
+
+
+def run(count, max_build_time, step, use_waiter):
+    manager = FakeServerManager()
+    status_waiter = waiter.StatusWaiter(manager.list, kind='VM')
+    vms = [manager.create('vm-%d' % i, random.uniform(0, max_build_time),
+                          random.random() < 0.02 and 'ERROR' or 'ACTIVE')
+           for i in xrange(count)]
+    results = {}
+
+    def wait(vm):
+        if use_waiter:
+            results[vm.id] = status_waiter.wait(vm.id, 'ACTIVE', 60,
+                                                step).reached
+        else:
+            results[vm.id] = legacy_wait(manager, vm, 'ACTIVE', step, 60)
+
+    threads = [threading.Thread(target=wait, args=(vm,)) for vm in vms]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = dict((vm.id, vm.final_status == 'ACTIVE') for vm in vms)
+    assert results == expected, "Waits resolved with wrong results"
+    return time.time() - start, manager.calls, count * manager.calls
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="StatusWaiter benchmark")
+    parser.add_argument('-n', '--count', type=int, default=200,
+                        help='Number of VMs waited for')
+    parser.add_argument('-b', '--build-time', type=float, default=10,
+                        help='Maximum time (in seconds) to build a VM')
+    parser.add_argument('-s', '--step', type=float, default=1,
+                        help='Poll interval (in seconds)')
+    args = parser.parse_args()
+
+    for label, use_waiter in (('per VM polling', False),
+                              ('StatusWaiter', True)):
+        duration, calls, servers = run(args.count, args.build_time,
+                                       args.step, use_waiter)
+        print ("%-15s %6.1fs %6d list calls %9d servers listed"
+               % (label, duration, calls, servers))
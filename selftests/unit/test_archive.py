@@ -3,7 +3,9 @@ import tempfile
 import os
 import shutil
 import random
+import zipfile
 
+from avocado.plugins import archive as archive_plugin
 from avocado.utils import archive
 from avocado.utils import crypto
 from avocado.utils import data_factory
@@ -146,5 +148,51 @@ class ArchiveTest(unittest.TestCase):
             pass
 
 
+
+class IncrementalArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.logdir = os.path.join(self.basedir, 'job')
+        self.archive = self.logdir + '.zip'
+        os.makedirs(os.path.join(self.logdir, 'test-results'))
+        with open(os.path.join(self.logdir, 'job.log'), 'w') as job_log:
+            job_log.write('job log')
+
+    def _test_state(self, name):
+        logdir = os.path.join(self.logdir, 'test-results', name)
+        os.makedirs(os.path.join(logdir, 'data'))
+        for path in ('debug.log', 'data/output'):
+            with open(os.path.join(logdir, path), 'w') as log:
+                log.write('%s %s' % (name, path))
+        return {'name': name, 'logdir': logdir, 'status': 'PASS'}
+
+    def test_incremental(self):
+        incremental = archive_plugin.IncrementalArchive(self.archive,
+                                                        self.logdir, True)
+        for name in ('1-first', '2-second'):
+            incremental.add_test(self._test_state(name))
+        self.assertFalse(os.path.exists(os.path.join(self.logdir,
+                                                     'test-results',
+                                                     '1-first')))
+        incremental.close()
+        self.assertEqual(os.listdir(os.path.join(self.logdir,
+                                                 'test-results')), [])
+        zip_file = zipfile.ZipFile(self.archive)
+        self.assertEqual(sorted(zip_file.namelist()),
+                         ['archive-index.json', 'job.log',
+                          'test-results/1-first/data/output',
+                          'test-results/1-first/debug.log',
+                          'test-results/2-second/data/output',
+                          'test-results/2-second/debug.log'])
+        path = archive_plugin.extract_test(self.archive, '2-second',
+                                           self.basedir)
+        with open(os.path.join(path, 'data', 'output')) as output:
+            self.assertEqual(output.read(), '2-second data/output')
+        self.assertRaises(KeyError, archive_plugin.extract_test,
+                          self.archive, 'missing', self.basedir)
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
 if __name__ == '__main__':
     unittest.main()
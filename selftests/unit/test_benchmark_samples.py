@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudtest import benchmark_samples
+
+
+def make_sample(metric, value, unit='Mbits/sec', labels=None, uri=None,
+                timestamp=1.0, benchmark='iperf'):
+    return benchmark_samples.Sample(benchmark, metric, value, unit,
+                                    timestamp, labels or {}, 'run-1',
+                                    uri or '%s-%s-%s' % (metric, value,
+                                                         timestamp))
+
+
+class SamplesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+
+    def test_load(self):
+        path = os.path.join(self.tmpdir, 'pkb_samples.json')
+        with open(path, 'w') as samples_file:
+            samples_file.write(json.dumps(
+                {'test': 'iperf', 'metric': 'Throughput', 'value': 940,
+                 'unit': 'Mbits/sec', 'timestamp': 10.5,
+                 'metadata': {'machine_type': '2-2048-40', 'vm_count': 2},
+                 'run_uri': 'abc', 'sample_uri': 'u1'}) + '\n\n')
+            samples_file.write(json.dumps(
+                {'test': 'iperf', 'metric': 'End to End Runtime',
+                 'value': '60.5', 'unit': 'seconds', 'timestamp': 11,
+                 'labels': '|machine_type:2-2048-40|,|url:http://a:1|',
+                 'run_uri': 'abc', 'sample_uri': 'u2'}) + '\n')
+        samples = benchmark_samples.load_samples(path)
+        self.assertEqual(samples[0].value, 940.0)
+        self.assertEqual(samples[0].labels,
+                         {'machine_type': '2-2048-40', 'vm_count': '2'})
+        self.assertEqual(samples[1].value, 60.5)
+        self.assertEqual(samples[1].labels,
+                         {'machine_type': '2-2048-40', 'url': 'http://a:1'})
+        typed_path = os.path.join(self.tmpdir, 'samples.json')
+        benchmark_samples.write_samples(samples, typed_path)
+        self.assertEqual(benchmark_samples.load_samples(typed_path)[1].value,
+                         60.5)
+
+    def test_store_query(self):
+        store = benchmark_samples.SampleStore(
+            os.path.join(self.tmpdir, 'store.sqlite'))
+        samples = [make_sample('Throughput', 900, labels={'mt': 'small'},
+                               timestamp=1),
+                   make_sample('Throughput', 950, labels={'mt': 'large'},
+                               timestamp=2),
+                   make_sample('Runtime', 60, 'seconds', {'mt': 'small'},
+                               timestamp=3)]
+        self.assertEqual(store.add(samples, 'job1'), 3)
+        # Samples already stored are ignored
+        self.assertEqual(store.add(samples[:1], 'job2'), 0)
+        self.assertEqual([_.value for _ in store.query(metric='Throughput')],
+                         [900, 950])
+        self.assertEqual([_.value for _ in store.query(labels={'mt':
+                                                               'small'})],
+                         [900, 60])
+        self.assertEqual([_.value for _ in store.query('iperf', 'Throughput',
+                                                       since=2)], [950])
+        self.assertEqual(store.query(benchmark='fio'), [])
+        self.assertEqual(store.query(until=1)[0].labels, {'mt': 'small'})
+        store.close()
+
+    def test_regressions(self):
+        store = benchmark_samples.SampleStore(
+            os.path.join(self.tmpdir, 'store.sqlite'))
+        first = [make_sample('Throughput', 1000), make_sample('Throughput',
+                                                              800),
+                 make_sample('Runtime', 60, 'seconds')]
+        # The first run makes the baselines
+        self.assertEqual(store.check_regressions(first, 0.1), [])
+        self.assertEqual(store.get_baseline('iperf', 'Throughput', '{}'),
+                         900)
+        # Lower throughput and higher runtime are regressions
+        second = [make_sample('Throughput', 800), make_sample('Runtime',
+                                                              70, 's')]
+        regressions = store.check_regressions(second, 0.1)
+        self.assertEqual([(_.sample.metric, _.baseline) for _ in regressions],
+                         [('Throughput', 900), ('Runtime', 60)])
+        second = [make_sample('Throughput', 850),
+                  make_sample('Runtime', 70, 'seconds')]
+        regressions = store.check_regressions(second, 0.1)
+        self.assertEqual([_.sample.metric for _ in regressions], ['Runtime'])
+        self.assertAlmostEqual(regressions[0].change, -1.0 / 6)
+        # Improvements and updated baselines
+        self.assertEqual(store.check_regressions(
+            [make_sample('Runtime', 50, 'seconds')], 0.1,
+            update_baseline=True), [])
+        self.assertEqual(store.get_baseline('iperf', 'Runtime', '{}'), 50)
+        store.close()
+
+    def test_lower_is_better(self):
+        for unit in ('ns', 'us', 'usec', 'ms', 'milliseconds', 's',
+                     'seconds'):
+            self.assertTrue(benchmark_samples.lower_is_better(
+                make_sample('Latency', 1, unit)), unit)
+        for unit in ('Mbits/sec', 'ops/sec', 'MB/s', '%'):
+            self.assertFalse(benchmark_samples.lower_is_better(
+                make_sample('Throughput', 1, unit)), unit)
+
+    def test_latency_regressions(self):
+        store = benchmark_samples.SampleStore(
+            os.path.join(self.tmpdir, 'store.sqlite'))
+        first = [make_sample('Latency', 100, 'usec'),
+                 make_sample('Runtime', 1000, 'milliseconds')]
+        self.assertEqual(store.check_regressions(first, 0.1), [])
+        # Higher latencies are regressions, lower ones improvements
+        regressions = store.check_regressions(
+            [make_sample('Latency', 150, 'usec'),
+             make_sample('Runtime', 500, 'milliseconds')], 0.1)
+        self.assertEqual([_.sample.metric for _ in regressions], ['Latency'])
+        regressions = store.check_regressions(
+            [make_sample('Latency', 50, 'usec'),
+             make_sample('Runtime', 1500, 'milliseconds')], 0.1)
+        self.assertEqual([_.sample.metric for _ in regressions], ['Runtime'])
+        store.close()
+
+    def test_baseline_labels(self):
+        store = benchmark_samples.SampleStore(
+            os.path.join(self.tmpdir, 'store.sqlite'))
+        store.check_regressions(
+            [make_sample('Throughput', 1000, labels={'mt': 'large',
+                                                     'host': 'a'}),
+             make_sample('Throughput', 100, labels={'mt': 'small',
+                                                    'host': 'b'})],
+            0.1, label_keys=['mt'])
+        regressions = store.check_regressions(
+            [make_sample('Throughput', 500, labels={'mt': 'large',
+                                                    'host': 'c'}),
+             make_sample('Throughput', 100, labels={'mt': 'small'})],
+            0.1, label_keys=['mt'])
+        self.assertEqual([_.sample.labels['mt'] for _ in regressions],
+                         ['large'])
+        store.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import BaseHTTPServer
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from flexmock import flexmock, flexmock_teardown
+
+from cloudtest.tests.ceph_api import common
+from cloudtest.tests.ceph_api.lib import http
+
+
+class CountingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveHttpTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                CountingHandler)
+        self.server.connections = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s/' % self.server.server_port
+
+    def test_connection_reuse(self):
+        http_obj = http.KeepAliveHttp(timeout=5, maxsize=1)
+        for _ in xrange(3):
+            resp, body = http_obj.request(self.url, 'GET')
+            self.assertEqual((resp.status, body), (200, 'ok'))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_closing(self):
+        http_obj = http.ClosingHttp(timeout=5)
+        for _ in xrange(3):
+            self.assertEqual(http_obj.request(self.url, 'GET')[1], 'ok')
+        self.assertEqual(self.server.connections, 3)
+
+    def test_shared_pool(self):
+        self.assertIs(http.get_keep_alive_http(timeout=5),
+                      http.get_keep_alive_http(timeout=5))
+        self.assertIsNot(http.get_keep_alive_http(timeout=5),
+                         http.get_keep_alive_http(timeout=5, maxsize=2))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        common._TOKENS.clear()
+        self.tokens = []
+        self.lifetime = datetime.timedelta(hours=2)
+        flexmock(common.CephMgmtClient).should_receive(
+            '_authenticate').replace_with(self._authenticate)
+
+    def _authenticate(self):
+        expires = datetime.datetime.utcnow() + self.lifetime
+        self.tokens.append('token%d' % len(self.tokens))
+        return {'access': {'token': {
+            'id': self.tokens[-1],
+            'expires': expires.strftime(common.ISO8601_INT_SECONDS)}}}
+
+    def _client(self):
+        client = common.CephMgmtClient({'sds_version': '1.2'})
+        client.cached_token_path = os.path.join(self.tmpdir, 'sds_token')
+        return client
+
+    def test_cached(self):
+        client = self._client()
+        self.assertEqual(client.get_token()['X-Auth-Token'], 'token0')
+        os.unlink(client.cached_token_path)
+        # Served from memory, the token file is not read again
+        self.assertEqual(self._client().get_token()['X-Auth-Token'],
+                         'token0')
+        self.assertEqual(self.tokens, ['token0'])
+
+    def test_shared_token_file(self):
+        self._client().get_token()
+        # As in another process
+        common._TOKENS.clear()
+        self.assertEqual(self._client().get_token()['X-Auth-Token'],
+                         'token0')
+        self.assertEqual(self.tokens, ['token0'])
+
+    def test_expiry(self):
+        # Tokens expiring within the refresh margin are renewed
+        self.lifetime = datetime.timedelta(seconds=30)
+        client = self._client()
+        self.assertEqual(client.get_token()['X-Auth-Token'], 'token0')
+        self.assertEqual(client.get_token()['X-Auth-Token'], 'token1')
+        self.lifetime = datetime.timedelta(hours=2)
+        self.assertEqual(client.get_token()['X-Auth-Token'], 'token2')
+        self.assertEqual(client.get_token()['X-Auth-Token'], 'token2')
+
+    def tearDown(self):
+        common._TOKENS.clear()
+        flexmock_teardown()
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
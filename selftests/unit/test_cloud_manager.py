@@ -0,0 +1,141 @@
+import time
+import unittest
+
+from flexmock import flexmock, flexmock_teardown
+
+from cloudtest.openstack import cloud_manager
+from cloudtest.openstack import cloud_node
+
+
+PARAMS = {'OS_AUTH_URL': 'http://192.168.0.2:5000/v2.0'}
+ENDPOINT = 'http://192.168.0.2:9080/v1/server/list_hosts'
+
+
+class FakeEnv(object):
+
+    def __init__(self):
+        self.topologies = {}
+
+    def get_cloud_topology(self, endpoint):
+        return self.topologies.get(endpoint)
+
+    def register_cloud_topology(self, endpoint, timestamp, nodes):
+        self.topologies[endpoint] = (timestamp, nodes)
+
+    def unregister_cloud_topology(self, endpoint=None):
+        if endpoint is None:
+            self.topologies.clear()
+        else:
+            self.topologies.pop(endpoint, None)
+
+
+def make_nodes():
+    return [cloud_node.CloudNode('node-3', ['compute'], 'ready', '10.0.0.3'),
+            cloud_node.CloudNode('node-1', ['controller', 'compute'],
+                                 'ready', '10.0.0.1'),
+            cloud_node.CloudNode('node-2', ['compute'], 'down', '10.0.0.2')]
+
+
+class CloudTopologyTest(unittest.TestCase):
+
+    def test_indexes(self):
+        nodes = make_nodes()
+        topology = cloud_manager.CloudTopology(nodes, timestamp=10)
+        self.assertEqual(len(topology), 3)
+        self.assertIs(topology.get_node('node-2'), nodes[2])
+        self.assertIs(topology.get_node('10.0.0.1'), nodes[1])
+        self.assertIsNone(topology.get_node('node-4'))
+        # Discovery order is kept
+        self.assertEqual([_.host for _ in topology.by_role['compute']],
+                         ['node-3', 'node-1', 'node-2'])
+        self.assertEqual(topology.by_role['controller'], [nodes[1]])
+        self.assertFalse(topology.is_fresh(60))
+        self.assertTrue(cloud_manager.CloudTopology(nodes).is_fresh(60))
+
+    def test_node_filter(self):
+        nodes = make_nodes()
+        match = cloud_manager.compile_node_filter(role='compute',
+                                                  status='ready')
+        self.assertEqual([_.host for _ in nodes if match(_)],
+                         ['node-3', 'node-1'])
+        # Filters set to None are ignored
+        match = cloud_manager.compile_node_filter(role=None, status='down')
+        self.assertEqual([_.host for _ in nodes if match(_)], ['node-2'])
+        self.assertRaises(ValueError, cloud_manager.compile_node_filter,
+                          rack='a')
+
+    def test_service_filter(self):
+        nodes = make_nodes()
+        nodes[0].services = [{'name': 'openstack-nova-compute'}]
+        nodes[1].services = [{'name': 'openstack-nova-api'}]
+        match = cloud_manager.compile_node_filter(service_name='nova-api',
+                                                  status='ready')
+        self.assertEqual([_.host for _ in nodes[:2] if match(_)],
+                         ['node-1'])
+        # The cheap filters go first, the services of a down node are not
+        # listed
+        self.assertFalse(match(flexmock(status='down')))
+
+
+class CloudManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        cloud_manager.invalidate_topology()
+        self.env = FakeEnv()
+        self.discovered = []
+
+        def discover_nodes():
+            self.discovered.append(time.time())
+            return make_nodes()
+
+        flexmock(cloud_manager.CloudManager).should_receive(
+            'discover_nodes').replace_with(discover_nodes)
+
+    def test_get_nodes(self):
+        manager = cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertEqual([_.host for _ in manager.nodes],
+                         ['node-1', 'node-2', 'node-3'])
+        self.assertEqual([_.host for _ in manager.get_nodes('compute')],
+                         ['node-1', 'node-2', 'node-3'])
+        self.assertEqual([_.host for _ in manager.get_nodes(
+            'compute', node_status='ready')], ['node-1', 'node-3'])
+        self.assertEqual(manager.get_nodes('mongo'), [])
+
+    def test_shared_topology(self):
+        manager = cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertIs(cloud_manager.CloudManager(PARAMS, self.env).topology,
+                      manager.topology)
+        self.assertEqual(len(self.discovered), 1)
+        self.assertEqual(self.env.topologies[ENDPOINT][1],
+                         manager.topology.nodes)
+        # Known by the env only (as in another test process)
+        cloud_manager.invalidate_topology(endpoint=ENDPOINT)
+        cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertEqual(len(self.discovered), 1)
+        # Stale topologies are discovered again
+        params = dict(PARAMS, cloud_topology_ttl=0)
+        cloud_manager.CloudManager(params, self.env)
+        self.assertEqual(len(self.discovered), 2)
+
+    def test_invalidate_topology(self):
+        manager = cloud_manager.CloudManager(PARAMS, self.env)
+        manager.invalidate_topology()
+        self.assertEqual(self.env.topologies, {})
+        cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertEqual(len(self.discovered), 2)
+        cloud_manager.invalidate_topology(self.env)
+        self.assertEqual(self.env.topologies, {})
+        cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertEqual(len(self.discovered), 3)
+        # Other endpoints are kept
+        cloud_manager.invalidate_topology(self.env, 'http://other')
+        cloud_manager.CloudManager(PARAMS, self.env)
+        self.assertEqual(len(self.discovered), 3)
+
+    def tearDown(self):
+        cloud_manager.invalidate_topology()
+        flexmock_teardown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from avocado.plugins import ct_options
+
+if sys.version_info[:2] == (2, 6):
+    import unittest2 as unittest
+else:
+    import unittest
+
+
+class CartesianParserCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="avocado_" + __name__)
+        self.cfg = os.path.join(self.tmpdir, 'tests.cfg')
+        self.subtests = os.path.join(self.tmpdir, 'subtests.cfg')
+        with open(self.cfg, 'w') as cfg:
+            cfg.write("include subtests.cfg\n")
+        self._write_subtests("variants:\n    - foo:\n    - bar:\n")
+
+    def _write_subtests(self, content, mtime=None):
+        with open(self.subtests, 'w') as cfg:
+            cfg.write(content)
+        if mtime is not None:
+            os.utime(self.subtests, (mtime, mtime))
+
+    @staticmethod
+    def _names(parser):
+        return [params['shortname'] for params in parser.get_dicts()]
+
+    def test_memory_cache(self):
+        cache = ct_options.CartesianParserCache()
+        parser = cache.get(self.cfg, [('key', 'value')])
+        parser.only_filter('foo')
+        self.assertEqual(self._names(parser), ['foo'])
+        # Filtering one copy must not affect the cached tree
+        self.assertEqual(self._names(cache.get(self.cfg, [('key', 'value')])),
+                         ['foo', 'bar'])
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'disk_hits': 0, 'misses': 1})
+        cache.get(self.cfg)
+        self.assertEqual(cache.misses, 2)
+
+    def test_included_file_invalidates(self):
+        cache = ct_options.CartesianParserCache()
+        cache.get(self.cfg)
+        self._write_subtests("variants:\n    - baz:\n", mtime=1)
+        self.assertEqual(self._names(cache.get(self.cfg)), ['baz'])
+        self.assertEqual(cache.misses, 2)
+
+    def test_disk_cache(self):
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        ct_options.CartesianParserCache(cache_dir).get(self.cfg)
+        cache = ct_options.CartesianParserCache(cache_dir)
+        self.assertEqual(self._names(cache.get(self.cfg)), ['foo', 'bar'])
+        self.assertEqual(cache.stats(),
+                         {'hits': 0, 'disk_hits': 1, 'misses': 0})
+
+    def test_concurrent_get(self):
+        cache = ct_options.CartesianParserCache()
+        parse = cache._parse
+        parsed = []
+
+        def slow_parse(key):
+            parsed.append(key)
+            time.sleep(0.1)
+            return parse(key)
+
+        cache._parse = slow_parse
+        parsers = []
+        threads = [threading.Thread(target=lambda: parsers.append(
+            cache.get(self.cfg))) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Only one thread parses, the others wait for its entry
+        self.assertEqual(len(parsed), 1)
+        self.assertEqual([self._names(_) for _ in parsers],
+                         [['foo', 'bar']] * 4)
+        self.assertEqual(cache.stats(),
+                         {'hits': 3, 'disk_hits': 0, 'misses': 1})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
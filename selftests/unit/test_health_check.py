@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+
+from flexmock import flexmock, flexmock_teardown
+
+from avocado.core.exceptions import HealthCheckFail
+from avocado.utils import process
+from cloudtest import health_check
+
+
+class FakeHealthCheck(object):
+
+    """
+    Health check whose outcome depends on the host: 'bad' hosts fail,
+    'broken' ones raise, 'stuck' ones never finish (until released)
+    """
+
+    release = threading.Event()
+    checked = []
+
+    def __init__(self, node, params, username, is_raise_health_check_excp,
+                 timeout):
+        self.node = node
+        self.params = params
+
+    def get_health_status(self):
+        self.checked.append((self.node, self.params))
+        if self.node.startswith('bad'):
+            raise HealthCheckFail("unhealthy")
+        if self.node.startswith('broken'):
+            raise RuntimeError("broken")
+        if self.node.startswith('stuck'):
+            self.release.wait(10)
+        return True
+
+
+class ProbeTest(unittest.TestCase):
+
+    def test_host_ips(self):
+        self.assertEqual(health_check.get_host_ips(
+            '10.0.0.5, 10.0.0.0/30,10.0.1.1-10.0.1.3,,10.0.0.1'),
+            ['10.0.0.5', '10.0.0.0', '10.0.0.1', '10.0.0.2', '10.0.0.3',
+             '10.0.1.1', '10.0.1.2', '10.0.1.3'])
+
+    def test_probe(self):
+        commands = ['echo out; echo err >&2', "printf 'no newline'",
+                    'exit 3', 'sleep 5']
+        script = health_check.build_probe_script(commands, 1)
+        result = process.run(script, shell=True)
+        results = health_check.parse_probe_document(commands, result.stdout)
+        self.assertEqual(len(results), 4)
+        self.assertEqual((results[commands[0]].stdout,
+                          results[commands[0]].stderr,
+                          results[commands[0]].exit_status),
+                         ('out\n', 'err\n', 0))
+        self.assertEqual(results[commands[1]].stdout, 'no newline')
+        self.assertEqual(results[commands[2]].exit_status, 3)
+        # Killed by timeout
+        self.assertEqual(results[commands[3]].exit_status, 124)
+
+    def test_malformed_probe(self):
+        self.assertRaises(ValueError, health_check.parse_probe_document,
+                          ['true'], 'garbage\n')
+        # Truncated documents keep their complete records
+        document = '%s 0 0 3 0\nok\n%s 1 0' % (health_check.PROBE_MARKER,
+                                               health_check.PROBE_MARKER)
+        results = health_check.parse_probe_document(['a', 'b'], document)
+        self.assertEqual(results.keys(), ['a'])
+        self.assertEqual(results['a'].stdout, 'ok\n')
+
+
+class CheckHostsTest(unittest.TestCase):
+
+    def setUp(self):
+        flexmock(health_check).should_receive('HealthCheck').replace_with(
+            FakeHealthCheck)
+        FakeHealthCheck.release.clear()
+        del FakeHealthCheck.checked[:]
+
+    def test_results(self):
+        params = {'health_check_ceph': 'true', 'health_check_cpu': 'true'}
+        results = health_check.check_hosts(['good1', 'bad1', 'broken1',
+                                            'good2'], params, concurrency=2,
+                                           timeout=10,
+                                           cluster_checks_once=True)
+        self.assertEqual(results, {'good1': True, 'bad1': False,
+                                   'broken1': False, 'good2': True})
+        checked = dict(FakeHealthCheck.checked)
+        self.assertEqual(checked['good1']['health_check_ceph'], 'true')
+        self.assertEqual(checked['good2'],
+                         {'health_check_ceph': 'false',
+                          'health_check_cpu': 'true'})
+        self.assertEqual(health_check.check_hosts([], params), {})
+
+    def test_stuck_hosts(self):
+        flexmock(health_check, HOST_TIMEOUT_GRACE=0)
+        start = time.time()
+        try:
+            results = health_check.check_hosts(['stuck1', 'stuck2', 'good1',
+                                                'bad1'], {}, concurrency=2,
+                                               timeout=1)
+        finally:
+            FakeHealthCheck.release.set()
+        self.assertLess(time.time() - start, 5)
+        # The hosts after the stuck ones are checked by other workers
+        self.assertEqual(results, {'stuck1': False, 'stuck2': False,
+                                   'good1': True, 'bad1': False})
+
+    def tearDown(self):
+        flexmock_teardown()
+
+
+if __name__ == '__main__':
+    unittest.main()
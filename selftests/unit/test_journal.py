@@ -0,0 +1,90 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from avocado.plugins import journal
+
+
+class JournalResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.journal = journal.JournalResult(
+            argparse.Namespace(journal_durability='off'))
+        self.journal.batch_size = 3
+        self.journal.flush_interval = 60
+
+    def _state(self, name, status='PASS'):
+        return {'name': name, 'status': status, 'job_logdir': self.tmpdir,
+                'job_unique_id': '0' * 40}
+
+    def _entries(self):
+        path = os.path.join(self.tmpdir, journal.JOURNAL_FILENAME)
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute("SELECT tag, action, status FROM "
+                                      "test_journal ORDER BY rowid").fetchall()
+        finally:
+            connection.close()
+
+    def test_batch(self):
+        self.journal.start_test(None, self._state('1-test'))
+        self.journal.end_test(None, self._state('1-test'))
+        self.assertEqual(self._entries(), [])
+        self.journal.start_test(None, self._state('2-test'))
+        self.assertEqual(self._entries(),
+                         [('1-test', 'STARTED', None),
+                          ('1-test', 'ENDED', 'PASS'),
+                          ('2-test', 'STARTED', None)])
+        self.journal.end_test(None, self._state('2-test', 'FAIL'))
+        self.assertEqual(len(self._entries()), 3)
+        self.journal.post_tests(None)
+        self.assertEqual(self._entries()[-1], ('2-test', 'ENDED', 'FAIL'))
+        self.assertFalse(self.journal.journal_initialized)
+
+    def test_flush_interval(self):
+        self.journal.flush_interval = 0.05
+        self.journal.start_test(None, self._state('1-test'))
+        self.journal.test_progress()
+        self.assertEqual(self._entries(), [])
+        time.sleep(0.1)
+        self.journal.test_progress()
+        self.assertEqual(self._entries(), [('1-test', 'STARTED', None)])
+        # The entries waiting too long are committed with the next one
+        self.journal.end_test(None, self._state('1-test'))
+        time.sleep(0.1)
+        self.journal.start_test(None, self._state('2-test'))
+        self.assertEqual(len(self._entries()), 3)
+
+    def test_forked_test(self):
+        self.journal.start_test(None, self._state('1-test'))
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self.journal.start_test(None, self._state('2-test'))
+            except Exception:
+                status = 1
+            finally:
+                os._exit(status)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        # Committed right away by the test process, not buffered
+        self.assertEqual(self._entries(), [('2-test', 'STARTED', None)])
+        self.assertEqual(len(self.journal._pending), 1)
+        self.journal.post_tests(None)
+        self.assertEqual(len(self._entries()), 2)
+
+    def test_durability(self):
+        self.assertRaises(ValueError, journal.JournalResult,
+                          argparse.Namespace(journal_durability='never'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
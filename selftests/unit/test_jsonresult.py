@@ -29,7 +29,8 @@ class JSONResultTest(unittest.TestCase):
 
         self.tmpfile = tempfile.mkstemp()
         self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
-        args = argparse.Namespace(json_output=self.tmpfile[1])
+        args = argparse.Namespace(json_output=self.tmpfile[1],
+                                  jenkins_build_url=None)
         self.job = job.Job(args)
         self.test_result = Result(FakeJob(args))
         self.test_result.filename = self.tmpfile[1]
@@ -108,6 +109,28 @@ class JSONResultTest(unittest.TestCase):
         check_item("[skip]", res["skip"], 0)
         check_item("[pass]", res["pass"], 1)
 
+    def testStreamWriter(self):
+        writer = jsonresult.JSONStreamWriter(self.job.args.json_output,
+                                             self.test_result)
+        for status in ("PASS", "FAIL"):
+            self.test_result.start_test(self.test1)
+            state = self.test1.get_state()
+            state['status'] = status
+            self.test_result.check_test(state)
+            writer.add_test(self.test_result, state)
+            # The document is valid while the job runs
+            res = json.loads(open(self.job.args.json_output).read())
+            self.assertEqual(res['tests'][-1]['status'], status)
+            self.assertEqual(len(res['tests']), writer.tests)
+        self.test_result.end_tests()
+        writer.close(self.test_result)
+        res = json.loads(open(self.job.args.json_output).read())
+        self.assertEqual(len(res['tests']), 2)
+        self.assertEqual(res['pass'], 1)
+        self.assertEqual(res['failures'], 1)
+        self.assertEqual(res['total'], 2)
+        self.assertEqual(res['job_id'], self.test_result.job_unique_id)
+
 
 if __name__ == '__main__':
     unittest.main()
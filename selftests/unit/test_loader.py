@@ -1,8 +1,11 @@
+import argparse
 import shutil
 import stat
 import sys
 import multiprocessing
 import tempfile
+import threading
+import time
 
 if sys.version_info[:2] == (2, 6):
     import unittest2 as unittest
@@ -335,5 +338,114 @@ class LoaderTest(unittest.TestCase):
         shutil.rmtree(self.tmpdir)
 
 
+class LazyLoaderPluginTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = loader.TestLoaderProxy()
+        self.args = argparse.Namespace(loaders=['@DEFAULT'])
+
+    def test_not_imported_on_register(self):
+        plugin = loader.LazyLoaderPlugin('lazy', 'avocado_no_such_module',
+                                         'NoSuchLoader', ['LAZY'])
+        self.proxy.register_plugin(plugin)
+        self.proxy.register_plugin(
+            loader.LazyLoaderPlugin('lazy', 'avocado_no_such_module',
+                                    'NoSuchLoader'))
+        self.assertEqual(self.proxy.registered_plugins, [plugin])
+        self.assertIsNone(plugin._plugin)
+
+    def test_load(self):
+        self.proxy.register_plugin(
+            loader.LazyLoaderPlugin('dummy', 'avocado.core.loader',
+                                    'DummyLoader', ['DUMMY']))
+        self.proxy.load_plugins(self.args)
+        loaders = [type(_) for _ in self.proxy._initialized_plugins]
+        self.assertIn(loader.DummyLoader, loaders)
+
+    def test_broken_default_loader_skipped(self):
+        self.proxy.register_plugin(
+            loader.LazyLoaderPlugin('lazy', 'avocado_no_such_module',
+                                    'NoSuchLoader'))
+        self.proxy.load_plugins(self.args)
+        self.assertEqual([type(_) for _ in self.proxy._initialized_plugins],
+                         [loader.ExternalLoader])
+        self.args.loaders = ['lazy']
+        self.assertRaises(loader.InvalidLoaderPlugin,
+                          self.proxy.load_plugins, self.args)
+
+
+class SleepyLoader(object):
+
+    def __init__(self, name, handled, delay=0.1):
+        self.name = name
+        self.handled = handled
+        self.delay = delay
+
+    def discover(self, reference, which_tests=loader.DEFAULT):
+        time.sleep(self.delay)
+        if reference == 'broken':
+            raise IOError("Broken reference")
+        if reference in self.handled:
+            return [(test.SimpleTest, {'name': '%s:%s' % (self.name,
+                                                          reference)})]
+        return []
+
+
+class ThreadRecordingFileLoader(loader.FileLoader):
+
+    def __init__(self):
+        self.name = 'file'
+        self.threads = []
+
+    def discover(self, reference, which_tests=loader.DEFAULT):
+        self.threads.append(threading.current_thread())
+        return []
+
+
+class ConcurrentDiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = loader.TestLoaderProxy()
+        self.proxy._initialized_plugins = [
+            SleepyLoader('first', ['a']),
+            SleepyLoader('second', ['a', 'b']),
+            SleepyLoader('third', ['b', 'c'])]
+
+    def _names(self, tests):
+        return [_[1]['name'] for _ in tests]
+
+    def test_order(self):
+        start = time.time()
+        tests = self.proxy.discover(['c', 'a', 'b'])
+        self.assertLess(time.time() - start, 0.1 * 5)
+        self.assertEqual(self._names(tests),
+                         ['third:c', 'first:a', 'second:b'])
+        tests = self.proxy.discover(['c', 'a', 'b'], loader.ALL)
+        self.assertEqual(self._names(tests),
+                         ['third:c', 'first:a', 'second:a', 'second:b',
+                          'third:b'])
+
+    def test_failures(self):
+        self.assertRaises(loader.LoaderUnhandledReferenceError,
+                          self.proxy.discover, ['a', 'broken'])
+        tests = self.proxy.discover(['broken'], loader.ALL)
+        self.assertEqual(tests, [(test.MissingTest, {'name': 'broken'})])
+
+    def test_discovery_times(self):
+        del loader.DISCOVERY_TIMES[:]
+        self.proxy.discover(['a'])
+        self.assertEqual(sorted(_[0] for _ in loader.DISCOVERY_TIMES),
+                         ['first', 'second', 'third'])
+
+    def test_file_loader_main_thread(self):
+        file_loader = ThreadRecordingFileLoader()
+        self.proxy._initialized_plugins.append(file_loader)
+        self.proxy.discover(['a', 'b', 'c'])
+        # The file loaders may prefetch scans in worker processes
+        self.assertEqual(len(file_loader.threads), 3)
+        for thread in file_loader.threads:
+            self.assertIsInstance(thread, threading._MainThread)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,4 @@
+import argparse
 import itertools
 import pickle
 import sys
@@ -76,6 +77,40 @@ class TestMultiplex(unittest.TestCase):
         self.assertNotIn('intel', str_act)
         self.assertNotIn('fedora', str_act)
 
+    def test_count(self):
+        self.assertEqual(multiplexer.MuxTree(self.mux_tree).count(), 12)
+        self.assertEqual(multiplexer.MuxTree(tree.TreeNode()).count(), 1)
+
+    def test_get_variant(self):
+        mux_tree = multiplexer.MuxTree(self.mux_tree)
+        for index, variant in enumerate(self.mux_full):
+            self.assertEqual(mux_tree.get_variant(index), variant)
+        self.assertEqual(mux_tree.get_variant(-1), self.mux_full[-1])
+        self.assertRaises(IndexError, mux_tree.get_variant, 12)
+        self.assertRaises(IndexError, mux_tree.get_variant, -13)
+
+    def test_iter_variants(self):
+        mux_tree = multiplexer.MuxTree(self.mux_tree)
+        for start, stop, step in ((0, None, 1), (0, 5, 1), (3, None, 4),
+                                  (11, 2, -3), (20, None, 1)):
+            self.assertEqual(tuple(mux_tree.iter_variants(start, stop, step)),
+                             self.mux_full[start:stop:step])
+
+    def test_shard(self):
+        variants = []
+        for shard in ('1/5', '2/5', '3/5', '4/5', '5/5'):
+            mux = multiplexer.Mux()
+            mux.data_merge(self.mux_tree)
+            mux.parse(argparse.Namespace(mux_shard=shard))
+            shard_variants = list(mux.iter_variants())
+            self.assertEqual(len(shard_variants),
+                             mux.get_number_of_variants())
+            variants.extend(shard_variants)
+        self.assertEqual(tuple(variant for _, variant in sorted(variants)),
+                         self.mux_full)
+        for shard in ('0/2', '3/2', '1', 'a/b'):
+            self.assertRaises(ValueError, multiplexer.parse_shard, shard)
+
 
 class TestAvocadoParams(unittest.TestCase):
 
@@ -96,6 +131,22 @@ class TestAvocadoParams(unittest.TestCase):
         params = pickle.loads(params)
         self.assertEqual(self.params1, params)
 
+    @unittest.skipIf(not yaml_to_mux.MULTIPLEX_CAPABLE, "Not multiplex capable")
+    def test_pickled_get(self):
+        params = pickle.loads(pickle.dumps(self.params1, 2))
+        for key, path in (('unique1', '/ch0/ch0.1/ch0.1.1/ch0.1.1.1/'),
+                          ('root', '/ch0/'), ('missing', None)):
+            self.assertEqual(params.get(key, path, 'default'),
+                             self.params1.get(key, path, 'default'))
+
+    def test_greedy_path_cache(self):
+        path = multiplexer.AvocadoParams._greedy_path('/foo/*/bar')
+        self.assertIs(path,
+                      multiplexer.AvocadoParams._greedy_path('/foo/*/bar'))
+        self.assertEqual(path.pattern, '/foo/[^/]*/bar$')
+        self.assertEqual(multiplexer.AvocadoParams._greedy_path('').pattern,
+                         '^$')
+
     @unittest.skipIf(not yaml_to_mux.MULTIPLEX_CAPABLE, "Not multiplex capable")
     def test_basic(self):
         self.assertEqual(self.params1, self.params1)
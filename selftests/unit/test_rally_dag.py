@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from cloudtest import rally_dag
+
+
+class FakeTasks(object):
+
+    """
+    Tasks recording their runs, failing a given number of times
+    """
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.runs = []
+        self.failures = {}
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def task(self, name):
+        def run():
+            with self.lock:
+                self.runs.append(name)
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(self.duration)
+            with self.lock:
+                self.running -= 1
+                if self.failures.get(name):
+                    self.failures[name] -= 1
+                    return False
+            return True
+        return run
+
+
+class DAGSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+
+    def _scheduler(self, graph, width=1, wait_ready=None):
+        return rally_dag.DAGScheduler(graph, width, wait_ready,
+                                      lock_dir=self.tmpdir)
+
+    def test_order(self):
+        tasks = FakeTasks()
+        graph = rally_dag.TaskGraph()
+        graph.add(rally_dag.TaskNode('test', tasks.task('test'),
+                                     ['dep1', 'dep2']))
+        graph.add(rally_dag.TaskNode('dep2', tasks.task('dep2'), ['dep1']))
+        graph.add(rally_dag.TaskNode('dep1', tasks.task('dep1')))
+        statuses = self._scheduler(graph, 4).run()
+        self.assertEqual(tasks.runs, ['dep1', 'dep2', 'test'])
+        self.assertEqual(statuses.items(),
+                         [('test', 'PASS'), ('dep2', 'PASS'),
+                          ('dep1', 'PASS')])
+
+    def test_concurrency(self):
+        tasks = FakeTasks(0.2)
+        graph = rally_dag.TaskGraph()
+        for name in 'abcd':
+            graph.add(rally_dag.TaskNode(name, tasks.task(name)))
+        start = time.time()
+        self._scheduler(graph, 2).run()
+        self.assertEqual(tasks.max_running, 2)
+        self.assertLess(time.time() - start, 0.7)
+
+    def test_exclusive(self):
+        tasks = FakeTasks(0.1)
+        graph = rally_dag.TaskGraph()
+        for name in 'abc':
+            graph.add(rally_dag.TaskNode(name, tasks.task(name),
+                                         deployment='d1', exclusive=True))
+        self._scheduler(graph, 3).run()
+        self.assertEqual(tasks.max_running, 1)
+
+    def test_failed_branch(self):
+        tasks = FakeTasks()
+        tasks.failures = {'a1': 2}
+        graph = rally_dag.TaskGraph()
+        graph.add(rally_dag.TaskNode('a1', tasks.task('a1'),
+                                     recovery=tasks.task('a1-recovery'),
+                                     reruns=2))
+        graph.add(rally_dag.TaskNode('a2', tasks.task('a2'), ['a1']))
+        graph.add(rally_dag.TaskNode('a3', tasks.task('a3'), ['a2']))
+        graph.add(rally_dag.TaskNode('b1', tasks.task('b1')))
+        statuses = self._scheduler(graph).run()
+        self.assertEqual(statuses,
+                         {'a1': 'FAIL', 'a2': 'SKIP', 'a3': 'SKIP',
+                          'b1': 'PASS'})
+        self.assertEqual(tasks.runs.count('a1'), 2)
+        self.assertEqual(tasks.runs.count('a1-recovery'), 2)
+        self.assertNotIn('a2', tasks.runs)
+
+    def test_rerun_and_error(self):
+        tasks = FakeTasks()
+        tasks.failures = {'a': 1}
+
+        def broken():
+            raise RuntimeError("boom")
+
+        graph = rally_dag.TaskGraph()
+        graph.add(rally_dag.TaskNode('a', tasks.task('a'), reruns=3))
+        graph.add(rally_dag.TaskNode('b', broken))
+        ready = []
+        scheduler = self._scheduler(graph, wait_ready=ready.append)
+        self.assertEqual(scheduler.run(), {'a': 'PASS', 'b': 'ERROR'})
+        self.assertEqual(tasks.runs, ['a', 'a'])
+        self.assertEqual(len(ready), 3)
+        self.assertIsInstance(scheduler.errors['b'], RuntimeError)
+
+    def test_invalid_graph(self):
+        graph = rally_dag.TaskGraph()
+        graph.add(rally_dag.TaskNode('a', None, ['b']))
+        self.assertRaises(ValueError, rally_dag.DAGScheduler, graph)
+        graph.add(rally_dag.TaskNode('b', None, ['a']))
+        self.assertRaises(ValueError, rally_dag.DAGScheduler, graph)
+        self.assertRaises(ValueError, graph.add,
+                          rally_dag.TaskNode('a', None))
+
+    def test_wait_until(self):
+        checks = iter([False, False, True])
+        self.assertTrue(rally_dag.wait_until(lambda: next(checks), 1, 0.01))
+        self.assertFalse(rally_dag.wait_until(lambda: False, 0.05, 0.01))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudtest import rally_result
+
+
+UUID = '6fd9a19f-5cf8-4904-8f7f-a2f0ab2d5f4c'
+
+RAW_RESULTS = [
+    {'key': {'name': 'NovaServers.boot_and_delete_server', 'pos': 0},
+     'load_duration': 9.5, 'full_duration': 12.0,
+     'sla': [{'criterion': 'failure_rate', 'success': False,
+              'detail': 'Failure rate criteria 0.00% <= 25.00% <= 0.00%'}],
+     'result': [
+         {'timestamp': 1, 'duration': 2.0, 'idle_duration': 0, 'error': [],
+          'atomic_actions': {'nova.boot_server': 1.5,
+                             'nova.delete_server': 0.5}},
+         {'timestamp': 2, 'duration': 4.0, 'idle_duration': 0, 'error': [],
+          'atomic_actions': {'nova.boot_server': 3.0,
+                             'nova.delete_server': 1.0}},
+         {'timestamp': 3, 'duration': 1.0, 'idle_duration': 0,
+          'error': ['TimeoutException', 'Timed out', 'Traceback...'],
+          'atomic_actions': {'nova.boot_server': 1.0}},
+         {'timestamp': 4, 'duration': 3.0, 'idle_duration': 0, 'error': [],
+          'atomic_actions': {'nova.boot_server': 2.0,
+                             'nova.delete_server': 1.0}}]},
+    {'key': {'name': 'Dummy.dummy', 'pos': 1},
+     'load_duration': 1.0, 'full_duration': 1.5,
+     'sla': [{'criterion': 'failure_rate', 'success': True, 'detail': ''}],
+     'result': [
+         {'timestamp': 5, 'duration': 1.0, 'idle_duration': 0, 'error': [],
+          'atomic_actions': [{'name': 'dummy.sleep', 'started_at': 5.0,
+                              'finished_at': 5.25, 'children': []},
+                             {'name': 'dummy.sleep', 'started_at': 5.5,
+                              'finished_at': 5.75, 'children': []}]}]}]
+
+
+class RallyResultTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+
+    def test_task_uuid(self):
+        output = ('Task %s: started\n...\nrally task report %s --out '
+                  'output.html' % (UUID, UUID))
+        self.assertEqual(rally_result.get_task_uuid(output), UUID)
+        # No guess from the rally globals, they may be of another task
+        self.assertIsNone(rally_result.get_task_uuid(
+            'Task config is invalid: bad args\n%s' % UUID))
+
+    def test_percentile(self):
+        self.assertEqual(rally_result.percentile([1, 2, 3, 4], 0.5), 2.5)
+        self.assertEqual(rally_result.percentile([1, 2, 3], 0.5), 2)
+        self.assertEqual(rally_result.percentile([1, 2, 3, 4, 5], 0.9), 4.6)
+        self.assertIsNone(rally_result.percentile([], 0.5))
+
+    def test_ingest(self):
+        task = rally_result.ingest_task(UUID, RAW_RESULTS)
+        self.assertEqual(task['error_count'], 1)
+        self.assertFalse(task['sla_passed'])
+        boot, dummy = task['scenarios']
+        self.assertEqual(boot['columns']['duration'], [2.0, 4.0, 1.0, 3.0])
+        self.assertEqual(boot['columns']['error'], [None, None, 0, None])
+        self.assertEqual(boot['errors'],
+                         [['TimeoutException', 'Timed out', 'Traceback...']])
+        # The durations of the failed iterations are left out
+        self.assertEqual(boot['atomic_actions']['nova.boot_server'],
+                         [1.5, 3.0, None, 2.0])
+        self.assertEqual(boot['atomic_actions']['nova.delete_server'],
+                         [0.5, 1.0, None, 1.0])
+        stats = boot['stats']['total']
+        self.assertEqual(stats['success'], 75.0)
+        self.assertEqual((stats['min'], stats['median'], stats['max']),
+                         (2.0, 3.0, 4.0))
+        self.assertEqual(stats['avg'], 3.0)
+        self.assertEqual(dummy['atomic_actions'], {'dummy.sleep': [0.5]})
+        self.assertTrue(dummy['sla_passed'])
+        self.assertEqual(task['total']['count'], 5)
+        self.assertEqual(task['total']['success'], 80.0)
+
+    def test_total_row(self):
+        task = rally_result.ingest_task(UUID, RAW_RESULTS)
+        row = rally_result.get_total_row(task)
+        self.assertEqual(row['Success'], '80.0%')
+        self.assertEqual(row['Max(sec)'], '4.000')
+        self.assertEqual(row['Count'], '5')
+        self.assertEqual(row['rally_task_uuid'], UUID)
+        empty = rally_result.get_total_row(rally_result.ingest_task(UUID,
+                                                                    []))
+        self.assertEqual((empty['Success'], empty['Min(sec)']),
+                         ('n/a', 'n/a'))
+
+    def test_artifact(self):
+        task = rally_result.ingest_task(UUID, RAW_RESULTS)
+        path = rally_result.write_artifact(task, self.tmpdir)
+        self.assertEqual(os.path.basename(path), 'rally_task_%s.json' % UUID)
+        self.assertEqual(json.load(open(path)),
+                         json.loads(json.dumps(task)))
+        summary = rally_result.get_summary(task)
+        self.assertNotIn('columns', summary['scenarios'][0])
+        self.assertEqual(summary['scenarios'][0]['error_count'], 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,10 @@
 #!/usr/bin/env python
 
+import json
+import Queue
+import shutil
+import tempfile
+import time
 import unittest
 import os
 
@@ -7,6 +12,8 @@ from flexmock import flexmock, flexmock_teardown
 
 from avocado.core import remoter
 from avocado.core import remote
+from avocado.core import result
+from avocado.core.remote import runner as remote_runner
 from avocado.utils import archive
 import logging
 
@@ -183,5 +190,145 @@ class RemoteTestRunnerSetup(unittest.TestCase):
         flexmock_teardown()
 
 
+class FakeShardedRunner(remote.ShardedRemoteTestRunner):
+
+    """
+    Runs each reference as one test, host 'lost' dies on its first test,
+    host 'gone' before it, and host 'half' (running three tests for each
+    reference) on the second one
+    """
+
+    def _run_host(self, hostname, port, next_index, events, deadline):
+        host = "%s:%s" % (hostname, port)
+        while hostname.startswith('ok') and not next_index.value:
+            time.sleep(0.01)
+        try:
+            while True:
+                reference = self._next_reference(next_index)
+                if reference is None:
+                    break
+                events.put(('reference', host, {'reference': reference}))
+                if hostname == 'gone':
+                    events.put(('lost', host, {'reason': 'gone'}))
+                    return
+                count = 3 if hostname == 'half' else 1
+                tests = ['%d-%s' % (_, reference)
+                         for _ in xrange(1, count + 1)]
+                events.put(('job', host, {'total': len(tests)}))
+                for test in tests:
+                    self._run_test(host, hostname, test, events)
+                    if hostname == 'half':
+                        hostname = 'lost'
+        finally:
+            events.put(('done', host, None))
+
+    def _run_test(self, host, hostname, test, events):
+        events.put(('start', host, {'test': test}))
+        if hostname == 'lost':
+            events.put(('lost', host, {'reason': 'gone'}))
+            raise SystemExit
+        # Leaves some time for the lost references to be requeued
+        time.sleep(0.02)
+        logdir = os.path.join(self._get_staging_dir(host), test)
+        os.makedirs(logdir)
+        events.put(('end', host, {'test': test, 'status': 'PASS',
+                                  'time': 0.1, 'start': 0, 'end': 0.1,
+                                  'fail_reason': 'None',
+                                  'local_logdir': logdir}))
+
+
+class ShardedRemoteTestRunnerTest(unittest.TestCase):
+
+    """ Tests ShardedRemoteTestRunner """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        args = flexmock(remote_hosts='ok1,ok2:2222,lost', remote_port=22,
+                        remote_username='username', remote_timeout=60,
+                        show_job_log=False)
+        log = flexmock()
+        log.should_receive("info")
+        log.should_receive("error")
+        self.states = []
+        dispatcher = flexmock()
+        dispatcher.should_receive("map_method").replace_with(
+            lambda method, *args: method == 'end_test' and
+            self.states.append(args[1]))
+        job = flexmock(args=args, log=log, logdir=self.tmpdir,
+                       unique_id='0' * 40, logfile=None,
+                       references=['ref%d' % i for i in xrange(10)],
+                       _result_events_dispatcher=dispatcher)
+        self.result = result.Result(job)
+        flexmock(logging).should_receive("FileHandler").and_return(
+            logging.StreamHandler())
+        self.runner = FakeShardedRunner(job, self.result)
+
+    def test_parse_hosts(self):
+        self.assertEqual(remote_runner.parse_hosts('a, b:2222,', 22),
+                         [('a', 22), ('b', 2222)])
+        self.assertRaises(ValueError, remote_runner.parse_hosts, 'a:b')
+
+    def test_event_streamer(self):
+        events = Queue.Queue()
+        streamer = remote_runner.TestEventStreamer('host', events)
+        event = {'event': 'end', 'test': '1-test', 'status': 'PASS'}
+        line = result.EVENT_PREFIX + json.dumps(event)
+        streamer.write(' (1/1) 1-test: PASS\r\n' + line[:10])
+        streamer.write(line[10:] + '\r\nnot an event\n')
+        streamer.wait()
+        self.assertEqual(events.get_nowait(), ('end', 'host', event))
+        self.assertRaises(Queue.Empty, events.get_nowait)
+
+    def test_run_suite(self):
+        summary = self.runner.run_suite(None, None)
+        self.assertEqual(summary, set(['FAIL']))
+        self.assertEqual(self.result.tests_total, 10)
+        self.assertEqual(self.result.errors, 1)
+        self.assertEqual(self.result.passed, 9)
+        # Tests are numbered in the order they are reported
+        self.assertEqual(sorted(int(state['name'].uid)
+                                for state in self.states), range(1, 11))
+        for state in self.states:
+            if state['status'] == 'PASS':
+                self.assertTrue(os.path.isdir(state['logdir']))
+            else:
+                self.assertIn('Lost host lost:22', state['fail_reason'])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['test-results'])
+
+    def test_lost_reference_moved(self):
+        self.runner.job.args.remote_hosts = 'ok1,gone'
+        self.assertEqual(self.runner.run_suite(None, None), set())
+        self.assertEqual(self.result.tests_total, 10)
+        self.assertEqual(self.result.passed, 10)
+        self.assertEqual(sorted(_['name'].name for _ in self.states),
+                         sorted(self.runner.job.references))
+
+    def test_lost_tests_reported(self):
+        self.runner.job.args.remote_hosts = 'ok1,half'
+        self.assertEqual(self.runner.run_suite(None, None), set(['FAIL']))
+        self.assertEqual(self.result.tests_total, 12)
+        self.assertEqual(self.result.passed, 10)
+        self.assertEqual(self.result.errors, 2)
+        reasons = [_['fail_reason'] for _ in self.states
+                   if _['status'] == 'ERROR']
+        self.assertIn('Lost host half:22: gone', reasons)
+        self.assertIn('Lost host half:22: 1 test(s) not run (gone)', reasons)
+
+    def test_no_host_left(self):
+        self.runner.job.args.remote_hosts = 'gone'
+        self.assertEqual(self.runner.run_suite(None, None), set(['FAIL']))
+        self.assertEqual(self.result.tests_total, 10)
+        self.assertEqual(self.result.errors, 10)
+        self.assertEqual(sorted(_['name'].name for _ in self.states),
+                         sorted(self.runner.job.references))
+        for state in self.states:
+            self.assertEqual(state['fail_reason'],
+                             'No remote host left to run it')
+
+    def tearDown(self):
+        flexmock_teardown()
+        shutil.rmtree(self.tmpdir)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,194 @@
+import os
+import socket
+import threading
+import unittest
+
+import aexpect
+import paramiko
+from flexmock import flexmock, flexmock_teardown
+
+from cloudtest import remote
+
+
+class FakeChannel(object):
+
+    """
+    Channel whose streams are already complete (or never end)
+    """
+
+    def __init__(self, stdout=(), stderr=(), status=0, done=True):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.status = status
+        self.done = done
+        self.eof_received = True
+        self.status_event = threading.Event()
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return self.done
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakeTransport(object):
+
+    def __init__(self, channel=None):
+        self.active = True
+        self.channel = channel
+        self.commands = []
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+    def open_session(self, timeout=None):
+        channel = self.channel
+        channel.exec_command = self.commands.append
+        channel.close = lambda: None
+        return channel
+
+
+class FakeClient(object):
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+
+
+class SSHConnectionTest(unittest.TestCase):
+
+    def test_run(self):
+        transport = FakeTransport(FakeChannel(['out', 'put'], ['err'], 3))
+        connection = remote.SSHConnection('host', timeout=1)
+        flexmock(connection).should_receive('_connect').and_return(
+            FakeClient(transport)).once()
+        self.assertEqual(connection.run('ls /', 1), (3, 'output', 'err'))
+        self.assertEqual(transport.commands, ['ls /'])
+        # The transport is kept for the next commands
+        transport.channel = FakeChannel(['again'])
+        self.assertEqual(connection.run('ls', 1), (0, 'again', ''))
+
+    def test_run_timeout(self):
+        transport = FakeTransport(FakeChannel(['partial'], done=False))
+        connection = remote.SSHConnection('host', timeout=1)
+        flexmock(connection).should_receive('_connect').and_return(
+            FakeClient(transport))
+        self.assertRaises(aexpect.ShellTimeoutError, connection.run,
+                          'sleep 10', 0.1)
+
+    def test_reconnect(self):
+        old = FakeClient(FakeTransport())
+        new = FakeClient(FakeTransport())
+        connection = remote.SSHConnection('host', timeout=1)
+        flexmock(connection).should_receive('_connect').and_return(
+            old).and_return(new).twice()
+        self.assertIs(connection.get_transport(), old.transport)
+        self.assertIs(connection.get_transport(), old.transport)
+        old.transport.active = False
+        self.assertIs(connection.get_transport(), new.transport)
+        connection.close()
+        self.assertTrue(new.closed)
+
+    def test_login_errors(self):
+        connection = remote.SSHConnection('host', timeout=0)
+        flexmock(connection).should_receive('_connect').and_raise(
+            paramiko.AuthenticationException('denied'))
+        self.assertRaises(remote.LoginAuthenticationError,
+                          connection.get_transport)
+        flexmock(connection).should_receive('_connect').and_raise(
+            socket.error('refused'))
+        self.assertRaises(remote.LoginTimeoutError, connection.get_transport)
+
+    def test_shared_connections(self):
+        flexmock(remote.SSHConnection).should_receive('get_transport')
+        first = remote.get_ssh_connection('host', 22, 'root', 'pass')
+        self.assertIs(remote.get_ssh_connection('host', '22', 'root',
+                                                'pass'), first)
+        self.assertIsNot(remote.get_ssh_connection('other', 22, 'root',
+                                                   'pass'), first)
+        # Connections of a parent process are not reused
+        flexmock(os).should_receive('getpid').and_return(-1)
+        self.assertIsNot(remote.get_ssh_connection('host', 22, 'root',
+                                                   'pass'), first)
+
+    def tearDown(self):
+        flexmock_teardown()
+
+
+class RemoteRunnerBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = flexmock(run=lambda command, timeout: (0, 'out',
+                                                                 ''))
+        flexmock(remote).should_receive('get_ssh_connection').and_return(
+            self.connection)
+
+    def test_paramiko(self):
+        session = flexmock()
+        session.should_receive('close').once()
+        flexmock(remote).should_receive('wait_for_login').and_return(
+            session).once()
+        runner = remote.RemoteRunner(host='host', password='pass',
+                                     backend='paramiko')
+        self.assertEqual(runner.backend, 'paramiko')
+        self.assertIs(runner.connection, self.connection)
+        self.assertEqual(runner.run('ls').stdout, 'out')
+        self.assertTrue(runner.is_responsive())
+        # The shell session is only logged in when asked for
+        self.assertIs(runner.session, session)
+        self.assertIs(runner.session, session)
+        runner.close()
+        runner.close()
+
+    def test_default_backend(self):
+        flexmock(remote.settings).should_receive('get_value').with_args(
+            'cloudtest.common', 'remote_runner_backend',
+            default='paramiko').and_return('aexpect')
+        session = flexmock(is_responsive=lambda timeout: False)
+        flexmock(remote).should_receive('wait_for_login').and_return(
+            session).once()
+        runner = remote.RemoteRunner(host='host', password='pass')
+        self.assertEqual(runner.backend, 'aexpect')
+        self.assertIsNone(runner.connection)
+        self.assertFalse(runner.is_responsive())
+
+    def test_aexpect_only(self):
+        session = flexmock()
+        flexmock(remote).should_receive('wait_for_login').never()
+        runner = remote.RemoteRunner(session=session, backend='paramiko')
+        self.assertEqual(runner.backend, 'aexpect')
+        self.assertIs(runner.session, session)
+        flexmock(remote).should_receive('wait_for_login').and_return(
+            session).once()
+        runner = remote.RemoteRunner(client='telnet', host='host',
+                                     backend='paramiko')
+        self.assertEqual(runner.backend, 'aexpect')
+        self.assertIsNone(runner.connection)
+
+    def tearDown(self):
+        flexmock_teardown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import multiprocessing
+import signal
+import sys
+import time
+from multiprocessing import queues
+
+from avocado.core import runner
+from avocado.core import tree
+
+if sys.version_info[:2] == (2, 6):
+    import unittest2 as unittest
+else:
+    import unittest
+
+
+class TestSerialOnly(unittest.TestCase):
+
+    def test_no_params(self):
+        factory = ('Test', {'name': 'test'})
+        self.assertFalse(runner.TestRunner._is_serial_only(factory))
+
+    def test_ct_params(self):
+        factory = ('Test', {'name': 'test',
+                            'ct_params': {'run_serial': 'yes'}})
+        self.assertTrue(runner.TestRunner._is_serial_only(factory))
+        factory[1]['ct_params']['run_serial'] = 'no'
+        self.assertFalse(runner.TestRunner._is_serial_only(factory))
+
+    @staticmethod
+    def _mux_factory(value):
+        leaf = tree.TreeNode('run', {'run_serial': value})
+        tree.TreeNode('', children=[leaf])
+        return ('Test', {'name': 'test', 'params': ([leaf], ['/run/*'])})
+
+    def test_mux_params(self):
+        for value in (True, 'yes', 'on'):
+            factory = self._mux_factory(value)
+            self.assertTrue(runner.TestRunner._is_serial_only(factory))
+        for value in (False, 'no'):
+            factory = self._mux_factory(value)
+            self.assertFalse(runner.TestRunner._is_serial_only(factory))
+
+
+class TestStatusWait(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = queues.SimpleQueue()
+        self.status = runner.TestStatus(None, self.queue)
+
+    def test_wakes_on_message(self):
+        proc = multiprocessing.Process(target=self.queue.put,
+                                       args=({'status': 'PASS'},))
+        start = time.time()
+        proc.start()
+        self.assertTrue(self.status.wait(lambda: not self.queue.empty(), 10))
+        self.assertLess(time.time() - start, 5)
+        proc.join()
+
+    def test_wakes_on_child_exit(self):
+        proc = multiprocessing.Process(target=time.sleep, args=(0.2,))
+        start = time.time()
+        proc.start()
+        self.assertTrue(self.status.wait(lambda: not proc.is_alive(), 10))
+        self.assertLess(time.time() - start, 5)
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertIsNone(self.status.wait(lambda: False, 0.2))
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+
+class FakeParallelRunner(runner.TestRunner):
+
+    """
+    Runner whose tests are processes sleeping for the test 'duration'
+    """
+
+    def __init__(self):
+        super(FakeParallelRunner, self).__init__(None, None)
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    def _start_parallel_test(self, test_factory, job_deadline):
+        name = test_factory[1]['name']
+        proc = multiprocessing.Process(target=time.sleep,
+                                       args=(test_factory[1]['duration'],))
+        proc.start()
+        self.events.append(('start', name))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        status = runner.TestStatus(None, queues.SimpleQueue())
+        return runner.RunningTest(test_factory, proc, status, time.time(),
+                                  time.time() + 10,
+                                  self._is_serial_only(test_factory))
+
+    def _finish_parallel_test(self, running_test, summary):
+        running_test.proc.join()
+        self.events.append(('finish', running_test.test_factory[1]['name']))
+        self.running -= 1
+        return running_test.test_factory[1].get('continue', True)
+
+
+class TestRunSuiteParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.sigtstp = signal.getsignal(signal.SIGTSTP)
+        self.runner = FakeParallelRunner()
+
+    @staticmethod
+    def _suite(*tests):
+        for name, duration, params in tests:
+            params = dict(params, name=name, duration=duration)
+            yield ('Test', params), 0
+
+    def test_parallel(self):
+        start = time.time()
+        self.runner.run_suite_parallel(self._suite(('a', 0.5, {}),
+                                                   ('b', 0.5, {}),
+                                                   ('c', 0.5, {})),
+                                       set(), 3)
+        self.assertLess(time.time() - start, 1.4)
+        self.assertEqual(self.runner.max_running, 3)
+        self.assertEqual(self.runner.events[:3],
+                         [('start', 'a'), ('start', 'b'), ('start', 'c')])
+
+    def test_serial_only_and_order(self):
+        serial = {'ct_params': {'run_serial': 'yes'}}
+        self.runner.run_suite_parallel(self._suite(('a', 1, {}),
+                                                   ('b', 0.1, {}),
+                                                   ('c', 0.1, {}),
+                                                   ('s', 0.1, serial),
+                                                   ('d', 0.1, {})),
+                                       set(), 2)
+        self.assertEqual(self.runner.max_running, 2)
+        # Results are delivered in the order the tests finish, the serial
+        # test waits for the running ones and runs alone
+        self.assertEqual(self.runner.events,
+                         [('start', 'a'), ('start', 'b'), ('finish', 'b'),
+                          ('start', 'c'), ('finish', 'c'), ('finish', 'a'),
+                          ('start', 's'), ('finish', 's'), ('start', 'd'),
+                          ('finish', 'd')])
+
+    def test_stop(self):
+        self.runner.run_suite_parallel(self._suite(('a', 0.1,
+                                                    {'continue': False}),
+                                                   ('b', 0.5, {}),
+                                                   ('c', 0.1, {})),
+                                       set(), 2)
+        # No test is started after a failed report, the running ones finish
+        self.assertEqual(self.runner.events,
+                         [('start', 'a'), ('start', 'b'), ('finish', 'a'),
+                          ('finish', 'b')])
+
+    def tearDown(self):
+        signal.signal(signal.SIGTSTP, self.sigtstp)
+
+
+if __name__ == '__main__':
+    unittest.main()
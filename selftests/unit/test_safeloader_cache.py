@@ -0,0 +1,139 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+if sys.version_info[:2] == (2, 6):
+    import unittest2 as unittest
+else:
+    import unittest
+
+from avocado.core import safeloader
+
+
+#: Files scanned by count_scans
+SCANNED = []
+
+
+def count_scans(path):
+    SCANNED.append(path)
+    return safeloader.find_avocado_tests(path)
+
+
+class ScanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.cache_file = os.path.join(self.tmpdir, 'cache', 'scans')
+        self.test_file = os.path.join(self.tmpdir, 'test.py')
+        self._write("from avocado import Test\n"
+                    "class MyTest(Test):\n"
+                    "    def test(self):\n"
+                    "        pass\n")
+        del SCANNED[:]
+
+    def _write(self, content, mtime=None):
+        with open(self.test_file, 'w') as test_file:
+            test_file.write(content)
+        if mtime is not None:
+            os.utime(self.test_file, (mtime, mtime))
+
+    def test_cached(self):
+        cache = safeloader.ScanCache(self.cache_file)
+        self.assertEqual(cache.scan(self.test_file, count_scans),
+                         {'MyTest': ['test']})
+        cache.scan(self.test_file, count_scans)
+        self.assertEqual(len(SCANNED), 1)
+        cache.save()
+        cache = safeloader.ScanCache(self.cache_file)
+        self.assertEqual(cache.scan(self.test_file, count_scans),
+                         {'MyTest': ['test']})
+        self.assertEqual(len(SCANNED), 1)
+
+    def test_invalidation(self):
+        cache = safeloader.ScanCache(self.cache_file)
+        cache.scan(self.test_file, count_scans)
+        # Same content, only the mtime changed
+        content = open(self.test_file).read()
+        self._write(content, 1)
+        cache.scan(self.test_file, count_scans)
+        self.assertEqual(len(SCANNED), 1)
+        # Different content
+        self._write(content.replace('test(', 'test2('), 2)
+        self.assertEqual(cache.scan(self.test_file, count_scans),
+                         {'MyTest': ['test2']})
+        self.assertEqual(len(SCANNED), 2)
+
+    def test_error(self):
+        self._write("class (:\n")
+        cache = safeloader.ScanCache(self.cache_file)
+        self.assertRaises(safeloader.ScanError, cache.scan, self.test_file,
+                          count_scans)
+        self.assertRaises(safeloader.ScanError, cache.scan, self.test_file,
+                          count_scans)
+        self.assertEqual(len(SCANNED), 1)
+
+    def test_prefetch(self):
+        paths = []
+        for i in xrange(safeloader.ScanCache.PARALLEL_MIN):
+            paths.append(os.path.join(self.tmpdir, 'test%d.py' % i))
+            shutil.copy(self.test_file, paths[-1])
+        cache = safeloader.ScanCache(self.cache_file, workers=2)
+        cache.prefetch(paths, count_scans)
+        for path in paths:
+            self.assertEqual(cache.scan(path, count_scans),
+                             {'MyTest': ['test']})
+        # Scanned in the worker processes
+        self.assertEqual(SCANNED, [])
+
+    def test_prefetch_thread(self):
+        paths = []
+        for i in xrange(safeloader.ScanCache.PARALLEL_MIN):
+            paths.append(os.path.join(self.tmpdir, 'test%d.py' % i))
+            shutil.copy(self.test_file, paths[-1])
+        cache = safeloader.ScanCache(self.cache_file, workers=2)
+        thread = threading.Thread(target=cache.prefetch,
+                                  args=(paths, count_scans))
+        thread.start()
+        thread.join()
+        for path in paths:
+            cache.scan(path, count_scans)
+        # No worker processes forked from the thread
+        self.assertEqual(len(SCANNED), len(paths))
+
+    def test_threads(self):
+        paths = []
+        for i in xrange(100):
+            paths.append(os.path.join(self.tmpdir, 'test%d.py' % i))
+            shutil.copy(self.test_file, paths[-1])
+        cache = safeloader.ScanCache(self.cache_file, workers=1)
+        errors = []
+
+        def scan(paths):
+            try:
+                for path in paths:
+                    cache.scan(path, count_scans)
+                    cache.save()
+            except Exception as details:
+                errors.append(details)
+
+        threads = [threading.Thread(target=scan, args=(paths[i::4],))
+                   for i in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        cache.save()
+        cache = safeloader.ScanCache(self.cache_file)
+        for path in paths:
+            cache.scan(path, count_scans)
+        self.assertEqual(len(SCANNED), len(paths))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+import aexpect
+
+from avocado.utils import process
+from cloudtest import strategy
+
+
+class FakeSession(object):
+
+    """
+    Runs the plan commands locally, 'sleep N' commands are interrupted by
+    the kill commands, as the remote process group would be
+    """
+
+    def __init__(self, host, runs):
+        self.host = host
+        self.runs = runs
+        self.killed = threading.Event()
+
+    def run(self, command, timeout=60, ignore_status=False):
+        self.runs.append((self.host, command, time.time()))
+        if command.startswith('test -f'):
+            self.killed.set()
+            return process.CmdResult(command, exit_status=0)
+        command = command.split(' -c ', 1)[1].strip("'")
+        duration, status = command.split()[1:3]
+        if not self.killed.wait(min(float(duration), timeout)):
+            if float(duration) > timeout:
+                raise aexpect.ShellTimeoutError(command, 'partial output')
+        return process.CmdResult(command, stdout='output of %s' % command,
+                                 exit_status=int(status))
+
+
+class PlanDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.state_path = os.path.join(self.tmpdir, 'strategy.state')
+        self.runs = []
+
+    def _dispatch(self, plans, **kwargs):
+        dispatcher = strategy.PlanDispatcher(
+            plans, strategy.StrategyState(self.state_path),
+            lambda host: FakeSession(host, self.runs),
+            lambda plan: 'sleep %s %s' % (plan['plan_name'],
+                                          plan['plan_status']),
+            log_dir=self.tmpdir, **kwargs)
+        return dispatcher.run()
+
+    @staticmethod
+    def _plan(host, uuid, duration, status=0, timeout=0):
+        return {'host_ip': host, 'plan_uuid': uuid, 'plan_name': duration,
+                'plan_status': status, 'plan_timeout': timeout}
+
+    def test_parallel_hosts(self):
+        plans = [self._plan('host1', '.1', 0.3),
+                 self._plan('host2', '.2', 0.3),
+                 self._plan('host3', '.3', 0.3, 1)]
+        start = time.time()
+        statuses = self._dispatch(plans)
+        self.assertLess(time.time() - start, 0.8)
+        self.assertEqual(statuses, {'.1': strategy.PLAN_PASS,
+                                    '.2': strategy.PLAN_PASS,
+                                    '.3': strategy.PLAN_FAIL})
+        with open(os.path.join(self.tmpdir,
+                               'avocado_run_test_strategy_1.log')) as log:
+            self.assertEqual(log.read(), 'output of sleep 0.3 0')
+
+    def test_same_host_serialized(self):
+        plans = [self._plan('host1', '.1', 0.2), self._plan('host1', '.2', 0)]
+        self._dispatch(plans)
+        self.assertEqual([_[1].split('-c ')[1] for _ in self.runs],
+                         ["'sleep 0.2 0'", "'sleep 0 0'"])
+        self.assertGreaterEqual(self.runs[1][2] - self.runs[0][2], 0.2)
+
+    def test_timeout(self):
+        plans = [self._plan('host1', '.1', 10, timeout=1)]
+        grace_time = strategy.STOP_GRACE_TIME
+        strategy.STOP_GRACE_TIME = 0
+        try:
+            statuses = self._dispatch(plans)
+        finally:
+            strategy.STOP_GRACE_TIME = grace_time
+        self.assertEqual(statuses, {'.1': strategy.PLAN_TIMEOUT})
+        self.assertTrue(self.runs[-1][1].startswith('test -f '
+                                                    '/tmp/avocado-strategy-1'))
+
+    def test_resume(self):
+        plans = [self._plan('host1', '.1', 0), self._plan('host2', '.2', 0, 1)]
+        self._dispatch(plans)
+        self.runs = []
+        statuses = self._dispatch(plans, resume=True)
+        self.assertEqual(self.runs, [])
+        self.assertEqual(statuses, {'.1': strategy.PLAN_PASS,
+                                    '.2': strategy.PLAN_FAIL})
+        state = strategy.StrategyState(self.state_path)
+        state.update('.2', status=strategy.PLAN_RUNNING)
+        self._dispatch(plans, resume=True)
+        self.assertEqual([_[0] for _ in self.runs], ['host2'])
+
+    def test_stop(self):
+        state = strategy.StrategyState(self.state_path)
+        state.update('.1', status=strategy.PLAN_RUNNING, host='host1',
+                     pid_file='/tmp/avocado-strategy-1.pid')
+        state.update('.2', status=strategy.PLAN_PASS, host='host2')
+        stopped = strategy.stop_plans(
+            strategy.StrategyState(self.state_path),
+            lambda host: FakeSession(host, self.runs), grace_time=0)
+        self.assertEqual(stopped, ['.1'])
+        self.assertEqual([_[0] for _ in self.runs], ['host1', 'host1'])
+        self.assertEqual(strategy.StrategyState(self.state_path).get('.1')
+                         ['status'], strategy.PLAN_STOPPED)
+
+    def test_stop_dispatcher(self):
+        dispatchers = [subprocess.Popen(['sleep', '30']) for _ in xrange(3)]
+        state = strategy.StrategyState(self.state_path)
+        identity = strategy.get_process_identity(dispatchers[0].pid)
+        self.assertIn('sleep 30', identity)
+        state.update('.1', status=strategy.PLAN_RUNNING, host='host1',
+                     pid_file='/tmp/avocado-strategy-1.pid',
+                     dispatcher_pid=dispatchers[0].pid, dispatcher=identity)
+        # Pids reused by other processes, or of unknown processes
+        state.update('.2', status=strategy.PLAN_RUNNING, host='host2',
+                     pid_file='/tmp/avocado-strategy-2.pid',
+                     dispatcher_pid=dispatchers[1].pid,
+                     dispatcher='1 avocado-run-test-strategy')
+        state.update('.3', status=strategy.PLAN_RUNNING, host='host3',
+                     pid_file='/tmp/avocado-strategy-3.pid',
+                     dispatcher_pid=dispatchers[2].pid)
+        try:
+            strategy.stop_plans(strategy.StrategyState(self.state_path),
+                                lambda host: FakeSession(host, self.runs),
+                                grace_time=0)
+            self.assertEqual(dispatchers[0].wait(), -signal.SIGTERM)
+            self.assertIsNone(dispatchers[1].poll())
+            self.assertIsNone(dispatchers[2].poll())
+        finally:
+            for dispatcher in dispatchers:
+                if dispatcher.poll() is None:
+                    dispatcher.kill()
+                    dispatcher.wait()
+        self.assertIsNone(strategy.get_process_identity(dispatchers[0].pid))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from cloudtest import subunit_v2
+
+
+def encode_number(value):
+    if value < 0x40:
+        return chr(value)
+    elif value < 0x4000:
+        return struct.pack('>H', value | 0x4000)
+    return struct.pack('>I', value | 0xc0000000)
+
+
+def encode_string(value):
+    return encode_number(len(value)) + value
+
+
+def encode_packet(test_id=None, status=0, timestamp=None, tags=(),
+                  file_name=None, file_bytes=''):
+    flags = 0x2000 | status
+    body = ''
+    if timestamp is not None:
+        flags |= subunit_v2.FLAG_TIMESTAMP
+        body += struct.pack('>I', int(timestamp))
+        body += encode_number(int(round((timestamp % 1) * 1e9)))
+    if test_id is not None:
+        flags |= subunit_v2.FLAG_TEST_ID
+        body += encode_string(test_id)
+    if tags:
+        flags |= subunit_v2.FLAG_TAGS
+        body += encode_number(len(tags)) + ''.join(encode_string(_)
+                                                   for _ in tags)
+    if file_name is not None:
+        flags |= subunit_v2.FLAG_FILE_CONTENT
+        body += encode_string(file_name) + encode_string(file_bytes)
+    # The length includes the signature, flags, itself and the CRC
+    length = 1 + 2 + 1 + len(body) + 4
+    while len(encode_number(length)) != length - 1 - 2 - len(body) - 4:
+        length += 1
+    packet = (subunit_v2.SIGNATURE + struct.pack('>H', flags) +
+              encode_number(length) + body)
+    return packet + struct.pack('>I', zlib.crc32(packet) & 0xffffffff)
+
+
+def encode_test(test_id, status, start, end, worker='worker-0', **kwargs):
+    status = subunit_v2.STATUSES.index(status)
+    return (encode_packet(test_id, 2, start, (worker,)) +
+            encode_packet(test_id, status, end, (worker,), **kwargs))
+
+
+class StreamParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = []
+        self.output = []
+        self.parser = subunit_v2.StreamParser(self.packets.append,
+                                              self.output.append)
+
+    def test_packet(self):
+        self.parser.feed(encode_packet('a.b.test', 3, 10.5, ('worker-1',),
+                                       'traceback', 'Traceback...'))
+        self.assertEqual(len(self.packets), 1)
+        packet = self.packets[0]
+        self.assertEqual(packet.test_id, 'a.b.test')
+        self.assertEqual(packet.status, 'success')
+        self.assertAlmostEqual(packet.timestamp, 10.5)
+        self.assertEqual(packet.tags, ('worker-1',))
+        self.assertEqual(packet.file_name, 'traceback')
+        self.assertEqual(packet.file_bytes, 'Traceback...')
+        self.assertEqual(self.output, [])
+
+    def test_long_packet(self):
+        self.parser.feed(encode_packet('a.test', 6, 1, (), 'traceback',
+                                       'x' * 70000))
+        self.assertEqual(len(self.packets[0].file_bytes), 70000)
+
+    def test_split_and_interleaved(self):
+        stream = ('some output\n' + encode_test('a.test', 'success', 1, 2) +
+                  'more output\n' + encode_test('b.test', 'fail', 2, 3))
+        for char in stream:
+            self.parser.feed(char)
+        self.parser.close()
+        self.assertEqual([(_.test_id, _.status) for _ in self.packets],
+                         [('a.test', 'inprogress'), ('a.test', 'success'),
+                          ('b.test', 'inprogress'), ('b.test', 'fail')])
+        self.assertEqual(''.join(self.output), 'some output\nmore output\n')
+
+    def test_corrupted_packet(self):
+        packet = encode_packet('a.test', 3)
+        packet = packet[:-1] + chr((ord(packet[-1]) + 1) % 256)
+        self.parser.feed(packet + encode_packet('b.test', 3))
+        self.parser.close()
+        self.assertEqual([_.test_id for _ in self.packets], ['b.test'])
+        self.assertEqual(''.join(self.output), packet)
+
+
+class ResultCollectorTest(unittest.TestCase):
+
+    def test_collect(self):
+        finished = []
+        collector = subunit_v2.ResultCollector(finished.append)
+        parser = subunit_v2.StreamParser(collector.packet)
+        parser.feed(encode_packet('a.test', 1))     # listed only
+        parser.feed(encode_test('a.test', 'success', 1, 2.5))
+        parser.feed(encode_test('b.test', 'fail', 2, 3, 'worker-1',
+                                file_name='traceback', file_bytes='Boom'))
+        parser.feed(encode_test('c.test', 'skip', 3, 3))
+        parser.feed(encode_test('d.test', 'uxsuccess', 3, 4))
+        self.assertEqual([_.id for _ in finished],
+                         ['a.test', 'b.test', 'c.test', 'd.test'])
+        self.assertEqual(finished[1].worker, 'worker-1')
+        self.assertEqual(finished[1].details, {'traceback': 'Boom'})
+        self.assertAlmostEqual(finished[0].duration, 1.5)
+        self.assertEqual(collector.total, 4)
+        self.assertEqual(collector.counters,
+                         {'success': 1, 'fail': 1, 'skip': 1, 'xfail': 0,
+                          'uxsuccess': 1})
+        self.assertEqual(collector.failures, ['b.test', 'd.test'])
+        self.assertAlmostEqual(collector.run_time, 3.5)
+        self.assertEqual(sorted(collector.durations),
+                         ['a.test', 'b.test', 'd.test'])
+
+
+class HTMLReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+
+    def test_report(self):
+        path = os.path.join(self.tmpdir, 'result.html')
+        report = subunit_v2.HTMLReport(path)
+        collector = subunit_v2.ResultCollector(report.add_test)
+        parser = subunit_v2.StreamParser(collector.packet)
+        parser.feed(encode_test('a.test', 'success', 1, 2))
+        # Rows are written as the tests finish
+        self.assertIn('a.test', open(path).read())
+        parser.feed(encode_test('b.test', 'fail', 2, 3,
+                                file_name='traceback', file_bytes='<Boom>'))
+        report.close(collector)
+        content = open(path).read()
+        self.assertIn('&lt;Boom&gt;', content)
+        self.assertIn('<tr><th>total</th><td>2</td></tr>', content)
+        self.assertTrue(content.endswith('</html>\n'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import os
 import sys
 import tempfile
 import shutil
+import time
 
 if sys.version_info[:2] == (2, 6):
     import unittest2 as unittest
@@ -67,6 +68,107 @@ class SysinfoTest(unittest.TestCase):
         job_postdir = os.path.join(jobdir, 'post')
         self.assertTrue(os.path.isdir(job_postdir))
 
+    def test_static_commands(self):
+        sysinfo_logger = sysinfo.SysInfo(basedir=self.tmpdir)
+        sysinfo_logger.commands = ['uname -a', 'uptime']
+        sysinfo_logger.static_commands = set(['uname -a'])
+        for static_in_job in (False, True):
+            for collectibles in sysinfo_logger.hook_mapping.itervalues():
+                collectibles.clear()
+            sysinfo_logger.static_in_job = static_in_job
+            sysinfo_logger._set_collectibles()
+            commands = dict((hook, set(_.cmd for _ in collectibles
+                                       if isinstance(_, sysinfo.Command)))
+                            for hook, collectibles
+                            in sysinfo_logger.hook_mapping.iteritems())
+            self.assertEqual(commands['start_job'],
+                             set(['uname -a', 'uptime']))
+            self.assertEqual(commands['end_job'], set(['uptime']))
+            self.assertEqual(commands['end_test'], set(['uptime']))
+            if static_in_job:
+                self.assertEqual(commands['start_test'], set(['uptime']))
+            else:
+                self.assertEqual(commands['start_test'],
+                                 set(['uname -a', 'uptime']))
+
+    def test_shipped_static_commands(self):
+        sysinfo_dir = os.path.join(os.path.dirname(__file__), os.pardir,
+                                   os.pardir, 'etc', 'avocado', 'sysinfo')
+        with open(os.path.join(sysinfo_dir, 'commands')) as commands:
+            commands = set(commands.read().splitlines())
+        with open(os.path.join(sysinfo_dir, 'static_commands')) as static:
+            static = set(static.read().splitlines())
+        self.assertTrue(static.issubset(commands))
+        # The output of these changes during a job
+        for cmd in ('top -n 1', 'free -m', 'df -mP', 'dmesg', 'uptime'):
+            self.assertNotIn(cmd, static)
+
+    def test_command_timeout(self):
+        cmd = sysinfo.Command("echo started; sleep 10", logf="sleep",
+                              timeout=0.2)
+        start = time.time()
+        cmd.run(self.tmpdir)
+        self.assertLess(time.time() - start, 5)
+        with open(os.path.join(self.tmpdir, "sleep")) as output:
+            self.assertEqual(output.read(), "started\n")
+
+    def test_command_timeout_children(self):
+        pid_path = os.path.join(self.tmpdir, "pid")
+        cmd = sysinfo.Command("sleep 10 & echo $! > %s; wait" % pid_path,
+                              logf="sleep", timeout=0.2)
+        cmd.run(self.tmpdir)
+        with open(pid_path) as pid_file:
+            pid = int(pid_file.read())
+        # The background child of the shell is killed with it
+        for _ in xrange(50):
+            try:
+                with open("/proc/%d/stat" % pid) as stat_file:
+                    if stat_file.read().rsplit(")", 1)[1].split()[0] == "Z":
+                        break
+            except IOError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("Child process %s still running" % pid)
+
+    def test_installed_packages_snapshot(self):
+        class FakeSoftwareManager(object):
+            calls = []
+
+            def list_all(self):
+                self.calls.append(None)
+                return ['pkg-%d' % len(self.calls)]
+
+        database = os.path.join(self.tmpdir, 'Packages')
+        open(database, 'w').close()
+        databases = sysinfo.PACKAGE_DATABASES
+        software_manager = sysinfo.software_manager.SoftwareManager
+        sysinfo.PACKAGE_DATABASES = (database,)
+        sysinfo.software_manager.SoftwareManager = FakeSoftwareManager
+        sysinfo._PACKAGES.clear()
+        try:
+            self.assertEqual(sysinfo.get_installed_packages(), ['pkg-1'])
+            self.assertEqual(sysinfo.get_installed_packages(), ['pkg-1'])
+            stat = os.stat(database)
+            os.utime(database, (stat.st_atime, stat.st_mtime + 10))
+            self.assertEqual(sysinfo.get_installed_packages(), ['pkg-2'])
+            self.assertEqual(len(FakeSoftwareManager.calls), 2)
+        finally:
+            sysinfo.PACKAGE_DATABASES = databases
+            sysinfo.software_manager.SoftwareManager = software_manager
+            sysinfo._PACKAGES.clear()
+
+    def test_hooks_overhead(self):
+        sysinfo_logger = sysinfo.SysInfo(basedir=self.tmpdir)
+        for collectibles in sysinfo_logger.hook_mapping.itervalues():
+            collectibles.clear()
+        for i in xrange(4):
+            sysinfo_logger.add_cmd("sleep 0.2; echo %d" % i, 'start_test')
+        sysinfo_logger.workers = 4
+        sysinfo_logger.start_test_hook()
+        self.assertLess(sysinfo_logger.overhead['start_test'], 0.6)
+        self.assertEqual(len(os.listdir(sysinfo_logger.pre_dir)), 4)
+
     def tearDown(self):
         shutil.rmtree(self.tmpdir)
 
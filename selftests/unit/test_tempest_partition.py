@@ -0,0 +1,94 @@
+import anydbm
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloudtest import tempest_partition
+
+
+class PartitionTest(unittest.TestCase):
+
+    def test_group(self):
+        groups = tempest_partition.group_tests(
+            ['tempest.api.a.TestA.test_1[id-1,smoke]',
+             'tempest.api.b.TestB.test_1',
+             'tempest.api.a.TestA.test_2'])
+        self.assertEqual(groups.items(),
+                         [('tempest.api.a.TestA.',
+                           ['tempest.api.a.TestA.test_1[id-1,smoke]',
+                            'tempest.api.a.TestA.test_2']),
+                          ('tempest.api.b.TestB.',
+                           ['tempest.api.b.TestB.test_1'])])
+
+    def test_longest_first(self):
+        durations = {'A.t1': 5, 'A.t2': 5, 'B.t1': 6, 'C.t1': 4, 'D.t1': 3,
+                     'E.t1': 2}
+        partitions = tempest_partition.partition_tests(sorted(durations),
+                                                       durations, 2)
+        # A (10) | B (6) + C (4), then D (3) and E (2) on the lighter ones
+        self.assertEqual([sorted(tests) for _, tests in partitions],
+                         [['A.t1', 'A.t2', 'D.t1'],
+                          ['B.t1', 'C.t1', 'E.t1']])
+        self.assertEqual([load for load, _ in partitions], [13, 12])
+
+    def test_unknown_durations(self):
+        durations = {'A.t1': 10, 'B.t1': 2}
+        partitions = tempest_partition.partition_tests(
+            ['A.t1', 'B.t1', 'C.t1', 'D.t1'], durations, 2)
+        # C and D are expected to last the mean (6 s)
+        self.assertEqual([(load, sorted(tests)) for load, tests in partitions],
+                         [(12, ['A.t1', 'B.t1']), (12, ['C.t1', 'D.t1'])])
+
+    def test_more_workers_than_groups(self):
+        partitions = tempest_partition.partition_tests(['A.t1', 'A.t2'], {},
+                                                       4)
+        self.assertEqual(partitions, [(2.0, ['A.t1', 'A.t2'])])
+
+    def test_worker_command(self):
+        conf = {'test_command': 'python -m subunit.run discover -t ./ '
+                                './tempest/test_discover $LISTOPT $IDOPTION',
+                'test_id_option': '--load-list $IDFILE'}
+        self.assertEqual(tempest_partition.get_worker_command(conf,
+                                                              '/tmp/w0'),
+                         'python -m subunit.run discover -t ./ '
+                         './tempest/test_discover  --load-list /tmp/w0')
+
+
+class FilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+
+    def test_history(self):
+        path = os.path.join(self.tmpdir, 'history', 'durations.json')
+        history = tempest_partition.DurationHistory(path)
+        self.assertEqual(history.durations, {})
+        times = anydbm.open(os.path.join(self.tmpdir, 'times.dbm'), 'c')
+        times['A.t1'] = '1.5'
+        times['A.t2'] = '2.5'
+        times.close()
+        history.update({'A.t2': 3.0})
+        self.assertEqual(history.harvest_testrepository(self.tmpdir), 1)
+        self.assertEqual(history.harvest_testrepository('/nonexistent'), 0)
+        history.save()
+        self.assertEqual(json.load(open(path)), {'A.t1': 1.5, 'A.t2': 3.0})
+        self.assertEqual(tempest_partition.DurationHistory(path).durations,
+                         {'A.t1': 1.5, 'A.t2': 3.0})
+
+    def test_orphaned_bytecode(self):
+        package = os.path.join(self.tmpdir, 'package')
+        os.mkdir(package)
+        for name in ('kept.py', 'kept.pyc', 'removed.pyc', 'removed.pyo'):
+            open(os.path.join(package, name), 'w').close()
+        self.assertEqual(
+            tempest_partition.remove_orphaned_bytecode(self.tmpdir), 2)
+        self.assertEqual(sorted(os.listdir(package)), ['kept.py', 'kept.pyc'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
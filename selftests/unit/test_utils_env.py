@@ -0,0 +1,197 @@
+import cPickle
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from cloudtest import funcatexit
+from cloudtest import utils_env
+
+
+CLEANED = []
+
+
+def cleanup(name):
+    CLEANED.append(name)
+
+
+class SqliteEnvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.filename = os.path.join(self.tmpdir, 'env')
+
+    def _rows(self):
+        connection = sqlite3.connect(self.filename)
+        try:
+            return dict((cPickle.loads(str(key)), mtime) for key, mtime in
+                        connection.execute("SELECT key, mtime FROM env"))
+        finally:
+            connection.close()
+
+    def test_save_load(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['vm'] = {'name': 'vm1'}
+        env.save()
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(env['vm'], {'name': 'vm1'})
+        self.assertEqual(env['version'], 1)
+
+    def test_incremental_save(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['a'] = 1
+        env['b'] = 2
+        env.save()
+        mtimes = self._rows()
+        time.sleep(0.01)
+        env['b'] = 3
+        del env['a']
+        env.save()
+        rows = self._rows()
+        self.assertNotIn('a', rows)
+        self.assertEqual(rows['version'], mtimes['version'])
+        self.assertGreater(rows['b'], mtimes['b'])
+        self.assertEqual(utils_env.Env(self.filename, 1)['b'], 3)
+
+    def test_touch(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['nodes'] = []
+        env.save()
+        env['nodes'].append('node1')
+        env.touch('nodes')
+        env.save()
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(env['nodes'], ['node1'])
+
+    def test_changed_in_place(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['address_cache'] = {}
+        env['vm'] = 'vm1'
+        env.save()
+        mtimes = self._rows()
+        time.sleep(0.01)
+        utils_env._update_address_cache(env, 'Your-IP 10.0.0.2')
+        env.save()
+        rows = self._rows()
+        self.assertGreater(rows['address_cache'], mtimes['address_cache'])
+        # Unchanged values are not written again
+        self.assertEqual(rows['vm'], mtimes['vm'])
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(env['address_cache'], {'last_seen_ip': '10.0.0.2'})
+
+    def test_exitfuncs(self):
+        del CLEANED[:]
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        funcatexit.register(env, 'nfv', cleanup, 'vm1')
+        env.save()
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(funcatexit.run_exitfuncs(env, 'nfv'), '')
+        env.save()
+        # The handlers already run are not run again by the next tests
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(env['exithandlers__nfv'], [])
+        funcatexit.run_exitfuncs(env, 'nfv')
+        self.assertEqual(CLEANED, ['vm1'])
+
+    def test_import_pickled_env(self):
+        with open(self.filename, 'w') as env_file:
+            cPickle.dump({'version': 1, 'vm': 'vm1'}, env_file)
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual(env['vm'], 'vm1')
+        env['vm2'] = 'vm2'
+        env.save()
+        with open(self.filename) as env_file:
+            self.assertEqual(env_file.read(16), utils_env.SQLITE_HEADER)
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        self.assertEqual((env['vm'], env['vm2']), ('vm1', 'vm2'))
+
+    def test_export_pickle(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['vm'] = 'vm1'
+        env.save()
+        exported = os.path.join(self.tmpdir, 'exported')
+        env.save(exported)
+        with open(exported) as env_file:
+            self.assertEqual(cPickle.load(env_file),
+                             {'version': 1, 'vm': 'vm1'})
+        other = utils_env.Env(backend='sqlite')
+        other.import_pickle(exported)
+        self.assertEqual(other['vm'], 'vm1')
+
+    def test_failed_save_keeps_previous_env(self):
+        with open(self.filename, 'w') as env_file:
+            cPickle.dump({'version': 1, 'vm': 'vm1'}, env_file)
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['lock'] = __import__('threading').Lock()
+        self.assertRaises(Exception, env.save)
+        self.assertEqual(os.listdir(self.tmpdir), ['env'])
+        env = utils_env.Env(self.filename, 1, backend='pickle')
+        self.assertEqual(env['vm'], 'vm1')
+
+    def test_compact(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env['rally_result__old'] = 'old'
+        env['vm'] = 'vm1'
+        env.save()
+        time.sleep(0.05)
+        env['rally_result__new'] = 'new'
+        env.save()
+        env.compact(max_age=0.04, prefix='rally_result__')
+        self.assertNotIn('rally_result__old', env)
+        self.assertEqual(sorted(self._rows()),
+                         ['rally_result__new', 'version', 'vm'])
+
+    def _free_pages(self):
+        connection = sqlite3.connect(self.filename)
+        try:
+            return connection.execute("PRAGMA freelist_count").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_compact_vacuum(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        for i in xrange(20):
+            env['rally_result__%s' % i] = 'x' * 4096
+        env.save()
+        del env['rally_result__0']
+        env.save()
+        free = self._free_pages()
+        self.assertGreater(free, 0)
+        # Nothing removed, the database is not rewritten
+        env.compact(max_age=3600, prefix='rally_result__')
+        self.assertEqual(self._free_pages(), free)
+        env.compact(max_age=0, prefix='rally_result__1')
+        self.assertEqual(self._free_pages(), 0)
+
+    def test_destroy(self):
+        env = utils_env.Env(self.filename, 1, backend='sqlite')
+        env.save()
+        env.destroy()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class PickleEnvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
+        self.filename = os.path.join(self.tmpdir, 'env')
+
+    def test_save_load(self):
+        env = utils_env.Env(self.filename, 1, backend='pickle')
+        env['vm'] = 'vm1'
+        env.save()
+        with open(self.filename) as env_file:
+            self.assertEqual(cPickle.load(env_file)['vm'], 'vm1')
+        self.assertEqual(os.listdir(self.tmpdir), ['env'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
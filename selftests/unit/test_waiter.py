@@ -0,0 +1,86 @@
+import threading
+import unittest
+
+from cloudtest.openstack import waiter
+
+
+class FakeResource(object):
+
+    def __init__(self, resource_id, status):
+        self.id = resource_id
+        self.name = 'vm-%s' % resource_id
+        self.status = status
+
+
+class FakeCloud(object):
+
+    """
+    Resources whose status follows a given sequence, one step per listing
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.listings = 0
+        self.lock = threading.Lock()
+
+    def list(self):
+        with self.lock:
+            resources = []
+            for resource_id, sequence in self.statuses.iteritems():
+                status = sequence[min(self.listings, len(sequence) - 1)]
+                if status is not None:
+                    resources.append(FakeResource(resource_id, status))
+            self.listings += 1
+            return resources
+
+
+class StatusWaiterTest(unittest.TestCase):
+
+    def _waiter(self, cloud):
+        return waiter.StatusWaiter(cloud.list, kind='VM', step=0.01,
+                                   max_step=0.05)
+
+    def test_batching(self):
+        cloud = FakeCloud({'a': ['BUILD', 'BUILD', 'ACTIVE'],
+                           'b': ['BUILD', 'ACTIVE'],
+                           'c': ['BUILD', 'BUILD', 'BUILD', 'ACTIVE']})
+        status_waiter = self._waiter(cloud)
+        requests = [status_waiter.submit(_, 'ACTIVE', timeout=5)
+                    for _ in 'abc']
+        for request in requests:
+            self.assertTrue(request.result(5))
+            self.assertEqual(request.resource.status, 'ACTIVE')
+        # All the waits are resolved from the same listings
+        self.assertEqual(status_waiter.polls, cloud.listings)
+        self.assertLessEqual(cloud.listings, 5)
+
+    def test_deleted(self):
+        cloud = FakeCloud({'a': ['ACTIVE', 'DELETING', None],
+                           'b': ['BUILD', None]})
+        status_waiter = self._waiter(cloud)
+        deleted = status_waiter.submit('a', 'DELETED', timeout=5)
+        disappeared = status_waiter.submit('b', 'ACTIVE', timeout=5)
+        missing = status_waiter.submit('c', 'ACTIVE', timeout=5)
+        self.assertTrue(status_waiter.wait('a', 'DELETED', 5).reached)
+        self.assertTrue(deleted.result(5))
+        self.assertIsNone(deleted.reason)
+        self.assertFalse(missing.result(5))
+        self.assertIsNone(missing.resource)
+        self.assertIn('not found', missing.reason)
+        self.assertFalse(disappeared.result(5))
+        self.assertIn('disappeared', disappeared.reason)
+
+    def test_error_and_timeout(self):
+        cloud = FakeCloud({'a': ['BUILD', 'ERROR'], 'b': ['BUILD']})
+        status_waiter = self._waiter(cloud)
+        failed = status_waiter.submit('a', 'ACTIVE', timeout=5)
+        timed_out = status_waiter.wait('b', 'ACTIVE', timeout=0.2)
+        self.assertFalse(timed_out.reached)
+        self.assertEqual(timed_out.resource.status, 'BUILD')
+        self.assertIn('still not in status ACTIVE', timed_out.reason)
+        self.assertFalse(failed.result(5))
+        self.assertIn('in status ERROR', failed.reason)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,7 @@ class xUnitSucceedTest(unittest.TestCase):
         self.tmpdir = tempfile.mkdtemp(prefix='avocado_' + __name__)
         args = argparse.Namespace()
         args.xunit_output = self.tmpfile[1]
+        args.jenkins_build_url = None
         self.job = job.Job(args)
         self.test_result = Result(FakeJob(args))
         self.test_result.tests_total = 1
@@ -74,6 +75,25 @@ class xUnitSucceedTest(unittest.TestCase):
                         "Failed to validate against %s, content:\n%s" %
                         (self.junit_schema_path, xml))
 
+    def testStreamWriter(self):
+        writer = xunit.XUnitStreamWriter(self.job.args.xunit_output,
+                                         self.test_result)
+        self.test_result.start_test(self.test1)
+        self.test_result.end_test(self.test1.get_state())
+        writer.add_test(self.test_result, self.test1.get_state())
+        self.test_result.end_tests()
+        writer.close(self.test_result)
+        with open(self.job.args.xunit_output) as fp:
+            xml = fp.read()
+        dom = minidom.parseString(xml)
+        self.assertEqual(len(dom.getElementsByTagName('testcase')), 1)
+        self.assertEqual(dom.documentElement.getAttribute('tests'), '1')
+        with open(self.junit_schema_path, 'r') as f:
+            xmlschema = etree.XMLSchema(etree.parse(f))
+        self.assertTrue(xmlschema.validate(etree.parse(StringIO(xml))),
+                        "Failed to validate against %s, content:\n%s" %
+                        (self.junit_schema_path, xml))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -53,7 +53,8 @@ def get_data_files():
     data_files += [(get_dir(['etc', 'avocado', 'sysinfo']),
                     ['etc/avocado/sysinfo/commands',
                      'etc/avocado/sysinfo/files',
-                     'etc/avocado/sysinfo/profilers'])]
+                     'etc/avocado/sysinfo/profilers',
+                     'etc/avocado/sysinfo/static_commands'])]
     data_files += [(get_dir(['etc', 'avocado', 'scripts', 'job', 'pre.d']),
                     ['etc/avocado/scripts/job/pre.d/README'])]
     data_files += [(get_dir(['etc', 'avocado', 'scripts', 'job', 'post.d']),
@@ -229,6 +230,11 @@ if __name__ == '__main__':
               'avocado.plugins.result_events': [
                   'human = avocado.plugins.human:Human',
                   'journal = avocado.plugins.journal:JournalResult',
+                  'json_stream = avocado.plugins.jsonresult:JSONStreamResult',
+                  'json_events = avocado.plugins.jsonresult:JSONEventsResult',
+                  'xunit_stream = avocado.plugins.xunit:XUnitStreamResult',
+                  'zip_archive_incremental = '
+                  'avocado.plugins.archive:ArchiveIncremental',
               ],
           },
           zip_safe=False,